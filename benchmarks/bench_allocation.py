@@ -0,0 +1,98 @@
+"""Cost allocation: indexed rule dispatch versus testing every rule per expense
+
+Streams synthetic expense items (generated lazily, so memory stays flat at any
+row count) through Allocation with rule sets of growing size, once with the
+compiled dispatcher and once with a first-match loop over every rule, and
+checks that both allocate identical cents and conserve the total.
+
+    python -m benchmarks.bench_allocation --rows 1000000 --rules 10 100 1000
+"""
+import argparse
+import random
+import time
+
+from src.analytics.allocation import Allocation, AllocationRules
+
+CLIENTS = ["production", "staging", "development", "testing"]
+
+
+def make_rules(count, services, rng):
+    """Mostly per-service rules (some narrowed by client or description), plus a few all-glob ones"""
+    rules = []
+    for position in range(count):
+        rule = {"split": {client: rng.randrange(1, 5) for client in rng.sample(CLIENTS, rng.randrange(1, 4))}}
+        if position % 10 == 9:
+            rule["service"] = f"svc-{rng.randrange(10)}*"
+        else:
+            rule["service"] = rng.choice(services)
+            if position % 3 == 1:
+                rule["client"] = rng.choice(CLIENTS)
+            if position % 5 == 2:
+                rule["description"] = "shared"
+        rules.append(rule)
+    return rules
+
+
+def make_items(rows, services, seed=7):
+    rng = random.Random(seed)
+    descriptions = ["shared cluster", "dedicated", None]
+    for _ in range(rows):
+        yield {
+            'service_name': rng.choice(services),
+            'client': rng.choice(CLIENTS),
+            'cost_units': rng.randrange(1, 50000),
+            'currency': 'USD',
+            'description': rng.choice(descriptions)
+        }
+
+
+class LinearRules(AllocationRules):
+    """The straightforward dispatcher: test each rule in order until one matches"""
+    
+    def match(self, service, client, description):
+        for rule in self.rules:
+            if rule.matches(service, client, description):
+                return rule
+        return None
+
+
+def run(rules, rows, services):
+    started = time.perf_counter()
+    allocation = Allocation.from_items(make_items(rows, services), rules)
+    return time.perf_counter() - started, allocation
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--services", type=int, default=200, help="distinct service names")
+    parser.add_argument("--linear-rows", type=int, default=100_000, help="rows for the every-rule baseline")
+    args = parser.parse_args()
+    
+    rng = random.Random(3)
+    services = [f"svc-{number}" for number in range(args.services)]
+    started = time.perf_counter()
+    expected = sum(item['cost_units'] for item in make_items(args.rows, services))
+    generate = time.perf_counter() - started
+    print(f"rows={args.rows} services={args.services} generating rows alone: {generate:.2f}s")
+    
+    print(f"{'rules':>6} {'indexed_s':>10} {'rows/s':>10} {'linear_rows/s':>14} {'speedup':>8} {'allocated%':>11}")
+    for count in args.rules:
+        specs = make_rules(count, services, rng)
+        seconds, allocation = run(AllocationRules(specs), args.rows, services)
+        assert allocation.total_units() == expected
+        
+        sample = min(args.linear_rows, args.rows)
+        linear_seconds, linear = run(LinearRules(specs), sample, services)
+        _, indexed = run(AllocationRules(specs), sample, services)
+        assert (linear.totals, linear.rule_totals) == (indexed.totals, indexed.rule_totals)
+        
+        rate = args.rows / max(seconds - generate, 1e-9)
+        linear_rate = sample / max(linear_seconds - generate * sample / args.rows, 1e-9)
+        allocated = sum(units for _, units in allocation.rule_totals.values()) / expected * 100
+        print(f"{count:>6} {seconds:>10.2f} {rate:>10.0f} {linear_rate:>14.0f} {rate / linear_rate:>7.1f}x {allocated:>10.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Analytics memory per row: Python-typed item dicts versus ExpenseColumns decoded from the wire
+
+Pages of projected expense items are produced as DynamoDB sends them (JSON in
+the wire format, parsed page by page as botocore does) and held three ways:
+as the TypeDeserializer dicts the resource client returns, as ExpenseColumns
+built from those dicts, and as ExpenseColumns decoded straight from the wire
+items. Reports retained bytes per row, rows per MB, the peak while reading,
+and decode throughput.
+
+    python -m benchmarks.bench_analytics_memory --rows 200000 1000000
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from src.analytics.columnar import ExpenseColumns
+
+SERVICES = ["EC2", "S3", "Lambda", "DynamoDB", "RDS", "CloudFront", "SQS"]
+CLIENTS = ["production", "staging", "development", "testing"]
+
+# Roughly what a 1 MB Query page holds at this projection
+PAGE_ROWS = 5000
+
+
+def make_pages(rows):
+    """JSON text of each page, as it arrives over HTTP"""
+    rng = random.Random(5)
+    start = datetime(2024, 1, 1)
+    pages = []
+    for offset in range(0, rows, PAGE_ROWS):
+        items = []
+        for _ in range(min(PAGE_ROWS, rows - offset)):
+            units = rng.randrange(1, 50000)
+            items.append({
+                'cost': {'N': f"{units / 100:.2f}"},
+                'cost_units': {'N': str(units)},
+                'currency': {'S': 'USD'},
+                'date': {'S': (start + timedelta(seconds=rng.randrange(365 * 86400))).isoformat()},
+                'service_name': {'S': rng.choice(SERVICES)},
+                'client': {'S': rng.choice(CLIENTS)}
+            })
+        pages.append(json.dumps({'Items': items}))
+    return pages
+
+
+def python_dicts(pages):
+    deserializer = TypeDeserializer()
+    held = []
+    for page in pages:
+        held.extend(
+            {name: deserializer.deserialize(value) for name, value in item.items()}
+            for item in json.loads(page)['Items']
+        )
+    return held
+
+
+def columns_from_dicts(pages):
+    deserializer = TypeDeserializer()
+    columns = ExpenseColumns()
+    for page in pages:
+        columns.extend(
+            {name: deserializer.deserialize(value) for name, value in item.items()}
+            for item in json.loads(page)['Items']
+        )
+    return columns
+
+
+def columns_from_wire(pages):
+    columns = ExpenseColumns()
+    for page in pages:
+        columns.extend_wire(json.loads(page)['Items'])
+    return columns
+
+
+def measure(build, pages):
+    """(seconds, retained bytes, peak bytes) of building and holding the result"""
+    gc.collect()
+    started = time.perf_counter()
+    build(pages)
+    seconds = time.perf_counter() - started
+    
+    gc.collect()
+    tracemalloc.start()
+    held = build(pages)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return seconds, retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[200_000])
+    parser.add_argument("--budget-mb", type=int, default=512, help="memory to project rows per invocation for")
+    args = parser.parse_args()
+    
+    cases = [
+        ("item dicts", python_dicts),
+        ("columns via dicts", columns_from_dicts),
+        ("columns via wire", columns_from_wire),
+    ]
+    print(f"{'rows':>9} {'representation':>18} {'bytes/row':>10} {'rows/MB':>9} {'peak_MB':>8} {'rows/s':>9} {'rows/' + str(args.budget_mb) + 'MB':>12}")
+    for rows in args.rows:
+        pages = make_pages(rows)
+        for name, build in cases:
+            seconds, retained, peak = measure(build, pages)
+            per_row = retained / rows
+            print(
+                f"{rows:>9} {name:>18} {per_row:>10.1f} {2 ** 20 / per_row:>9.0f} {peak / 2 ** 20:>8.1f} "
+                f"{rows / seconds:>9.0f} {args.budget_mb * 2 ** 20 / per_row:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
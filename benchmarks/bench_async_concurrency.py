@@ -0,0 +1,100 @@
+"""Request throughput under concurrency: blocking calls in async routes versus the async data path
+
+Drives the FastAPI app in-process through httpx's ASGI transport against moto.
+--latency-ms adds a simulated DynamoDB round trip to every table call. The
+"blocking" mode runs each DynamoDB call inline on the event loop, as the routes
+did before AsyncDynamoDBClient; "async" offloads them to the bounded pool.
+
+    python -m benchmarks.bench_async_concurrency --requests 400 --concurrency 50 --latency-ms 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from datetime import datetime
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("CACHE_BACKEND", "none")
+
+import httpx
+from moto import mock_dynamodb
+
+from benchmarks.bench_batch_ingest import create_table
+from src.database.async_dynamodb_client import AsyncDynamoDBClient
+
+
+class SlowTable:
+    """Delay every table call by a fixed round trip before delegating"""
+    
+    def __init__(self, table, latency):
+        self._table = table
+        self.latency = latency
+    
+    def __getattr__(self, name):
+        attr = getattr(self._table, name)
+        if not callable(attr):
+            return attr
+        
+        def call(*args, **kwargs):
+            time.sleep(self.latency)
+            return attr(*args, **kwargs)
+        return call
+
+
+async def _run_inline(self, func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def drive(app, expense_ids, concurrency):
+    """Issue GET /expenses/{id} for every id with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one(expense_id):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(f"/expenses/{expense_id}")
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+        
+        started = time.perf_counter()
+        await asyncio.gather(*(one(expense_id) for expense_id in expense_ids))
+        return time.perf_counter() - started, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    
+    with mock_dynamodb():
+        create_table()
+        from src.main import app, get_expense_handler
+        
+        db_client = get_expense_handler().db_client
+        expense_ids = [
+            db_client.create_expense({"service_name": "EC2", "client": "production", "cost": 1.0, "date": datetime(2024, 1, 1)})["expense_id"]
+            for _ in range(min(args.requests, 50))
+        ]
+        expense_ids = [expense_ids[i % len(expense_ids)] for i in range(args.requests)]
+        db_client.table = SlowTable(db_client.table, args.latency_ms / 1000)
+        
+        print(f"{'mode':>10} {'wall_s':>8} {'req/s':>8} {'p50_ms':>8} {'p95_ms':>8}")
+        real_run = AsyncDynamoDBClient._run
+        for mode in ("blocking", "async"):
+            AsyncDynamoDBClient._run = _run_inline if mode == "blocking" else real_run
+            elapsed, latencies = asyncio.run(drive(app, expense_ids, args.concurrency))
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000
+            p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+            print(f"{mode:>10} {elapsed:>8.3f} {args.requests / elapsed:>8.0f} {p50:>8.1f} {p95:>8.1f}")
+        AsyncDynamoDBClient._run = real_run
+
+
+if __name__ == "__main__":
+    main()
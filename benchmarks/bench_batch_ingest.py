@@ -0,0 +1,114 @@
+"""Ingestion throughput: one put_item per expense versus DynamoDBClient.batch_create
+
+Runs against moto in-process. --latency-ms adds a simulated round trip to every
+DynamoDB call, which is where batching and concurrent chunks pay off in AWS.
+
+    python -m benchmarks.bench_batch_ingest --rows 5000 --latency-ms 5
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+import boto3
+from moto import mock_dynamodb
+
+from src.database.dynamodb_client import DynamoDBClient
+
+SERVICES = ["EC2", "S3", "Lambda", "DynamoDB", "RDS", "CloudFront", "SQS"]
+CLIENTS = ["production", "staging", "development", "testing"]
+
+
+class LatencyClient:
+    """Delay every call by a fixed round trip before delegating"""
+    
+    def __init__(self, client, latency):
+        self._client = client
+        self.latency = latency
+    
+    def __getattr__(self, name):
+        operation = getattr(self._client, name)
+        
+        def call(*args, **kwargs):
+            time.sleep(self.latency)
+            return operation(*args, **kwargs)
+        return call
+
+
+class LatencyTable:
+    def __init__(self, table, latency):
+        self._table = table
+        self.latency = latency
+    
+    def __getattr__(self, name):
+        return getattr(self._table, name)
+    
+    def put_item(self, **kwargs):
+        time.sleep(self.latency)
+        return self._table.put_item(**kwargs)
+
+
+def make_expenses(rows):
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            'service_name': rng.choice(SERVICES),
+            'client': rng.choice(CLIENTS),
+            'cost': round(rng.uniform(0.01, 500), 2),
+            'date': start + timedelta(days=rng.randrange(365)),
+            'description': f"line item {i}"
+        }
+        for i in range(rows)
+    ]
+
+
+def create_table():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    return dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'expense_id', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+    
+    expenses = make_expenses(args.rows)
+    latency = args.latency_ms / 1000
+    
+    print(f"{'mode':>14} {'wall_s':>8} {'rows/s':>10}")
+    with mock_dynamodb():
+        create_table()
+        db_client = DynamoDBClient()
+        db_client.table = LatencyTable(db_client.table, latency)
+        started = time.perf_counter()
+        for expense in expenses:
+            db_client.create_expense(expense)
+        elapsed = time.perf_counter() - started
+        print(f"{'single':>14} {elapsed:>8.3f} {args.rows / elapsed:>10.0f}")
+    
+    for workers in args.workers:
+        with mock_dynamodb():
+            create_table()
+            db_client = DynamoDBClient()
+            db_client.client = LatencyClient(db_client.client, latency)
+            started = time.perf_counter()
+            results = db_client.batch_create(expenses, max_workers=workers)
+            elapsed = time.perf_counter() - started
+            assert all(result["status"] == "created" for result in results)
+            print(f"{f'batch x{workers}':>14} {elapsed:>8.3f} {args.rows / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
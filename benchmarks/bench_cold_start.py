@@ -0,0 +1,99 @@
+"""Cold start: time to import the app and serve its first requests in a fresh interpreter
+
+Each run spawns a new Python process, so nothing is warm: it times importing
+src.main, the first GET /health, and the first DynamoDB-backed request against
+moto. moto is imported only after the app so it can't pre-load boto3 into the
+import timing; the first request therefore covers building the shared
+resource and handlers, not importing boto3. Runs
+are repeated with docs enabled and disabled. Pass --max-import-ms and/or
+--max-first-request-ms to fail with exit status 1 when the median regresses.
+
+    python -m benchmarks.bench_cold_start --runs 5 --max-import-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = r'''
+import asyncio, json, sys, time
+
+started = time.perf_counter()
+import src.main
+imported = time.perf_counter()
+boto3_loaded = "boto3" in sys.modules
+
+import httpx
+from moto import mock_dynamodb
+
+async def first_requests():
+    transport = httpx.ASGITransport(app=src.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t0 = time.perf_counter()
+        assert (await client.get("/health")).status_code == 200
+        t1 = time.perf_counter()
+        assert (await client.get("/expenses", params={"limit": 1})).status_code == 200
+        t2 = time.perf_counter()
+    return t1 - t0, t2 - t1
+
+with mock_dynamodb():
+    from benchmarks.bench_batch_ingest import create_table
+    create_table()
+    health, data = asyncio.run(first_requests())
+
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_health_ms": health * 1000,
+    "first_request_ms": data * 1000,
+    "boto3_at_import": boto3_loaded,
+}))
+'''
+
+METRICS = ("import_ms", "first_health_ms", "first_request_ms")
+
+
+def probe(enable_docs):
+    env = dict(
+        os.environ,
+        ENABLE_DOCS="true" if enable_docs else "false",
+        AWS_ACCESS_KEY_ID=os.getenv("AWS_ACCESS_KEY_ID", "testing"),
+        AWS_SECRET_ACCESS_KEY=os.getenv("AWS_SECRET_ACCESS_KEY", "testing"),
+        CACHE_BACKEND="none",
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float)
+    parser.add_argument("--max-first-request-ms", type=float)
+    args = parser.parse_args()
+    
+    print(f"{'docs':>6} {'import_ms':>10} {'health_ms':>10} {'request_ms':>11} {'boto3_at_import':>16}")
+    regressed = False
+    for enable_docs in (True, False):
+        runs = [probe(enable_docs) for _ in range(args.runs)]
+        medians = {metric: statistics.median(run[metric] for run in runs) for metric in METRICS}
+        boto3_loaded = any(run["boto3_at_import"] for run in runs)
+        print(
+            f"{'on' if enable_docs else 'off':>6} {medians['import_ms']:>10.1f} "
+            f"{medians['first_health_ms']:>10.1f} {medians['first_request_ms']:>11.1f} {str(boto3_loaded):>16}"
+        )
+        if args.max_import_ms is not None and medians["import_ms"] > args.max_import_ms:
+            regressed = True
+        if args.max_first_request_ms is not None and medians["first_request_ms"] > args.max_first_request_ms:
+            regressed = True
+    
+    if regressed:
+        print("Cold start exceeded the configured budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
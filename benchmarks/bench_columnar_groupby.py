@@ -0,0 +1,117 @@
+"""Group-by cost: the original row-wise _group_expenses versus columnar aggregation
+
+Builds synthetic items shaped like a projected DynamoDB read (Decimal cost and
+cost_units, ISO date string) and times, per grouping, the original dict-of-lists
+implementation, the row-wise fold it was replaced by, and ExpenseColumns
+(column build and group-by timed separately). NumPy is used when installed.
+
+    python -m benchmarks.bench_columnar_groupby --rows 1000000
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from src.analytics import columnar
+from src.analytics.columnar import ExpenseColumns
+
+SERVICES = ["EC2", "S3", "Lambda", "DynamoDB", "RDS", "CloudFront", "SQS"]
+CLIENTS = ["production", "staging", "development", "testing"]
+
+
+def make_items(rows):
+    rng = random.Random(11)
+    start = datetime(2024, 1, 1)
+    items = []
+    for _ in range(rows):
+        units = rng.randrange(1, 50000)
+        items.append({
+            'service_name': rng.choice(SERVICES),
+            'client': rng.choice(CLIENTS),
+            'cost': Decimal(units) / 100,
+            # boto3 returns every number as a Decimal
+            'cost_units': Decimal(units),
+            'currency': 'USD',
+            'date': (start + timedelta(days=rng.randrange(365), seconds=rng.randrange(86400))).isoformat()
+        })
+    return items
+
+
+def group_expenses(expenses, group_by):
+    """The original CostAnalysisHandler._group_expenses"""
+    grouped = defaultdict(lambda: {"total_cost": 0, "count": 0, "expenses": []})
+    for expense in expenses:
+        key = expense.get(group_by, 'Unknown')
+        grouped[key]["total_cost"] += float(expense.get('cost', 0))
+        grouped[key]["count"] += 1
+        grouped[key]["expenses"].append(expense)
+    return [
+        {
+            "category": category,
+            "total_cost": round(data["total_cost"], 2),
+            "expense_count": data["count"],
+            "percentage": round((data["total_cost"] / sum(float(exp.get('cost', 0)) for exp in expenses)) * 100, 2) if expenses else 0
+        }
+        for category, data in grouped.items()
+    ]
+
+
+def monthly_original(expenses):
+    """The original monthly-trends loop"""
+    monthly = defaultdict(lambda: {"total_cost": 0, "count": 0})
+    for expense in expenses:
+        month_key = datetime.fromisoformat(expense['date']).strftime("%Y-%m")
+        monthly[month_key]["total_cost"] += float(expense.get('cost', 0))
+        monthly[month_key]["count"] += 1
+    return monthly
+
+
+def row_wise(expenses, key_fn):
+    """The per-row fold used before columnar aggregation"""
+    totals = defaultdict(lambda: [0.0, 0])
+    for expense in expenses:
+        entry = totals[key_fn(expense)]
+        entry[0] += float(expense.get('cost', 0))
+        entry[1] += 1
+    return totals
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    
+    items = make_items(args.rows)
+    print(f"rows={args.rows} numpy={'yes' if columnar.np is not None else 'no'}")
+    
+    started = time.perf_counter()
+    columns = ExpenseColumns.from_items(items)
+    build = time.perf_counter() - started
+    print(f"{'columnar build':>28} {build:>8.3f}s")
+    
+    cases = [
+        ("service", lambda: group_expenses(items, 'service_name'),
+         lambda: row_wise(items, lambda e: e.get('service_name', 'Unknown')),
+         lambda: columns.group_by('service_name')),
+        ("month", lambda: monthly_original(items),
+         lambda: row_wise(items, lambda e: e['date'][:7]),
+         lambda: columns.group_by('month')),
+    ]
+    print(f"{'group':>8} {'original_s':>11} {'row_wise_s':>11} {'columnar_s':>11} {'+build_s':>9}")
+    for name, original, fold, vectorized in cases:
+        t_original = timed(original)
+        t_fold = timed(fold)
+        t_columnar = timed(vectorized)
+        print(f"{name:>8} {t_original:>11.3f} {t_fold:>11.3f} {t_columnar:>11.3f} {t_columnar + build:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
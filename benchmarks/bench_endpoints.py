@@ -0,0 +1,465 @@
+"""Endpoint suite: throughput and p50/p95/p99 latency for every route on a seeded dataset
+
+Seeds the expenses and budgets tables with --rows expenses (services and
+clients drawn with Zipf skew, dates spread over the last --days) and drives
+each endpoint, analytics included, with --requests requests from --concurrency
+tasks. Requests go through httpx's ASGI transport into the app in-process, so
+the numbers are app and DynamoDB time with no network; pass --base-url to
+drive a server running against the same DynamoDB Local over HTTP instead.
+
+DynamoDB is moto by default; --endpoint-url points at DynamoDB Local (tables
+are created if missing, and --no-seed reuses what is already there). moto is
+slow in ways DynamoDB is not: every TransactWriteItems copies all its tables,
+so write latency grows with --rows, its transactions are not thread-safe (so
+writes run one at a time on it), and queries walk the whole table. Compare
+moto runs only with moto runs, and use DynamoDB Local (or --skip-writes) past
+a few thousand rows.
+
+Results are written as JSON with --output. Each run is compared against
+--baseline (benchmarks/baselines/endpoints.json unless given; skipped with a
+note while that file has not been recorded) and exits with status 1 when an endpoint's p50 or p95 grew, or its throughput
+fell, by more than --tolerance. The committed baseline is a moto run with the
+default options; refresh it on the machine that does the comparing, after a
+deliberate performance change, with --no-baseline --output pointing at it.
+
+    python -m benchmarks.bench_endpoints
+    python -m benchmarks.bench_endpoints --no-baseline --output benchmarks/baselines/endpoints.json
+    python -m benchmarks.bench_endpoints --rows 10000 --baseline results.json --tolerance 0.25
+    python -m benchmarks.bench_endpoints --endpoint-url http://localhost:8000 --rows 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+# Measure the reads themselves rather than cache hits; --cache turns the cache back on
+os.environ.setdefault("CACHE_BACKEND", "none")
+os.environ.setdefault("BUDGETS_TABLE", "expense-budgets")
+
+import boto3
+import httpx
+
+SERVICES = [
+    "EC2", "S3", "Lambda", "DynamoDB", "RDS", "CloudFront", "SQS", "SNS",
+    "ECS", "EKS", "Kinesis", "Redshift", "ElastiCache", "Athena", "Glue"
+]
+CLIENTS = [f"client-{index:02d}" for index in range(40)]
+PERCENTILES = (50, 95, 99)
+SEED_CHUNK = 5000
+
+# Results each run is compared against unless --baseline or --no-baseline says otherwise
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "endpoints.json")
+
+# Run settings that must match the baseline's for the numbers to be comparable
+COMPARABLE_META = ("rows", "days", "skew", "seed", "requests", "concurrency", "transport", "dynamodb", "cache")
+
+
+def zipf_weights(count: int, exponent: float) -> List[float]:
+    """Weights 1/rank^exponent: a few services and clients carry most of the spend"""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def make_expenses(rows: int, days: int, seed: int, skew: float):
+    """Expenses in SEED_CHUNK-sized lists, reproducible for a given seed"""
+    rng = random.Random(seed)
+    service_weights = zipf_weights(len(SERVICES), skew)
+    client_weights = zipf_weights(len(CLIENTS), skew)
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for start in range(0, rows, SEED_CHUNK):
+        count = min(SEED_CHUNK, rows - start)
+        services = rng.choices(SERVICES, service_weights, k=count)
+        clients = rng.choices(CLIENTS, client_weights, k=count)
+        yield [
+            {
+                'service_name': service,
+                'client': client,
+                # Log-normal costs: mostly cents to tens of dollars, a long tail above
+                'cost': round(min(rng.lognormvariate(1.5, 1.5), 50000), 2),
+                'date': end - timedelta(days=rng.randrange(days), seconds=rng.randrange(86400)),
+                'description': f"line item {start + offset}"
+            }
+            for offset, (service, client) in enumerate(zip(services, clients))
+        ]
+
+
+def create_tables(dynamodb) -> None:
+    """The expenses table with its three GSIs and the budgets table, as in terraform/"""
+    existing = set(dynamodb.meta.client.list_tables()['TableNames'])
+    if 'expenses-table' not in existing:
+        dynamodb.create_table(
+            TableName='expenses-table',
+            KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[
+                {'AttributeName': name, 'AttributeType': 'S'}
+                for name in ('expense_id', 'month_bucket', 'date', 'client_key', 'service_key')
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    'IndexName': index,
+                    'KeySchema': [
+                        {'AttributeName': hash_key, 'KeyType': 'HASH'},
+                        {'AttributeName': 'date', 'KeyType': 'RANGE'}
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'}
+                }
+                for index, hash_key in (
+                    ('date-index', 'month_bucket'), ('client-index', 'client_key'), ('service-index', 'service_key')
+                )
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+    if os.environ['BUDGETS_TABLE'] not in existing:
+        dynamodb.create_table(
+            TableName=os.environ['BUDGETS_TABLE'],
+            KeySchema=[
+                {'AttributeName': 'budget_key', 'KeyType': 'HASH'},
+                {'AttributeName': 'month', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'budget_key', 'AttributeType': 'S'},
+                {'AttributeName': 'month', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+
+def seed(rows: int, days: int, seed_value: int, skew: float) -> List[str]:
+    """Write the dataset through batch_create (so budget counters follow); returns sampled ids"""
+    from src.main import get_expense_handler
+    
+    db_client = get_expense_handler().db_client
+    sampled: List[str] = []
+    for chunk in make_expenses(rows, days, seed_value, skew):
+        results = db_client.batch_create(chunk)
+        failed = [result for result in results if result["status"] != "created"]
+        if failed:
+            raise RuntimeError(f"Seeding failed for {len(failed)} items: {failed[0]['error']}")
+        sampled.extend(result["item"]["expense_id"] for result in results[:100])
+    return sampled
+
+
+def existing_ids(limit: int = 1000) -> List[str]:
+    """Ids already in the table, for runs that skip seeding"""
+    from src.main import get_expense_handler
+    
+    items, _ = get_expense_handler().db_client.list_expenses_page(limit)
+    return [item['expense_id'] for item in items]
+
+
+class Scenario(NamedTuple):
+    """One endpoint call; `build` returns (method, url, params, body) for a request number"""
+    name: str
+    build: Callable[[int], tuple]
+    heavy: bool = False
+    write: bool = False
+    # Called with each response, e.g. to remember created ids
+    record: Optional[Callable[[httpx.Response], None]] = None
+
+
+def expense_body(rng: random.Random) -> Dict:
+    return {
+        "service_name": rng.choice(SERVICES),
+        "client": rng.choice(CLIENTS),
+        "cost": round(rng.uniform(0.01, 500), 2)
+    }
+
+
+def scenarios(ids: List[str], seed_value: int) -> List[Scenario]:
+    """Every route, read and write; updates and deletes use the expenses POST /expenses created"""
+    rng = random.Random(seed_value + 1)
+    created: List[str] = []
+    month = datetime.now().strftime('%Y-%m')
+    
+    def by_id(_):
+        return "GET", f"/expenses/{rng.choice(ids)}", None, None
+    
+    def create(_):
+        return "POST", "/expenses", None, expense_body(rng)
+    
+    def update(number):
+        pool = created or ids
+        return "PUT", f"/expenses/{pool[number % len(pool)]}", None, {"cost": round(rng.uniform(1, 100), 2)}
+    
+    def remember(response):
+        if response.status_code == 201:
+            created.append(response.json()["expense_id"])
+    
+    def delete(_):
+        # Without POST /expenses in the run, fall back to seeded ids; deletes run last
+        return "DELETE", f"/expenses/{(created or ids).pop()}", None, None
+    
+    def import_ndjson(_):
+        lines = "".join(
+            json.dumps(dict(expense_body(rng), date=datetime.now().isoformat())) + "\n" for _ in range(100)
+        )
+        return "POST", "/expenses/import", {"format": "ndjson"}, lines.encode()
+    
+    def fixed(method, url, params=None, body=None):
+        return lambda _: (method, url, params, body)
+    
+    return [
+        Scenario("GET /health", fixed("GET", "/health")),
+        Scenario("GET /metrics", fixed("GET", "/metrics")),
+        Scenario("POST /expenses", create, record=remember, write=True),
+        Scenario("GET /expenses/{expense_id}", by_id),
+        Scenario("PUT /expenses/{expense_id}", update, write=True),
+        Scenario("GET /expenses", fixed("GET", "/expenses", {"limit": 50})),
+        Scenario("POST /expenses/batch", lambda _: ("POST", "/expenses/batch", None, [
+            dict(expense_body(rng), date=datetime.now().isoformat()) for _ in range(25)
+        ]), write=True),
+        Scenario("POST /expenses/import", import_ndjson, write=True),
+        Scenario("GET /cost-breakdown", fixed("GET", "/cost-breakdown")),
+        Scenario("GET /cost-breakdown?group_by=service,month", fixed(
+            "GET", "/cost-breakdown", {"group_by": "service,month", "metrics": "avg,p95", "layout": "nested"}
+        )),
+        Scenario("GET /cost-breakdown?client", lambda _: (
+            "GET", "/cost-breakdown", {"client": rng.choice(CLIENTS[:5]), "group_by": "service"}, None
+        )),
+        Scenario("GET /monthly-trends", fixed("GET", "/monthly-trends", {"months": 6})),
+        Scenario("GET /top-services", fixed("GET", "/top-services")),
+        Scenario("GET /forecast", fixed("GET", "/forecast", {"dimension": "service", "days": 14})),
+        Scenario("GET /anomalies", fixed("GET", "/anomalies", {"dimension": "client"})),
+        Scenario("PUT /budgets/{scope}/{name}", lambda _: (
+            "PUT", f"/budgets/client/{rng.choice(CLIENTS)}", None, {"limit": 1000, "month": month}
+        ), write=True),
+        Scenario("GET /budgets/{scope}/{name}", lambda _: (
+            "GET", f"/budgets/service/{rng.choice(SERVICES)}", {"month": month}, None
+        )),
+        Scenario("GET /expenses/export", fixed("GET", "/expenses/export", {"format": "ndjson"}), heavy=True),
+        Scenario("DELETE /expenses/{expense_id}", delete, write=True),
+    ]
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(latencies: List[float], errors: int, wall: float) -> Dict:
+    ordered = sorted(latencies)
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}_ms"] = round(percentile(ordered, pct) * 1000, 3)
+    summary["max_ms"] = round(ordered[-1] * 1000, 3) if ordered else 0.0
+    return summary
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int, warmup: int):
+    """Send `warmup` untimed requests, then `requests` timed ones from `concurrency` tasks"""
+    async def send(number):
+        method, url, params, body = scenario.build(number)
+        if isinstance(body, bytes):
+            response = await client.request(method, url, params=params, content=body)
+        else:
+            response = await client.request(method, url, params=params, json=body)
+        await response.aread()
+        if scenario.record is not None:
+            scenario.record(response)
+        return response.status_code
+    
+    for number in range(warmup):
+        await send(number)
+    
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(warmup, warmup + requests))
+    
+    async def worker():
+        nonlocal errors
+        for number in counter:
+            started = time.perf_counter()
+            status_code = await send(number)
+            latencies.append(time.perf_counter() - started)
+            if status_code >= 400:
+                errors += 1
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_suite(
+    ids: List[str],
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    seed_value: int,
+    base_url: Optional[str] = None,
+    only: Optional[List[str]] = None,
+    heavy: bool = True,
+    writes: bool = True,
+    serial_writes: bool = False
+) -> Dict[str, Dict]:
+    if base_url:
+        client = httpx.AsyncClient(base_url=base_url, timeout=120)
+    else:
+        from src.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None)
+    
+    results: Dict[str, Dict] = {}
+    async with client:
+        for scenario in scenarios(ids, seed_value):
+            if only and not any(name in scenario.name for name in only):
+                continue
+            if (scenario.heavy and not heavy) or (scenario.write and not writes):
+                continue
+            tasks = 1 if scenario.write and serial_writes else concurrency
+            results[scenario.name] = await run_scenario(client, scenario, requests, tasks, warmup)
+            print(f"  {scenario.name}", file=sys.stderr)
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float, min_delta_ms: float) -> List[str]:
+    """Regressions against a baseline run; latency changes under min_delta_ms are noise"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            limit = previous[metric] * (1 + tolerance)
+            if current[metric] > limit and current[metric] - previous[metric] > min_delta_ms:
+                regressions.append(f"{name}: {metric} {previous[metric]:.2f} -> {current[metric]:.2f}")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {previous['throughput_rps']:.1f} -> {current['throughput_rps']:.1f} req/s"
+            )
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict], baseline: Optional[Dict[str, Dict]] = None) -> None:
+    print(f"{'endpoint':<44} {'req/s':>9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'errors':>7}"
+          + (f" {'p95_base':>9}" if baseline else ""))
+    for name, row in results.items():
+        line = (f"{name:<44} {row['throughput_rps']:>9.1f} {row['p50_ms']:>9.2f} "
+                f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['errors']:>7}")
+        if baseline:
+            previous = baseline.get(name)
+            line += f" {previous['p95_ms']:>9.2f}" if previous else f" {'-':>9}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="expenses to seed (10K to 10M)")
+    parser.add_argument("--days", type=int, default=180, help="seeded dates span the last N days")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for services and clients")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=20, help="timed requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--endpoints", nargs="+", help="only endpoints whose name contains one of these")
+    parser.add_argument("--skip-heavy", action="store_true", help="skip full-table exports")
+    parser.add_argument("--skip-writes", action="store_true", help="only time reads")
+    parser.add_argument("--cache", action="store_true", help="use the in-memory cache (off by default)")
+    parser.add_argument("--endpoint-url", help="DynamoDB Local URL; moto when unset")
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data already in --endpoint-url")
+    parser.add_argument("--base-url", help="drive a running server over HTTP instead of in-process")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="results JSON to compare against")
+    parser.add_argument("--no-baseline", action="store_true", help="don't compare, e.g. when refreshing the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed fractional regression")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore latency changes smaller than this")
+    args = parser.parse_args()
+    if args.base_url and not args.endpoint_url:
+        parser.error("--base-url needs --endpoint-url: the server and the seeding must share DynamoDB Local")
+    
+    if args.cache:
+        os.environ["CACHE_BACKEND"] = "memory"
+    mock = None
+    if args.endpoint_url:
+        os.environ["AWS_ENDPOINT_URL_DYNAMODB"] = args.endpoint_url
+    else:
+        from moto import mock_dynamodb
+        # moto ignores Segment/TotalSegments, so every segment would return the whole table
+        os.environ.setdefault("SCAN_SEGMENTS", "1")
+        mock = mock_dynamodb()
+        mock.start()
+    
+    try:
+        create_tables(boto3.resource('dynamodb', region_name=os.environ['AWS_DEFAULT_REGION']))
+        started = time.perf_counter()
+        ids = existing_ids() if args.no_seed else seed(args.rows, args.days, args.seed, args.skew)
+        print(f"seeded {0 if args.no_seed else args.rows} expenses in {time.perf_counter() - started:.1f}s",
+              file=sys.stderr)
+        
+        results = asyncio.run(run_suite(
+            ids, args.requests, args.concurrency, args.warmup, args.seed,
+            args.base_url, args.endpoints, not args.skip_heavy, not args.skip_writes,
+            # moto's TransactWriteItems isn't thread-safe, so writes run one at a time on it
+            serial_writes=not args.endpoint_url and not args.base_url
+        ))
+    finally:
+        if mock is not None:
+            mock.stop()
+    
+    try:
+        import numpy  # noqa: F401
+        has_numpy = True
+    except ImportError:
+        has_numpy = False
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "rows": args.rows,
+            "days": args.days,
+            "skew": args.skew,
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "transport": "http" if args.base_url else "asgi",
+            "dynamodb": "local" if args.endpoint_url else "moto",
+            "cache": os.environ["CACHE_BACKEND"],
+            "python": platform.python_version(),
+            "numpy": has_numpy
+        },
+        "results": results
+    }
+    
+    baseline = None
+    if args.baseline == DEFAULT_BASELINE and not os.path.exists(DEFAULT_BASELINE) and not args.no_baseline:
+        print(f"no baseline at {DEFAULT_BASELINE} yet; record one with --no-baseline --output", file=sys.stderr)
+    elif args.baseline and not args.no_baseline:
+        with open(args.baseline) as f:
+            previous = json.load(f)
+        baseline = previous["results"]
+        mismatched = [key for key in COMPARABLE_META if previous["meta"].get(key) != report["meta"][key]]
+        if mismatched:
+            print(f"WARNING baseline {args.baseline} was run with different {', '.join(mismatched)}; "
+                  "compare like with like", file=sys.stderr)
+    print_table(results, baseline)
+    
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Anomaly detection and forecasting over thousands of daily cost series
+
+Generates synthetic per-series daily costs (level, weekend dip, noise and a
+few injected spikes), then times the batched NumPy pass and the per-series
+pure-Python pass of forecast.analyze, and building dense series from columns.
+Reports how many injected spikes each pass caught.
+
+    python -m benchmarks.bench_forecast --series 5000 --days 365
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from src.analytics import columnar
+from src.analytics.columnar import ExpenseColumns
+from src.analytics.forecast import analyze, daily_series
+
+FIRST_DAY = date(2024, 1, 1)
+
+
+def make_series(count, days, spikes):
+    rng = random.Random(7)
+    series = []
+    injected = set()
+    for index in range(count):
+        level = rng.randrange(1000, 100000)
+        values = [
+            max(0, int(level * (0.4 if (FIRST_DAY + timedelta(days=offset)).weekday() >= 5 else 1.0)
+                       * rng.gauss(1, 0.05)))
+            for offset in range(days)
+        ]
+        if index < spikes:
+            offset = rng.randrange(days // 2, days)
+            values[offset] *= 6
+            injected.add((index, FIRST_DAY.toordinal() + offset))
+        series.append(values)
+    return series, injected
+
+
+def make_items(series):
+    """One expense item per non-zero point, shaped like a projected DynamoDB read"""
+    for index, values in enumerate(series):
+        for offset, units in enumerate(values):
+            if units:
+                yield {
+                    'service_name': f"service-{index}",
+                    'client': 'production',
+                    'cost_units': units,
+                    'date': (FIRST_DAY + timedelta(days=offset)).isoformat()
+                }
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--series", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--spikes", type=int, default=100)
+    parser.add_argument("--horizon", type=int, default=14)
+    parser.add_argument("--skip-python", action="store_true", help="skip the pure-Python pass")
+    args = parser.parse_args()
+    
+    series, injected = make_series(args.series, args.days, args.spikes)
+    first_day = FIRST_DAY.toordinal()
+    print(f"series={args.series} days={args.days} points={args.series * args.days} "
+          f"numpy={'yes' if columnar.np is not None else 'no'}")
+    
+    columns = ExpenseColumns.from_items(make_items(series))
+    build, _ = timed(lambda: daily_series(columns, 'service_name', first_day, first_day + args.days - 1))
+    print(f"{'dense series build':>20} {build:>8.3f}s")
+    
+    passes = [("batched", columnar.np)] if columnar.np is not None else []
+    if not args.skip_python:
+        passes.append(("per-series", None))
+    
+    original = columnar.np
+    try:
+        for name, np in passes:
+            columnar.np = np
+            elapsed, (anomalies, _) = timed(lambda: analyze(series, first_day, horizon=args.horizon))
+            caught = len(injected & {(index, day) for index, day, _, _, _ in anomalies})
+            print(f"{name:>20} {elapsed:>8.3f}s  {elapsed / (args.series * args.days) * 1e6:.3f}us/point  "
+                  f"caught {caught}/{len(injected)} spikes, {len(anomalies)} flagged")
+    finally:
+        columnar.np = original
+
+
+if __name__ == "__main__":
+    main()
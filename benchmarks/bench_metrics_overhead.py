@@ -0,0 +1,96 @@
+"""Per-request cost of the metrics middleware and DynamoDB hooks
+
+Drives a trivial route in-process through raw ASGI calls, once on a bare app
+and once behind MetricsMiddleware (with EMF lines written to memory), and
+times the after-call hook on a canned DynamoDB response. Exits non-zero when
+the added time per request exceeds OVERHEAD_BUDGET_SECONDS.
+
+    python -m benchmarks.bench_metrics_overhead --requests 20000
+"""
+import argparse
+import asyncio
+import io
+import sys
+import time
+
+from fastapi import FastAPI
+
+from src.middleware import metrics
+from src.middleware.metrics import MetricsMiddleware, RequestMetrics, current_request
+
+
+def build_app(instrumented):
+    app = FastAPI()
+    if instrumented:
+        app.add_middleware(MetricsMiddleware, emf=True, stream=io.StringIO())
+    
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        return {"id": item_id}
+    
+    return app
+
+
+async def drive(app, requests):
+    """Send `requests` GETs straight to the ASGI app and return seconds per request"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/items/42", "raw_path": b"/items/42", "query_string": b"",
+        "root_path": "", "headers": [], "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+    
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    
+    async def send(message):
+        pass
+    
+    for _ in range(200):
+        await app(dict(scope), receive, send)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / requests
+
+
+class Model:
+    name = "Query"
+
+
+def hook_cost(calls):
+    """Seconds per DynamoDB call spent in the before/after hooks"""
+    parsed = {"ConsumedCapacity": {"TableName": "t", "CapacityUnits": 2.5}, "ScannedCount": 100, "Count": 10}
+    token = current_request.set(RequestMetrics())
+    started = time.perf_counter()
+    for _ in range(calls):
+        context = {}
+        metrics._before_call(model=Model, context=context)
+        metrics._after_call(parsed=parsed, model=Model, context=context)
+    elapsed = time.perf_counter() - started
+    current_request.reset(token)
+    return elapsed / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--calls-per-request", type=int, default=5, help="DynamoDB calls assumed per request")
+    args = parser.parse_args()
+    
+    bare = asyncio.run(drive(build_app(False), args.requests))
+    instrumented = asyncio.run(drive(build_app(True), args.requests))
+    per_call = hook_cost(args.requests)
+    
+    overhead = instrumented - bare + per_call * args.calls_per_request
+    budget = metrics.OVERHEAD_BUDGET_SECONDS
+    print(f"{'bare request':>24} {bare * 1e6:>9.1f}us")
+    print(f"{'instrumented request':>24} {instrumented * 1e6:>9.1f}us")
+    print(f"{'hooks per DynamoDB call':>24} {per_call * 1e6:>9.1f}us")
+    print(f"{'overhead per request':>24} {overhead * 1e6:>9.1f}us  "
+          f"(middleware + {args.calls_per_request} calls; budget {budget * 1e6:.0f}us)")
+    if overhead > budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Wall-time scaling of DynamoDBClient.parallel_scan with segment count
+
+moto answers a scan in-process and ignores Segment/TotalSegments, so the table
+is seeded in moto, snapshotted once, and served back through a stand-in client
+that splits the key space by hash like DynamoDB and sleeps for each page to
+model service round-trip time. That I/O wait is what parallel segments overlap.
+
+    python -m benchmarks.bench_parallel_scan --rows 20000 --latency-ms 15
+"""
+import argparse
+import os
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+import boto3
+from moto import mock_dynamodb
+
+from src.database.dynamodb_client import ANALYTICS_FIELDS, DynamoDBClient
+
+SERVICES = ["EC2", "S3", "Lambda", "DynamoDB", "RDS", "CloudFront", "SQS"]
+CLIENTS = ["production", "staging", "development", "testing"]
+
+
+class SimulatedScanClient:
+    """Serve segmented scan pages from a snapshot with per-page latency"""
+    
+    def __init__(self, items, page_size, latency):
+        self.items = items
+        self.page_size = page_size
+        self.latency = latency
+        self._splits = {}
+    
+    def split(self, total_segments):
+        if total_segments not in self._splits:
+            segments = [[] for _ in range(total_segments)]
+            for item in self.items:
+                segments[zlib.crc32(item['expense_id'].encode()) % total_segments].append(item)
+            self._splits[total_segments] = segments
+        return self._splits[total_segments]
+    
+    def scan(self, Segment=0, TotalSegments=1, ExclusiveStartKey=None, **kwargs):
+        time.sleep(self.latency)
+        segment = self.split(TotalSegments)[Segment]
+        start = ExclusiveStartKey['offset'] if ExclusiveStartKey else 0
+        page = segment[start:start + self.page_size]
+        response = {'Items': page}
+        if start + self.page_size < len(segment):
+            response['LastEvaluatedKey'] = {'offset': start + self.page_size}
+        return response
+
+
+def seed(table, rows):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    with table.batch_writer() as batch:
+        for i in range(rows):
+            batch.put_item(Item={
+                'expense_id': f"exp-{i:08d}",
+                'service_name': rng.choice(SERVICES),
+                'client': rng.choice(CLIENTS),
+                'cost': str(round(rng.uniform(0.01, 500), 2)),
+                'date': (start + timedelta(days=rng.randrange(365))).isoformat()
+            })
+
+
+def fold(items):
+    totals = {}
+    for item in items:
+        key = item['service_name']
+        cost, count = totals.get(key, (0.0, 0))
+        totals[key] = (cost + float(item['cost']), count + 1)
+    return totals
+
+
+def merge(left, right):
+    merged = dict(left)
+    for key, (cost, count) in right.items():
+        prev_cost, prev_count = merged.get(key, (0.0, 0))
+        merged[key] = (prev_cost + cost, prev_count + count)
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, default=1000, help="items per simulated 1 MB page")
+    parser.add_argument("--latency-ms", type=float, default=15.0, help="simulated round trip per page")
+    parser.add_argument("--segments", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+    
+    with mock_dynamodb():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        table = dynamodb.create_table(
+            TableName='expenses-table',
+            KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'expense_id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        seed(table, args.rows)
+        
+        db_client = DynamoDBClient()
+        snapshot = list(db_client.iter_expenses())
+    
+    db_client.client = SimulatedScanClient(snapshot, args.page_size, args.latency_ms / 1000)
+    
+    for segments in args.segments:
+        db_client.client.split(segments)
+    
+    print(f"{'segments':>8} {'wall_s':>8} {'speedup':>8} {'rows':>8}")
+    baseline = None
+    for segments in args.segments:
+        started = time.perf_counter()
+        totals = db_client.parallel_scan(fold, merge, total_segments=segments, projection=ANALYTICS_FIELDS)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        rows = sum(count for _, count in totals.values())
+        print(f"{segments:>8} {elapsed:>8.3f} {baseline / elapsed:>7.2f}x {rows:>8}")
+
+
+if __name__ == "__main__":
+    main()
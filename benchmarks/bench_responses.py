@@ -0,0 +1,118 @@
+"""Expense list serialization: response models versus direct item encoding
+
+Serves N stored-shape items from an in-process route two ways: the previous
+pipeline (ExpenseResponse per item, then FastAPI validating against
+response_model and serializing) and FastJSONResponse over expense_documents,
+with orjson and with the stdlib json fallback. Requests are raw ASGI calls,
+so the timings are the route and serialization alone.
+
+    python -m benchmarks.bench_responses --items 1000 10000
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+from fastapi import FastAPI
+
+from src.handlers import responses
+from src.handlers.expense_handler import format_expense
+from src.handlers.responses import FastJSONResponse, expense_documents
+from src.models.expense import ExpenseResponse
+
+SERVICES = ["EC2", "S3", "Lambda", "DynamoDB", "RDS", "CloudFront", "SQS"]
+CLIENTS = ["production", "staging", "development", "testing"]
+
+
+def make_items(count):
+    """Items shaped like a DynamoDB read: Decimal numbers, isoformat strings"""
+    rng = random.Random(5)
+    start = datetime(2024, 1, 1)
+    items = []
+    for index in range(count):
+        stamp = (start + timedelta(seconds=rng.randrange(10 ** 7), microseconds=rng.randrange(10 ** 6))).isoformat()
+        units = rng.randrange(1, 10 ** 6)
+        items.append({
+            'expense_id': f"{index:08d}-0000-4000-8000-000000000000",
+            'service_name': rng.choice(SERVICES),
+            'client': rng.choice(CLIENTS),
+            'cost': Decimal(units).scaleb(-2),
+            'cost_units': Decimal(units),
+            'currency': 'USD',
+            'date': stamp,
+            'month_bucket': stamp[:7],
+            'description': f"line item {index}",
+            'created_at': stamp,
+            'updated_at': stamp,
+            'version': Decimal(1)
+        })
+    return items
+
+
+def build_app(items):
+    app = FastAPI()
+    
+    @app.get("/models", response_model=List[ExpenseResponse])
+    async def models():
+        return [format_expense(item) for item in items]
+    
+    @app.get("/direct", response_model=List[ExpenseResponse])
+    async def direct():
+        return FastJSONResponse(expense_documents(items))
+    
+    return app
+
+
+async def drive(app, path, repeat):
+    """Seconds per request and the response size for GET `path`"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [], "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+    size = 0
+    
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+    
+    await app(dict(scope), receive, send)
+    size = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / repeat, size // repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    
+    orjson = responses.orjson
+    print(f"{'items':>7} {'pipeline':>16} {'ms/request':>11} {'items/s':>11} {'speedup':>8} {'bytes':>10}")
+    for count in args.items:
+        app = build_app(make_items(count))
+        baseline = None
+        runs = [("models", "/models", orjson), ("direct json", "/direct", None)]
+        if orjson is not None:
+            runs.append(("direct orjson", "/direct", orjson))
+        for label, path, encoder in runs:
+            responses.orjson = encoder
+            seconds, size = asyncio.run(drive(app, path, args.repeat))
+            baseline = baseline or seconds
+            print(f"{count:>7} {label:>16} {seconds * 1000:>11.2f} {count / seconds:>11.0f} "
+                  f"{baseline / seconds:>7.1f}x {size:>10}")
+        responses.orjson = orjson
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Year-long reports: live DynamoDB reads versus columnar snapshots of closed months
+
+Seeds a year of expenses into moto, times a twelve-month cost breakdown read
+live, compacts the closed months into snapshots, then times the same report
+again. Live time grows with the rows in the window; snapshot time stays close to
+flat, as only the current month is read from the table.
+
+    python -m benchmarks.bench_snapshots --rows 5000 20000 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("CACHE_BACKEND", "none")
+
+import boto3
+from moto import mock_dynamodb
+
+from src.analytics.snapshots import month_range, snapshot_key
+from src.database.snapshot_store import LocalSnapshotStore
+from src.handlers.cost_analysis_handler import CostAnalysisHandler
+from src.handlers.snapshot_handler import closed_months, compact
+
+SERVICES = ["EC2", "S3", "Lambda", "DynamoDB", "RDS", "CloudFront", "SQS"]
+CLIENTS = ["production", "staging", "development", "testing"]
+
+
+def create_table():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    return dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'expense_id', 'AttributeType': 'S'},
+            {'AttributeName': 'month_bucket', 'AttributeType': 'S'},
+            {'AttributeName': 'date', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': 'date-index',
+            'KeySchema': [
+                {'AttributeName': 'month_bucket', 'KeyType': 'HASH'},
+                {'AttributeName': 'date', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def make_expenses(rows, start, end):
+    rng = random.Random(7)
+    return [
+        {
+            'service_name': rng.choice(SERVICES),
+            'client': rng.choice(CLIENTS),
+            'cost': round(rng.uniform(0.01, 500), 2),
+            'date': start + (end - start) * rng.random(),
+            'description': f"line item {i}"
+        }
+        for i in range(rows)
+    ]
+
+
+def timed(report, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = report()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[5000, 20000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    months = closed_months(11)
+    start, end = month_range(months[0])[0], datetime.now()
+    
+    print(f"{'rows':>8} {'live_ms':>9} {'snapshot_ms':>12} {'speedup':>8} {'plan':>20} {'bytes/row':>10}")
+    for rows in args.rows:
+        with mock_dynamodb(), tempfile.TemporaryDirectory() as directory:
+            create_table()
+            handler = CostAnalysisHandler()
+            handler.db_client.batch_create(make_expenses(rows, start, end))
+            
+            def report():
+                return handler.get_cost_breakdown(start_date=start, end_date=end, group_by="service,month")
+            
+            live_s, live = timed(report, args.repeat)
+            store = LocalSnapshotStore(directory)
+            compact(months, db_client=handler.db_client, store=store)
+            handler.snapshots = store
+            snapshot_s, merged = timed(report, args.repeat)
+            assert merged["summary"] == live["summary"]
+            
+            stored = sum(len(store.open(snapshot_key(month))) for month in months)
+            compacted = merged["summary"]["total_expenses"]
+            print(
+                f"{rows:>8} {live_s * 1000:>9.1f} {snapshot_s * 1000:>12.1f} {live_s / snapshot_s:>7.1f}x "
+                f"{merged['metadata']['query_plan']:>20} {stored / compacted:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
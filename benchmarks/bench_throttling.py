@@ -0,0 +1,137 @@
+"""Hot partitions: a noisy client flooding writes, with and without sharded index keys and adaptive rates
+
+Runs against moto in-process, in front of which a simulator throttles any
+client-index or service-index partition (one key value) taking more than
+--partition-wcu writes per second, as DynamoDB throttles a hot GSI partition.
+Each run reports the calls throttled, the writes given up on after every retry
+(429s from the API), and the rate of writes that got through.
+
+    python -m benchmarks.bench_throttling --writes 3000 --partition-wcu 150 --shards 1 4 8
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+import boto3
+from botocore.awsrequest import AWSResponse
+from moto import mock_dynamodb
+from moto.core.models import botocore_stubber
+
+from src.database import dynamodb_client, throttle
+from src.database.dynamodb_client import DynamoDBClient, ThrottledError, get_dynamodb
+
+THROTTLE_BODY = json.dumps({
+    '__type': 'com.amazonaws.dynamodb.v20120810#ProvisionedThroughputExceededException',
+    'message': 'The level of configured provisioned throughput for the table was exceeded.'
+}).encode()
+
+
+class RawBody:
+    def __init__(self, body):
+        self._body = body
+    
+    def stream(self, **kwargs):
+        yield self._body
+
+
+class PartitionSimulator:
+    """Throttle PutItem calls whose client_key or service_key partition is over its per-second capacity
+    
+    Stands in for moto's before-send hook while active, so a throttled write
+    is never applied.
+    """
+    
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.used = Counter()
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self.events = get_dynamodb().meta.client.meta.events
+    
+    def __enter__(self):
+        self.events.unregister('before-send', botocore_stubber)
+        self.events.register('before-send', self.respond)
+        return self
+    
+    def __exit__(self, *exc):
+        self.events.unregister('before-send', self.respond)
+        self.events.register('before-send', botocore_stubber)
+    
+    def respond(self, event_name, request, **kwargs):
+        if event_name.endswith('.PutItem'):
+            item = json.loads(request.body)['Item']
+            second = int(time.monotonic())
+            partitions = [(attr, item[attr]['S'], second) for attr in ('client_key', 'service_key') if attr in item]
+            with self._lock:
+                if any(self.used[partition] >= self.capacity for partition in partitions):
+                    self.throttled += 1
+                    return AWSResponse(request.url, 400, {'x-amzn-requestid': 'simulated'}, RawBody(THROTTLE_BODY))
+                self.used.update(partitions)
+        return botocore_stubber(event_name, request, **kwargs)
+
+
+def create_table():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    return dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'expense_id', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def flood(writes, workers, capacity):
+    """Write `writes` expenses for one client over `workers` threads; returns (stats, elapsed seconds)"""
+    def write(i):
+        try:
+            db_client.create_expense({
+                'service_name': 'EC2',
+                'client': 'noisy-client',
+                'cost': 1.25,
+                'date': datetime(2024, 1, 1) + timedelta(hours=i)
+            })
+            return 'created'
+        except ThrottledError:
+            return 'throttled'
+    
+    with mock_dynamodb():
+        create_table()
+        db_client = DynamoDBClient()
+        with PartitionSimulator(capacity) as simulator, ThreadPoolExecutor(workers) as pool:
+            started = time.perf_counter()
+            outcomes = Counter(pool.map(write, range(writes)))
+            elapsed = time.perf_counter() - started
+    return dict(outcomes, throttles=simulator.throttled), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writes", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--partition-wcu", type=int, default=150)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+    
+    print(f"{'shards':>6} {'adaptive':>8} {'throttles':>9} {'created':>8} {'429s':>6} {'wall_s':>8} {'writes/s':>9}")
+    for shards in args.shards:
+        for adaptive in (False, True):
+            dynamodb_client.INDEX_SHARDS = shards
+            throttle.ADAPTIVE_RATE = adaptive
+            throttle.reset_limiters()
+            stats, elapsed = flood(args.writes, args.workers, args.partition_wcu)
+            print(
+                f"{shards:>6} {str(adaptive).lower():>8} {stats['throttles']:>9} {stats.get('created', 0):>8} "
+                f"{stats.get('throttled', 0):>6} {elapsed:>8.2f} {stats.get('created', 0) / elapsed:>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
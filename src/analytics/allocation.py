@@ -0,0 +1,268 @@
+from fractions import Fraction
+from functools import reduce
+from math import lcm
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import fnmatch
+import re
+
+from src.models.money import DEFAULT_CURRENCY, to_minor_units
+
+# Characters that make a rule pattern a glob rather than a literal name
+GLOB_CHARACTERS = frozenset('*?[')
+
+# Distinct (service, client) pairs whose candidate rules are memoized before the memo starts over
+MAX_DISPATCH_ENTRIES = 65536
+
+
+def split_units(units: int, weights: Sequence[int]) -> List[int]:
+    """Split integer minor units in proportion to integer weights, conserving the total exactly
+    
+    Largest remainder: every share is rounded down, then the units left over
+    go one each to the shares with the largest remainders, earlier shares
+    first on ties. A negative amount (a credit) splits as its magnitude.
+    """
+    if units < 0:
+        return [-share for share in split_units(-units, weights)]
+    total_weight = sum(weights)
+    shares, remainders = [], []
+    for weight in weights:
+        share, remainder = divmod(units * weight, total_weight)
+        shares.append(share)
+        remainders.append(remainder)
+    left = units - sum(shares)
+    if left:
+        for position in sorted(range(len(weights)), key=lambda i: -remainders[i])[:left]:
+            shares[position] += 1
+    return shares
+
+
+def _compile_pattern(pattern: Optional[str]) -> Tuple[Optional[str], Optional[Callable[[str], bool]]]:
+    """(literal, matcher) for a rule pattern: globs match whole names ignoring case and padding
+    
+    Literal names get a literal (used as an index key) and no matcher; `None`
+    matches anything and gives neither.
+    """
+    if pattern is None:
+        return None, None
+    key = pattern.strip().lower()
+    if not GLOB_CHARACTERS.intersection(key):
+        return key, None
+    return None, re.compile(fnmatch.translate(key)).match
+
+
+class AllocationRule:
+    """One compiled rule: which expenses it matches and the weights it splits them by"""
+    
+    __slots__ = (
+        'position', 'name', 'service', 'client', 'description', 'targets', 'weights',
+        '_service_match', '_client_match'
+    )
+    
+    def __init__(
+        self,
+        position: int,
+        split: Mapping[str, object],
+        service: Optional[str] = None,
+        client: Optional[str] = None,
+        description: Optional[str] = None,
+        name: Optional[str] = None
+    ):
+        if not split:
+            raise ValueError(f"Rule {position + 1} has no split targets")
+        weights = [Fraction(str(weight)) for weight in split.values()]
+        if any(weight <= 0 for weight in weights):
+            raise ValueError(f"Rule {position + 1} has a weight that is not positive")
+        # Whole-number weights in the same proportions, so shares are exact integer division
+        scale = reduce(lcm, (weight.denominator for weight in weights), 1)
+        
+        self.position = position
+        self.name = name or f"rule {position + 1}"
+        self.targets = list(split)
+        self.weights = [int(weight * scale) for weight in weights]
+        self.service, self._service_match = _compile_pattern(service)
+        self.client, self._client_match = _compile_pattern(client)
+        # Descriptions match anywhere in the text unless the pattern anchors itself with globs
+        self.description = None
+        if description is not None:
+            key = description.strip().lower()
+            glob = key if GLOB_CHARACTERS.intersection(key) else f"*{key}*"
+            self.description = re.compile(fnmatch.translate(glob), re.DOTALL).match
+    
+    def matches_names(self, service_key: str, client_key: str) -> bool:
+        """Whether the service and client patterns match these normalized names"""
+        if self.service is not None and self.service != service_key:
+            return False
+        if self._service_match is not None and not self._service_match(service_key):
+            return False
+        if self.client is not None and self.client != client_key:
+            return False
+        if self._client_match is not None and not self._client_match(client_key):
+            return False
+        return True
+    
+    def matches(self, service: str, client: str, description: Optional[str]) -> bool:
+        """Whether the rule applies to an expense, testing every pattern"""
+        if not self.matches_names(service.strip().lower(), client.strip().lower()):
+            return False
+        return self.description is None or self.description((description or '').lower()) is not None
+
+
+class AllocationRules:
+    """Ordered allocation rules compiled into an indexed dispatcher; the first matching rule applies
+    
+    Rules naming a literal service are indexed under it, else under a literal
+    client, and only the remaining all-glob rules are tested against every
+    name. The service/client part of the match is then memoized per distinct
+    pair, leaving at most the description patterns of that pair's candidates
+    to test per expense, so dispatch cost does not grow with the rule count.
+    """
+    
+    def __init__(self, rules: Sequence[Mapping]):
+        self.rules = [
+            AllocationRule(
+                position,
+                rule['split'],
+                service=rule.get('service'),
+                client=rule.get('client'),
+                description=rule.get('description'),
+                name=rule.get('name')
+            )
+            for position, rule in enumerate(rules)
+        ]
+        self._by_service: Dict[str, List[AllocationRule]] = {}
+        self._by_client: Dict[str, List[AllocationRule]] = {}
+        self._unindexed: List[AllocationRule] = []
+        for rule in self.rules:
+            if rule.service is not None:
+                self._by_service.setdefault(rule.service, []).append(rule)
+            elif rule.client is not None:
+                self._by_client.setdefault(rule.client, []).append(rule)
+            else:
+                self._unindexed.append(rule)
+        self._dispatch: Dict[Tuple[str, str], Tuple[AllocationRule, ...]] = {}
+    
+    def __len__(self) -> int:
+        return len(self.rules)
+    
+    def candidates(self, service: str, client: str) -> Tuple[AllocationRule, ...]:
+        """Rules whose service and client patterns match, in order, up to the first without a description"""
+        pair = (service, client)
+        found = self._dispatch.get(pair)
+        if found is not None:
+            return found
+        
+        service_key, client_key = service.strip().lower(), client.strip().lower()
+        pool = self._by_service.get(service_key, []) + self._by_client.get(client_key, []) + self._unindexed
+        found = []
+        for rule in sorted(pool, key=lambda rule: rule.position):
+            if rule.matches_names(service_key, client_key):
+                found.append(rule)
+                if rule.description is None:
+                    break
+        if len(self._dispatch) >= MAX_DISPATCH_ENTRIES:
+            self._dispatch.clear()
+        found = self._dispatch[pair] = tuple(found)
+        return found
+    
+    def match(self, service: str, client: str, description: Optional[str]) -> Optional[AllocationRule]:
+        """The first rule that applies to an expense, or None to leave it with its own client"""
+        lowered = None
+        for rule in self.candidates(service, client):
+            if rule.description is None:
+                return rule
+            if lowered is None:
+                lowered = (description or '').lower()
+            if rule.description(lowered) is not None:
+                return rule
+        return None
+
+
+class Allocation:
+    """Cost per (client, service) after applying allocation rules, in integer minor units
+    
+    Each entry is [direct units, allocated units]: direct cost stayed with the
+    expense's own client, allocated cost arrived through a rule's split. Every
+    split conserves its expense's units, so the grand total always equals the
+    cost of the expenses read. Built from a stream of items, so millions of
+    rows fold in constant memory; partials from parallel reads merge.
+    """
+    
+    def __init__(self, rules: AllocationRules, currency: str = DEFAULT_CURRENCY):
+        self.rules = rules
+        self.currency = currency
+        self.totals: Dict[Tuple[str, str], List[int]] = {}
+        # Per rule position: [expenses matched, units split]
+        self.rule_totals: Dict[int, List[int]] = {}
+        self.count = 0
+    
+    @classmethod
+    def from_items(
+        cls,
+        items: Iterable[Dict],
+        rules: AllocationRules,
+        currency: str = DEFAULT_CURRENCY
+    ) -> "Allocation":
+        """Allocate a stream of expense items; usable as a scan fold"""
+        allocation = cls(rules, currency)
+        allocation.extend(items)
+        return allocation
+    
+    def extend(self, items: Iterable[Dict]) -> None:
+        """Allocate items in `currency`, skipping the rest; lookups are hoisted out of the loop"""
+        totals = self.totals
+        rule_totals = self.rule_totals
+        match = self.rules.match
+        currency = self.currency
+        count = 0
+        
+        for item in items:
+            if item.get('currency', DEFAULT_CURRENCY) != currency:
+                continue
+            units = item.get('cost_units')
+            units = int(units) if units is not None else to_minor_units(item.get('cost') or 0, currency)
+            service = item.get('service_name', 'Unknown')
+            client = item.get('client', 'Unknown')
+            count += 1
+            
+            rule = match(service, client, item.get('description'))
+            if rule is None:
+                entry = totals.get((client, service))
+                if entry is None:
+                    entry = totals[(client, service)] = [0, 0]
+                entry[0] += units
+                continue
+            
+            matched = rule_totals.get(rule.position)
+            if matched is None:
+                matched = rule_totals[rule.position] = [0, 0]
+            matched[0] += 1
+            matched[1] += units
+            for target, share in zip(rule.targets, split_units(units, rule.weights)):
+                entry = totals.get((target, service))
+                if entry is None:
+                    entry = totals[(target, service)] = [0, 0]
+                entry[1] += share
+        self.count += count
+    
+    def merge(self, other: "Allocation") -> "Allocation":
+        """Add another partial allocation in place"""
+        for key, (direct, allocated) in other.totals.items():
+            entry = self.totals.setdefault(key, [0, 0])
+            entry[0] += direct
+            entry[1] += allocated
+        for position, (matched, units) in other.rule_totals.items():
+            entry = self.rule_totals.setdefault(position, [0, 0])
+            entry[0] += matched
+            entry[1] += units
+        self.count += other.count
+        return self
+    
+    def total_units(self) -> int:
+        return sum(direct + allocated for direct, allocated in self.totals.values())
+    
+    def by_client(self) -> Dict[str, Dict[str, List[int]]]:
+        """{client: {service: [direct units, allocated units]}}"""
+        clients: Dict[str, Dict[str, List[int]]] = {}
+        for (client, service), entry in self.totals.items():
+            clients.setdefault(client, {})[service] = entry
+        return clients
@@ -0,0 +1,267 @@
+from array import array
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.models.money import DEFAULT_CURRENCY, currency_exponent, to_minor_units
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised when numpy isn't installed
+    np = None
+
+# Time granularities, each labelling a date; derived from the day-ordinal column
+TIME_GRAINS: Dict[str, Callable[[date], str]] = {
+    'day': lambda day: day.isoformat(),
+    'week': lambda day: "%04d-W%02d" % day.isocalendar()[:2],
+    'month': lambda day: f"{day:%Y-%m}",
+    'quarter': lambda day: f"{day.year}-Q{(day.month - 1) // 3 + 1}",
+}
+
+# Dimensions group_by understands
+DIMENSIONS = ('service_name', 'client') + tuple(TIME_GRAINS)
+
+class Dictionary:
+    """Dictionary encoding: each distinct string gets a small integer code"""
+    
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+    
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+    
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class ExpenseColumns:
+    """A batch of expenses stored column-wise for vectorized aggregation
+    
+    Cost is kept as integer minor units of one currency, the date as a proleptic
+    day ordinal, and service/client as dictionary codes, so grouping is integer
+    arithmetic over flat arrays rather than per-row float() and datetime
+    parsing. Items in other currencies are skipped; amounts of different
+    currencies are never summed. NumPy is used for the group-by when installed;
+    otherwise the same arrays are summed in a single pure-Python pass.
+    """
+    
+    def __init__(self, currency: str = DEFAULT_CURRENCY):
+        self.currency = currency
+        self.exponent = currency_exponent(currency)
+        # 20 bytes a row: 64-bit units, and 32-bit day ordinals and dictionary codes
+        self.units = array('q')
+        self.days = array('i')
+        self.services = array('i')
+        self.clients = array('i')
+        self.service_names = Dictionary()
+        self.client_names = Dictionary()
+        # ISO date prefix -> ordinal; a table spans few distinct days, so each is parsed once
+        self._day_ordinals: Dict[str, int] = {}
+    
+    @classmethod
+    def from_items(cls, items: Iterable[Dict], currency: str = DEFAULT_CURRENCY) -> "ExpenseColumns":
+        """Build columns from a stream of expense items; usable as a scan fold"""
+        columns = cls(currency)
+        columns.extend(items)
+        return columns
+    
+    @classmethod
+    def from_wire_items(cls, items: Iterable[Dict], currency: str = DEFAULT_CURRENCY) -> "ExpenseColumns":
+        """Build columns from a stream of wire-format items ({'S': ...}, {'N': ...}); usable as a scan fold"""
+        columns = cls(currency)
+        columns.extend_wire(items)
+        return columns
+    
+    @classmethod
+    def from_arrays(
+        cls,
+        units: array,
+        days: array,
+        services: array,
+        service_names: Sequence[str],
+        clients: array,
+        client_names: Sequence[str],
+        currency: str = DEFAULT_CURRENCY,
+        distinct_days: Optional[Iterable[int]] = None
+    ) -> "ExpenseColumns":
+        """Adopt already-encoded columns (typecodes as built by extend); every code must be used by some row
+        
+        `distinct_days` spares a pass over `days` when the caller already knows them.
+        """
+        columns = cls(currency)
+        columns.units, columns.days, columns.services, columns.clients = units, days, services, clients
+        for name in service_names:
+            columns.service_names.encode(name)
+        for name in client_names:
+            columns.client_names.encode(name)
+        distinct = set(distinct_days if distinct_days is not None else days)
+        columns._day_ordinals = {date.fromordinal(ordinal).isoformat(): ordinal for ordinal in distinct}
+        return columns
+    
+    def extend(self, items: Iterable[Dict]) -> None:
+        """Append items; the loop body is the only per-row work, so lookups are hoisted"""
+        day_ordinals = self._day_ordinals
+        service_codes = self.service_names.codes
+        client_codes = self.client_names.codes
+        currency = self.currency
+        add_units = self.units.append
+        add_day = self.days.append
+        add_service = self.services.append
+        add_client = self.clients.append
+        
+        for item in items:
+            if item.get('currency', DEFAULT_CURRENCY) != currency:
+                continue
+            
+            # Items written before cost_units existed fall back to converting the Decimal
+            units = item.get('cost_units')
+            units = int(units) if units is not None else to_minor_units(item.get('cost') or 0, currency)
+            
+            day = item['date'][:10]
+            ordinal = day_ordinals.get(day)
+            if ordinal is None:
+                ordinal = day_ordinals[day] = date.fromisoformat(day).toordinal()
+            
+            service = item.get('service_name', 'Unknown')
+            service_code = service_codes.get(service)
+            if service_code is None:
+                service_code = self.service_names.encode(service)
+            client = item.get('client', 'Unknown')
+            client_code = client_codes.get(client)
+            if client_code is None:
+                client_code = self.client_names.encode(client)
+            
+            add_units(units)
+            add_day(ordinal)
+            add_service(service_code)
+            add_client(client_code)
+    
+    def extend_wire(self, items: Iterable[Dict]) -> None:
+        """Append items as a low-level read returns them, skipping the Python-typed dict per row
+        
+        Only the strings and number text the columns keep are read out of each
+        attribute value, and costs go straight from text to integer minor units,
+        so no Decimal or per-item dict outlives the loop.
+        """
+        day_ordinals = self._day_ordinals
+        service_codes = self.service_names.codes
+        client_codes = self.client_names.codes
+        currency = self.currency
+        add_units = self.units.append
+        add_day = self.days.append
+        add_service = self.services.append
+        add_client = self.clients.append
+        
+        for item in items:
+            value = item.get('currency')
+            if (value['S'] if value is not None else DEFAULT_CURRENCY) != currency:
+                continue
+            
+            value = item.get('cost_units')
+            if value is not None:
+                units = int(value['N'])
+            else:
+                value = item.get('cost')
+                units = to_minor_units(value['N'], currency) if value is not None else 0
+            
+            day = item['date']['S'][:10]
+            ordinal = day_ordinals.get(day)
+            if ordinal is None:
+                ordinal = day_ordinals[day] = date.fromisoformat(day).toordinal()
+            
+            value = item.get('service_name')
+            service = value['S'] if value is not None else 'Unknown'
+            service_code = service_codes.get(service)
+            if service_code is None:
+                service_code = self.service_names.encode(service)
+            value = item.get('client')
+            client = value['S'] if value is not None else 'Unknown'
+            client_code = client_codes.get(client)
+            if client_code is None:
+                client_code = self.client_names.encode(client)
+            
+            add_units(units)
+            add_day(ordinal)
+            add_service(service_code)
+            add_client(client_code)
+    
+    def __len__(self) -> int:
+        return len(self.units)
+    
+    def merge(self, other: "ExpenseColumns") -> "ExpenseColumns":
+        """Append another batch in place, re-coding its dictionaries into ours"""
+        if other.currency != self.currency:
+            raise ValueError(f"Cannot merge {other.currency} columns into {self.currency}")
+        self.units.extend(other.units)
+        self.days.extend(other.days)
+        self.services.extend(_recode(other.services, other.service_names, self.service_names))
+        self.clients.extend(_recode(other.clients, other.client_names, self.client_names))
+        self._day_ordinals.update(other._day_ordinals)
+        return self
+    
+    def group_by(self, dimension: str) -> Dict[str, Tuple[int, int]]:
+        """Total minor units and row count per value of `dimension`"""
+        codes, labels = self.codes(dimension)
+        sums, counts = group_sums(codes, len(labels), self.units)
+        return {
+            labels[code]: (sums[code], counts[code])
+            for code in range(len(labels))
+            if counts[code]
+        }
+    
+    def codes(self, dimension: str) -> Tuple[Sequence[int], List[str]]:
+        """Per-row group codes and the label of each code for a dimension"""
+        if dimension == 'service_name':
+            return self.services, self.service_names.values
+        if dimension == 'client':
+            return self.clients, self.client_names.values
+        if dimension in TIME_GRAINS:
+            return self._date_codes(TIME_GRAINS[dimension])
+        raise ValueError(f"Unknown dimension: {dimension}")
+    
+    def _date_codes(self, label: Callable[[date], str]) -> Tuple[Sequence[int], List[str]]:
+        """Label each distinct day once, then map every row through that small table"""
+        labels = Dictionary()
+        day_codes: Dict[int, int] = {}
+        for ordinal in sorted(self._day_ordinals.values()):
+            day_codes[ordinal] = labels.encode(label(date.fromordinal(ordinal)))
+        
+        if np is not None and len(self.days):
+            days = np.frombuffer(self.days, dtype=self.days.typecode)
+            distinct, inverse = np.unique(days, return_inverse=True)
+            lookup = np.array([day_codes[int(d)] for d in distinct], dtype=np.int64)
+            return lookup[inverse], labels.values
+        return array('i', [day_codes[d] for d in self.days]), labels.values
+
+
+def group_sums(codes: Sequence[int], size: int, units: Sequence[int]) -> Tuple[List[int], List[int]]:
+    """Sum amounts and count rows per group code in [0, size)"""
+    if np is not None and len(units):
+        codes = np.asarray(codes, dtype=np.int64)
+        counts = np.bincount(codes, minlength=size)
+        # An int64 reduction, not bincount's float64 weights, so large totals stay exact
+        sums = np.zeros(size, dtype=np.int64)
+        np.add.at(sums, codes, np.frombuffer(units, dtype=np.int64))
+        return sums.tolist(), counts.tolist()
+    
+    sums = [0] * size
+    counts = [0] * size
+    for code, amount in zip(codes, units):
+        sums[code] += amount
+        counts[code] += 1
+    return sums, counts
+
+
+def _recode(codes: array, source: Dictionary, target: Dictionary) -> array:
+    """Translate codes from one dictionary to another"""
+    mapping = [target.encode(value) for value in source.values]
+    if np is not None and len(codes):
+        recoded = np.asarray(mapping, dtype=codes.typecode)[np.frombuffer(codes, dtype=codes.typecode)]
+        result = array(codes.typecode)
+        result.frombytes(recoded.tobytes())
+        return result
+    return array(codes.typecode, [mapping[code] for code in codes])
@@ -0,0 +1,169 @@
+from array import array
+from typing import List, Sequence, Tuple
+
+from src.analytics import columnar
+from src.analytics.columnar import ExpenseColumns
+
+# Smoothing weights for level, trend and day-of-week seasonality, and for the
+# residual variance that anomalies are scored against
+ALPHA = 0.3
+BETA = 0.05
+GAMMA = 0.2
+VARIANCE_WEIGHT = 0.1
+SEASON_LENGTH = 7
+
+# Points seen before anomalies are flagged; two seasons lets the weekday profile settle
+WARMUP_POINTS = 2 * SEASON_LENGTH
+DEFAULT_THRESHOLD = 3.0
+# Variance floor of one minor unit, so a perfectly flat series can still flag a spike
+MIN_VARIANCE = 1.0
+
+# (series index, day ordinal, actual units, expected units, standard deviation)
+Anomaly = Tuple[int, int, float, float, float]
+
+
+class SeasonalBaseline:
+    """Additive Holt-Winters state for daily costs, updated in O(1) per point
+    
+    Tracks an EWMA level and trend, a day-of-week seasonal offset and an EWMA of
+    squared one-step residuals; the first week of points seeds the seasonal
+    offsets before any smoothing starts. The update is plain arithmetic, so the state may
+    be floats for one series or equal-length NumPy arrays for a batch of series
+    observed on the same days; a batch then costs one vector update per day.
+    State is small and self-contained, so it can be carried forward and fed new
+    days as they arrive.
+    """
+    
+    __slots__ = ('level', 'trend', 'seasonal', 'variance', 'count', 'day')
+    
+    def __init__(self, value, day: int):
+        self.level = value * 1.0
+        self.trend = value * 0.0
+        self.seasonal = [self.trend] * SEASON_LENGTH
+        self.variance = self.trend
+        self.count = 1
+        self.day = day
+    
+    def update(self, value, day: int):
+        """Fold in the cost for `day`, returning (expected, std) as predicted before it"""
+        season = day % SEASON_LENGTH
+        seasonal = self.seasonal[season]
+        expected = self.level + self.trend + seasonal
+        std = (self.variance + MIN_VARIANCE) ** 0.5
+        residual = value - expected
+        self.count += 1
+        self.day = day
+        
+        if self.count <= SEASON_LENGTH:
+            # The first week seeds each weekday's offset from the first day's level
+            self.seasonal[season] = value - self.level
+            return expected, std
+        
+        level = ALPHA * (value - seasonal) + (1 - ALPHA) * (self.level + self.trend)
+        self.trend = BETA * (level - self.level) + (1 - BETA) * self.trend
+        self.level = level
+        self.seasonal[season] = GAMMA * (value - level) + (1 - GAMMA) * seasonal
+        self.variance = (1 - VARIANCE_WEIGHT) * self.variance + VARIANCE_WEIGHT * residual * residual
+        return expected, std
+    
+    def forecast(self, steps: int):
+        """(expected, std) `steps` days after the last update; the band widens with sqrt(steps)"""
+        expected = self.level + steps * self.trend + self.seasonal[(self.day + steps) % SEASON_LENGTH]
+        return expected, ((self.variance + MIN_VARIANCE) * steps) ** 0.5
+
+
+def daily_series(
+    columns: ExpenseColumns,
+    dimension: str,
+    first_day: int,
+    last_day: int
+) -> Tuple[List[str], Sequence[Sequence[int]]]:
+    """Dense per-label daily totals in minor units over [first_day, last_day]
+    
+    Returns the labels and one row per label with a zero for each day without
+    expenses: a 2-D NumPy array when installed, otherwise a list of arrays.
+    """
+    codes, labels = columns.codes(dimension)
+    days = last_day - first_day + 1
+    
+    if columnar.np is not None:
+        np = columnar.np
+        ordinals = np.frombuffer(columns.days, dtype=columns.days.typecode).astype(np.int64) - first_day
+        keep = (ordinals >= 0) & (ordinals < days)
+        cells = np.asarray(codes, dtype=np.int64)[keep] * days + ordinals[keep]
+        units = np.frombuffer(columns.units, dtype=np.int64)[keep]
+        # An int64 reduction, not bincount's float64 weights, so large totals stay exact
+        totals = np.zeros(len(labels) * days, dtype=np.int64)
+        np.add.at(totals, cells, units)
+        return labels, totals.reshape(len(labels), days)
+    
+    rows = [array('q', bytes(8 * days)) for _ in labels]
+    for code, ordinal, units in zip(codes, columns.days, columns.units):
+        offset = ordinal - first_day
+        if 0 <= offset < days:
+            rows[code][offset] += units
+    return labels, rows
+
+
+def analyze(
+    series: Sequence[Sequence[int]],
+    first_day: int,
+    horizon: int = 0,
+    threshold: float = DEFAULT_THRESHOLD
+) -> Tuple[List[Anomaly], List[List[Tuple[float, float]]]]:
+    """Run every series through a SeasonalBaseline, flagging anomalies and forecasting
+    
+    A point is anomalous once the baseline has warmed up and it lies more than
+    `threshold` standard deviations from the one-step forecast. Returns the
+    anomalies ordered by day then series, and per series `horizon` (expected, std)
+    pairs for the days after the last one; expected costs are clamped at zero.
+    """
+    if not len(series) or not len(series[0]):
+        return [], [[] for _ in range(len(series))]
+    if columnar.np is not None:
+        return _analyze_batch(series, first_day, horizon, threshold)
+    
+    anomalies: List[Anomaly] = []
+    forecasts = []
+    for index, values in enumerate(series):
+        baseline = SeasonalBaseline(float(values[0]), first_day)
+        for offset in range(1, len(values)):
+            value = values[offset]
+            warm = baseline.count >= WARMUP_POINTS
+            expected, std = baseline.update(float(value), first_day + offset)
+            if warm and abs(value - expected) > threshold * std:
+                anomalies.append((index, first_day + offset, float(value), expected, std))
+        forecasts.append([_clamp(*baseline.forecast(step)) for step in range(1, horizon + 1)])
+    
+    anomalies.sort(key=lambda anomaly: (anomaly[1], anomaly[0]))
+    return anomalies, forecasts
+
+
+def _analyze_batch(series, first_day: int, horizon: int, threshold: float):
+    """analyze() with one vectorized update per day across all series"""
+    np = columnar.np
+    matrix = np.asarray(series, dtype=np.float64)
+    baseline = SeasonalBaseline(matrix[:, 0].copy(), first_day)
+    
+    anomalies: List[Anomaly] = []
+    for offset in range(1, matrix.shape[1]):
+        values = matrix[:, offset]
+        warm = baseline.count >= WARMUP_POINTS
+        expected, std = baseline.update(values, first_day + offset)
+        if warm:
+            for index in np.flatnonzero(np.abs(values - expected) > threshold * std).tolist():
+                anomalies.append(
+                    (index, first_day + offset, float(values[index]), float(expected[index]), float(std[index]))
+                )
+    
+    steps = [baseline.forecast(step) for step in range(1, horizon + 1)]
+    forecasts = [
+        [_clamp(float(expected[index]), float(std[index])) for expected, std in steps]
+        for index in range(matrix.shape[0])
+    ]
+    return anomalies, forecasts
+
+
+def _clamp(expected: float, std: float) -> Tuple[float, float]:
+    """Costs can't go negative, whatever the trend says"""
+    return max(expected, 0.0), std
@@ -0,0 +1,140 @@
+from array import array
+from typing import Dict, List, Sequence, Tuple
+
+from src.analytics import columnar
+from src.analytics.columnar import ExpenseColumns
+
+# Per-group statistics beyond total and count; percentiles are requested as pNN
+STATISTICS = ('min', 'max', 'avg')
+
+
+def parse_metrics(metrics: Sequence[str]) -> Tuple[List[str], List[float]]:
+    """Split metric names like ["min", "avg", "p95"] into statistics and percentiles"""
+    statistics: List[str] = []
+    percentiles: List[float] = []
+    for metric in metrics:
+        metric = metric.strip().lower()
+        if metric in STATISTICS:
+            if metric not in statistics:
+                statistics.append(metric)
+            continue
+        try:
+            if not metric.startswith('p'):
+                raise ValueError
+            percentile = float(metric[1:])
+        except ValueError:
+            raise ValueError(f"Unknown metric: {metric}")
+        if not 0 <= percentile <= 100:
+            raise ValueError(f"Percentile out of range: {metric}")
+        if percentile not in percentiles:
+            percentiles.append(percentile)
+    return statistics, percentiles
+
+
+def aggregate_groups(
+    columns: ExpenseColumns,
+    dimensions: Sequence[str],
+    percentiles: Sequence[float] = ()
+) -> List[Dict]:
+    """Total, count, min and max minor units per combination of `dimensions`
+    
+    Each row's dimension codes are folded into one mixed-radix group code, so
+    any combination groups the same way and state is one accumulator per
+    non-empty group. Percentile values are kept per group only when asked for,
+    as integers. Returns one dict per group, ordered by group code, with
+    `labels` (a tuple, one entry per dimension) and the statistics in minor units.
+    """
+    if not dimensions:
+        raise ValueError("At least one dimension is required")
+    
+    encoded = [columns.codes(dimension) for dimension in dimensions]
+    sizes = [len(labels) for _, labels in encoded]
+    if columnar.np is not None and len(columns):
+        groups = _aggregate_numpy(columns, encoded, sizes, percentiles)
+    else:
+        groups = _aggregate_python(columns, encoded, sizes, percentiles)
+    
+    for group in groups:
+        group['labels'] = _decode(group.pop('code'), encoded, sizes)
+    return groups
+
+
+def _aggregate_python(columns, encoded, sizes, percentiles) -> List[Dict]:
+    composite = array('q', bytes(8 * len(columns)))
+    for (codes, _), size in zip(encoded, sizes):
+        composite = array('q', [group * size + code for group, code in zip(composite, codes)])
+    
+    # code -> [total, count, min, max]
+    stats: Dict[int, List[int]] = {}
+    values: Dict[int, array] = {}
+    for group, amount in zip(composite, columns.units):
+        entry = stats.get(group)
+        if entry is None:
+            stats[group] = [amount, 1, amount, amount]
+        else:
+            entry[0] += amount
+            entry[1] += 1
+            if amount < entry[2]:
+                entry[2] = amount
+            elif amount > entry[3]:
+                entry[3] = amount
+        if percentiles:
+            values.setdefault(group, array('q')).append(amount)
+    
+    groups = []
+    for group in sorted(stats):
+        total, count, low, high = stats[group]
+        row = {'code': group, 'total_units': total, 'count': count, 'min_units': low, 'max_units': high}
+        if percentiles:
+            ordered = sorted(values[group])
+            row['percentiles'] = {p: _interpolate(ordered, 0, count, p) for p in percentiles}
+        groups.append(row)
+    return groups
+
+
+def _aggregate_numpy(columns, encoded, sizes, percentiles) -> List[Dict]:
+    np = columnar.np
+    composite = np.zeros(len(columns), dtype=np.int64)
+    for (codes, _), size in zip(encoded, sizes):
+        composite = composite * size + np.asarray(codes, dtype=np.int64)
+    units = np.frombuffer(columns.units, dtype=np.int64)
+    
+    # Sorting by (group, units) puts each group's min first and max last
+    order = np.lexsort((units, composite))
+    composite = composite[order]
+    units = units[order]
+    starts = np.flatnonzero(np.concatenate(([True], composite[1:] != composite[:-1])))
+    ends = np.append(starts[1:], len(units))
+    totals = np.add.reduceat(units, starts)
+    
+    groups = []
+    for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        row = {
+            'code': int(composite[start]),
+            'total_units': int(totals[i]),
+            'count': end - start,
+            'min_units': int(units[start]),
+            'max_units': int(units[end - 1])
+        }
+        if percentiles:
+            row['percentiles'] = {p: _interpolate(units, start, end, p) for p in percentiles}
+        groups.append(row)
+    return groups
+
+
+def _interpolate(ordered, start: int, end: int, percentile: float) -> float:
+    """Linearly interpolated percentile of ordered[start:end]"""
+    position = start + (end - start - 1) * percentile / 100
+    lower = int(position)
+    upper = min(lower + 1, end - 1)
+    fraction = position - lower
+    return float(ordered[lower]) + (float(ordered[upper]) - float(ordered[lower])) * fraction
+
+
+def _decode(group: int, encoded, sizes) -> Tuple[str, ...]:
+    """Invert the mixed-radix group code back into one label per dimension"""
+    labels = []
+    for (_, names), size in zip(reversed(encoded), reversed(sizes)):
+        group, code = divmod(group, size)
+        labels.append(names[code])
+    return tuple(reversed(labels))
@@ -0,0 +1,264 @@
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import struct
+import sys
+
+from src.analytics import columnar
+from src.analytics.columnar import Dictionary, ExpenseColumns, _recode
+from src.models.money import DEFAULT_CURRENCY, to_minor_units
+
+# A snapshot file: MAGIC, the header length (uint64 little-endian), a JSON header,
+# then each column's raw array bytes, every section starting on an 8-byte boundary
+# so columns can be viewed in place from a memory map.
+MAGIC = b'EXPCOL01'
+ALIGNMENT = 8
+
+# Timestamps are microseconds since the proleptic epoch (day ordinal 0), so
+# timestamp // DAY_MICROSECONDS is the day ordinal ExpenseColumns groups on.
+DAY_MICROSECONDS = 86_400_000_000
+
+
+def snapshot_key(month: str) -> str:
+    """Storage key of the snapshot for a YYYY-MM month"""
+    return f"expenses/month={month}/expenses.cols"
+
+
+def month_range(month: str) -> Tuple[datetime, datetime]:
+    """First and last instant of a YYYY-MM month"""
+    start = datetime.strptime(month, '%Y-%m')
+    following = (start + timedelta(days=32)).replace(day=1)
+    return start, following - timedelta(microseconds=1)
+
+
+def timestamp(value: datetime) -> int:
+    """Microseconds since the proleptic epoch for a naive datetime"""
+    seconds = (value.hour * 60 + value.minute) * 60 + value.second
+    return value.toordinal() * DAY_MICROSECONDS + seconds * 1_000_000 + value.microsecond
+
+
+class SnapshotBuilder:
+    """One month of expenses in every currency, collected column-wise for writing as a snapshot
+    
+    Like ExpenseColumns, cost is integer minor units and service/client are
+    dictionary codes; the currency is a coded column too, and the date is kept
+    to the microsecond so a report's date range can be applied exactly.
+    """
+    
+    def __init__(self):
+        self.units = array('q')
+        self.timestamps = array('q')
+        self.services = array('i')
+        self.clients = array('i')
+        self.currencies = array('i')
+        self.service_names = Dictionary()
+        self.client_names = Dictionary()
+        self.currency_codes = Dictionary()
+    
+    @classmethod
+    def from_items(cls, items: Iterable[Dict]) -> "SnapshotBuilder":
+        """Collect a stream of expense items; usable as a scan fold"""
+        builder = cls()
+        for item in items:
+            builder.add(item)
+        return builder
+    
+    def add(self, item: Dict) -> None:
+        currency = item.get('currency', DEFAULT_CURRENCY)
+        units = item.get('cost_units')
+        units = int(units) if units is not None else to_minor_units(item.get('cost') or 0, currency)
+        self.units.append(units)
+        # Timezone suffixes are dropped: date range filters compare the stored text, which ignores them
+        self.timestamps.append(timestamp(datetime.fromisoformat(item['date']).replace(tzinfo=None)))
+        self.services.append(self.service_names.encode(item.get('service_name', 'Unknown')))
+        self.clients.append(self.client_names.encode(item.get('client', 'Unknown')))
+        self.currencies.append(self.currency_codes.encode(currency))
+    
+    def merge(self, other: "SnapshotBuilder") -> "SnapshotBuilder":
+        """Append another batch in place, re-coding its dictionaries into ours"""
+        self.units.extend(other.units)
+        self.timestamps.extend(other.timestamps)
+        self.services.extend(_recode(other.services, other.service_names, self.service_names))
+        self.clients.extend(_recode(other.clients, other.client_names, self.client_names))
+        self.currencies.extend(_recode(other.currencies, other.currency_codes, self.currency_codes))
+        return self
+    
+    def __len__(self) -> int:
+        return len(self.units)
+    
+    def to_bytes(self, month: str, compacted_at: Optional[datetime] = None) -> bytes:
+        columns = {
+            'units': self.units,
+            'timestamps': self.timestamps,
+            'service_name': self.services,
+            'client': self.clients,
+            'currency': self.currencies,
+        }
+        layout, offset = {}, 0
+        for name, values in columns.items():
+            size = len(values) * values.itemsize
+            layout[name] = {'type': values.typecode, 'itemsize': values.itemsize, 'offset': offset, 'length': len(values)}
+            offset = _aligned(offset + size)
+        header = json.dumps({
+            'month': month,
+            'rows': len(self),
+            'byteorder': sys.byteorder,
+            'compacted_at': (compacted_at or datetime.now()).isoformat(),
+            'dictionaries': {
+                'service_name': self.service_names.values,
+                'client': self.client_names.values,
+                'currency': self.currency_codes.values,
+            },
+            'columns': layout,
+        }).encode()
+        
+        header_end = len(MAGIC) + 8 + len(header)
+        parts = [MAGIC, struct.pack('<Q', len(header)), header, bytes(_aligned(header_end) - header_end)]
+        for name, values in columns.items():
+            data = values.tobytes()
+            parts.append(data)
+            parts.append(bytes(_aligned(len(data)) - len(data)))
+        return b''.join(parts)
+
+
+def read_header(buffer) -> Tuple[Dict, int]:
+    """The snapshot's header and the offset its column data starts at"""
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not an expense snapshot")
+    (length,) = struct.unpack_from('<Q', buffer, len(MAGIC))
+    start = len(MAGIC) + 8
+    return json.loads(bytes(buffer[start:start + length])), _aligned(start + length)
+
+
+def load_columns(
+    buffer,
+    currency: str = DEFAULT_CURRENCY,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    client: Optional[str] = None,
+    service: Optional[str] = None
+) -> ExpenseColumns:
+    """The snapshot's expenses in `currency` within the filters, as ExpenseColumns
+    
+    `buffer` is the snapshot's bytes, typically a memory map. Filters mean what
+    they do for DynamoDB reads: inclusive dates, case-insensitive names. With
+    NumPy the columns are filtered in place, without being copied first;
+    dictionaries are trimmed to the names still used, as ExpenseColumns
+    built from the same items would hold.
+    """
+    header, data_start = read_header(buffer)
+    dictionaries = header['dictionaries']
+    if currency not in dictionaries['currency'] or not header['rows']:
+        return ExpenseColumns(currency)
+    
+    wanted = {
+        'currency': [dictionaries['currency'].index(currency)],
+        'client': _matching_codes(dictionaries['client'], client),
+        'service_name': _matching_codes(dictionaries['service_name'], service),
+    }
+    low = timestamp(start_date) if start_date else None
+    high = timestamp(end_date) if end_date else None
+    if columnar.np is not None:
+        return _load_numpy(buffer, header, data_start, currency, wanted, low, high)
+    return _load_python(buffer, header, data_start, currency, wanted, low, high)
+
+
+def _load_numpy(buffer, header, data_start, currency, wanted, low, high) -> ExpenseColumns:
+    np = columnar.np
+    
+    def column(name):
+        spec = header['columns'][name]
+        dtype = np.dtype(spec['type'])
+        if header['byteorder'] != sys.byteorder:
+            dtype = dtype.newbyteorder()
+        return np.frombuffer(buffer, dtype=dtype, count=spec['length'], offset=data_start + spec['offset'])
+    
+    timestamps = column('timestamps')
+    keep = column('currency') == wanted['currency'][0]
+    for name in ('client', 'service_name'):
+        if wanted[name] is not None:
+            keep &= np.isin(column(name), wanted[name])
+    if low is not None:
+        keep &= timestamps >= low
+    if high is not None:
+        keep &= timestamps <= high
+    
+    days = timestamps[keep] // DAY_MICROSECONDS
+    services, service_names = _trim_numpy(column('service_name')[keep], header['dictionaries']['service_name'])
+    clients, client_names = _trim_numpy(column('client')[keep], header['dictionaries']['client'])
+    return ExpenseColumns.from_arrays(
+        _to_array('q', column('units')[keep]),
+        _to_array('i', days),
+        _to_array('i', services),
+        service_names,
+        _to_array('i', clients),
+        client_names,
+        currency,
+        distinct_days=np.unique(days).tolist()
+    )
+
+
+def _load_python(buffer, header, data_start, currency, wanted, low, high) -> ExpenseColumns:
+    def column(name):
+        spec = header['columns'][name]
+        start = data_start + spec['offset']
+        values = array(spec['type'])
+        values.frombytes(bytes(buffer[start:start + spec['length'] * spec['itemsize']]))
+        if header['byteorder'] != sys.byteorder:
+            values.byteswap()
+        return values
+    
+    dictionaries = header['dictionaries']
+    currency_code = wanted['currency'][0]
+    clients_wanted = set(wanted['client']) if wanted['client'] is not None else None
+    services_wanted = set(wanted['service_name']) if wanted['service_name'] is not None else None
+    service_names, client_names = Dictionary(), Dictionary()
+    units, days, services, clients = array('q'), array('i'), array('i'), array('i')
+    
+    rows = zip(column('units'), column('timestamps'), column('service_name'), column('client'), column('currency'))
+    for amount, moment, service_code, client_code, currency_of in rows:
+        if currency_of != currency_code:
+            continue
+        if clients_wanted is not None and client_code not in clients_wanted:
+            continue
+        if services_wanted is not None and service_code not in services_wanted:
+            continue
+        if (low is not None and moment < low) or (high is not None and moment > high):
+            continue
+        units.append(amount)
+        days.append(moment // DAY_MICROSECONDS)
+        services.append(service_names.encode(dictionaries['service_name'][service_code]))
+        clients.append(client_names.encode(dictionaries['client'][client_code]))
+    
+    return ExpenseColumns.from_arrays(
+        units, days, services, service_names.values, clients, client_names.values, currency
+    )
+
+
+def _matching_codes(names: List[str], wanted: Optional[str]) -> Optional[List[int]]:
+    """Codes of the dictionary names equal to `wanted` ignoring case and padding; None when unfiltered"""
+    if wanted is None:
+        return None
+    key = wanted.strip().lower()
+    return [code for code, name in enumerate(names) if name.strip().lower() == key]
+
+
+def _trim_numpy(codes, names: List[str]):
+    """Re-code to the names actually used, in order of first appearance as extend() would"""
+    np = columnar.np
+    used, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[inverse], [names[code] for code in used[order].tolist()]
+
+
+def _to_array(typecode: str, values) -> array:
+    result = array(typecode)
+    result.frombytes(values.astype(columnar.np.dtype(typecode), copy=False).tobytes())
+    return result
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+import contextvars
+import os
+
+from src.database.dynamodb_client import DYNAMODB_MAX_CONNECTIONS, DynamoDBClient
+
+# Blocking DynamoDB calls in flight at once; sized to the client's connection pool
+DYNAMODB_CONCURRENCY = int(os.getenv('DYNAMODB_CONCURRENCY', str(DYNAMODB_MAX_CONNECTIONS)))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Bounded pool shared by every async client in the process"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DYNAMODB_CONCURRENCY, thread_name_prefix='dynamodb')
+    return _executor
+
+
+class AsyncDynamoDBClient:
+    """Awaitable DynamoDBClient: each call runs on a bounded thread pool
+    
+    boto3 is blocking, so calling it from an `async def` route stalls the event
+    loop for the whole round trip. Offloading keeps the loop free to accept and
+    start other requests while up to DYNAMODB_CONCURRENCY calls are in flight,
+    all sharing the wrapped client's connection pool.
+    """
+    
+    def __init__(self, db_client: Optional[DynamoDBClient] = None, executor: Optional[ThreadPoolExecutor] = None):
+        self.sync = db_client or DynamoDBClient()
+        self._executor = executor
+    
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # run_in_executor doesn't carry context variables (like per-request metrics) over; copy them
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor or get_executor(), partial(context.run, func, *args, **kwargs))
+    
+    async def create_expense(self, expense_data: Dict) -> Dict:
+        return await self._run(self.sync.create_expense, expense_data)
+    
+    async def create_expense_once(self, expense_data: Dict, key: str, fingerprint: str) -> Tuple[Dict, bool]:
+        return await self._run(self.sync.create_expense_once, expense_data, key, fingerprint)
+    
+    async def batch_create(
+        self,
+        expenses: List[Dict],
+        idempotency: Optional[List[Optional[Tuple[str, str]]]] = None
+    ) -> List[Dict]:
+        return await self._run(self.sync.batch_create, expenses, None, idempotency)
+    
+    async def get_expense(self, expense_id: str) -> Optional[Dict]:
+        return await self._run(self.sync.get_expense, expense_id)
+    
+    async def update_expense(self, expense_id: str, update_data: Dict, expected_version: Optional[int] = None) -> Dict:
+        return await self._run(self.sync.update_expense, expense_id, update_data, expected_version)
+    
+    async def delete_expense(self, expense_id: str, expected_version: Optional[int] = None) -> Dict:
+        return await self._run(self.sync.delete_expense, expense_id, expected_version)
+    
+    async def list_expenses_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        projection: Optional[Sequence[str]] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        return await self._run(self.sync.list_expenses_page, limit, cursor, projection)
+    
+    async def query_expenses_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        **filters
+    ) -> Tuple[List[Dict], Optional[str], str]:
+        return await self._run(self.sync.query_expenses_page, limit, cursor, **filters)
@@ -0,0 +1,186 @@
+from botocore.exceptions import ClientError
+from typing import Dict, List, Optional, Tuple
+import os
+
+from src.database.dynamodb_client import CounterUpdateError, client_failure, get_dynamodb, normalize_key
+from src.models.money import DEFAULT_CURRENCY, to_minor_units
+
+# Budget scopes mapped to the expense field they track
+BUDGET_SCOPES = {'client': 'client', 'service': 'service_name'}
+
+# Percent-of-limit thresholds that raise an alert, each at most once per budget month
+BUDGET_THRESHOLDS = (50, 80, 100)
+
+# (budget_key, month) -> [scope, name, currency, units, count]
+Deltas = Dict[Tuple[str, str], List]
+
+
+def budget_key(scope: str, name: str, currency: str = DEFAULT_CURRENCY) -> str:
+    """Hash key of a budget's counter rows: scope, currency and the normalized name"""
+    return f"{scope}#{currency}#{normalize_key(name)}"
+
+
+def budget_deltas(old: Optional[Dict], new: Optional[Dict]) -> Deltas:
+    """Counter changes for replacing `old` with `new` (either may be None)
+    
+    The old item's spend is subtracted and the new item's added, so an update
+    that changes cost, client, service or month moves spend between counters.
+    Entries that cancel out are dropped.
+    """
+    deltas: Deltas = {}
+    for item, sign in ((old, -1), (new, 1)):
+        if not item:
+            continue
+        currency = item.get('currency', DEFAULT_CURRENCY)
+        units = item.get('cost_units')
+        units = int(units) if units is not None else to_minor_units(item.get('cost') or 0, currency)
+        month = item['date'][:7]
+        for scope, field in BUDGET_SCOPES.items():
+            name = item.get(field, 'Unknown')
+            entry = deltas.setdefault((budget_key(scope, name, currency), month), [scope, name, currency, 0, 0])
+            entry[3] += units * sign
+            entry[4] += sign
+    return {key: entry for key, entry in deltas.items() if entry[3] or entry[4]}
+
+
+def crossed_threshold(spent_units: int, limit_units: int) -> int:
+    """Highest BUDGET_THRESHOLDS percentage that `spent_units` has reached, or 0"""
+    if limit_units <= 0:
+        return 0
+    return max((t for t in BUDGET_THRESHOLDS if spent_units * 100 >= limit_units * t), default=0)
+
+
+class BudgetClient:
+    """Per-client and per-service monthly budget rows with running spend counters
+    
+    One row per (budget_key, month) holds the limit, the spend so far in integer
+    minor units and the highest threshold already alerted, so checking a budget
+    is a single GetItem however many expenses it covers. Counter rows are kept
+    for every client and service with spend, budgeted or not, which makes a
+    budget set mid-month start from the right total.
+    """
+    
+    def __init__(self):
+        self.dynamodb = get_dynamodb()
+        self.table_name = os.getenv('BUDGETS_TABLE', 'expense-budgets')
+        self.table = self.dynamodb.Table(self.table_name)
+        self.client = self.dynamodb.meta.client
+    
+    def transact_items(self, old: Optional[Dict], new: Optional[Dict]) -> List[Dict]:
+        """TransactWriteItems entries that ADD an expense change into its counters"""
+        return [
+            {'Update': dict(self._counter_update(key, month, entry), TableName=self.table_name)}
+            for (key, month), entry in budget_deltas(old, new).items()
+        ]
+    
+    def apply_items(self, items: List[Dict]) -> int:
+        """ADD many new expenses into their counters, one UpdateItem per counter row
+        
+        Used for batch writes, which BatchWriteItem can't pair with counter
+        updates atomically; the deltas are summed first so a large batch touches
+        each counter once. Every row is attempted; if any fail, CounterUpdateError
+        carries the deltas that were not applied.
+        """
+        deltas: Deltas = {}
+        for item in items:
+            for key, (scope, name, currency, units, count) in budget_deltas(None, item).items():
+                entry = deltas.setdefault(key, [scope, name, currency, 0, 0])
+                entry[3] += units
+                entry[4] += count
+        unapplied: Deltas = {}
+        failure = None
+        for (key, month), entry in deltas.items():
+            try:
+                self.table.update_item(**self._counter_update(key, month, entry))
+            except ClientError as e:
+                unapplied[(key, month)] = entry
+                failure = e
+        if unapplied:
+            raise CounterUpdateError(str(client_failure("Failed to update budgets", failure)), unapplied)
+        return len(deltas)
+    
+    def get_budget(self, scope: str, name: str, month: str, currency: str = DEFAULT_CURRENCY) -> Optional[Dict]:
+        """Read one budget month's row"""
+        return self.get_row(budget_key(scope, name, currency), month)
+    
+    def get_row(self, key: str, month: str) -> Optional[Dict]:
+        """Read a counter row by key with a strongly consistent GetItem"""
+        try:
+            response = self.table.get_item(Key={'budget_key': key, 'month': month}, ConsistentRead=True)
+            return response.get('Item')
+        
+        except ClientError as e:
+            raise client_failure("Failed to get budget", e)
+    
+    def set_limit(self, scope: str, name: str, month: str, limit_units: int, currency: str = DEFAULT_CURRENCY) -> Dict:
+        """Set a month's limit, keeping its spend; alerts re-arm against the new limit"""
+        try:
+            response = self.table.update_item(
+                Key={'budget_key': budget_key(scope, name, currency), 'month': month},
+                UpdateExpression=(
+                    'SET budget_scope = :scope, budget_name = :name, currency = :currency, limit_units = :limit'
+                    ' REMOVE alerted'
+                ),
+                ExpressionAttributeValues={':scope': scope, ':name': name, ':currency': currency, ':limit': limit_units},
+                ReturnValues='ALL_NEW'
+            )
+            return response['Attributes']
+        
+        except ClientError as e:
+            raise client_failure("Failed to set budget", e)
+    
+    def claim_alert(self, key: str, month: str, threshold: int) -> bool:
+        """Record `threshold` as alerted unless it (or a higher one) already was
+        
+        The conditional write makes concurrent writers agree on exactly one
+        winner, which is the one that sends the alert.
+        """
+        try:
+            self.table.update_item(
+                Key={'budget_key': key, 'month': month},
+                UpdateExpression='SET alerted = :threshold',
+                ConditionExpression='attribute_exists(limit_units) AND (attribute_not_exists(alerted) OR alerted < :threshold)',
+                ExpressionAttributeValues={':threshold': threshold}
+            )
+            return True
+        
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise client_failure("Failed to record budget alert", e)
+    
+    def release_alert(self, key: str, month: str, threshold: int, previous: int) -> None:
+        """Undo a claim_alert whose alert could not be sent, so a later write retries it
+        
+        Only rolls back while `threshold` is still the recorded one; a limit
+        change or a higher claim since then is left as it is.
+        """
+        update = 'SET alerted = :previous' if previous else 'REMOVE alerted'
+        values = {':threshold': threshold}
+        if previous:
+            values[':previous'] = previous
+        try:
+            self.table.update_item(
+                Key={'budget_key': key, 'month': month},
+                UpdateExpression=update,
+                ConditionExpression='alerted = :threshold',
+                ExpressionAttributeValues=values
+            )
+        
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise client_failure("Failed to release budget alert", e)
+    
+    def _counter_update(self, key: str, month: str, entry: List) -> Dict:
+        """UpdateItem arguments adding one counter delta"""
+        scope, name, currency, units, count = entry
+        return {
+            'Key': {'budget_key': key, 'month': month},
+            'UpdateExpression': (
+                'SET budget_scope = :scope, budget_name = if_not_exists(budget_name, :name), currency = :currency'
+                ' ADD spent_units :units, expense_count :count'
+            ),
+            'ExpressionAttributeValues': {
+                ':scope': scope, ':name': name, ':currency': currency, ':units': units, ':count': count
+            }
+        }
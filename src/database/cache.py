@@ -0,0 +1,212 @@
+from collections import OrderedDict
+from datetime import date, datetime
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Optional
+import os
+import pickle
+import time
+
+# Cache configuration; CACHE_BACKEND is memory (default), redis or none
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', '30'))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+CACHE_URL = os.getenv('CACHE_URL', 'redis://localhost:6379/0')
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Size-bounded, TTL-expiring LRU cache local to one warm Lambda container"""
+    
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Counters live outside the LRU so eviction can never reset them
+        self._counters: Dict[str, int] = {}
+        self._lock = Lock()
+        self.evictions = 0
+    
+    def get(self, key: str) -> Any:
+        """Return the cached value, or _MISSING if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def incr(self, key: str) -> int:
+        """Atomically bump an integer counter that never expires"""
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+    
+    def read_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+
+class RedisCache:
+    """Cache backed by any client speaking the Redis get/set/delete/incr commands
+    
+    Values are pickled, so Decimal and datetime survive the round trip; only
+    point this at a cache the service trusts. Eviction is Redis's own policy.
+    """
+    
+    def __init__(self, client):
+        self.client = client
+        self.evictions = 0
+    
+    def get(self, key: str) -> Any:
+        raw = self.client.get(key)
+        return _MISSING if raw is None else pickle.loads(raw)
+    
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.client.set(key, pickle.dumps(value), px=max(1, int(ttl * 1000)))
+    
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+    
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+    
+    def read_counter(self, key: str) -> int:
+        raw = self.client.get(key)
+        return int(raw) if raw is not None else 0
+
+
+class ExpenseCache:
+    """Read-through cache for expense lookups and analytics results
+    
+    Expenses are invalidated by ID. Analytics keys embed a generation counter
+    that every write bumps, which drops all cached analytics at once without
+    enumerating keys. Entries also expire after `ttl` seconds, which bounds how
+    stale another container's cache can be.
+    """
+    
+    GENERATION_KEY = 'analytics:generation'
+    
+    def __init__(self, backend=None, ttl: float = CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+    
+    def get_expense(self, expense_id: str, loader: Callable[[str], Optional[Dict]]) -> Optional[Dict]:
+        """Return a cached expense or load it; missing expenses aren't cached"""
+        return self._get_or_load(f"expense:{expense_id}", lambda: loader(expense_id), cache_none=False)
+    
+    async def get_expense_async(self, expense_id: str, loader: Callable[[str], Awaitable[Optional[Dict]]]) -> Optional[Dict]:
+        """Async variant of get_expense for awaitable loaders"""
+        key = f"expense:{expense_id}"
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+        value = await loader(expense_id)
+        self._store(key, value, cache_none=False)
+        return value
+    
+    def analytics(self, name: str, params: Dict, loader: Callable[[], Any]) -> Any:
+        """Return a cached analytics result keyed by its normalized parameters"""
+        if self.backend is None:
+            return loader()
+        generation = self.backend.read_counter(self.GENERATION_KEY)
+        key = f"analytics:{generation}:{name}:{normalize_params(params)}"
+        return self._get_or_load(key, loader)
+    
+    def invalidate_expense(self, expense_id: str) -> None:
+        if self.backend is not None:
+            self.backend.delete(f"expense:{expense_id}")
+    
+    def invalidate_analytics(self) -> None:
+        if self.backend is not None:
+            self.backend.incr(self.GENERATION_KEY)
+    
+    def stats(self) -> Dict:
+        """Hit/miss/eviction counters for this container"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": getattr(self.backend, 'evictions', 0),
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+    
+    def _get_or_load(self, key: str, loader: Callable[[], Any], cache_none: bool = True) -> Any:
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+        value = loader()
+        self._store(key, value, cache_none)
+        return value
+    
+    def _lookup(self, key: str) -> Any:
+        """Fetch a key and count the hit or miss; _MISSING when uncached"""
+        if self.backend is None:
+            return _MISSING
+        value = self.backend.get(key)
+        if value is _MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+    
+    def _store(self, key: str, value: Any, cache_none: bool = True) -> None:
+        if self.backend is not None and (value is not None or cache_none):
+            self.backend.set(key, value, self.ttl)
+
+
+def normalize_params(params: Dict) -> str:
+    """Stable cache-key fragment: sorted names, lowercased strings, ISO dates, no Nones"""
+    parts = []
+    for name in sorted(params):
+        value = params[name]
+        if value is None:
+            continue
+        if isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        elif isinstance(value, str):
+            value = value.strip().lower()
+        parts.append(f"{name}={value}")
+    return "&".join(parts)
+
+
+def build_backend():
+    """Create the configured cache backend; the Redis client is imported only when selected"""
+    if CACHE_BACKEND == 'none':
+        return None
+    if CACHE_BACKEND == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        return RedisCache(redis.Redis.from_url(CACHE_URL))
+    return LRUCache()
+
+
+_cache: Optional[ExpenseCache] = None
+
+
+def get_cache() -> ExpenseCache:
+    """Shared cache for this container, created on first use"""
+    global _cache
+    if _cache is None:
+        _cache = ExpenseCache(build_backend())
+    return _cache
@@ -1,90 +1,1224 @@
 import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.transform import TransformationInjector
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
 from decimal import Decimal
+import base64
+import contextvars
+import heapq
+import json
+import logging
+import math
+import random
+import time
 import uuid
+import zlib
 from datetime import datetime
 import os
 
+from src.database.throttle import get_limiter, install_throttling
+from src.middleware.metrics import instrument_client
+from src.models.money import DEFAULT_CURRENCY, Money
+
+logger = logging.getLogger(__name__)
+
+# Attributes needed by the cost analytics; projecting to these keeps scans cheap
+ANALYTICS_FIELDS = ('cost', 'cost_units', 'currency', 'date', 'service_name', 'client')
+
+# Parallel scan fan-out; workers default to one thread per segment
+SCAN_SEGMENTS = int(os.getenv('SCAN_SEGMENTS', '4'))
+SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', '0'))
+
+# HTTP connection pool shared by every thread using this client
+DYNAMODB_MAX_CONNECTIONS = int(os.getenv('DYNAMODB_MAX_CONNECTIONS', '32'))
+
+# BatchWriteItem accepts at most 25 requests; chunks are written concurrently
+BATCH_WRITE_SIZE = 25
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '4'))
+BATCH_MAX_RETRIES = 5
+BATCH_BACKOFF_BASE = 0.05
+
+# Attempts at a read-then-transact update before giving up on a hot item
+TRANSACT_MAX_ATTEMPTS = 3
+
+# GSIs; each is sorted by the ISO date so range filters become key conditions
+DATE_INDEX = 'date-index'        # month_bucket (YYYY-MM)
+CLIENT_INDEX = 'client-index'    # client_key (lowercased client, plus #shard when sharded)
+SERVICE_INDEX = 'service-index'  # service_key (lowercased service_name, plus #shard when sharded)
+
+# Write shards per client/service index key, so one busy client or service spreads over this
+# many index partitions; reads query every shard concurrently. Changing it re-keys existing
+# items only after backfill_index_keys has run.
+INDEX_SHARDS = max(1, int(os.getenv('INDEX_SHARDS', '1')))
+
+# Read plans reported by DynamoDBClient.aggregate and query_expenses_page
+PLAN_SCAN = 'scan'
+
+# Key attributes of each read plan; a page cursor holds exactly these, taken from its last item
+PLAN_KEYS = {
+    PLAN_SCAN: ('expense_id',),
+    DATE_INDEX: ('expense_id', 'month_bucket', 'date'),
+    CLIENT_INDEX: ('expense_id', 'client_key', 'date'),
+    SERVICE_INDEX: ('expense_id', 'service_key', 'date'),
+}
+
+# Items evaluated per listing call when a FilterExpression may drop some of them
+LIST_READ_AHEAD = 100
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+# Set while a read wants its items left in the wire format ({'S': ...}, {'N': ...})
+_wire_items: contextvars.ContextVar = contextvars.ContextVar('wire_items', default=False)
+
+T = TypeVar('T')
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+class ExpenseNotFoundError(Exception):
+    """Raised when a conditional write targets an expense that doesn't exist"""
+
+
+class VersionConflictError(Exception):
+    """Raised when a write's expected version doesn't match the stored one"""
+
+
+class ThrottledError(Exception):
+    """Raised when DynamoDB kept throttling a call through every retry"""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        # Whole seconds, as a Retry-After header carries them
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def client_failure(action: str, error: ClientError) -> Exception:
+    """The exception for a failed DynamoDB call: ThrottledError if it was throttled, else a plain one"""
+    message = f"{action}: {error.response['Error']['Message']}"
+    if 'RetryAfterSeconds' in error.response:
+        return ThrottledError(message, error.response['RetryAfterSeconds'])
+    return Exception(message)
+
+
+class IdempotencyConflictError(Exception):
+    """Raised when an idempotency key is reused for a different request"""
+
+
+class IdempotencyKeyBusyError(Exception):
+    """Raised when concurrent requests with one idempotency key keep cancelling each other"""
+
+
+class CounterUpdateError(Exception):
+    """Raised when some running counter rows could not be updated; `unapplied` holds their deltas"""
+    
+    def __init__(self, message: str, unapplied: Dict):
+        super().__init__(message)
+        self.unapplied = unapplied
+
+
+def _expense_condition_failed(error: ClientError) -> bool:
+    """Whether a cancelled transaction failed on its first item's condition (the expense write)"""
+    if error.response['Error']['Code'] != 'TransactionCanceledException':
+        return False
+    reasons = error.response.get('CancellationReasons') or []
+    return bool(reasons) and reasons[0].get('Code') == 'ConditionalCheckFailed'
+
+
+def encode_cursor(last_evaluated_key: Optional[Dict]) -> Optional[str]:
+    """Encode a LastEvaluatedKey as an opaque, URL-safe cursor token"""
+    if not last_evaluated_key:
+        return None
+    wire = {k: _serializer.serialize(v) for k, v in last_evaluated_key.items()}
+    raw = json.dumps(wire, separators=(',', ':'), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict]:
+    """Decode a cursor token back into an ExclusiveStartKey"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        wire = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return {k: _deserializer.deserialize(v) for k, v in wire.items()}
+    except (ValueError, TypeError, AttributeError) as e:
+        raise InvalidCursorError(f"Invalid pagination cursor: {e}")
+
+
+def month_buckets(start_date: datetime, end_date: datetime) -> List[str]:
+    """List the YYYY-MM buckets spanned by a date range, inclusive"""
+    buckets = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        buckets.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return buckets
+
+
+def normalize_key(value: str) -> str:
+    """Normalize a client/service name for case-insensitive index lookups"""
+    return value.strip().lower()
+
+
+def index_shard(expense_id: str) -> int:
+    """The write shard of an expense; fixed by its id, so updates never move it between shards"""
+    return zlib.crc32(expense_id.encode()) % INDEX_SHARDS
+
+
+def index_key(value: str, expense_id: str) -> str:
+    """client_key/service_key for an expense: the normalized name, suffixed with its shard when sharded"""
+    key = normalize_key(value)
+    return key if INDEX_SHARDS == 1 else f"{key}#{index_shard(expense_id)}"
+
+
+def shard_keys(value: str) -> List[str]:
+    """Every client_key/service_key a name is stored under, in shard order"""
+    key = normalize_key(value)
+    return [key] if INDEX_SHARDS == 1 else [f"{key}#{shard}" for shard in range(INDEX_SHARDS)]
+
+
+def list_plan(
+    client: Optional[str] = None,
+    service: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> str:
+    """The read plan for a listing: a client or service GSI, the date index for a closed range, else a scan"""
+    if client:
+        return CLIENT_INDEX
+    if service:
+        return SERVICE_INDEX
+    if start_date and end_date:
+        return DATE_INDEX
+    return PLAN_SCAN
+
+
+def build_projection(fields: Optional[Sequence[str]]) -> Dict:
+    """Build ProjectionExpression kwargs, aliasing names to dodge reserved words like `date`"""
+    if not fields:
+        return {}
+    names = {f"#p{i}": field for i, field in enumerate(fields)}
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
+
+
+def fan_out(
+    operation,
+    requests: List[Dict],
+    fold: Callable[[Iterator[Dict]], T],
+    merge: Callable[[T, T], T],
+    max_workers: Optional[int] = None,
+    wire: bool = False
+) -> T:
+    """Run each paginated request on a thread pool, folding its items, and merge the partials
+    
+    `operation` must be a thread-safe client method such as `table.meta.client.query`.
+    With `wire`, `fold` receives items in the wire format (see install_wire_reads).
+    """
+    def run(request: Dict) -> T:
+        return fold(iter_items(operation, request))
+    
+    # Set before the pool threads copy this context
+    token = _wire_items.set(wire)
+    try:
+        # No requests (a reversed date range spans no buckets) still folds to an empty result
+        if not requests:
+            return fold(iter(()))
+        if len(requests) == 1:
+            return run(requests[0])
+        
+        max_workers = max(1, min(max_workers or SCAN_WORKERS or len(requests), len(requests)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            partials = list(executor.map(_in_context(run), requests))
+        return reduce(merge, partials)
+    finally:
+        _wire_items.reset(token)
+
+
+def _in_context(func: Callable) -> Callable:
+    """Wrap `func` to run in the caller's context, so pool threads see its context variables"""
+    context = contextvars.copy_context()
+    
+    def call(*args):
+        # A Context can't be entered by two threads at once, so each call gets its own copy
+        return context.copy().run(func, *args)
+    
+    return call
+
+
+def iter_items(operation, request: Dict) -> Iterator[Dict]:
+    """Stream every item of a scan/query, following LastEvaluatedKey"""
+    request = dict(request)
+    
+    while True:
+        try:
+            response = operation(**request)
+        except ClientError as e:
+            raise client_failure("Failed to read expenses", e)
+        
+        yield from response.get('Items', [])
+        
+        if 'LastEvaluatedKey' not in response:
+            return
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+_dynamodb = None
+
+
+def install_wire_reads(client) -> None:
+    """Hook a resource's DynamoDB client so reads run by fan_out(wire=True) keep Items in the wire format
+    
+    The resource client turns every attribute value of a response into Python
+    types: a dict per item, Decimal numbers. Analytics folds that decode
+    straight from the wire format skip that work and its garbage. Keys such as
+    LastEvaluatedKey are still converted, so paging continues unchanged.
+    """
+    injector = TransformationInjector()
+    
+    def convert(parsed, model, **kwargs):
+        items = parsed.pop('Items', None) if _wire_items.get() else None
+        injector.inject_attribute_value_output(parsed, model, **kwargs)
+        if items is not None:
+            parsed['Items'] = items
+    
+    events = client.meta.events
+    events.unregister('after-call.dynamodb', unique_id='dynamodb-attr-value-output')
+    events.register('after-call.dynamodb', convert, unique_id='dynamodb-attr-value-output')
+
+
+def get_dynamodb():
+    """Shared DynamoDB resource, built on first use and reused across warm invocations
+    
+    Building a resource loads the service model (the bulk of boto3's setup
+    cost), so every client in the process borrows this one instead.
+    """
+    global _dynamodb
+    if _dynamodb is None:
+        _dynamodb = boto3.resource(
+            'dynamodb',
+            region_name=os.getenv('AWS_REGION', 'us-east-1'),
+            # Retries are jittered and rate-limited per table/index by install_throttling instead
+            config=Config(max_pool_connections=DYNAMODB_MAX_CONNECTIONS, retries={'total_max_attempts': 1})
+        )
+        # Every client in the process shares this resource, so one hook covers all their calls
+        instrument_client(_dynamodb.meta.client)
+        install_throttling(_dynamodb.meta.client)
+        install_wire_reads(_dynamodb.meta.client)
+    return _dynamodb
+
+
 class DynamoDBClient:
     def __init__(self):
-        self.dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION', 'us-east-1'))
+        self.dynamodb = get_dynamodb()
         self.table_name = os.getenv('EXPENSES_TABLE', 'expenses-table')
         self.table = self.dynamodb.Table(self.table_name)
+        # Resources aren't thread-safe but their client is (and still speaks Python types)
+        self.client = self.dynamodb.meta.client
+        # Optional running counters (a BudgetClient) updated in the same transaction as each write
+        self.counters = None
+        # Optional idempotency records (an IdempotencyClient) written in the same transaction as keyed creates
+        self.idempotency = None
     
     def create_expense(self, expense_data: Dict) -> Dict:
         """Create a new expense record"""
         try:
-            expense_id = str(uuid.uuid4())
-            now = datetime.now()
-            
-            item = {
-                'expense_id': expense_id,
-                'service_name': expense_data['service_name'],
-                'client': expense_data['client'],
-                'cost': Decimal(str(expense_data['cost'])),
-                'date': expense_data['date'].isoformat(),
-                'description': expense_data.get('description'),
-                'created_at': now.isoformat(),
-                'updated_at': now.isoformat()
-            }
-            
-            response = self.table.put_item(Item=item)
+            item = self._build_item(expense_data)
+            if self.counters is not None:
+                self._transact(
+                    {'Put': {'TableName': self.table_name, 'Item': item, 'ConditionExpression': 'attribute_not_exists(expense_id)'}},
+                    self.counters.transact_items(None, item)
+                )
+            else:
+                self.table.put_item(Item=item)
             return item
-            
+        
         except ClientError as e:
-            raise Exception(f"Failed to create expense: {e.response['Error']['Message']}")
+            raise client_failure("Failed to create expense", e)
+    
+    def create_expense_once(self, expense_data: Dict, key: str, fingerprint: str) -> Tuple[Dict, bool]:
+        """Create an expense unless `key` already created one; returns (item, replayed)
+        
+        The expense, its idempotency record and any counter updates are one
+        transaction conditioned on the key being unused, so concurrent retries
+        agree on a single write. The losers get the winner's item back from the
+        record. Raises IdempotencyConflictError if the key was used for a
+        different request.
+        """
+        for attempt in range(TRANSACT_MAX_ATTEMPTS):
+            item = self._build_item(expense_data)
+            counter_items = self.counters.transact_items(None, item) if self.counters is not None else []
+            try:
+                self.client.transact_write_items(TransactItems=[
+                    self.idempotency.transact_item(key, fingerprint, item),
+                    {'Put': {'TableName': self.table_name, 'Item': item, 'ConditionExpression': 'attribute_not_exists(expense_id)'}}
+                ] + counter_items)
+                return item, False
+            
+            except ClientError as e:
+                record = self._failed_record(e, key)
+                if record is not None:
+                    return self.idempotency.replay(record, fingerprint), True
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise client_failure("Failed to create expense", e)
+            # Cancelled by a concurrent transaction on the same key that hasn't committed yet
+            time.sleep(BATCH_BACKOFF_BASE * (2 ** attempt) * (1 + random.random()))
+        raise IdempotencyKeyBusyError(f"Idempotency key {key} is in use by another request; retry it")
+    
+    def _failed_record(self, error: ClientError, key: str) -> Optional[Dict]:
+        """The live idempotency record a create transaction failed against, or None"""
+        if error.response['Error']['Code'] != 'TransactionCanceledException':
+            return None
+        reasons = error.response.get('CancellationReasons') or []
+        if not reasons or reasons[0].get('Code') != 'ConditionalCheckFailed':
+            return None
+        # The record comes back with the cancellation; older endpoints omit it, so look it up
+        record = reasons[0].get('Item')
+        if record is None:
+            return self.idempotency.get(key)
+        return {k: _deserializer.deserialize(v) for k, v in record.items()}
+    
+    def batch_create(
+        self,
+        expenses: List[Dict],
+        max_workers: Optional[int] = None,
+        idempotency: Optional[List[Optional[Tuple[str, str]]]] = None
+    ) -> List[Dict]:
+        """Create many expenses with BatchWriteItem, returning a result per input item
+        
+        Items are written in 25-item chunks on a thread pool. Unprocessed items are
+        retried with exponential backoff; whatever is still unprocessed afterwards
+        is reported as failed rather than raised. Counter updates that fail after
+        the items are stored are logged for repair, not reported as failures.
+        
+        `idempotency` optionally gives a (key, fingerprint) per item. When
+        idempotency records are enabled, keyed items are created at most once
+        each (see _create_keyed) and the results of repeats say `replayed`.
+        """
+        keyed: Dict[int, Tuple[str, str]] = {}
+        if self.idempotency is not None and idempotency:
+            keyed = {i: entry for i, entry in enumerate(idempotency) if entry}
+        items = [self._build_item(expense_data) for expense_data in expenses]
+        plain = [i for i in range(len(items)) if i not in keyed]
+        chunks = [plain[start:start + BATCH_WRITE_SIZE] for start in range(0, len(plain), BATCH_WRITE_SIZE)]
+        
+        def write_chunk(indexes: List[int]) -> Dict[int, str]:
+            return self._write_chunk({items[i]['expense_id']: i for i in indexes}, items)
+        
+        failures: Dict[int, str] = {}
+        if chunks:
+            workers = max(1, min(max_workers or BATCH_WORKERS, len(chunks)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for chunk_failures in executor.map(_in_context(write_chunk), chunks):
+                    failures.update(chunk_failures)
+        
+        if self.counters is not None:
+            try:
+                self.counters.apply_items([items[i] for i in plain if i not in failures])
+            except CounterUpdateError as e:
+                # The expenses are stored either way; log the missed deltas so the counters can be repaired
+                logger.error("%s; unapplied counter deltas: %s", e, json.dumps([
+                    {'key': key, 'month': month, 'units': units, 'count': count}
+                    for (key, month), (_, _, _, units, count) in e.unapplied.items()
+                ]))
+        
+        outcomes = self._create_keyed(expenses, keyed, max_workers) if keyed else {}
+        return [
+            outcomes[i] if i in outcomes
+            else {"index": i, "status": "failed", "error": failures[i]} if i in failures
+            else {"index": i, "status": "created", "item": item}
+            for i, item in enumerate(items)
+        ]
+    
+    def _create_keyed(
+        self,
+        expenses: List[Dict],
+        keyed: Dict[int, Tuple[str, str]],
+        max_workers: Optional[int]
+    ) -> Dict[int, Dict]:
+        """Create each keyed item at most once; returns batch_create results by index
+        
+        Keys that already have records are answered from one round of
+        BatchGetItem reads, so a retried batch costs reads rather than failed
+        transactions. A key repeated within the batch is written once and the
+        repeats answered from that write. The rest go through
+        create_expense_once on a thread pool.
+        """
+        records = self.idempotency.get_many(key for key, _ in keyed.values())
+        outcomes: Dict[int, Dict] = {}
+        first: Dict[str, int] = {}
+        repeats: List[int] = []
+        
+        def replayed(index: int, record: Dict) -> Dict:
+            try:
+                item = self.idempotency.replay(record, keyed[index][1])
+                return {"index": index, "status": "created", "item": item, "replayed": True}
+            except Exception as e:
+                return {"index": index, "status": "failed", "error": str(e)}
+        
+        for index, (key, _) in keyed.items():
+            if key in records:
+                outcomes[index] = replayed(index, records[key])
+            elif key in first:
+                repeats.append(index)
+            else:
+                first[key] = index
+        
+        def write(index: int) -> Dict:
+            key, fingerprint = keyed[index]
+            try:
+                item, repeated = self.create_expense_once(expenses[index], key, fingerprint)
+                return {"index": index, "status": "created", "item": item, "replayed": repeated}
+            except Exception as e:
+                return {"index": index, "status": "failed", "error": str(e)}
+        
+        if first:
+            workers = max(1, min(max_workers or BATCH_WORKERS, len(first)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for outcome in executor.map(_in_context(write), first.values()):
+                    outcomes[outcome["index"]] = outcome
+        
+        for index in repeats:
+            key = keyed[index][0]
+            written = outcomes[first[key]]
+            if written["status"] != "created":
+                outcomes[index] = dict(written, index=index)
+            else:
+                record = {'idempotency_key': key, 'fingerprint': keyed[first[key]][1], 'response': written["item"]}
+                outcomes[index] = replayed(index, record)
+        return outcomes
+    
+    def _write_chunk(self, pending_ids: Dict[str, int], items: List[Dict]) -> Dict[int, str]:
+        """Write one chunk, retrying UnprocessedItems; returns {index: error} for failures"""
+        requests = [{'PutRequest': {'Item': items[i]}} for i in pending_ids.values()]
+        
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            try:
+                response = self.client.batch_write_item(RequestItems={self.table_name: requests})
+            except ClientError as e:
+                message = e.response['Error']['Message']
+                return {i: f"Failed to create expense: {message}" for i in pending_ids.values()}
+            
+            requests = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            if not requests:
+                return {}
+            if attempt < BATCH_MAX_RETRIES:
+                # Unprocessed items mean the table is throttling; slow its other writes down too
+                get_limiter(self.table_name, 'write').throttled()
+                time.sleep(BATCH_BACKOFF_BASE * (2 ** attempt) * (1 + random.random()))
+        
+        return {
+            pending_ids[request['PutRequest']['Item']['expense_id']]: "Failed to create expense: unprocessed after retries"
+            for request in requests
+        }
+    
+    def _build_item(self, expense_data: Dict) -> Dict:
+        """Build the stored item for a new expense, including GSI key attributes
+        
+        Cost is stored twice: the Decimal amount, and `cost_units`, the same amount
+        as integer minor units of `currency` that analytics sum without Decimal math.
+        """
+        now = datetime.now().isoformat()
+        cost = Money.of(expense_data['cost'], expense_data.get('currency') or DEFAULT_CURRENCY)
+        expense_id = str(uuid.uuid4())
+        return {
+            'expense_id': expense_id,
+            'service_name': expense_data['service_name'],
+            'client': expense_data['client'],
+            'cost': cost.amount,
+            'cost_units': cost.units,
+            'currency': cost.currency,
+            'date': expense_data['date'].isoformat(),
+            'month_bucket': expense_data['date'].strftime('%Y-%m'),
+            'client_key': index_key(expense_data['client'], expense_id),
+            'service_key': index_key(expense_data['service_name'], expense_id),
+            'description': expense_data.get('description'),
+            'created_at': now,
+            'updated_at': now,
+            'version': 1
+        }
     
     def get_expense(self, expense_id: str) -> Optional[Dict]:
         """Get expense by ID"""
         try:
             response = self.table.get_item(Key={'expense_id': expense_id})
             return response.get('Item')
-            
+        
         except ClientError as e:
-            raise Exception(f"Failed to get expense: {e.response['Error']['Message']}")
+            raise client_failure("Failed to get expense", e)
     
-    def update_expense(self, expense_id: str, update_data: Dict) -> Dict:
-        """Update an existing expense"""
+    def update_expense(self, expense_id: str, update_data: Dict, expected_version: Optional[int] = None) -> Dict:
+        """Update an existing expense in a single conditional write
+        
+        Raises ExpenseNotFoundError if the item doesn't exist and, when
+        `expected_version` is given, VersionConflictError if it has moved on.
+        
+        A new cost without a currency is converted to minor units assuming the
+        default currency, guarded by a condition on the stored currency; if the
+        item turns out to use another currency the write is retried once with it.
+        """
+        update_data = {key: value for key, value in update_data.items() if value is not None}
+        if self.counters is not None:
+            return self._transact_update(expense_id, update_data, expected_version)
+        
+        assume_currency = 'cost' in update_data and 'currency' not in update_data
         try:
-            # Build update expression
-            update_expression = "SET updated_at = :updated_at"
-            expression_values = {':updated_at': datetime.now().isoformat()}
-            
-            for key, value in update_data.items():
-                if value is not None:
-                    if key == 'cost':
-                        value = Decimal(str(value))
-                    update_expression += f", {key} = :{key}"
-                    expression_values[f":{key}"] = value
-            
-            response = self.table.update_item(
-                Key={'expense_id': expense_id},
-                UpdateExpression=update_expression,
-                ExpressionAttributeValues=expression_values,
-                ReturnValues='ALL_NEW'
-            )
+            return self._update_item(expense_id, update_data, expected_version, assume_currency)
+        
+        except ClientError as e:
+            error = e
+            current = self._failed_item(e, expense_id) if assume_currency else None
+            if (
+                current is not None
+                and current.get('currency', DEFAULT_CURRENCY) != DEFAULT_CURRENCY
+                and (expected_version is None or int(current.get('version', 1)) == expected_version)
+            ):
+                try:
+                    return self._update_item(
+                        expense_id, {**update_data, 'currency': current['currency']}, expected_version, False
+                    )
+                except ClientError as retry_error:
+                    error = retry_error
+            self._raise_condition_failure(error, expense_id, expected_version)
+            raise client_failure("Failed to update expense", error)
+    
+    def _update_item(
+        self,
+        expense_id: str,
+        update_data: Dict,
+        expected_version: Optional[int],
+        assume_currency: bool
+    ) -> Dict:
+        """Issue the conditional UpdateItem for update_expense"""
+        update_expression = "SET updated_at = :updated_at"
+        expression_values = {':updated_at': datetime.now().isoformat()}
+        
+        for key, value in update_data.items():
+            if key == 'cost':
+                # Keep cost and cost_units an exact pair
+                cost = Money.of(value, update_data.get('currency', DEFAULT_CURRENCY))
+                value = cost.amount
+                update_expression += ", cost_units = :cost_units"
+                expression_values[':cost_units'] = cost.units
+            update_expression += f", {key} = :{key}"
+            expression_values[f":{key}"] = value
             
-            return response['Attributes']
+            # Keep the lowercased index keys in step with the fields they mirror
+            if key in ('client', 'service_name'):
+                key_attr = 'client_key' if key == 'client' else 'service_key'
+                update_expression += f", {key_attr} = :{key_attr}"
+                expression_values[f":{key_attr}"] = index_key(value, expense_id)
+        
+        update_expression += " ADD version :one"
+        expression_values[':one'] = 1
+        
+        condition = self._write_condition(expected_version, expression_values)
+        if assume_currency:
+            condition['ConditionExpression'] += ' AND (attribute_not_exists(currency) OR currency = :assumed_currency)'
+            expression_values[':assumed_currency'] = DEFAULT_CURRENCY
+        
+        response = self.table.update_item(
+            Key={'expense_id': expense_id},
+            UpdateExpression=update_expression,
+            ExpressionAttributeValues=expression_values,
+            ReturnValues='ALL_NEW',
+            **condition
+        )
+        return response['Attributes']
+    
+    def _transact_update(self, expense_id: str, update_data: Dict, expected_version: Optional[int]) -> Dict:
+        """Update an expense and its counters in one transaction
+        
+        The counters need the old values, which a transaction can't return, so the
+        item is read first and written back conditioned on the version read; a
+        concurrent write in between causes a re-read, up to TRANSACT_MAX_ATTEMPTS.
+        """
+        for _ in range(TRANSACT_MAX_ATTEMPTS):
+            current = self._read_for_write(expense_id, expected_version)
+            updated = dict(current, **update_data, updated_at=datetime.now().isoformat())
+            if 'cost' in update_data:
+                cost = Money.of(update_data['cost'], updated.get('currency', DEFAULT_CURRENCY))
+                updated.update(cost=cost.amount, cost_units=cost.units, currency=cost.currency)
+            updated['client_key'] = index_key(updated['client'], expense_id)
+            updated['service_key'] = index_key(updated['service_name'], expense_id)
+            updated['version'] = int(current.get('version', 1)) + 1
             
+            try:
+                self._transact(
+                    {'Put': dict(self._version_guard(current), TableName=self.table_name, Item=updated)},
+                    self.counters.transact_items(current, updated)
+                )
+                return updated
+            except ClientError as e:
+                if not _expense_condition_failed(e):
+                    raise client_failure("Failed to update expense", e)
+        raise VersionConflictError(f"Expense {expense_id} kept changing; retry the update")
+    
+    def _transact_delete(self, expense_id: str, expected_version: Optional[int]) -> Dict:
+        """Delete an expense and reverse its counters in one transaction, re-reading on a race"""
+        for _ in range(TRANSACT_MAX_ATTEMPTS):
+            current = self._read_for_write(expense_id, expected_version)
+            try:
+                self._transact(
+                    {'Delete': dict(
+                        self._version_guard(current),
+                        TableName=self.table_name,
+                        Key={'expense_id': expense_id}
+                    )},
+                    self.counters.transact_items(current, None)
+                )
+                return current
+            except ClientError as e:
+                if not _expense_condition_failed(e):
+                    raise client_failure("Failed to delete expense", e)
+        raise VersionConflictError(f"Expense {expense_id} kept changing; retry the delete")
+    
+    def _read_for_write(self, expense_id: str, expected_version: Optional[int]) -> Dict:
+        """Consistent read of an item about to be rewritten, checking it exists at the expected version"""
+        try:
+            current = self.table.get_item(Key={'expense_id': expense_id}, ConsistentRead=True).get('Item')
         except ClientError as e:
-            raise Exception(f"Failed to update expense: {e.response['Error']['Message']}")
+            raise client_failure("Failed to get expense", e)
+        if current is None:
+            raise ExpenseNotFoundError(f"Expense with ID {expense_id} not found")
+        version = int(current.get('version', 1))
+        if expected_version is not None and version != expected_version:
+            raise VersionConflictError(
+                f"Expense {expense_id} is at version {version}, expected {expected_version}"
+            )
+        return current
+    
+    def _version_guard(self, current: Dict) -> Dict:
+        """Condition that the item is still at the version it was read at"""
+        if 'version' not in current:
+            return {'ConditionExpression': 'attribute_exists(expense_id) AND attribute_not_exists(version)'}
+        return {
+            'ConditionExpression': 'version = :read_version',
+            'ExpressionAttributeValues': {':read_version': current['version']}
+        }
     
-    def delete_expense(self, expense_id: str) -> bool:
-        """Delete an expense"""
+    def _transact(self, write: Dict, counter_items: List[Dict]) -> None:
+        """Run an expense write and its counter updates as one TransactWriteItems call"""
+        self.client.transact_write_items(TransactItems=[write] + counter_items)
+    
+    def delete_expense(self, expense_id: str, expected_version: Optional[int] = None) -> Dict:
+        """Delete an expense in a single conditional write and return the deleted item"""
+        if self.counters is not None:
+            return self._transact_delete(expense_id, expected_version)
         try:
-            self.table.delete_item(Key={'expense_id': expense_id})
-            return True
+            expression_values: Dict = {}
+            condition = self._write_condition(expected_version, expression_values)
+            if expression_values:
+                condition['ExpressionAttributeValues'] = expression_values
             
+            response = self.table.delete_item(
+                Key={'expense_id': expense_id},
+                ReturnValues='ALL_OLD',
+                **condition
+            )
+            return response['Attributes']
+        
         except ClientError as e:
-            raise Exception(f"Failed to delete expense: {e.response['Error']['Message']}")
+            self._raise_condition_failure(e, expense_id, expected_version)
+            raise client_failure("Failed to delete expense", e)
+    
+    def _write_condition(self, expected_version: Optional[int], expression_values: Dict) -> Dict:
+        """Build the existence (and optional version) condition for a mutating write"""
+        condition = 'attribute_exists(expense_id)'
+        if expected_version is not None:
+            # Items written before versioning count as version 1
+            condition += ' AND (version = :expected OR (attribute_not_exists(version) AND :expected = :first))'
+            expression_values[':expected'] = expected_version
+            expression_values[':first'] = 1
+        return {
+            'ConditionExpression': condition,
+            'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+        }
+    
+    def _raise_condition_failure(self, error: ClientError, expense_id: str, expected_version: Optional[int]):
+        """Translate a failed write condition into not-found or version-conflict errors"""
+        if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            return
+        
+        if expected_version is not None:
+            current = self._failed_item(error, expense_id)
+            if current is not None:
+                raise VersionConflictError(
+                    f"Expense {expense_id} is at version {int(current.get('version', 1))}, expected {expected_version}"
+                )
+        raise ExpenseNotFoundError(f"Expense with ID {expense_id} not found")
+    
+    def _failed_item(self, error: ClientError, expense_id: str) -> Optional[Dict]:
+        """The item a conditional write failed against, or None if it doesn't exist"""
+        if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            return None
+        # The failing item comes back with the error; older endpoints omit it, so look it up
+        current = error.response.get('Item')
+        if current is None:
+            return self.get_expense(expense_id)
+        return {k: _deserializer.deserialize(v) for k, v in current.items()}
     
     def list_expenses(self, limit: int = 50) -> List[Dict]:
-        """List all expenses with pagination"""
-        try:
-            response = self.table.scan(Limit=limit)
-            return response.get('Items', [])
+        """List up to `limit` expenses, following LastEvaluatedKey across pages"""
+        items, _ = self.list_expenses_page(limit)
+        return items
+    
+    def list_expenses_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        projection: Optional[Sequence[str]] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Return one keyset page of expenses and the cursor for the next page"""
+        items: List[Dict] = []
+        start_key = decode_cursor(cursor)
+        last_key = start_key
+        
+        for page, last_key in self._paginate(
+            self.table.scan,
+            page_size=limit,
+            start_key=start_key,
+            remaining=limit,
+            **build_projection(projection)
+        ):
+            items.extend(page)
+        
+        return items, encode_cursor(last_key) if len(items) >= limit else None
+    
+    def query_expenses_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        client: Optional[str] = None,
+        service: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        min_cost: Optional[Decimal] = None,
+        max_cost: Optional[Decimal] = None,
+        descending: bool = False,
+        projection: Optional[Sequence[str]] = None
+    ) -> Tuple[List[Dict], Optional[str], str]:
+        """One filtered page of expenses, the cursor for the next page, and the read plan
+        
+        Client and service filters query their GSI and a closed date range queries
+        the date index month by month, so the range is a key condition and items
+        come back in date order (newest first when `descending`). Cost bounds and
+        anything the plan can't key on become a FilterExpression; only a listing
+        with neither client, service nor a closed date range scans. The cursor is
+        built from the last item returned, so a filtered read can look ahead past
+        the page without skipping items.
+        """
+        plan = list_plan(client, service, start_date, end_date)
+        key_attrs = PLAN_KEYS[plan]
+        if projection:
+            projection = list(dict.fromkeys(list(projection) + list(key_attrs)))
+        
+        if plan == DATE_INDEX:
+            buckets = month_buckets(start_date, end_date)
+            requests = [
+                self._index_query(DATE_INDEX, 'month_bucket', bucket, start_date, end_date, projection)
+                for bucket in (reversed(buckets) if descending else buckets)
+            ]
+        elif plan == PLAN_SCAN:
+            requests = [dict(build_projection(projection), TableName=self.table_name)]
+        else:
+            # One query per write shard, each already filtered on service when both are given
+            requests = self._shard_queries(plan, client, service, start_date, end_date, projection)
+        
+        conditions, names, values = [], {}, {}
+        if plan == PLAN_SCAN and (start_date or end_date):
+            names['#d'] = 'date'
+            if start_date:
+                conditions.append('#d >= :start')
+                values[':start'] = start_date.isoformat()
+            if end_date:
+                conditions.append('#d <= :end')
+                values[':end'] = end_date.isoformat()
+        if min_cost is not None or max_cost is not None:
+            names['#c'] = 'cost'
+            if min_cost is not None:
+                conditions.append('#c >= :min_cost')
+                values[':min_cost'] = min_cost
+            if max_cost is not None:
+                conditions.append('#c <= :max_cost')
+                values[':max_cost'] = max_cost
+        for request in requests:
+            if conditions:
+                request['FilterExpression'] = ' AND '.join(
+                    ([request['FilterExpression']] if 'FilterExpression' in request else []) + conditions
+                )
+                request['ExpressionAttributeNames'] = dict(request.get('ExpressionAttributeNames', {}), **names)
+                request['ExpressionAttributeValues'] = dict(request.get('ExpressionAttributeValues', {}), **values)
+            if descending:
+                request['ScanIndexForward'] = False
+        read_ahead = bool(conditions) or (plan == CLIENT_INDEX and bool(service))
+        
+        start_key = decode_cursor(cursor)
+        if plan in (CLIENT_INDEX, SERVICE_INDEX) and INDEX_SHARDS > 1:
+            items, next_cursor = self._merge_shards(requests, limit, start_key, key_attrs, read_ahead, descending)
+            return items, next_cursor, plan
+        if start_key is not None:
+            if set(start_key) != set(key_attrs):
+                raise InvalidCursorError("Invalid pagination cursor: it belongs to a different query")
+            if plan == DATE_INDEX:
+                # Resume in the cursor's month bucket
+                bucket = start_key['month_bucket']
+                position = next(
+                    (i for i, request in enumerate(requests) if request['ExpressionAttributeValues'][':h'] == bucket),
+                    None
+                )
+                if position is None:
+                    raise InvalidCursorError("Invalid pagination cursor: it belongs to a different query")
+                requests = requests[position:]
+            requests[0]['ExclusiveStartKey'] = start_key
+        
+        operation = self.client.scan if plan == PLAN_SCAN else self.client.query
+        items, more = self._read_items(operation, requests, limit, read_ahead)
+        next_cursor = encode_cursor({k: items[-1][k] for k in key_attrs}) if more else None
+        return items, next_cursor, plan
+    
+    def _read_items(self, operation, requests: List[Dict], limit: int, read_ahead: bool) -> Tuple[List[Dict], bool]:
+        """Read up to `limit` items from `requests` in turn; returns (items, whether more may follow)
+        
+        With `read_ahead` each call evaluates at least LIST_READ_AHEAD items, since
+        a FilterExpression may drop most of them; the page is cut at `limit`.
+        """
+        items: List[Dict] = []
+        for position, request in enumerate(requests):
+            while True:
+                remaining = limit - len(items)
+                request['Limit'] = max(remaining, LIST_READ_AHEAD) if read_ahead else remaining
+                try:
+                    response = operation(**request)
+                except ClientError as e:
+                    raise client_failure("Failed to list expenses", e)
+                
+                page = response.get('Items', [])
+                last_key = response.get('LastEvaluatedKey')
+                if len(page) >= remaining:
+                    items.extend(page[:remaining])
+                    return items, len(page) > remaining or last_key is not None or position < len(requests) - 1
+                
+                items.extend(page)
+                if not last_key:
+                    break
+                request['ExclusiveStartKey'] = last_key
+        return items, False
+    
+    def _merge_shards(
+        self,
+        requests: List[Dict],
+        limit: int,
+        start_key: Optional[Dict],
+        key_attrs: Sequence[str],
+        read_ahead: bool,
+        descending: bool
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """One page across the write shards of an index, in date order, and its cursor
+        
+        Every shard still in play is read concurrently for up to `limit` items and
+        the pages are merged by date. The cursor keeps a position per shard: the
+        key of the last item it contributed, an empty map for a shard not read
+        from yet, and no entry once a shard is exhausted.
+        """
+        positions = {str(shard): {} for shard in range(len(requests))}
+        if start_key is not None:
+            positions = start_key.get('shards')
+            if (
+                set(start_key) != {'shards'} or not isinstance(positions, dict)
+                or not set(positions) <= {str(shard) for shard in range(len(requests))}
+                or any(position and set(position) != set(key_attrs) for position in positions.values())
+            ):
+                raise InvalidCursorError("Invalid pagination cursor: it belongs to a different query")
+        
+        live = [shard for shard in range(len(requests)) if str(shard) in positions]
+        for shard in live:
+            if positions[str(shard)]:
+                requests[shard]['ExclusiveStartKey'] = positions[str(shard)]
+        
+        def read(shard: int) -> Tuple[int, List[Dict], bool]:
+            return (shard, *self._read_items(self.client.query, [requests[shard]], limit, read_ahead))
+        
+        if live:
+            with ThreadPoolExecutor(max_workers=min(len(live), SCAN_WORKERS or len(live))) as executor:
+                pages = list(executor.map(_in_context(read), live))
+        else:
+            pages = []
+        
+        merged = heapq.merge(
+            *([(item, shard) for item in page] for shard, page, _ in pages),
+            key=lambda entry: entry[0]['date'],
+            reverse=descending
+        )
+        items: List[Dict] = []
+        last: Dict[int, Dict] = {}
+        taken: Dict[int, int] = {}
+        for item, shard in islice(merged, limit):
+            items.append(item)
+            last[shard] = item
+            taken[shard] = taken.get(shard, 0) + 1
+        
+        remaining = {}
+        for shard, page, more in pages:
+            if more or taken.get(shard, 0) < len(page):
+                remaining[str(shard)] = (
+                    {k: last[shard][k] for k in key_attrs} if shard in last else positions[str(shard)]
+                )
+        return items, encode_cursor({'shards': remaining}) if remaining else None
+    
+    def iter_expense_pages(
+        self,
+        page_size: Optional[int] = None,
+        projection: Optional[Sequence[str]] = None,
+        cursor: Optional[str] = None
+    ) -> Iterator[List[Dict]]:
+        """Yield every expense in the table one DynamoDB page at a time"""
+        for page, _ in self._paginate(
+            self.table.scan,
+            page_size=page_size,
+            start_key=decode_cursor(cursor),
+            **build_projection(projection)
+        ):
+            yield page
+    
+    def iter_expenses(
+        self,
+        page_size: Optional[int] = None,
+        projection: Optional[Sequence[str]] = None
+    ) -> Iterator[Dict]:
+        """Stream every expense in the table without materializing the full result"""
+        for page in self.iter_expense_pages(page_size=page_size, projection=projection):
+            yield from page
+    
+    def _paginate(
+        self,
+        operation,
+        page_size: Optional[int] = None,
+        start_key: Optional[Dict] = None,
+        remaining: Optional[int] = None,
+        **kwargs
+    ) -> Iterator[Tuple[List[Dict], Optional[Dict]]]:
+        """Drive a scan/query to completion, yielding (items, LastEvaluatedKey) per page
+        
+        When `remaining` is set the page size shrinks so that the final page ends
+        exactly on the last returned item, keeping its LastEvaluatedKey a valid cursor.
+        """
+        while True:
+            request = dict(kwargs)
+            limit = page_size
+            if remaining is not None:
+                limit = remaining if limit is None else min(limit, remaining)
+            if limit:
+                request['Limit'] = limit
+            if start_key:
+                request['ExclusiveStartKey'] = start_key
             
-        except ClientError as e:
-            raise Exception(f"Failed to list expenses: {e.response['Error']['Message']}")
+            try:
+                response = operation(**request)
+            except ClientError as e:
+                raise client_failure("Failed to list expenses", e)
+            
+            items = response.get('Items', [])
+            start_key = response.get('LastEvaluatedKey')
+            yield items, start_key
+            
+            if remaining is not None:
+                remaining -= len(items)
+                if remaining <= 0:
+                    return
+            if not start_key:
+                return
+    
+    def parallel_scan(
+        self,
+        fold: Callable[[Iterator[Dict]], T],
+        merge: Callable[[T, T], T],
+        total_segments: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        projection: Optional[Sequence[str]] = None,
+        wire: bool = False
+    ) -> T:
+        """Scan the table as parallel segments, folding each into a partial aggregate
+        
+        `fold` reduces one segment's item stream to a partial result on its worker
+        thread and `merge` combines partials, so raw items never leave the worker.
+        With `wire`, `fold` receives items in DynamoDB's wire format.
+        """
+        total_segments = max(1, total_segments or SCAN_SEGMENTS)
+        request = dict(build_projection(projection), TableName=self.table_name)
+        
+        if total_segments == 1:
+            requests = [request]
+        else:
+            requests = [
+                dict(request, Segment=segment, TotalSegments=total_segments)
+                for segment in range(total_segments)
+            ]
+        return fan_out(self.client.scan, requests, fold, merge, max_workers, wire)
+    
+    def aggregate(
+        self,
+        fold: Callable[[Iterator[Dict]], T],
+        merge: Callable[[T, T], T],
+        client: Optional[str] = None,
+        service: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        max_workers: Optional[int] = None,
+        projection: Optional[Sequence[str]] = None,
+        wire: bool = False
+    ) -> Tuple[T, str]:
+        """Pick the narrowest read for the filters, run it, and return (result, plan)
+        
+        A client or service filter queries its GSI (with any date range as a sort
+        key condition, and every write shard concurrently), a bare date range
+        queries the month buckets of the date index concurrently, and only an
+        unfiltered read falls back to a parallel scan.
+        """
+        if client or service:
+            index = CLIENT_INDEX if client else SERVICE_INDEX
+            requests = self._shard_queries(index, client, service, start_date, end_date, projection)
+            return fan_out(self.client.query, requests, fold, merge, max_workers, wire), index
+        
+        if start_date and end_date:
+            return self.query_date_range(
+                fold, merge, start_date, end_date, max_workers, projection, wire
+            ), DATE_INDEX
+        
+        return self.parallel_scan(fold, merge, max_workers=max_workers, projection=projection, wire=wire), PLAN_SCAN
+    
+    def query_date_range(
+        self,
+        fold: Callable[[Iterator[Dict]], T],
+        merge: Callable[[T, T], T],
+        start_date: datetime,
+        end_date: datetime,
+        max_workers: Optional[int] = None,
+        projection: Optional[Sequence[str]] = None,
+        wire: bool = False
+    ) -> T:
+        """Query the date index for [start_date, end_date], one concurrent Query per month bucket
+        
+        Reads touch only the months in the window, so cost scales with the window
+        rather than the table. Uses the same fold/merge contract as parallel_scan.
+        """
+        requests = [
+            self._index_query(DATE_INDEX, 'month_bucket', bucket, start_date, end_date, projection)
+            for bucket in month_buckets(start_date, end_date)
+        ]
+        return fan_out(self.client.query, requests, fold, merge, max_workers, wire)
+    
+    def backfill_index_keys(self) -> int:
+        """Stamp GSI keys and cost_units/currency on items written before those attributes existed
+        
+        Client and service keys that don't match the current INDEX_SHARDS are
+        rewritten too, so this also re-keys the table after the shard count changes.
+        """
+        updated = 0
+        fields = (
+            'expense_id', 'date', 'client', 'service_name', 'month_bucket', 'client_key', 'service_key',
+            'cost', 'cost_units', 'currency'
+        )
+        for item in self.iter_expenses(projection=fields):
+            missing = {}
+            if 'month_bucket' not in item and 'date' in item:
+                missing['month_bucket'] = item['date'][:7]
+            if 'client' in item and item.get('client_key') != index_key(item['client'], item['expense_id']):
+                missing['client_key'] = index_key(item['client'], item['expense_id'])
+            if 'service_name' in item and item.get('service_key') != index_key(item['service_name'], item['expense_id']):
+                missing['service_key'] = index_key(item['service_name'], item['expense_id'])
+            if 'cost_units' not in item and 'cost' in item:
+                cost = Money.of(item['cost'], item.get('currency', DEFAULT_CURRENCY))
+                missing['cost_units'] = cost.units
+                missing['currency'] = cost.currency
+            if not missing:
+                continue
+            
+            condition = {}
+            if 'cost_units' in missing:
+                # A concurrent cost update stamps its own units; don't overwrite them
+                condition['ConditionExpression'] = 'attribute_not_exists(cost_units)'
+            try:
+                self.table.update_item(
+                    Key={'expense_id': item['expense_id']},
+                    UpdateExpression='SET ' + ', '.join(f"{name} = :{name}" for name in missing),
+                    ExpressionAttributeValues={f":{name}": value for name, value in missing.items()},
+                    **condition
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                continue
+            updated += 1
+        return updated
+    
+    def _shard_queries(
+        self,
+        index: str,
+        client: Optional[str],
+        service: Optional[str],
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        projection: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
+        """Query requests for a client or service across its write shards, one per shard
+        
+        On the client index a service filter matches the service key of the same
+        shard, which an expense shares since both come from its id.
+        """
+        hash_attr, hash_value = ('client_key', client) if index == CLIENT_INDEX else ('service_key', service)
+        service_keys = shard_keys(service) if index == CLIENT_INDEX and service else None
+        requests = []
+        for shard, key in enumerate(shard_keys(hash_value)):
+            request = self._index_query(index, hash_attr, key, start_date, end_date, projection)
+            if service_keys is not None:
+                request['FilterExpression'] = '#sk = :sk'
+                request['ExpressionAttributeNames']['#sk'] = 'service_key'
+                request['ExpressionAttributeValues'][':sk'] = service_keys[shard]
+            requests.append(request)
+        return requests
+    
+    def _index_query(
+        self,
+        index: str,
+        hash_attr: str,
+        hash_value: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        projection: Optional[Sequence[str]] = None
+    ) -> Dict:
+        """Build a Query request on a date-sorted GSI"""
+        request = build_projection(projection)
+        names = dict(request.pop('ExpressionAttributeNames', {}), **{'#h': hash_attr})
+        values = {':h': hash_value}
+        condition = '#h = :h'
+        
+        if start_date or end_date:
+            names['#d'] = 'date'
+            if start_date and end_date:
+                condition += ' AND #d BETWEEN :start AND :end'
+            else:
+                condition += ' AND #d >= :start' if start_date else ' AND #d <= :end'
+            if start_date:
+                values[':start'] = start_date.isoformat()
+            if end_date:
+                values[':end'] = end_date.isoformat()
+        
+        request.update(
+            TableName=self.table_name,
+            IndexName=index,
+            KeyConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+        return request
@@ -0,0 +1,104 @@
+from botocore.exceptions import ClientError
+from typing import Dict, Iterable, Optional
+import hashlib
+import json
+import os
+import random
+import time
+
+from src.database.dynamodb_client import IdempotencyConflictError, client_failure, get_dynamodb
+
+# How long a key replays its first response; DynamoDB's TTL sweeper deletes records some time after this
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+
+# Longest Idempotency-Key accepted (a UUID is 36 characters)
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# BatchGetItem reads at most 100 keys per call
+BATCH_GET_SIZE = 100
+BATCH_GET_MAX_RETRIES = 5
+BATCH_GET_BACKOFF_BASE = 0.05
+
+
+def request_fingerprint(payload: Dict) -> str:
+    """Stable hash of a request body, so a reused key can be told apart from a retry"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class IdempotencyClient:
+    """Idempotency records: one row per client-supplied key, holding the first response
+    
+    A record is written in the same transaction as the expense it created, on
+    the condition that no live record exists for its key. A retry's transaction
+    therefore fails on that condition, and the stored response is returned
+    instead of writing a second expense. Records carry `expires_at` for
+    DynamoDB TTL; until the sweeper removes an expired record it counts as
+    absent, so the key can be used again.
+    """
+    
+    def __init__(self):
+        self.dynamodb = get_dynamodb()
+        self.table_name = os.getenv('IDEMPOTENCY_TABLE', 'expense-idempotency')
+        self.table = self.dynamodb.Table(self.table_name)
+        self.client = self.dynamodb.meta.client
+    
+    def transact_item(self, key: str, fingerprint: str, response: Dict, now: Optional[float] = None) -> Dict:
+        """TransactWriteItems entry recording `response` for `key`, unless a live record exists"""
+        now = int(now if now is not None else time.time())
+        return {'Put': {
+            'TableName': self.table_name,
+            'Item': {
+                'idempotency_key': key,
+                'fingerprint': fingerprint,
+                'response': response,
+                'expires_at': now + IDEMPOTENCY_TTL_SECONDS
+            },
+            'ConditionExpression': 'attribute_not_exists(idempotency_key) OR expires_at <= :now',
+            'ExpressionAttributeValues': {':now': now},
+            'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+        }}
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """The live record for `key`, read consistently, or None"""
+        try:
+            record = self.table.get_item(Key={'idempotency_key': key}, ConsistentRead=True).get('Item')
+        except ClientError as e:
+            raise client_failure("Failed to read idempotency record", e)
+        return record if record is not None and not self._expired(record) else None
+    
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        """Live records for `keys` with consistent BatchGetItem reads, keyed by idempotency key"""
+        keys = list(dict.fromkeys(keys))
+        records: Dict[str, Dict] = {}
+        for start in range(0, len(keys), BATCH_GET_SIZE):
+            request = {self.table_name: {
+                'Keys': [{'idempotency_key': key} for key in keys[start:start + BATCH_GET_SIZE]],
+                'ConsistentRead': True
+            }}
+            for attempt in range(BATCH_GET_MAX_RETRIES + 1):
+                try:
+                    response = self.client.batch_get_item(RequestItems=request)
+                except ClientError as e:
+                    raise client_failure("Failed to read idempotency records", e)
+                for record in response.get('Responses', {}).get(self.table_name, []):
+                    if not self._expired(record):
+                        records[record['idempotency_key']] = record
+                request = response.get('UnprocessedKeys') or {}
+                if not request:
+                    break
+                if attempt == BATCH_GET_MAX_RETRIES:
+                    raise Exception("Failed to read idempotency records: unprocessed after retries")
+                time.sleep(BATCH_GET_BACKOFF_BASE * (2 ** attempt) * (1 + random.random()))
+        return records
+    
+    def replay(self, record: Dict, fingerprint: str) -> Dict:
+        """The response stored in `record`, if it was recorded for the same request"""
+        if record['fingerprint'] != fingerprint:
+            raise IdempotencyConflictError(
+                f"Idempotency key {record['idempotency_key']} was already used for a different request"
+            )
+        return record['response']
+    
+    def _expired(self, record: Dict) -> bool:
+        return int(record['expires_at']) <= time.time()
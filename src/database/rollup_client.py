@@ -0,0 +1,244 @@
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+import calendar
+import os
+import time
+
+from src.database.dynamodb_client import (
+    ANALYTICS_FIELDS,
+    DynamoDBClient,
+    client_failure,
+    fan_out,
+    get_dynamodb,
+    iter_items,
+    normalize_key,
+)
+from src.models.money import DEFAULT_CURRENCY
+
+# Rollup rows are keyed by period (DAY#YYYY-MM-DD, MONTH#YYYY-MM, ALL#all) and
+# rollup_key "<dimension>#<filter key>#<group>". The filtered dimensions let a
+# client- or service-filtered breakdown read pre-split totals directly.
+ALL_TIME = 'ALL#all'
+
+# Stream records already folded in leave a marker row under their own period,
+# which rollup reads never query. Markers outlive the stream's 24h retention so
+# any retry of a record still finds its marker.
+APPLIED_PERIOD = 'STREAM#'
+APPLIED_RECORD_TTL_SECONDS = int(os.getenv('APPLIED_RECORD_TTL_SECONDS', str(2 * 86400)))
+
+_deserializer = TypeDeserializer()
+
+T = TypeVar('T')
+
+# (period, rollup_key) -> [group, cost, count]
+Deltas = Dict[Tuple[str, str], List]
+
+
+def rollup_prefix(dimension: str, filter_key: str = '') -> str:
+    """Build the rollup_key prefix selecting one dimension (and filter value)"""
+    return f"{dimension}#{filter_key}#"
+
+
+def rollup_rows(expense: Dict) -> Iterator[Tuple[str, str, str]]:
+    """Yield (period, rollup_key, group) for every rollup row an expense contributes to"""
+    service_name = expense.get('service_name', 'Unknown')
+    client = expense.get('client', 'Unknown')
+    
+    groups = (
+        (rollup_prefix('total'), 'total'),
+        (rollup_prefix('service'), service_name),
+        (rollup_prefix('client'), client),
+        (rollup_prefix('client_service', normalize_key(client)), service_name),
+        (rollup_prefix('service_client', normalize_key(service_name)), client),
+    )
+    day = expense['date'][:10]
+    for period in (f"DAY#{day}", f"MONTH#{day[:7]}", ALL_TIME):
+        for prefix, group in groups:
+            yield period, prefix + group, group
+
+
+def add_deltas(deltas: Deltas, expense: Dict, sign: int = 1) -> None:
+    """Accumulate an expense's contribution (or its reversal) into a delta map
+    
+    Rollups hold DEFAULT_CURRENCY totals only; expenses in other currencies are
+    aggregated from the raw table instead.
+    """
+    if expense.get('currency', DEFAULT_CURRENCY) != DEFAULT_CURRENCY:
+        return
+    cost = Decimal(str(expense.get('cost', 0))) * sign
+    for period, rollup_key, group in rollup_rows(expense):
+        entry = deltas.setdefault((period, rollup_key), [group, Decimal(0), 0])
+        entry[1] += cost
+        entry[2] += sign
+
+
+def rollup_buckets(start_day: date, end_day: date) -> List[str]:
+    """Cover [start_day, end_day] with the fewest periods: whole months, plus days at the edges"""
+    periods = []
+    day = start_day
+    while day <= end_day:
+        month_end = day.replace(day=calendar.monthrange(day.year, day.month)[1])
+        if day.day == 1 and month_end <= end_day:
+            periods.append(f"MONTH#{day:%Y-%m}")
+            day = month_end + timedelta(days=1)
+        else:
+            periods.append(f"DAY#{day.isoformat()}")
+            day += timedelta(days=1)
+    return periods
+
+
+class RollupClient:
+    def __init__(self, db_client: Optional[DynamoDBClient] = None):
+        self.dynamodb = get_dynamodb()
+        self.table_name = os.getenv('ROLLUPS_TABLE', 'expense-rollups')
+        self.table = self.dynamodb.Table(self.table_name)
+        self.client = self.dynamodb.meta.client
+        self.db_client = db_client
+    
+    def apply_deltas(self, deltas: Deltas, record_id: Optional[str] = None) -> int:
+        """ADD each non-zero delta into its rollup row in one transaction
+        
+        With a `record_id` the transaction also writes that record's applied
+        marker, conditional on it not existing yet, so a record that was already
+        applied changes nothing and returns 0.
+        """
+        items = [
+            {'Update': {
+                'TableName': self.table_name,
+                'Key': {'period': period, 'rollup_key': rollup_key},
+                'UpdateExpression': 'SET group_value = :g ADD total_cost :c, expense_count :n',
+                'ExpressionAttributeValues': {':g': group, ':c': cost, ':n': count}
+            }}
+            for (period, rollup_key), (group, cost, count) in deltas.items()
+            if cost or count
+        ]
+        updated = len(items)
+        if not updated:
+            return 0
+        if record_id is not None:
+            items.insert(0, {'Put': {
+                'TableName': self.table_name,
+                'Item': {
+                    'period': f"{APPLIED_PERIOD}{record_id}",
+                    'rollup_key': 'applied',
+                    'expires_at': int(time.time()) + APPLIED_RECORD_TTL_SECONDS
+                },
+                'ConditionExpression': 'attribute_not_exists(period)'
+            }})
+        try:
+            self.client.transact_write_items(TransactItems=items)
+            return updated
+        
+        except ClientError as e:
+            if record_id is not None and _marker_exists(e):
+                return 0
+            raise client_failure("Failed to update rollups", e)
+    
+    def apply_stream_records(self, records: Iterable[Dict]) -> int:
+        """Turn DynamoDB stream records into rollup deltas and apply each exactly once
+        
+        Old images are subtracted and new images added, so an update that changes
+        cost, client or service_name moves money between rollup rows. Each record
+        is applied in its own transaction together with a marker keyed by its
+        eventID, so a retried batch skips the records that already landed.
+        """
+        applied = 0
+        for record in records:
+            images = record.get('dynamodb', {})
+            deltas: Deltas = {}
+            old_image = images.get('OldImage')
+            new_image = images.get('NewImage')
+            if old_image:
+                add_deltas(deltas, _deserialize_image(old_image), sign=-1)
+            if new_image:
+                add_deltas(deltas, _deserialize_image(new_image))
+            applied += self.apply_deltas(deltas, record.get('eventID') or images.get('SequenceNumber'))
+        return applied
+    
+    def query(
+        self,
+        periods: List[str],
+        prefix: str,
+        fold: Callable[[Iterator[Dict]], T],
+        merge: Callable[[T, T], T]
+    ) -> T:
+        """Read the rollup rows under `prefix` for each period, one concurrent Query per period"""
+        requests = [
+            {
+                'TableName': self.table_name,
+                'KeyConditionExpression': '#p = :p AND begins_with(#k, :prefix)',
+                'ExpressionAttributeNames': {'#p': 'period', '#k': 'rollup_key'},
+                'ExpressionAttributeValues': {':p': period, ':prefix': prefix}
+            }
+            for period in periods
+        ]
+        return fan_out(self.client.query, requests, fold, merge)
+    
+    def rebuild(self) -> int:
+        """Recompute every rollup row from the raw expenses table and replace the rollups
+        
+        Run with the stream consumer paused; deltas applied mid-rebuild would be lost.
+        """
+        db_client = self.db_client or DynamoDBClient()
+        
+        def fold(expenses: Iterator[Dict]) -> Deltas:
+            deltas: Deltas = {}
+            for expense in expenses:
+                add_deltas(deltas, expense)
+            return deltas
+        
+        totals = db_client.parallel_scan(fold, _merge_deltas, projection=ANALYTICS_FIELDS)
+        
+        try:
+            # Applied-record markers outlive the rebuild, so stream batches retried after it still skip
+            stale_keys = list(iter_items(self.client.scan, {
+                'TableName': self.table_name,
+                'ProjectionExpression': '#p, rollup_key',
+                'FilterExpression': 'NOT begins_with(#p, :applied)',
+                'ExpressionAttributeNames': {'#p': 'period'},
+                'ExpressionAttributeValues': {':applied': APPLIED_PERIOD}
+            }))
+            with self.table.batch_writer() as batch:
+                for key in stale_keys:
+                    batch.delete_item(Key=key)
+            with self.table.batch_writer() as batch:
+                for (period, rollup_key), (group, cost, count) in totals.items():
+                    batch.put_item(Item={
+                        'period': period,
+                        'rollup_key': rollup_key,
+                        'group_value': group,
+                        'total_cost': cost,
+                        'expense_count': count
+                    })
+            return len(totals)
+        
+        except ClientError as e:
+            raise client_failure("Failed to rebuild rollups", e)
+
+
+def _deserialize_image(image: Dict) -> Dict:
+    """Convert a stream image from wire format to Python values"""
+    return {k: _deserializer.deserialize(v) for k, v in image.items()}
+
+
+def _marker_exists(error: ClientError) -> bool:
+    """Whether a cancelled rollup transaction failed on its applied marker (the first item)"""
+    if error.response['Error']['Code'] != 'TransactionCanceledException':
+        return False
+    reasons = error.response.get('CancellationReasons') or []
+    return bool(reasons) and reasons[0].get('Code') == 'ConditionalCheckFailed'
+
+
+def _merge_deltas(left: Deltas, right: Deltas) -> Deltas:
+    """Merge two partial delta maps"""
+    merged = dict(left)
+    for key, (group, cost, count) in right.items():
+        if key in merged:
+            prev = merged[key]
+            merged[key] = [group, prev[1] + cost, prev[2] + count]
+        else:
+            merged[key] = [group, cost, count]
+    return merged
@@ -0,0 +1,181 @@
+from botocore.exceptions import ClientError
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+import mmap
+import os
+import time
+
+import boto3
+
+# Where downloaded S3 snapshots are kept between warm invocations (Lambda can only write under /tmp)
+SNAPSHOT_CACHE_DIR = os.getenv('SNAPSHOT_CACHE_DIR', '/tmp/snapshots')
+
+# How long an S3 snapshot's version (or its absence) is trusted before asking S3 again
+SNAPSHOT_REFRESH_SECONDS = float(os.getenv('SNAPSHOT_REFRESH_SECONDS', '300'))
+
+
+class LocalSnapshotStore:
+    """Snapshot files under a directory, read through read-only memory maps
+    
+    Keys are '/'-separated paths relative to `root`. Writes go to a temporary
+    file that replaces the old one, so a reader maps either the old snapshot
+    or the new one, never a partial write. Maps are kept open and reused
+    until the file changes.
+    """
+    
+    def __init__(self, root: str):
+        self.root = root
+        self._maps: Dict[str, Tuple[Tuple[int, int], mmap.mmap]] = {}
+        self._lock = Lock()
+    
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, path)
+    
+    def open(self, key: str) -> Optional[mmap.mmap]:
+        """A read-only map of the snapshot, or None if there is none"""
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._maps.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # A replaced map is closed once the last reader's buffers are released
+            self._maps[key] = (version, mapped)
+            return mapped
+    
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._maps.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+    
+    def keys(self) -> List[str]:
+        found = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith('.tmp'):
+                    found.append(os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/'))
+        return sorted(found)
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+
+class S3SnapshotStore:
+    """Snapshot objects in S3, downloaded once per version and memory-mapped from local disk
+    
+    Each version (ETag) of an object is fetched into `cache_dir` the first time
+    it is opened; warm invocations then map the local copy. Whether an object
+    changed is checked at most every SNAPSHOT_REFRESH_SECONDS.
+    """
+    
+    def __init__(self, bucket: str, prefix: str = '', cache_dir: str = SNAPSHOT_CACHE_DIR, client=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client or boto3.client('s3', region_name=os.getenv('AWS_REGION', 'us-east-1'))
+        self.local = LocalSnapshotStore(cache_dir)
+        # key -> (checked at, ETag or None when absent)
+        self._versions: Dict[str, Tuple[float, Optional[str]]] = {}
+        self._local_keys: Dict[str, str] = {}
+        self._lock = Lock()
+    
+    def put(self, key: str, data: bytes) -> None:
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+        except ClientError as e:
+            raise Exception(f"Failed to write snapshot {key}: {e.response['Error']['Message']}")
+        self._forget(key)
+    
+    def open(self, key: str) -> Optional[mmap.mmap]:
+        """A read-only map of the snapshot's current version, or None if there is none"""
+        etag = self._version(key)
+        if etag is None:
+            return None
+        local_key = f"{key}.{etag}"
+        mapped = self.local.open(local_key)
+        if mapped is None:
+            try:
+                response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'NoSuchKey':
+                    self._forget(key)
+                    return None
+                raise Exception(f"Failed to read snapshot {key}: {e.response['Error']['Message']}")
+            # The object may have been replaced since it was checked; name the copy after what was read
+            local_key = f"{key}." + response['ETag'].strip('"')
+            self.local.put(local_key, response['Body'].read())
+            mapped = self.local.open(local_key)
+        with self._lock:
+            previous = self._local_keys.get(key)
+            self._local_keys[key] = local_key
+        if previous is not None and previous != local_key:
+            self.local.delete(previous)
+        return mapped
+    
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as e:
+            raise Exception(f"Failed to delete snapshot {key}: {e.response['Error']['Message']}")
+        self._forget(key)
+    
+    def keys(self) -> List[str]:
+        found = []
+        try:
+            for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=self.prefix):
+                found.extend(item['Key'][len(self.prefix):] for item in page.get('Contents', []))
+        except ClientError as e:
+            raise Exception(f"Failed to list snapshots: {e.response['Error']['Message']}")
+        return sorted(found)
+    
+    def _version(self, key: str) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            checked = self._versions.get(key)
+        if checked is not None and now - checked[0] < SNAPSHOT_REFRESH_SECONDS:
+            return checked[1]
+        try:
+            etag = self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)['ETag'].strip('"')
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                raise Exception(f"Failed to read snapshot {key}: {e.response['Error']['Message']}")
+            etag = None
+        with self._lock:
+            self._versions[key] = (now, etag)
+        return etag
+    
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._versions.pop(key, None)
+
+
+_store = None
+
+
+def get_snapshot_store():
+    """Shared snapshot store for this container: S3 when SNAPSHOT_BUCKET is set, else SNAPSHOT_DIR
+    
+    Returns None when neither is configured, and analytics read DynamoDB only.
+    """
+    global _store
+    if _store is None:
+        bucket = os.getenv('SNAPSHOT_BUCKET')
+        directory = os.getenv('SNAPSHOT_DIR')
+        if bucket:
+            _store = S3SnapshotStore(bucket, os.getenv('SNAPSHOT_PREFIX', 'snapshots/'))
+        elif directory:
+            _store = LocalSnapshotStore(directory)
+    return _store
@@ -0,0 +1,280 @@
+from botocore.exceptions import ConnectionError as BotocoreConnectionError, HTTPClientError
+from collections import deque
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+import math
+import os
+import random
+import time
+
+from src.middleware.metrics import CAPACITY_OPERATIONS, READ_OPERATIONS, registry
+
+# Attempts per DynamoDB call, first try included; botocore's own retries are turned off in favour of these
+DYNAMODB_MAX_ATTEMPTS = int(os.getenv('DYNAMODB_MAX_ATTEMPTS', '8'))
+# Full-jitter backoff: each retry sleeps uniformly in [0, min(cap, base * 2^attempt)]
+RETRY_BASE_SECONDS = float(os.getenv('DYNAMODB_RETRY_BASE_SECONDS', '0.025'))
+RETRY_CAP_SECONDS = float(os.getenv('DYNAMODB_RETRY_CAP_SECONDS', '1.0'))
+
+# Client-side send rates per table/index back off when DynamoDB throttles them, unless ADAPTIVE_RATE=false
+ADAPTIVE_RATE = os.getenv('DYNAMODB_ADAPTIVE_RATE', 'true').lower() != 'false'
+RATE_BACKOFF = 0.5        # multiplier applied to the send rate on a throttle
+RATE_RECOVERY = 0.5       # time constant, in seconds, of the climb back to the rate that was throttled
+RATE_INCREASE = 10.0      # requests/s added per second beyond that rate, probing for more capacity
+RATE_FLOOR = 1.0          # requests/s never limited below
+RATE_COOLDOWN = 1.0       # seconds between decreases; DynamoDB meters capacity per second
+RATE_RELEASE = 60.0       # seconds without a throttle before the limit is lifted
+
+# Error codes meaning the request was throttled, not rejected
+THROTTLE_ERRORS = frozenset((
+    'ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded'
+))
+# Failures worth retrying as they are
+TRANSIENT_ERRORS = frozenset(('InternalServerError', 'ServiceUnavailable'))
+
+registry.describe('dynamodb_throttles_total', 'Throttled DynamoDB calls by operation')
+registry.describe('dynamodb_retries_total', 'DynamoDB call retries by operation')
+
+
+class TokenBucket:
+    """Tokens refill at `rate` per second up to one second's worth; each call takes one
+    
+    A caller that finds the bucket empty still takes its token, leaving the
+    balance negative, and is told how long to wait; concurrent callers so
+    queue up behind each other instead of all retrying at once.
+    """
+    
+    def __init__(self, rate: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._lock = Lock()
+    
+    def reserve(self) -> float:
+        """Take a token; returns the seconds to wait before using it"""
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+    
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = max(1.0, rate)
+            self.tokens = min(self.tokens, self.capacity)
+    
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class AdaptiveRateLimiter:
+    """Send rate for one table or index and kind of capacity, adapted to throttling
+    
+    Unlimited until DynamoDB throttles a call. A throttle records the rate
+    that was actually being sent as the ceiling and limits to RATE_BACKOFF
+    times it; throttles of calls sent before that decrease, or within
+    RATE_COOLDOWN of it, don't back off again. Successful calls close the gap
+    to the ceiling exponentially with time constant RATE_RECOVERY, then probe
+    past it by RATE_INCREASE per second; both are paced by elapsed time, not
+    by call count. The limit is lifted only after RATE_RELEASE seconds
+    without a throttle.
+    """
+    
+    def __init__(self, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.bucket: Optional[TokenBucket] = None
+        self.ceiling = 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._sent: deque = deque()
+        self._decreased = -math.inf
+        self._adjusted = -math.inf
+        # Bumped on every decrease, so a throttle can be traced to the limit its call was sent under
+        self.epoch = 0
+        self._lock = Lock()
+    
+    @property
+    def rate(self) -> Optional[float]:
+        """Current limit in requests/s, or None when unlimited"""
+        bucket = self.bucket
+        return bucket.rate if bucket is not None else None
+    
+    def reserve(self) -> float:
+        """Take a send slot; returns the seconds to wait before sending"""
+        with self._lock:
+            self._record_send(self._clock())
+        bucket = self.bucket
+        return bucket.reserve() if bucket is not None else 0.0
+    
+    def acquire(self) -> float:
+        """Wait for a send slot; returns the seconds waited"""
+        wait = self.reserve()
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+    
+    def throttled(self, epoch: Optional[int] = None) -> None:
+        """Back off for a throttled call, sent under `epoch` when known"""
+        with self._lock:
+            now = self._clock()
+            if (epoch is not None and epoch != self.epoch) or now - self._decreased < RATE_COOLDOWN:
+                return
+            self.epoch += 1
+            self._decreased = self._adjusted = now
+            sending = max(RATE_FLOOR, self._send_rate(now))
+            if self.bucket is None:
+                self.ceiling = sending
+                self.bucket = TokenBucket(max(RATE_FLOOR, sending * RATE_BACKOFF), self._clock)
+            else:
+                # A limit the callers weren't using up says nothing about capacity
+                self.ceiling = min(self.bucket.rate, sending)
+                self.bucket.set_rate(max(RATE_FLOOR, self.ceiling * RATE_BACKOFF))
+    
+    def succeeded(self) -> None:
+        bucket = self.bucket
+        if bucket is None:
+            return
+        with self._lock:
+            now = self._clock()
+            if now - self._decreased >= RATE_RELEASE:
+                self.bucket = None
+                return
+            elapsed, self._adjusted = now - self._adjusted, now
+            rate = bucket.rate
+            if self.ceiling - rate > RATE_FLOOR:
+                rate = self.ceiling - (self.ceiling - rate) * math.exp(-elapsed / RATE_RECOVERY)
+            else:
+                rate += RATE_INCREASE * elapsed
+            bucket.set_rate(rate)
+    
+    def retry_after(self) -> float:
+        """Seconds until a call would next be sent at the current limit"""
+        bucket = self.bucket
+        return 1.0 / bucket.rate if bucket is not None else 0.0
+    
+    def _record_send(self, now: float) -> None:
+        self._sent.append(now)
+        while self._sent and self._sent[0] < now - 1.0:
+            self._sent.popleft()
+    
+    def _send_rate(self, now: float) -> float:
+        """Calls sent in the last second"""
+        while self._sent and self._sent[0] < now - 1.0:
+            self._sent.popleft()
+        return float(len(self._sent))
+
+
+_limiters: Dict[Tuple[str, str], AdaptiveRateLimiter] = {}
+_limiters_lock = Lock()
+
+
+def get_limiter(resource: str, kind: str) -> AdaptiveRateLimiter:
+    """The process-wide limiter for a table (or table/index) and 'read' or 'write' capacity"""
+    key = (resource, kind)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.setdefault(key, AdaptiveRateLimiter())
+    return limiter
+
+
+def reset_limiters() -> None:
+    with _limiters_lock:
+        _limiters.clear()
+
+
+def call_resources(operation: str, params: Dict) -> List[Tuple[str, str]]:
+    """(table or table/index, capacity kind) pairs a DynamoDB call consumes"""
+    kind = 'read' if operation in READ_OPERATIONS else 'write'
+    if 'TableName' in params:
+        index = params.get('IndexName')
+        return [(f"{params['TableName']}/{index}" if index else params['TableName'], kind)]
+    if 'RequestItems' in params:
+        return [(table, kind) for table in params['RequestItems']]
+    if 'TransactItems' in params:
+        tables = dict.fromkeys(
+            entry['TableName'] for item in params['TransactItems'] for entry in item.values()
+        )
+        return [(table, kind) for table in tables]
+    return []
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter delay before retry number `attempt` (1-based)"""
+    return random.uniform(0, min(RETRY_CAP_SECONDS, RETRY_BASE_SECONDS * (2 ** attempt)))
+
+
+def is_throttle(parsed: Dict) -> bool:
+    """Whether a parsed DynamoDB error response is throttling, including throttled transactions"""
+    code = parsed.get('Error', {}).get('Code')
+    if code in THROTTLE_ERRORS:
+        return True
+    if code == 'TransactionCanceledException':
+        return any(reason.get('Code') == 'ThrottlingError' for reason in parsed.get('CancellationReasons') or ())
+    return False
+
+
+def install_throttling(client) -> None:
+    """Hook a botocore DynamoDB client: rate-limit calls per table/index and retry with jitter
+    
+    The client must be built with botocore retries off (total_max_attempts=1);
+    the needs-retry hook below then decides every retry. When a throttled call
+    runs out of attempts its error carries RetryAfterSeconds.
+    """
+    events = client.meta.events
+    events.register('provide-client-params.dynamodb.*', _note_resources)
+    # Ahead of the metrics hooks, so time spent waiting for a token isn't counted as call latency
+    events.register_first('before-call.dynamodb.*', _acquire)
+    events.register_first('needs-retry.dynamodb.*', _needs_retry)
+
+
+def _note_resources(params, model, context, **kwargs):
+    if ADAPTIVE_RATE and model.name in CAPACITY_OPERATIONS:
+        context['rate_limiters'] = [get_limiter(*resource) for resource in call_resources(model.name, params)]
+
+
+def _acquire(context, **kwargs):
+    limiters = context.get('rate_limiters', ())
+    for limiter in limiters:
+        limiter.acquire()
+    context['rate_epochs'] = [limiter.epoch for limiter in limiters]
+
+
+def _needs_retry(response, attempts, operation, request_dict, caught_exception=None, **kwargs):
+    context = request_dict.get('context', {})
+    limiters = context.get('rate_limiters', ())
+    parsed = response[1] if response is not None else {}
+    throttled = is_throttle(parsed)
+    
+    if throttled:
+        registry.increment('dynamodb_throttles_total', operation=operation.name)
+        for limiter, epoch in zip(limiters, context.get('rate_epochs', [None] * len(limiters))):
+            limiter.throttled(epoch)
+    elif response is not None and 'Error' not in parsed:
+        for limiter in limiters:
+            limiter.succeeded()
+        return None
+    
+    retryable = (
+        throttled
+        or isinstance(caught_exception, (BotocoreConnectionError, HTTPClientError))
+        or parsed.get('Error', {}).get('Code') in TRANSIENT_ERRORS
+        or (response is not None and response[0].status_code >= 500)
+    )
+    if not retryable:
+        return None
+    if attempts >= DYNAMODB_MAX_ATTEMPTS:
+        if throttled:
+            parsed['RetryAfterSeconds'] = max(
+                [RETRY_CAP_SECONDS] + [limiter.retry_after() for limiter in limiters]
+            )
+        return None
+    
+    registry.increment('dynamodb_retries_total', operation=operation.name)
+    # The retry takes its own token, so retries slow down with everything else
+    delay = max([backoff_delay(attempts)] + [limiter.reserve() for limiter in limiters])
+    context['rate_epochs'] = [limiter.epoch for limiter in limiters]
+    return delay
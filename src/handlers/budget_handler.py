@@ -0,0 +1,155 @@
+from fastapi import HTTPException, status
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+import asyncio
+import logging
+
+from src.database.async_dynamodb_client import get_executor
+from src.database.budget_client import BUDGET_SCOPES, BudgetClient, budget_deltas, crossed_threshold
+from src.models.budget import BudgetSet, BudgetStatus
+from src.models.money import DEFAULT_CURRENCY, currency_exponent, to_amount, to_minor_units
+from src.notifications.notifier import Notifier, get_notifier
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetHandler:
+    def __init__(self, budgets: Optional[BudgetClient] = None, notifier: Optional[Notifier] = None):
+        self.budgets = budgets or BudgetClient()
+        self.notifier = notifier or get_notifier()
+    
+    def set_budget(self, scope: str, name: str, budget: BudgetSet) -> BudgetStatus:
+        """Set a monthly limit (default: this month); alerts any threshold it is already past"""
+        _check_scope(scope)
+        month = budget.month or datetime.now().strftime('%Y-%m')
+        try:
+            row = self.budgets.set_limit(
+                scope, name, month, to_minor_units(budget.limit, budget.currency), budget.currency
+            )
+        
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to set budget: {str(e)}"
+            )
+        
+        # The limit is saved either way; an alert that fails is logged, and the next write retries it
+        try:
+            row = self._alert(row, month) or row
+        except Exception:
+            logger.exception("Budget alert failed for %s %s (%s)", scope, name, month)
+        return _format_status(scope, name, month, budget.currency, row)
+    
+    def get_budget_status(
+        self,
+        scope: str,
+        name: str,
+        month: Optional[str] = None,
+        currency: Optional[str] = None
+    ) -> BudgetStatus:
+        """Limit, spend and alert state for one budget month, from a single item read"""
+        _check_scope(scope)
+        month = month or datetime.now().strftime('%Y-%m')
+        currency = (currency or DEFAULT_CURRENCY).upper()
+        try:
+            currency_exponent(currency)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
+        try:
+            row = self.budgets.get_budget(scope, name, month, currency) or {}
+            return _format_status(scope, name, month, currency, row)
+        
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to get budget: {str(e)}"
+            )
+    
+    def check_alerts(self, items: Iterable[Dict]) -> int:
+        """Alert every budget the written items pushed past a new threshold; returns alerts sent
+        
+        Runs after the write has committed. If it is interrupted, the next write to
+        the same budget still catches up, since it compares spend with the highest
+        threshold already alerted rather than with this write's delta.
+        """
+        keys = set()
+        for item in items:
+            keys.update(key for key, entry in budget_deltas(None, item).items() if entry[3] > 0)
+        
+        sent = 0
+        for key, month in keys:
+            row = self.budgets.get_row(key, month)
+            if row and self._alert(row, month):
+                sent += 1
+        return sent
+    
+    async def check_alerts_async(self, items: Iterable[Dict]) -> None:
+        """check_alerts on the DynamoDB pool; failures are logged, since the write itself succeeded"""
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(get_executor(), self.check_alerts, list(items))
+        except Exception:
+            logger.exception("Budget alert check failed")
+    
+    def _alert(self, row: Dict, month: str) -> Optional[Dict]:
+        """Publish the highest newly crossed threshold for a budget row; returns the row if alerted"""
+        if row.get('limit_units') is None:
+            return None
+        spent, limit = int(row.get('spent_units', 0)), int(row['limit_units'])
+        threshold, alerted = crossed_threshold(spent, limit), int(row.get('alerted', 0))
+        if threshold <= alerted:
+            return None
+        if not self.budgets.claim_alert(row['budget_key'], month, threshold):
+            return None
+        
+        currency = row.get('currency', DEFAULT_CURRENCY)
+        scope, name = row['budget_scope'], row['budget_name']
+        try:
+            self.notifier.publish(
+                f"Budget {threshold}% reached: {scope} {name} ({month})",
+                {
+                    "scope": scope,
+                    "name": name,
+                    "month": month,
+                    "currency": currency,
+                    "threshold": threshold,
+                    "limit": to_amount(limit, currency),
+                    "spent": to_amount(spent, currency)
+                }
+            )
+        except Exception:
+            # The claim stays with this writer until the alert is out; give it back so the next write retries
+            try:
+                self.budgets.release_alert(row['budget_key'], month, threshold, alerted)
+            except Exception:
+                logger.exception("Failed to release budget alert claim for %s %s", row['budget_key'], month)
+            raise
+        return dict(row, alerted=threshold)
+
+
+def _check_scope(scope: str) -> None:
+    if scope not in BUDGET_SCOPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported budget scope: {scope}"
+        )
+
+
+def _format_status(scope: str, name: str, month: str, currency: str, row: Dict) -> BudgetStatus:
+    """Build the API view of a budget row; a missing row means no limit and no spend"""
+    spent = int(row.get('spent_units', 0))
+    limit = row.get('limit_units')
+    limit = int(limit) if limit is not None else None
+    return BudgetStatus(
+        scope=scope,
+        name=row.get('budget_name', name),
+        month=month,
+        currency=currency,
+        limit=to_amount(limit, currency) if limit is not None else None,
+        spent=to_amount(spent, currency),
+        remaining=to_amount(limit - spent, currency) if limit is not None else None,
+        percent_used=round(spent * 100 / limit, 2) if limit else None,
+        expense_count=int(row.get('expense_count', 0)),
+        alerted_threshold=int(row.get('alerted', 0))
+    )
@@ -0,0 +1,202 @@
+from fastapi import HTTPException, status
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import codecs
+import csv
+import io
+import json
+
+from src.models.expense import ImportResponse
+from src.database.async_dynamodb_client import AsyncDynamoDBClient
+from src.database.cache import get_cache
+from src.database.dynamodb_client import DynamoDBClient
+from src.handlers.expense_handler import describe_validation_error, parse_keyed_expense
+from src.models.money import DEFAULT_CURRENCY
+
+# Column order for exports; also the CSV header
+EXPORT_FIELDS = (
+    'expense_id', 'service_name', 'client', 'currency', 'cost', 'date',
+    'description', 'created_at', 'updated_at', 'version'
+)
+IMPORT_FIELDS = ('service_name', 'client', 'currency', 'cost', 'date', 'description', 'idempotency_key')
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Valid rows are buffered up to this many before a batched write
+IMPORT_FLUSH_SIZE = 500
+# Import responses report at most this many row errors
+MAX_REPORTED_ERRORS = 100
+# Scan page size for exports; each page is encoded and sent as one chunk
+EXPORT_PAGE_SIZE = 500
+
+
+class BulkHandler:
+    def __init__(self, db_client: Optional[DynamoDBClient] = None, budgets=None):
+        self.db_client = db_client or DynamoDBClient()
+        self.db = AsyncDynamoDBClient(self.db_client)
+        self.cache = get_cache()
+        # BudgetHandler alerted after each flush, when budgets are enabled
+        self.budgets = budgets
+    
+    async def import_expenses(self, byte_stream: AsyncIterator[bytes], fmt: str) -> ImportResponse:
+        """Parse an NDJSON or CSV body as it streams in and write rows in batches
+        
+        Only IMPORT_FLUSH_SIZE validated rows are held at a time, so memory stays
+        flat however large the upload is. Rows with an `idempotency_key` are
+        written at most once, so a re-sent upload doesn't duplicate them.
+        """
+        parse = _parse_csv if fmt == "csv" else _parse_ndjson
+        imported = 0
+        failed = 0
+        errors: List[Dict] = []
+        pending: List[Tuple[int, Dict, Optional[Tuple[str, str]]]] = []
+        
+        def record_error(line: int, message: str):
+            nonlocal failed
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line, "error": message})
+        
+        async def flush():
+            nonlocal imported
+            results = await self.db.batch_create([data for _, data, _ in pending], [entry for _, _, entry in pending])
+            for (line, _, _), result in zip(pending, results):
+                if result["status"] == "created":
+                    imported += 1
+                else:
+                    record_error(line, result["error"])
+            pending.clear()
+            if self.budgets is not None:
+                await self.budgets.check_alerts_async(
+                    result["item"] for result in results if result["status"] == "created" and not result.get("replayed")
+                )
+        
+        try:
+            async for line_number, record in parse(_iter_lines(byte_stream)):
+                if isinstance(record, str):
+                    record_error(line_number, record)
+                    continue
+                try:
+                    pending.append((line_number, *parse_keyed_expense(record)))
+                except (ValueError, TypeError) as e:
+                    record_error(line_number, describe_validation_error(e))
+                    continue
+                
+                if len(pending) >= IMPORT_FLUSH_SIZE:
+                    await flush()
+            
+            if pending:
+                await flush()
+        
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to import expenses: {str(e)}"
+            )
+        
+        if imported:
+            self.cache.invalidate_analytics()
+        return ImportResponse(imported=imported, failed=failed, errors=errors)
+    
+    def export_expenses(self, fmt: str) -> Iterator[bytes]:
+        """Yield the whole table as NDJSON or CSV, one encoded chunk per scan page"""
+        if fmt == "csv":
+            yield _csv_line(EXPORT_FIELDS)
+        
+        for page in self.db_client.iter_expense_pages(page_size=EXPORT_PAGE_SIZE):
+            if fmt == "csv":
+                yield b"".join(_csv_line(export_row(item).values()) for item in page)
+            else:
+                yield b"".join(
+                    json.dumps(export_row(item), separators=(',', ':')).encode() + b"\n"
+                    for item in page
+                )
+
+
+def export_row(item: Dict) -> Dict:
+    """Convert a stored item for export in a single pass
+    
+    Dates are already stored as ISO strings, so only the Decimal cost needs
+    converting; no model is built per row.
+    """
+    row = {field: item.get(field) for field in EXPORT_FIELDS}
+    row['cost'] = float(row['cost']) if row['cost'] is not None else None
+    row['version'] = int(row['version'] or 1)
+    row['currency'] = row['currency'] or DEFAULT_CURRENCY
+    return row
+
+
+def _csv_line(values) -> bytes:
+    """Encode one CSV record"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(['' if value is None else value for value in values])
+    return buffer.getvalue().encode()
+
+
+async def _iter_lines(byte_stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    remainder = ''
+    async for chunk in byte_stream:
+        text = remainder + decoder.decode(chunk)
+        lines = text.split('\n')
+        remainder = lines.pop()
+        for line in lines:
+            yield line
+    remainder += decoder.decode(b'', final=True)
+    if remainder:
+        yield remainder
+
+
+async def _parse_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (line number, dict) per NDJSON record, or an error string for bad lines"""
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        yield line_number, record if isinstance(record, dict) else "Expected a JSON object"
+
+
+async def _parse_csv(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (line number, dict) per CSV record; the first record is the header
+    
+    Lines are joined while a quoted field is still open, so quoted newlines work.
+    """
+    header: Optional[List[str]] = None
+    line_number = 0
+    record_start = 0
+    buffered: List[str] = []
+    
+    async for line in lines:
+        line_number += 1
+        if not buffered:
+            record_start = line_number
+        buffered.append(line.rstrip('\r'))
+        
+        text = '\n'.join(buffered)
+        if text.count('"') % 2:
+            continue
+        buffered.clear()
+        if not text.strip():
+            continue
+        
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield record_start, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        
+        yield record_start, {
+            name: value for name, value in zip(header, values)
+            if name in IMPORT_FIELDS and value != ''
+        }
+    
+    if buffered:
+        yield record_start, "Unterminated quoted field"
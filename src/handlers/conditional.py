@@ -0,0 +1,25 @@
+from fastapi import HTTPException, status
+from typing import Optional
+
+from src.models.expense import ExpenseResponse
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Read the expected version from an If-Match header ("3", W/"3" or *)"""
+    if not if_match or if_match.strip() == "*":
+        return None
+    tag = if_match.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid If-Match header: {if_match}"
+        )
+
+
+def etag(expense: ExpenseResponse) -> str:
+    """ETag for an expense representation, derived from its version"""
+    return f'"{expense.version}"'
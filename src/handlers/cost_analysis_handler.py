@@ -1,88 +1,361 @@
 from fastapi import HTTPException, status
 from boto3.dynamodb.conditions import Key
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
 from collections import defaultdict
+from functools import partial
 import calendar
+import hashlib
+import json
+import os
 
-from src.database.dynamodb_client import DynamoDBClient
+from src.analytics import forecast
+from src.analytics.allocation import Allocation, AllocationRules
+from src.analytics.columnar import DIMENSIONS, ExpenseColumns
+from src.analytics.groupby import aggregate_groups, parse_metrics
+from src.analytics.snapshots import load_columns, month_range, snapshot_key
+from src.database.cache import get_cache
+from src.database.dynamodb_client import ANALYTICS_FIELDS, DynamoDBClient, month_buckets, normalize_key
+from src.database.rollup_client import ALL_TIME, RollupClient, rollup_buckets, rollup_prefix
+from src.database.snapshot_store import get_snapshot_store
+from src.models.money import DEFAULT_CURRENCY, currency_exponent, to_amount, to_minor_units
+
+# API group_by names mapped to the column dimension they group on
+GROUP_BY_FIELDS = {
+    "service": "service_name",
+    "client": "client",
+    "day": "day",
+    "week": "week",
+    "month": "month",
+    "quarter": "quarter"
+}
+
+# Breakdown output shapes
+LAYOUTS = ("flat", "nested", "pivot")
+
+# Dimensions /forecast and /anomalies build one daily series per value of
+SERIES_FIELDS = {"service": "service_name", "client": "client"}
+
+# Forecast bands are expected cost plus or minus this many standard deviations
+FORECAST_BAND_Z = 1.96
+
+# Read plan reported when an answer comes from the pre-aggregated rollup table
+PLAN_ROLLUP = "rollup"
+
+# Read plan reported for months answered from columnar snapshots (joined with the live plan when mixed)
+PLAN_SNAPSHOT = "snapshot"
+
+# Allocation rules may match on descriptions, which analytics reads otherwise leave out
+ALLOCATION_FIELDS = ANALYTICS_FIELDS + ('description',)
 
 class CostAnalysisHandler:
-    def __init__(self):
-        self.db_client = DynamoDBClient()
+    def __init__(self, db_client: Optional[DynamoDBClient] = None):
+        self.db_client = db_client or DynamoDBClient()
+        # Rollups are maintained by the stream consumer wherever ROLLUPS_TABLE is deployed
+        self.rollups = RollupClient(self.db_client) if os.getenv('ROLLUPS_TABLE') else None
+        # Closed months compacted by the snapshot job are read from there instead of DynamoDB
+        self.snapshots = get_snapshot_store()
+        self.cache = get_cache()
     
     def get_cost_breakdown(
         self, 
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
         group_by: str = "service",
-        client_filter: Optional[str] = None
+        client_filter: Optional[str] = None,
+        service_filter: Optional[str] = None,
+        metrics: Sequence[str] = (),
+        layout: str = "flat",
+        currency: Optional[str] = None
+    ) -> Dict:
+        """Get cost breakdown by any combination of service, client and time granularity
+        
+        `group_by` is comma-separated (e.g. "service,month"); `metrics` adds
+        per-group min/max/avg and pNN percentiles; `layout` is flat, nested or
+        pivot (pivot needs exactly two dimensions). Only expenses in `currency`
+        (default DEFAULT_CURRENCY) are counted.
+        """
+        currency = resolve_currency(currency)
+        check_date_range(start_date, end_date)
+        params = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "group_by": group_by,
+            "client": client_filter,
+            "service": service_filter,
+            "metrics": ",".join(metrics),
+            "layout": layout,
+            "currency": currency
+        }
+        return self.cache.analytics(
+            "cost_breakdown",
+            params,
+            lambda: self._cost_breakdown(
+                start_date, end_date, group_by, client_filter, service_filter, metrics, layout, currency
+            )
+        )
+    
+    def get_monthly_trends(self, months: int = 6, currency: Optional[str] = None) -> Dict:
+        """Get monthly cost trends"""
+        currency = resolve_currency(currency)
+        return self.cache.analytics(
+            "monthly_trends",
+            {"months": months, "currency": currency},
+            lambda: self._monthly_trends(months, currency)
+        )
+    
+    def get_top_services(self, limit: int = 10, currency: Optional[str] = None) -> List[Dict]:
+        """Get top services by cost"""
+        currency = resolve_currency(currency)
+        return self.cache.analytics(
+            "top_services",
+            {"limit": limit, "currency": currency},
+            lambda: self._top_services(limit, currency)
+        )
+    
+    def get_forecast(
+        self,
+        dimension: str = "service",
+        days: int = 14,
+        history: int = 90,
+        client_filter: Optional[str] = None,
+        service_filter: Optional[str] = None,
+        currency: Optional[str] = None
+    ) -> Dict:
+        """Forecast daily cost per service or client for the next `days` days from `history` days of data"""
+        currency = resolve_currency(currency)
+        params = {
+            "dimension": dimension,
+            "days": days,
+            "history": history,
+            "client": client_filter,
+            "service": service_filter,
+            "currency": currency
+        }
+        return self.cache.analytics(
+            "forecast",
+            params,
+            lambda: self._forecast(dimension, days, history, client_filter, service_filter, currency)
+        )
+    
+    def get_anomalies(
+        self,
+        dimension: str = "service",
+        history: int = 90,
+        threshold: float = forecast.DEFAULT_THRESHOLD,
+        client_filter: Optional[str] = None,
+        service_filter: Optional[str] = None,
+        currency: Optional[str] = None
+    ) -> Dict:
+        """Days whose cost for a service or client strays more than `threshold` deviations from its baseline"""
+        currency = resolve_currency(currency)
+        params = {
+            "dimension": dimension,
+            "history": history,
+            "threshold": threshold,
+            "client": client_filter,
+            "service": service_filter,
+            "currency": currency
+        }
+        return self.cache.analytics(
+            "anomalies",
+            params,
+            lambda: self._anomalies(dimension, history, threshold, client_filter, service_filter, currency)
+        )
+    
+    def get_cost_allocation(
+        self,
+        rules: Sequence[Mapping],
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        currency: Optional[str] = None
+    ) -> Dict:
+        """Split shared expenses across clients by the first matching rule and report cost per client
+        
+        Each rule has optional service, client and description patterns and a
+        `split` of target client -> weight. Expenses no rule matches stay with
+        their own client. Defaults to the last 30 whole days, as the breakdown does.
+        """
+        currency = resolve_currency(currency)
+        check_date_range(start_date, end_date)
+        # Rule text is case-sensitive (split targets), so it is keyed by digest rather than normalized
+        digest = hashlib.sha256(json.dumps(list(rules), sort_keys=True, default=str).encode()).hexdigest()
+        params = {"start_date": start_date, "end_date": end_date, "rules": digest, "currency": currency}
+        return self.cache.analytics(
+            "cost_allocation",
+            params,
+            lambda: self._cost_allocation(rules, start_date, end_date, currency)
+        )
+    
+    def _cost_breakdown(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        group_by: str,
+        client_filter: Optional[str],
+        service_filter: Optional[str],
+        metrics: Sequence[str] = (),
+        layout: str = "flat",
+        currency: str = DEFAULT_CURRENCY
     ) -> Dict:
-        """Get cost breakdown by service, client, or time period"""
+        """Compute a cost breakdown, bypassing the cache"""
+        names = [name.strip() for name in group_by.split(",")]
+        fields = [GROUP_BY_FIELDS.get(name, name) for name in names]
         try:
-            # Set default date range (last 30 days)
-            if not end_date:
-                end_date = datetime.now()
-            if not start_date:
-                start_date = end_date - timedelta(days=30)
-            
-            # Get all expenses
-            expenses = self.db_client.list_expenses(limit=1000)
-            
-            # Filter by date range
-            filtered_expenses = self._filter_by_date_range(expenses, start_date, end_date)
+            if any(field not in DIMENSIONS for field in fields) or len(set(fields)) != len(fields):
+                raise ValueError(f"Unsupported group_by: {group_by}")
+            if layout not in LAYOUTS:
+                raise ValueError(f"Unsupported layout: {layout}")
+            if layout == "pivot" and len(fields) != 2:
+                raise ValueError("Pivot layout needs exactly two group_by dimensions")
+            statistics, percentiles = parse_metrics(metrics)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
+        try:
+            start_date, end_date = default_date_range(start_date, end_date)
             
-            # Filter by client if specified
-            if client_filter:
-                filtered_expenses = [
-                    exp for exp in filtered_expenses 
-                    if exp.get('client', '').lower() == client_filter.lower()
+            # Rollups hold default-currency daily totals only, for one service or client dimension
+            if (self.rollups and currency == DEFAULT_CURRENCY and len(fields) == 1
+                    and fields[0] in ('service_name', 'client') and not statistics and not percentiles
+                    and _whole_days(start_date, end_date)):
+                totals = self._rollup_breakdown(fields[0], start_date, end_date, client_filter, service_filter)
+                groups = [
+                    {"labels": (key,), "total_units": units, "count": count}
+                    for key, (units, count) in totals.items()
                 ]
+                plan = PLAN_ROLLUP
+            else:
+                # Filters are pushed down to the index the planner picks
+                columns, plan = self._read_columns(
+                    start_date,
+                    end_date,
+                    client=client_filter,
+                    service=service_filter,
+                    currency=currency
+                )
+                groups = aggregate_groups(columns, fields, percentiles)
             
-            # Group expenses
-            breakdown = self._group_expenses(filtered_expenses, group_by)
-            
-            # Calculate totals
-            total_cost = sum(float(exp.get('cost', 0)) for exp in filtered_expenses)
-            total_count = len(filtered_expenses)
+            total_units = sum(group["total_units"] for group in groups)
+            breakdown = format_groups(groups, names, total_units, currency, statistics, percentiles, layout)
             
             return {
                 "summary": {
-                    "total_cost": round(total_cost, 2),
-                    "total_expenses": total_count,
+                    "total_cost": to_amount(total_units, currency),
+                    "currency": currency,
+                    "total_expenses": sum(group["count"] for group in groups),
                     "start_date": start_date.isoformat(),
                     "end_date": end_date.isoformat(),
                     "group_by": group_by
                 },
-                "breakdown": breakdown
+                "breakdown": breakdown,
+                "metadata": {"query_plan": plan}
             }
-            
+        
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to get cost breakdown: {str(e)}"
             )
     
-    def get_monthly_trends(self, months: int = 6) -> Dict:
-        """Get monthly cost trends"""
+    def _cost_allocation(
+        self,
+        rules: Sequence[Mapping],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        currency: str = DEFAULT_CURRENCY
+    ) -> Dict:
+        """Compute a cost allocation, bypassing the cache"""
+        try:
+            compiled = AllocationRules(rules)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
         try:
-            # Get expenses for the last N months
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=months * 30)
+            start_date, end_date = default_date_range(start_date, end_date)
             
-            expenses = self.db_client.list_expenses(limit=1000)
-            filtered_expenses = self._filter_by_date_range(expenses, start_date, end_date)
+            # Segments and month buckets each fold their stream, sharing the compiled dispatcher
+            allocation, plan = self.db_client.aggregate(
+                partial(Allocation.from_items, rules=compiled, currency=currency),
+                Allocation.merge,
+                start_date=start_date,
+                end_date=end_date,
+                projection=ALLOCATION_FIELDS
+            )
             
-            # Group by month
-            monthly_data = defaultdict(lambda: {"total_cost": 0, "count": 0})
+            total_units = allocation.total_units()
+            clients = []
+            for client, services in allocation.by_client().items():
+                direct = sum(entry[0] for entry in services.values())
+                allocated = sum(entry[1] for entry in services.values())
+                clients.append((direct + allocated, client, direct, allocated, services))
+            clients.sort(key=lambda row: (-row[0], row[1]))
             
-            for expense in filtered_expenses:
-                expense_date = datetime.fromisoformat(expense['date'])
-                month_key = expense_date.strftime("%Y-%m")
-                
-                monthly_data[month_key]["total_cost"] += float(expense.get('cost', 0))
-                monthly_data[month_key]["count"] += 1
+            return {
+                "summary": {
+                    "total_cost": to_amount(total_units, currency),
+                    "allocated_cost": to_amount(sum(units for _, units in allocation.rule_totals.values()), currency),
+                    "currency": currency,
+                    "total_expenses": allocation.count,
+                    "start_date": start_date.isoformat(),
+                    "end_date": end_date.isoformat()
+                },
+                "allocation": [
+                    {
+                        "client": client,
+                        "total_cost": to_amount(units, currency),
+                        "direct_cost": to_amount(direct, currency),
+                        "allocated_cost": to_amount(allocated, currency),
+                        "percentage": round(units / total_units * 100, 2) if total_units else 0,
+                        "services": [
+                            {
+                                "service": service,
+                                "total_cost": to_amount(service_direct + service_allocated, currency),
+                                "direct_cost": to_amount(service_direct, currency),
+                                "allocated_cost": to_amount(service_allocated, currency)
+                            }
+                            for service, (service_direct, service_allocated) in sorted(
+                                services.items(), key=lambda item: (-sum(item[1]), item[0])
+                            )
+                        ]
+                    }
+                    for units, client, direct, allocated, services in clients
+                ],
+                "rules": [
+                    {
+                        "name": rule.name,
+                        "matched_expenses": allocation.rule_totals.get(rule.position, (0, 0))[0],
+                        "allocated_cost": to_amount(allocation.rule_totals.get(rule.position, (0, 0))[1], currency)
+                    }
+                    for rule in compiled.rules
+                ],
+                "metadata": {"query_plan": plan, "rule_count": len(compiled)}
+            }
+        
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to get cost allocation: {str(e)}"
+            )
+    
+    def _monthly_trends(self, months: int, currency: str = DEFAULT_CURRENCY) -> Dict:
+        """Compute monthly trends, bypassing the cache"""
+        try:
+            # Get expenses for the last N months, in whole days so rollups and raw reads agree
+            end_date = datetime.combine(date.today(), time.max)
+            start_date = datetime.combine(end_date.date() - timedelta(days=months * 30), time.min)
+            
+            if self.rollups and currency == DEFAULT_CURRENCY:
+                # Period keys look like DAY#YYYY-MM-DD or MONTH#YYYY-MM
+                monthly_data = self._rollup_totals(
+                    rollup_buckets(start_date.date(), end_date.date()),
+                    rollup_prefix('total'),
+                    lambda row: row['period'].split('#', 1)[1][:7]
+                )
+                plan = PLAN_ROLLUP
+            else:
+                monthly_data, plan = self._aggregate('month', start_date, end_date, currency=currency)
             
             # Format response
             trends = []
@@ -90,83 +363,401 @@ class CostAnalysisHandler:
                 year, month = month_key.split('-')
                 month_name = calendar.month_name[int(month)]
                 
+                total_units, count = monthly_data[month_key]
                 trends.append({
                     "month": f"{month_name} {year}",
-                    "total_cost": round(monthly_data[month_key]["total_cost"], 2),
-                    "expense_count": monthly_data[month_key]["count"]
+                    "total_cost": to_amount(total_units, currency),
+                    "expense_count": count
                 })
             
             return {
                 "trends": trends,
-                "period": f"Last {months} months"
+                "currency": currency,
+                "period": f"Last {months} months",
+                "metadata": {"query_plan": plan}
             }
-            
+        
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to get monthly trends: {str(e)}"
             )
     
-    def get_top_services(self, limit: int = 10) -> List[Dict]:
-        """Get top services by cost"""
+    def _top_services(self, limit: int, currency: str = DEFAULT_CURRENCY) -> List[Dict]:
+        """Compute top services, bypassing the cache"""
         try:
-            expenses = self.db_client.list_expenses(limit=1000)
-            
-            # Group by service
-            service_costs = defaultdict(lambda: {"total_cost": 0, "count": 0})
+            if self.rollups and currency == DEFAULT_CURRENCY:
+                service_costs = self._rollup_totals(
+                    [ALL_TIME], rollup_prefix('service'), lambda row: row['group_value']
+                )
+            else:
+                service_costs, _ = self._aggregate('service_name', currency=currency)
             
-            for expense in expenses:
-                service_name = expense.get('service_name', 'Unknown')
-                service_costs[service_name]["total_cost"] += float(expense.get('cost', 0))
-                service_costs[service_name]["count"] += 1
+            # Rank on exact units, converting only the services returned
+            ranked = sorted(service_costs.items(), key=lambda item: item[1][0], reverse=True)
+            return [
+                {
+                    "service_name": service,
+                    "total_cost": to_amount(total_units, currency),
+                    "expense_count": count
+                }
+                for service, (total_units, count) in ranked[:limit]
+            ]
+        
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to get top services: {str(e)}"
+            )
+    
+    def _forecast(
+        self,
+        dimension: str,
+        days: int,
+        history: int,
+        client_filter: Optional[str],
+        service_filter: Optional[str],
+        currency: str = DEFAULT_CURRENCY
+    ) -> Dict:
+        """Compute forecasts, bypassing the cache"""
+        try:
+            labels, first_day, last_day, series, plan = self._daily_series(
+                dimension, history, client_filter, service_filter, currency
+            )
+            _, forecasts = forecast.analyze(series, first_day.toordinal(), horizon=days)
             
-            # Sort by total cost
-            top_services = sorted(
-                [
+            return {
+                "dimension": dimension,
+                "currency": currency,
+                "history_start": first_day.isoformat(),
+                "history_end": last_day.isoformat(),
+                "series": [
                     {
-                        "service_name": service,
-                        "total_cost": round(data["total_cost"], 2),
-                        "expense_count": data["count"]
+                        dimension: label,
+                        "forecast": [
+                            {
+                                "date": (last_day + timedelta(days=step)).isoformat(),
+                                "expected_cost": to_amount(expected, currency),
+                                "lower": to_amount(max(expected - FORECAST_BAND_Z * std, 0.0), currency),
+                                "upper": to_amount(expected + FORECAST_BAND_Z * std, currency)
+                            }
+                            for step, (expected, std) in enumerate(points, start=1)
+                        ]
                     }
-                    for service, data in service_costs.items()
+                    for label, points in zip(labels, forecasts)
                 ],
-                key=lambda x: x["total_cost"],
-                reverse=True
+                "metadata": {"query_plan": plan, "series_count": len(labels)}
+            }
+        
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to get forecast: {str(e)}"
             )
+    
+    def _anomalies(
+        self,
+        dimension: str,
+        history: int,
+        threshold: float,
+        client_filter: Optional[str],
+        service_filter: Optional[str],
+        currency: str = DEFAULT_CURRENCY
+    ) -> Dict:
+        """Compute anomalies, bypassing the cache"""
+        try:
+            labels, first_day, last_day, series, plan = self._daily_series(
+                dimension, history, client_filter, service_filter, currency
+            )
+            anomalies, _ = forecast.analyze(series, first_day.toordinal(), threshold=threshold)
             
-            return top_services[:limit]
-            
+            # Most recent first, so the newest surprises lead
+            return {
+                "dimension": dimension,
+                "currency": currency,
+                "history_start": first_day.isoformat(),
+                "history_end": last_day.isoformat(),
+                "threshold": threshold,
+                "anomalies": [
+                    {
+                        dimension: labels[index],
+                        "date": date.fromordinal(day).isoformat(),
+                        "actual_cost": to_amount(actual, currency),
+                        "expected_cost": to_amount(max(expected, 0.0), currency),
+                        "z_score": round((actual - expected) / std, 2),
+                        "direction": "spike" if actual > expected else "drop"
+                    }
+                    for index, day, actual, expected, std in reversed(anomalies)
+                ],
+                "metadata": {"query_plan": plan, "series_count": len(labels)}
+            }
+        
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to get top services: {str(e)}"
+                detail=f"Failed to get anomalies: {str(e)}"
             )
     
-    def _filter_by_date_range(self, expenses: List[Dict], start_date: datetime, end_date: datetime) -> List[Dict]:
-        """Filter expenses by date range"""
-        filtered = []
-        for expense in expenses:
-            expense_date = datetime.fromisoformat(expense['date'])
-            if start_date <= expense_date <= end_date:
-                filtered.append(expense)
-        return filtered
-    
-    def _group_expenses(self, expenses: List[Dict], group_by: str) -> List[Dict]:
-        """Group expenses by specified field"""
-        grouped = defaultdict(lambda: {"total_cost": 0, "count": 0, "expenses": []})
-        
-        for expense in expenses:
-            key = expense.get(group_by, 'Unknown')
-            grouped[key]["total_cost"] += float(expense.get('cost', 0))
-            grouped[key]["count"] += 1
-            grouped[key]["expenses"].append(expense)
-        
-        return [
-            {
-                "category": category,
-                "total_cost": round(data["total_cost"], 2),
-                "expense_count": data["count"],
-                "percentage": round((data["total_cost"] / sum(float(exp.get('cost', 0)) for exp in expenses)) * 100, 2) if expenses else 0
-            }
-            for category, data in grouped.items()
-        ]
+    def _daily_series(
+        self,
+        dimension: str,
+        history: int,
+        client_filter: Optional[str],
+        service_filter: Optional[str],
+        currency: str
+    ) -> Tuple[List[str], date, date, Sequence[Sequence[int]], str]:
+        """Read `history` complete days (through yesterday) into one dense daily series per label"""
+        field = SERIES_FIELDS.get(dimension)
+        if field is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported dimension: {dimension}"
+            )
+        
+        last_day = date.today() - timedelta(days=1)
+        first_day = last_day - timedelta(days=history - 1)
+        columns, plan = self._read_columns(
+            datetime.combine(first_day, time.min),
+            datetime.combine(last_day, time.max),
+            client=client_filter,
+            service=service_filter,
+            currency=currency
+        )
+        labels, series = forecast.daily_series(columns, field, first_day.toordinal(), last_day.toordinal())
+        return labels, first_day, last_day, series, plan
+    
+    def _aggregate(
+        self,
+        dimension: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        client: Optional[str] = None,
+        service: Optional[str] = None,
+        currency: str = DEFAULT_CURRENCY
+    ) -> Tuple[Dict[str, Tuple[int, int]], str]:
+        """Sum minor units and count per value of `dimension`, returning the totals and the read plan used"""
+        columns, plan = self._read_columns(start_date, end_date, client, service, currency)
+        return columns.group_by(dimension), plan
+    
+    def _read_columns(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        client: Optional[str] = None,
+        service: Optional[str] = None,
+        currency: str = DEFAULT_CURRENCY
+    ) -> Tuple[ExpenseColumns, str]:
+        """Read the matching expenses into columnar arrays, returning them and the read plan used
+        
+        Each segment or query is folded into its own columns and the partials are
+        merged, so grouping runs once over the result, in integer minor units.
+        Within a date range, closed months with a snapshot are read from it and
+        only the remaining months (the current one at least) from DynamoDB.
+        """
+        if self.snapshots is None or not (start_date and end_date):
+            return self._read_live(start_date, end_date, client, service, currency)
+        
+        columns = ExpenseColumns(currency)
+        plans: List[str] = []  # live read plans used
+        from_snapshots = False
+        current_month = f"{datetime.now():%Y-%m}"
+        pending: List[str] = []  # consecutive months to read live
+        
+        def read_pending():
+            if pending:
+                live, plan = self._read_live(
+                    max(start_date, month_range(pending[0])[0]),
+                    min(end_date, month_range(pending[-1])[1]),
+                    client,
+                    service,
+                    currency
+                )
+                columns.merge(live)
+                plans.append(plan)
+                pending.clear()
+        
+        for month in month_buckets(start_date, end_date):
+            snapshot = self.snapshots.open(snapshot_key(month)) if month < current_month else None
+            if snapshot is None:
+                pending.append(month)
+                continue
+            read_pending()
+            columns.merge(load_columns(snapshot, currency, start_date, end_date, client, service))
+            from_snapshots = True
+        read_pending()
+        return columns, "+".join([PLAN_SNAPSHOT] * from_snapshots + list(dict.fromkeys(plans)))
+    
+    def _read_live(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        client: Optional[str] = None,
+        service: Optional[str] = None,
+        currency: str = DEFAULT_CURRENCY
+    ) -> Tuple[ExpenseColumns, str]:
+        """Read the matching expenses from DynamoDB, on the narrowest plan for the filters
+        
+        Pages are decoded from the wire format straight into columns, so no
+        Python-typed item is built per row.
+        """
+        return self.db_client.aggregate(
+            partial(ExpenseColumns.from_wire_items, currency=currency),
+            ExpenseColumns.merge,
+            client=client,
+            service=service,
+            start_date=start_date,
+            end_date=end_date,
+            projection=ANALYTICS_FIELDS,
+            wire=True
+        )
+    
+    def _rollup_breakdown(
+        self,
+        field: str,
+        start_date: datetime,
+        end_date: datetime,
+        client: Optional[str] = None,
+        service: Optional[str] = None
+    ) -> Dict[str, Tuple[int, int]]:
+        """Answer a breakdown from rollup rows at day granularity
+        
+        Only ranges of whole days (see _whole_days) match what the raw path reads.
+        A filter on the other dimension selects its pre-split rows; a filter on the
+        grouped dimension itself is applied to the (few) groups read back.
+        """
+        if field == 'service_name':
+            prefix = rollup_prefix('client_service', normalize_key(client)) if client else rollup_prefix('service')
+            match = service
+        else:
+            prefix = rollup_prefix('service_client', normalize_key(service)) if service else rollup_prefix('client')
+            match = client
+        
+        match_key = normalize_key(match) if match else None
+        return self._rollup_totals(
+            rollup_buckets(start_date.date(), end_date.date()),
+            prefix,
+            lambda row: row['group_value'] if not match_key or normalize_key(row['group_value']) == match_key else None
+        )
+    
+    def _rollup_totals(
+        self,
+        periods: List[str],
+        prefix: str,
+        key_fn: Callable[[Dict], Optional[str]]
+    ) -> Dict[str, Tuple[int, int]]:
+        """Sum rollup rows per key in minor units; work is O(periods x groups), independent of expense count"""
+        def fold(rows: Iterable[Dict]) -> Dict[str, Tuple[int, int]]:
+            totals = defaultdict(lambda: [0, 0])
+            for row in rows:
+                key = key_fn(row)
+                if key is None or not row.get('expense_count'):
+                    continue
+                entry = totals[key]
+                entry[0] += to_minor_units(row['total_cost'])
+                entry[1] += int(row['expense_count'])
+            return {key: (cost, count) for key, (cost, count) in totals.items()}
+        
+        return self.rollups.query(periods, prefix, fold, _merge_totals)
+
+
+def format_groups(
+    groups: List[Dict],
+    names: Sequence[str],
+    total_units: int,
+    currency: str = DEFAULT_CURRENCY,
+    statistics: Sequence[str] = (),
+    percentiles: Sequence[float] = (),
+    layout: str = "flat"
+):
+    """Shape aggregated groups for the API, converting minor units to amounts
+    
+    flat: one row per group ("category" for a single dimension, else one key per
+    dimension); nested: dimension labels as nested keys down to the metrics;
+    pivot: first dimension as rows, second as columns, total cost in each cell.
+    """
+    rows = []
+    for group in groups:
+        units, count = group["total_units"], group["count"]
+        metrics = {
+            "total_cost": to_amount(units, currency),
+            "expense_count": count,
+            "percentage": round(units / total_units * 100, 2) if total_units else 0
+        }
+        for statistic in statistics:
+            if statistic == "avg":
+                metrics["avg_cost"] = to_amount(units / count, currency)
+            else:
+                metrics[f"{statistic}_cost"] = to_amount(group[f"{statistic}_units"], currency)
+        for percentile in percentiles:
+            metrics[f"p{percentile:g}_cost"] = to_amount(group["percentiles"][percentile], currency)
+        rows.append((group["labels"], metrics))
+    
+    if layout == "nested":
+        nested: Dict = {}
+        for labels, metrics in rows:
+            node = nested
+            for label in labels[:-1]:
+                node = node.setdefault(label, {})
+            node[labels[-1]] = metrics
+        return nested
+    
+    if layout == "pivot":
+        columns = sorted({labels[1] for labels, _ in rows})
+        table: Dict[str, Dict] = {}
+        for (row_label, column_label), metrics in rows:
+            table.setdefault(row_label, {names[0]: row_label, **{column: 0 for column in columns}})
+            table[row_label][column_label] = metrics["total_cost"]
+        return {"rows": names[0], "columns": columns, "data": list(table.values())}
+    
+    if len(names) == 1:
+        return [{"category": labels[0], **metrics} for labels, metrics in rows]
+    return [{**dict(zip(names, labels)), **metrics} for labels, metrics in rows]
+
+
+def resolve_currency(currency: Optional[str]) -> str:
+    """Normalize a requested currency code, defaulting to DEFAULT_CURRENCY"""
+    currency = (currency or DEFAULT_CURRENCY).upper()
+    try:
+        currency_exponent(currency)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return currency
+
+
+def check_date_range(start_date: Optional[datetime], end_date: Optional[datetime]) -> None:
+    """Reject a requested range that ends before it starts"""
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date must not be after end_date")
+
+
+def default_date_range(
+    start_date: Optional[datetime],
+    end_date: Optional[datetime]
+) -> Tuple[datetime, datetime]:
+    """Fill in a missing range end: the last 30 whole days, through the end of today"""
+    if not end_date:
+        end_date = datetime.combine(date.today(), time.max)
+    if not start_date:
+        start_date = datetime.combine(end_date.date() - timedelta(days=30), time.min)
+    return start_date, end_date
+
+
+def _merge_totals(
+    left: Dict[str, Tuple[int, int]],
+    right: Dict[str, Tuple[int, int]]
+) -> Dict[str, Tuple[int, int]]:
+    """Merge two partial unit/count aggregates"""
+    merged = dict(left)
+    for key, (units, count) in right.items():
+        prev_units, prev_count = merged.get(key, (0, 0))
+        merged[key] = (prev_units + units, prev_count + count)
+    return merged
+
+
+def _whole_days(start_date: datetime, end_date: datetime) -> bool:
+    """Whether a range starts at midnight and ends on a day's last instant, as daily rollup rows cover"""
+    return start_date.time() == time.min and end_date.time() == time.max
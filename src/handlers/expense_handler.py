@@ -1,31 +1,154 @@
 from fastapi import HTTPException, status
-from typing import List
-from src.models.expense import ExpenseCreate, ExpenseUpdate, ExpenseResponse
-from src.database.dynamodb_client import DynamoDBClient
+from pydantic import ValidationError
+from typing import Any, Dict, List, Optional, Tuple
+from src.models.expense import (
+    EXPENSE_FIELDS,
+    BatchCreateResponse,
+    BatchItemResult,
+    ExpenseCreate,
+    ExpenseUpdate,
+    ExpenseResponse,
+)
+from src.models.money import DEFAULT_CURRENCY
+from src.database.async_dynamodb_client import AsyncDynamoDBClient
+from src.database.idempotency_client import MAX_IDEMPOTENCY_KEY_LENGTH, request_fingerprint
+from src.database.cache import get_cache
+from src.database.dynamodb_client import (
+    DynamoDBClient,
+    ExpenseNotFoundError,
+    IdempotencyConflictError,
+    IdempotencyKeyBusyError,
+    InvalidCursorError,
+    ThrottledError,
+    VersionConflictError,
+    PLAN_SCAN,
+    list_plan,
+)
 from decimal import Decimal
 from datetime import datetime
+import os
 
 class ExpenseHandler:
     def __init__(self):
         self.db_client = DynamoDBClient()
+        # Routes await this; calls run on a bounded pool instead of the event loop
+        self.db = AsyncDynamoDBClient(self.db_client)
+        self.cache = get_cache()
+        self.budgets = None
+        # Budget counters move in the same transaction as each write wherever BUDGETS_TABLE is deployed
+        if os.getenv('BUDGETS_TABLE'):
+            from src.handlers.budget_handler import BudgetHandler
+            self.budgets = BudgetHandler()
+            self.db_client.counters = self.budgets.budgets
+        # Idempotency-Key (and per-item idempotency_key) deduplication needs IDEMPOTENCY_TABLE; keys are ignored without it
+        if os.getenv('IDEMPOTENCY_TABLE'):
+            from src.database.idempotency_client import IdempotencyClient
+            self.db_client.idempotency = IdempotencyClient()
     
-    def create_expense(self, expense: ExpenseCreate) -> ExpenseResponse:
+    async def create_expense(self, expense: ExpenseCreate) -> ExpenseResponse:
         """Create a new expense"""
         try:
-            expense_data = expense.dict()
-            created_expense = self.db_client.create_expense(expense_data)
+            expense_data = expense.model_dump()
+            created_expense = await self.db.create_expense(expense_data)
+            self.cache.invalidate_analytics()
+            await self._check_budgets([created_expense])
             return self._format_response(created_expense)
-            
+        
+        except ThrottledError as e:
+            raise too_many_requests(e)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to create expense: {str(e)}"
             )
     
-    def get_expense(self, expense_id: str) -> ExpenseResponse:
+    async def create_expense_idempotent(self, expense: ExpenseCreate, key: str) -> Tuple[ExpenseResponse, bool]:
+        """Create an expense at most once per idempotency key; returns (expense, replayed)
+        
+        A retry with the same key and body gets the first response back without
+        a second write. Reusing a key for a different body is a 422; a key still
+        contended by concurrent requests after a few attempts is a 409.
+        """
+        try:
+            key = check_idempotency_key(key)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if self.db_client.idempotency is None:
+            return await self.create_expense(expense), False
+        
+        try:
+            fingerprint = request_fingerprint(expense.model_dump(exclude_unset=True))
+            created_expense, replayed = await self.db.create_expense_once(expense.model_dump(), key, fingerprint)
+            if not replayed:
+                self.cache.invalidate_analytics()
+                await self._check_budgets([created_expense])
+            return self._format_response(created_expense), replayed
+        
+        except IdempotencyConflictError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+        except IdempotencyKeyBusyError as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+        except ThrottledError as e:
+            raise too_many_requests(e)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to create expense: {str(e)}"
+            )
+    
+    async def create_expenses_bulk(self, raw_expenses: List[Dict[str, Any]]) -> BatchCreateResponse:
+        """Validate and create many expenses, reporting success or failure per item
+        
+        Items may carry an `idempotency_key`; a retried batch then replays the
+        items it already created (marked `replayed`) and writes only the rest.
+        """
+        results: Dict[int, BatchItemResult] = {}
+        valid_indexes = []
+        valid_data = []
+        idempotency = []
+        
+        for index, raw in enumerate(raw_expenses):
+            try:
+                expense_data, entry = parse_keyed_expense(raw)
+                valid_data.append(expense_data)
+                idempotency.append(entry)
+                valid_indexes.append(index)
+            except (ValueError, TypeError) as e:
+                results[index] = BatchItemResult(index=index, status="failed", error=describe_validation_error(e))
+        
+        try:
+            written = await self.db.batch_create(valid_data, idempotency)
+        except ThrottledError as e:
+            raise too_many_requests(e)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to create expenses: {str(e)}"
+            )
+        
+        for index, outcome in zip(valid_indexes, written):
+            if outcome["status"] == "created":
+                results[index] = BatchItemResult(
+                    index=index,
+                    status="created",
+                    expense=self._format_response(outcome["item"]),
+                    replayed=outcome.get("replayed", False)
+                )
+            else:
+                results[index] = BatchItemResult(index=index, status="failed", error=outcome["error"])
+        
+        ordered = [results[index] for index in range(len(raw_expenses))]
+        created = sum(1 for result in ordered if result.status == "created")
+        fresh = [outcome["item"] for outcome in written if outcome["status"] == "created" and not outcome.get("replayed")]
+        if fresh:
+            self.cache.invalidate_analytics()
+            await self._check_budgets(fresh)
+        return BatchCreateResponse(created=created, failed=len(ordered) - created, results=ordered)
+    
+    async def get_expense(self, expense_id: str) -> ExpenseResponse:
         """Get expense by ID"""
         try:
-            expense = self.db_client.get_expense(expense_id)
+            expense = await self.cache.get_expense_async(expense_id, self.db.get_expense)
             if not expense:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -33,81 +156,220 @@ class ExpenseHandler:
                 )
             
             return self._format_response(expense)
-            
+        
         except HTTPException:
             raise
+        except ThrottledError as e:
+            raise too_many_requests(e)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to get expense: {str(e)}"
             )
     
-    def update_expense(self, expense_id: str, expense_update: ExpenseUpdate) -> ExpenseResponse:
-        """Update an existing expense"""
+    async def update_expense(
+        self,
+        expense_id: str,
+        expense_update: ExpenseUpdate,
+        expected_version: Optional[int] = None
+    ) -> ExpenseResponse:
+        """Update an existing expense, optionally only if it is still at `expected_version`"""
         try:
-            # Check if expense exists
-            existing_expense = self.db_client.get_expense(expense_id)
-            if not existing_expense:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Expense with ID {expense_id} not found"
-                )
-            
-            update_data = expense_update.dict(exclude_unset=True)
-            updated_expense = self.db_client.update_expense(expense_id, update_data)
+            update_data = expense_update.model_dump(exclude_unset=True)
+            updated_expense = await self.db.update_expense(expense_id, update_data, expected_version)
+            self._invalidate(expense_id)
+            await self._check_budgets([updated_expense])
             return self._format_response(updated_expense)
-            
-        except HTTPException:
-            raise
+        
+        except ExpenseNotFoundError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        except VersionConflictError as e:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=str(e))
+        except ThrottledError as e:
+            raise too_many_requests(e)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to update expense: {str(e)}"
             )
     
-    def delete_expense(self, expense_id: str) -> dict:
-        """Delete an expense"""
+    async def delete_expense(self, expense_id: str, expected_version: Optional[int] = None) -> dict:
+        """Delete an expense and return what was deleted"""
         try:
-            # Check if expense exists
-            existing_expense = self.db_client.get_expense(expense_id)
-            if not existing_expense:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Expense with ID {expense_id} not found"
-                )
-            
-            self.db_client.delete_expense(expense_id)
-            return {"message": f"Expense {expense_id} deleted successfully"}
-            
-        except HTTPException:
-            raise
+            deleted_expense = await self.db.delete_expense(expense_id, expected_version)
+            self._invalidate(expense_id)
+            return {
+                "message": f"Expense {expense_id} deleted successfully",
+                "expense": self._format_response(deleted_expense)
+            }
+        
+        except ExpenseNotFoundError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        except VersionConflictError as e:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=str(e))
+        except ThrottledError as e:
+            raise too_many_requests(e)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to delete expense: {str(e)}"
             )
     
-    def list_expenses(self, limit: int = 50) -> List[ExpenseResponse]:
+    async def list_expenses(self, limit: int = 50) -> List[ExpenseResponse]:
         """List all expenses"""
+        expenses, _ = await self.list_expenses_page(limit)
+        return expenses
+    
+    async def list_expenses_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[ExpenseResponse], Optional[str]]:
+        """List one page of expenses along with the cursor for the next page"""
+        expenses, next_cursor, _ = await self.list_expense_items(limit, cursor)
+        return [self._format_response(expense) for expense in expenses], next_cursor
+    
+    async def list_expense_items(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        client: Optional[str] = None,
+        service: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        min_cost: Optional[Decimal] = None,
+        max_cost: Optional[Decimal] = None,
+        sort: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[Dict], Optional[str], str]:
+        """One page of stored items matching the filters, unformatted, with the next cursor and read plan
+        
+        `sort` is "date" or "-date"; ordering needs a client, service or closed
+        date range to key on. `fields` limits what is read to those response
+        fields (plus expense_id).
+        """
+        if start_date and end_date and start_date > end_date:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date must not be after end_date")
+        if min_cost is not None and max_cost is not None and min_cost > max_cost:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="min_cost must not exceed max_cost")
+        if sort and list_plan(client, service, start_date, end_date) == PLAN_SCAN:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Sorting needs a client, service, or both start_date and end_date"
+            )
+        
+        projection = None
+        if fields:
+            unknown = [field for field in fields if field not in EXPENSE_FIELDS]
+            if unknown:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(EXPENSE_FIELDS)}"
+                )
+            # Cost is rounded to its currency's precision, so reading it needs the currency too
+            projection = sparse_fields(fields) + (['currency'] if 'cost' in fields else [])
+        
         try:
-            expenses = self.db_client.list_expenses(limit)
-            return [self._format_response(expense) for expense in expenses]
-            
+            return await self.db.query_expenses_page(
+                limit,
+                cursor,
+                client=client,
+                service=service,
+                start_date=start_date,
+                end_date=end_date,
+                min_cost=min_cost,
+                max_cost=max_cost,
+                descending=sort == '-date',
+                projection=projection
+            )
+        
+        except InvalidCursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except ThrottledError as e:
+            raise too_many_requests(e)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to list expenses: {str(e)}"
             )
     
+    async def _check_budgets(self, items) -> None:
+        """Alert budgets that committed writes pushed past a threshold"""
+        if self.budgets is not None:
+            await self.budgets.check_alerts_async(items)
+    
+    def _invalidate(self, expense_id: str):
+        """Drop the cached expense and every cached analytics result"""
+        self.cache.invalidate_expense(expense_id)
+        self.cache.invalidate_analytics()
+    
     def _format_response(self, expense: dict) -> ExpenseResponse:
         """Format database response to Pydantic model"""
-        return ExpenseResponse(
-            expense_id=expense['expense_id'],
-            service_name=expense['service_name'],
-            client=expense['client'],
-            cost=float(expense['cost']),
-            date=datetime.fromisoformat(expense['date']),
-            description=expense.get('description'),
-            created_at=datetime.fromisoformat(expense['created_at']),
-            updated_at=datetime.fromisoformat(expense['updated_at'])
+        return format_expense(expense)
+
+
+def sparse_fields(fields: List[str]) -> List[str]:
+    """Requested response fields in schema order, always with expense_id"""
+    return [field for field in EXPENSE_FIELDS if field in fields or field == 'expense_id']
+
+
+def format_expense(expense: Dict) -> ExpenseResponse:
+    """Build the response model for a stored expense item"""
+    return ExpenseResponse(
+        expense_id=expense['expense_id'],
+        service_name=expense['service_name'],
+        client=expense['client'],
+        currency=expense.get('currency', DEFAULT_CURRENCY),
+        cost=float(expense['cost']),
+        date=datetime.fromisoformat(expense['date']),
+        description=expense.get('description'),
+        created_at=datetime.fromisoformat(expense['created_at']),
+        updated_at=datetime.fromisoformat(expense['updated_at']),
+        version=int(expense.get('version', 1))
+    )
+
+
+def too_many_requests(error: ThrottledError) -> HTTPException:
+    """429 for a request DynamoDB throttled, telling the caller when to come back"""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+def check_idempotency_key(key: Any) -> str:
+    """Validate a client-supplied idempotency key, raising ValueError if it is unusable"""
+    if not isinstance(key, str) or not key.strip():
+        raise ValueError("Idempotency key must be a non-empty string")
+    if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise ValueError(f"Idempotency key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters")
+    return key
+
+
+def parse_keyed_expense(raw: Dict[str, Any]) -> Tuple[Dict, Optional[Tuple[str, str]]]:
+    """Validate a batch or import record, splitting off its optional `idempotency_key`
+    
+    Returns the expense data and, for keyed records, (key, fingerprint). The
+    fingerprint covers only the fields sent, so a retry that leaves out `date`
+    still matches even though each attempt defaults it to the current time.
+    """
+    raw = dict(raw)
+    key = raw.pop('idempotency_key', None)
+    expense = ExpenseCreate(**raw)
+    data = expense.model_dump()
+    if key is None:
+        return data, None
+    return data, (check_idempotency_key(key), request_fingerprint(expense.model_dump(exclude_unset=True)))
+
+
+def describe_validation_error(error: Exception) -> str:
+    """Flatten a Pydantic validation error into a single readable line"""
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors()
         )
+    return str(error)
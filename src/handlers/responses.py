@@ -0,0 +1,108 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import json
+
+from fastapi.responses import JSONResponse
+
+from src.handlers.expense_handler import format_expense
+from src.models.money import CURRENCY_EXPONENTS, DEFAULT_CURRENCY, currency_exponent
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson isn't installed
+    orjson = None
+
+# Lengths of naive datetime.isoformat() output without and with microseconds
+ISO_LENGTHS = (19, 26)
+TIMESTAMP_FIELDS = frozenset(('date', 'created_at', 'updated_at'))
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON, byte for byte what JSONResponse would render"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed
+    
+    Content must already be JSON types: routes returning a response directly
+    skip response_model validation and serialization.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def expense_document(item: Dict, fields: Optional[Sequence[str]] = None) -> Dict:
+    """The ExpenseResponse JSON for a stored item, without building the model
+    
+    Items written by this API store canonical values: naive isoformat
+    timestamps and a cost already at its currency's precision. Those are
+    copied straight through. Anything else (older or hand-written items) goes
+    through the model, so the output is the same either way.
+    
+    With `fields` (in schema order) only those are encoded, field by field,
+    as the model would have; the item may hold just those attributes.
+    """
+    if fields is not None:
+        return _sparse_document(item, fields)
+    cost = item['cost']
+    currency = item.get('currency', DEFAULT_CURRENCY)
+    date, created_at, updated_at = item['date'], item['created_at'], item['updated_at']
+    if (
+        len(date) in ISO_LENGTHS and date[10] == 'T'
+        and len(created_at) in ISO_LENGTHS and created_at[10] == 'T'
+        and len(updated_at) in ISO_LENGTHS and updated_at[10] == 'T'
+        and isinstance(cost, Decimal) and -cost.as_tuple().exponent <= CURRENCY_EXPONENTS.get(currency, -1)
+    ):
+        return {
+            'service_name': item['service_name'],
+            'client': item['client'],
+            'currency': currency,
+            'cost': float(cost),
+            'date': date,
+            'description': item.get('description'),
+            'expense_id': item['expense_id'],
+            'created_at': created_at,
+            'updated_at': updated_at,
+            'version': int(item.get('version', 1))
+        }
+    return format_expense(item).model_dump(mode='json')
+
+
+def expense_documents(items: Iterable[Dict], fields: Optional[Sequence[str]] = None) -> List[Dict]:
+    return [expense_document(item, fields) for item in items]
+
+
+def _sparse_document(item: Dict, fields: Sequence[str]) -> Dict:
+    currency = item.get('currency', DEFAULT_CURRENCY)
+    document = {}
+    for field in fields:
+        if field == 'cost':
+            value = _cost(item['cost'], currency)
+        elif field in TIMESTAMP_FIELDS:
+            value = _timestamp(item[field])
+        elif field == 'currency':
+            value = currency
+        elif field == 'version':
+            value = int(item.get('version', 1))
+        else:
+            value = item.get(field)
+        document[field] = value
+    return document
+
+
+def _cost(cost, currency: str) -> float:
+    if isinstance(cost, Decimal) and -cost.as_tuple().exponent <= CURRENCY_EXPONENTS.get(currency, -1):
+        return float(cost)
+    # The model takes cost as a float and rounds it at the currency's precision
+    return float(round(Decimal(str(float(cost))), currency_exponent(currency)))
+
+
+def _timestamp(value: str) -> str:
+    if len(value) in ISO_LENGTHS and value[10] == 'T':
+        return value
+    return datetime.fromisoformat(value).isoformat()
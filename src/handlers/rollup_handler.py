@@ -0,0 +1,42 @@
+import argparse
+from typing import Dict, Optional
+
+from src.database.rollup_client import RollupClient
+from src.handlers.snapshot_handler import drop_stale_snapshots
+
+_rollup_client: Optional[RollupClient] = None
+
+
+def _get_rollup_client() -> RollupClient:
+    """Reuse one rollup client across warm invocations"""
+    global _rollup_client
+    if _rollup_client is None:
+        _rollup_client = RollupClient()
+    return _rollup_client
+
+
+def handler(event: Dict, context=None) -> Dict:
+    """DynamoDB Streams consumer that folds expense changes into the rollup table
+    
+    Changes to closed months also drop those months' snapshots, so reports fall
+    back to DynamoDB for them until they are compacted again. Records are applied
+    exactly once, so a batch retried after a partial failure is safe to replay.
+    """
+    records = event.get('Records', [])
+    applied = _get_rollup_client().apply_stream_records(records)
+    stale = drop_stale_snapshots(records)
+    return {"records": len(records), "rollups_updated": applied, "snapshots_dropped": len(stale)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the expense rollup table")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: backfill rollups from the raw expenses table")
+    args = parser.parse_args()
+    
+    if args.command == "rebuild":
+        rows = _get_rollup_client().rebuild()
+        print(f"Rebuilt {rows} rollup rows")
+
+
+if __name__ == "__main__":
+    main()
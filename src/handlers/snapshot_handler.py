@@ -0,0 +1,119 @@
+import argparse
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+import os
+
+from src.analytics.snapshots import SnapshotBuilder, month_range, snapshot_key
+from src.database.dynamodb_client import ANALYTICS_FIELDS, DynamoDBClient
+from src.database.snapshot_store import get_snapshot_store
+
+# Closed months the scheduled job keeps compacted, counting back from last month
+SNAPSHOT_LOOKBACK_MONTHS = int(os.getenv('SNAPSHOT_LOOKBACK_MONTHS', '24'))
+
+_db_client: Optional[DynamoDBClient] = None
+
+
+def _get_db_client() -> DynamoDBClient:
+    """Reuse one DynamoDB client across warm invocations"""
+    global _db_client
+    if _db_client is None:
+        _db_client = DynamoDBClient()
+    return _db_client
+
+
+def _require_store():
+    store = get_snapshot_store()
+    if store is None:
+        raise RuntimeError("Snapshots need SNAPSHOT_BUCKET or SNAPSHOT_DIR")
+    return store
+
+
+def closed_months(count: int, today: Optional[date] = None) -> List[str]:
+    """The `count` months before today's, oldest first"""
+    today = today or date.today()
+    year, month = today.year, today.month
+    months = []
+    for _ in range(count):
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+        months.append(f"{year:04d}-{month:02d}")
+    return months[::-1]
+
+
+def compact_month(month: str, db_client: Optional[DynamoDBClient] = None, store=None) -> int:
+    """Export one month of expenses from the date index into its snapshot; returns the row count"""
+    db_client = db_client or _get_db_client()
+    store = store or _require_store()
+    start, end = month_range(month)
+    compacted_at = datetime.now()
+    builder = db_client.query_date_range(
+        SnapshotBuilder.from_items, SnapshotBuilder.merge, start, end, projection=ANALYTICS_FIELDS
+    )
+    store.put(snapshot_key(month), builder.to_bytes(month, compacted_at))
+    return len(builder)
+
+
+def compact(
+    months: Optional[Iterable[str]] = None,
+    force: bool = False,
+    db_client: Optional[DynamoDBClient] = None,
+    store=None
+) -> Dict[str, int]:
+    """Snapshot closed months that have none (every listed month with `force`); returns rows per month written
+    
+    Months default to the last SNAPSHOT_LOOKBACK_MONTHS. The current month is
+    never compacted: it is still being written to.
+    """
+    store = store or _require_store()
+    current_month = f"{date.today():%Y-%m}"
+    months = list(months) if months is not None else closed_months(SNAPSHOT_LOOKBACK_MONTHS)
+    existing = set() if force else set(store.keys())
+    return {
+        month: compact_month(month, db_client, store)
+        for month in months
+        if month < current_month and snapshot_key(month) not in existing
+    }
+
+
+def drop_stale_snapshots(records: Iterable[Dict], store=None) -> List[str]:
+    """Delete the snapshots of closed months that DynamoDB stream records changed
+    
+    Reports then read those months live until the next compaction rewrites
+    them. A change landing while its month is being compacted can still be
+    missed by that snapshot; compacting the month again with force picks it up.
+    """
+    store = store or get_snapshot_store()
+    if store is None:
+        return []
+    current_month = f"{date.today():%Y-%m}"
+    months = set()
+    for record in records:
+        images = record.get('dynamodb', {})
+        for image in (images.get('OldImage'), images.get('NewImage')):
+            if image and 'date' in image:
+                months.add(image['date']['S'][:7])
+    stale = sorted(month for month in months if month < current_month)
+    for month in stale:
+        store.delete(snapshot_key(month))
+    return stale
+
+
+def handler(event: Dict, context=None) -> Dict:
+    """Scheduled compaction; the event may list "months" and set "force" to rewrite them"""
+    written = compact(event.get('months'), force=bool(event.get('force')))
+    return {"months": written}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain columnar snapshots of closed months")
+    parser.add_argument("command", choices=["compact"], help="compact: export closed months into snapshots")
+    parser.add_argument("--months", nargs="+", help="YYYY-MM months to compact (default: the lookback window)")
+    parser.add_argument("--force", action="store_true", help="rewrite snapshots that already exist")
+    args = parser.parse_args()
+    
+    if args.command == "compact":
+        for month, rows in compact(args.months, force=args.force).items():
+            print(f"Compacted {month}: {rows} expenses")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,41 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Path, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from mangum import Mangum
-from typing import List
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+import os
 
-from src.models.expense import ExpenseCreate, ExpenseUpdate, ExpenseResponse
-from src.handlers.expense_handler import ExpenseHandler
+from src.models.allocation import AllocationRequest
+from src.models.budget import BudgetSet, BudgetStatus
+from src.models.expense import (
+    BatchCreateResponse,
+    ExpenseCreate,
+    ExpenseUpdate,
+    ExpenseResponse,
+    ImportResponse,
+)
+from src.handlers.conditional import etag, parse_if_match
+from src.middleware.metrics import MetricsMiddleware, registry
+
+# Upper bound on items per POST /expenses/batch request
+MAX_BATCH_ITEMS = 1000
+
+# Dimensions accepted in /cost-breakdown's comma-separated group_by
+GROUP_BY_PATTERN = "(service|client|day|week|month|quarter)"
+
+# Set ENABLE_DOCS=false in production to skip the /docs, /redoc and OpenAPI routes
+ENABLE_DOCS = os.getenv('ENABLE_DOCS', 'true').lower() != 'false'
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Serverless Cost Tracker API",
     description="A serverless API for tracking AWS costs and expenses",
     version="1.0.0",
-    docs_url="/docs",
-    redoc_url="/redoc"
+    docs_url="/docs" if ENABLE_DOCS else None,
+    redoc_url="/redoc" if ENABLE_DOCS else None,
+    openapi_url="/openapi.json" if ENABLE_DOCS else None
 )
 
 # CORS middleware
@@ -23,41 +45,243 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Idempotent-Replayed"],
 )
 
-# Initialize handler
-expense_handler = ExpenseHandler()
+# Outermost, so recorded latency covers every other middleware
+app.add_middleware(MetricsMiddleware)
+
+# Handlers are built on first use so importing this module never touches boto3;
+# the Lambda container then reuses them across warm invocations
+_expense_handler = None
+_bulk_handler = None
+_cost_analysis_handler = None
+
+def get_expense_handler():
+    global _expense_handler
+    if _expense_handler is None:
+        from src.handlers.expense_handler import ExpenseHandler
+        _expense_handler = ExpenseHandler()
+    return _expense_handler
+
+def get_bulk_handler():
+    global _bulk_handler
+    if _bulk_handler is None:
+        from src.handlers.bulk_handler import BulkHandler
+        _bulk_handler = BulkHandler(get_expense_handler().db_client, get_expense_handler().budgets)
+    return _bulk_handler
+
+def get_cost_analysis_handler():
+    global _cost_analysis_handler
+    if _cost_analysis_handler is None:
+        from src.handlers.cost_analysis_handler import CostAnalysisHandler
+        _cost_analysis_handler = CostAnalysisHandler(get_expense_handler().db_client)
+    return _cost_analysis_handler
+
+def get_budget_handler():
+    """The expense handler's BudgetHandler; budgets need BUDGETS_TABLE so writes keep the counters"""
+    budgets = get_expense_handler().budgets
+    if budgets is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Budgets are not enabled")
+    return budgets
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "message": "Cost Tracker API is running"}
 
+# Cache counters for this container
+@app.get("/cache/stats")
+async def cache_stats():
+    from src.database.cache import get_cache
+    return get_cache().stats()
+
+# This container's metrics in Prometheus text format
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # Expense endpoints
 @app.post("/expenses", response_model=ExpenseResponse, status_code=status.HTTP_201_CREATED)
-async def create_expense(expense: ExpenseCreate):
-    """Create a new expense record"""
-    return expense_handler.create_expense(expense)
+async def create_expense(expense: ExpenseCreate, response: Response, idempotency_key: Optional[str] = Header(None)):
+    """Create a new expense record
+    
+    Retries carrying the same Idempotency-Key get the original expense back,
+    marked with Idempotent-Replayed: true, instead of creating another.
+    """
+    if idempotency_key is None:
+        created = await get_expense_handler().create_expense(expense)
+    else:
+        created, replayed = await get_expense_handler().create_expense_idempotent(expense, idempotency_key)
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+    response.headers["ETag"] = etag(created)
+    return created
+
+@app.post("/expenses/batch", response_model=BatchCreateResponse, status_code=status.HTTP_201_CREATED)
+async def create_expenses_batch(expenses: List[Dict[str, Any]], response: Response):
+    """Create many expenses at once; responds 207 when some items failed
+    
+    Each item may carry an idempotency_key; retried items come back replayed.
+    """
+    if len(expenses) > MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds {MAX_BATCH_ITEMS} items"
+        )
+    
+    result = await get_expense_handler().create_expenses_bulk(expenses)
+    if result.failed:
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return result
+
+@app.post("/expenses/import", response_model=ImportResponse)
+async def import_expenses(request: Request, format: Optional[str] = Query(None, pattern="^(ndjson|csv)$")):
+    """Stream an NDJSON or CSV body into the table; format defaults from Content-Type"""
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    return await get_bulk_handler().import_expenses(request.stream(), fmt)
+
+@app.get("/expenses/export")
+async def export_expenses(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """Stream every expense as NDJSON or CSV while the table is scanned"""
+    from src.handlers.bulk_handler import FORMATS
+    return StreamingResponse(
+        get_bulk_handler().export_expenses(format),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="expenses.{format}"'}
+    )
 
 @app.get("/expenses/{expense_id}", response_model=ExpenseResponse)
-async def get_expense(expense_id: str):
+async def get_expense(expense_id: str, response: Response):
     """Get expense by ID"""
-    return expense_handler.get_expense(expense_id)
+    expense = await get_expense_handler().get_expense(expense_id)
+    response.headers["ETag"] = etag(expense)
+    return expense
 
 @app.put("/expenses/{expense_id}", response_model=ExpenseResponse)
-async def update_expense(expense_id: str, expense_update: ExpenseUpdate):
-    """Update an existing expense"""
-    return expense_handler.update_expense(expense_id, expense_update)
+async def update_expense(
+    expense_id: str,
+    expense_update: ExpenseUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None)
+):
+    """Update an existing expense; send If-Match with the ETag to guard against lost updates"""
+    updated = await get_expense_handler().update_expense(expense_id, expense_update, parse_if_match(if_match))
+    response.headers["ETag"] = etag(updated)
+    return updated
 
 @app.delete("/expenses/{expense_id}")
-async def delete_expense(expense_id: str):
-    """Delete an expense"""
-    return expense_handler.delete_expense(expense_id)
+async def delete_expense(expense_id: str, if_match: Optional[str] = Header(None)):
+    """Delete an expense and return the deleted record"""
+    return await get_expense_handler().delete_expense(expense_id, parse_if_match(if_match))
 
 @app.get("/expenses", response_model=List[ExpenseResponse])
-async def list_expenses(limit: int = 50):
-    """List all expenses"""
-    return expense_handler.list_expenses(limit)
+async def list_expenses(
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    client: Optional[str] = None,
+    service: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    min_cost: Optional[Decimal] = Query(None, ge=0),
+    max_cost: Optional[Decimal] = Query(None, ge=0),
+    sort: Optional[str] = Query(None, pattern="^-?date$", description="date or -date (newest first)"),
+    fields: Optional[str] = Query(None, description="Comma-separated response fields, e.g. cost,date")
+):
+    """List expenses one page at a time, filtered, sorted and trimmed to `fields`
+    
+    The next page's cursor is in X-Next-Cursor and the index the read used in
+    X-Query-Plan. Client and service filters match case-insensitively.
+    """
+    from src.handlers.expense_handler import sparse_fields
+    from src.handlers.responses import FastJSONResponse, expense_documents
+    requested = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    items, next_cursor, plan = await get_expense_handler().list_expense_items(
+        limit, cursor, client, service, start_date, end_date, min_cost, max_cost, sort, requested
+    )
+    headers = {"X-Query-Plan": plan}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    # Stored items are encoded directly; response_model only documents the schema
+    return FastJSONResponse(
+        expense_documents(items, sparse_fields(requested) if requested else None),
+        headers=headers
+    )
+
+# Analytics endpoints; plain def so FastAPI runs the fan-out reads on its threadpool
+@app.get("/cost-breakdown")
+def cost_breakdown(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    group_by: str = Query("service", pattern=f"^{GROUP_BY_PATTERN}(,{GROUP_BY_PATTERN})*$"),
+    client: Optional[str] = None,
+    service: Optional[str] = None,
+    metrics: Optional[str] = Query(None, description="Comma-separated: min, max, avg, pNN"),
+    layout: str = Query("flat", pattern="^(flat|nested|pivot)$"),
+    currency: Optional[str] = None
+):
+    """Cost totals and shares per group, e.g. group_by=service,month; defaults to the last 30 whole days by service"""
+    return get_cost_analysis_handler().get_cost_breakdown(
+        start_date, end_date, group_by, client, service,
+        metrics.split(",") if metrics else (), layout, currency
+    )
+
+@app.get("/monthly-trends")
+def monthly_trends(months: int = Query(6, ge=1, le=36), currency: Optional[str] = None):
+    """Cost and expense count per month over the last N months"""
+    return get_cost_analysis_handler().get_monthly_trends(months, currency)
+
+@app.get("/top-services")
+def top_services(limit: int = Query(10, ge=1, le=100), currency: Optional[str] = None):
+    """Services ranked by all-time cost"""
+    return get_cost_analysis_handler().get_top_services(limit, currency)
+
+@app.get("/forecast")
+def cost_forecast(
+    dimension: str = Query("service", pattern="^(service|client)$"),
+    days: int = Query(14, ge=1, le=90),
+    history: int = Query(90, ge=14, le=730),
+    client: Optional[str] = None,
+    service: Optional[str] = None,
+    currency: Optional[str] = None
+):
+    """Expected daily cost per service or client over the next N days, with a 95% band"""
+    return get_cost_analysis_handler().get_forecast(dimension, days, history, client, service, currency)
+
+@app.get("/anomalies")
+def cost_anomalies(
+    dimension: str = Query("service", pattern="^(service|client)$"),
+    history: int = Query(90, ge=15, le=730),
+    threshold: float = Query(3.0, gt=0),
+    client: Optional[str] = None,
+    service: Optional[str] = None,
+    currency: Optional[str] = None
+):
+    """Days where a service's or client's cost strayed from its seasonal baseline"""
+    return get_cost_analysis_handler().get_anomalies(dimension, history, threshold, client, service, currency)
+
+@app.post("/cost-allocation")
+def cost_allocation(request: AllocationRequest):
+    """Shared costs split across clients by ordered rules; defaults to the last 30 whole days"""
+    return get_cost_analysis_handler().get_cost_allocation(
+        [rule.model_dump() for rule in request.rules], request.start_date, request.end_date, request.currency
+    )
+
+# Budget endpoints; scope is client or service
+@app.put("/budgets/{scope}/{name}", response_model=BudgetStatus)
+def set_budget(budget: BudgetSet, scope: str = Path(..., pattern="^(client|service)$"), name: str = Path(...)):
+    """Set a monthly budget (default: this month); alerts fire at 50, 80 and 100% of the limit"""
+    return get_budget_handler().set_budget(scope, name, budget)
+
+@app.get("/budgets/{scope}/{name}", response_model=BudgetStatus)
+def budget_status(
+    scope: str = Path(..., pattern="^(client|service)$"),
+    name: str = Path(...),
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    currency: Optional[str] = None
+):
+    """Limit, spend so far and alerts sent for one budget month"""
+    return get_budget_handler().get_budget_status(scope, name, month, currency)
 
 # Global exception handler
 @app.exception_handler(Exception)
@@ -0,0 +1,324 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import os
+import sys
+import time
+
+# Metrics are recorded unless METRICS_ENABLED=false; EMF log lines are written
+# by default only inside Lambda, where CloudWatch turns them into metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() != 'false'
+METRICS_EMF = os.getenv('METRICS_EMF', 'true' if os.getenv('AWS_LAMBDA_FUNCTION_NAME') else 'false').lower() == 'true'
+METRICS_NAMESPACE = os.getenv('METRICS_NAMESPACE', 'ServerlessCostTracker')
+
+# Instrumentation may add at most this much to a request; benchmarks/bench_metrics_overhead.py checks it
+OVERHEAD_BUDGET_SECONDS = 0.0005
+
+# Histogram upper bounds in seconds, from 1ms to 10s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OVERHEAD_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025)
+
+# Operations that consume read capacity; everything else that reports capacity is a write
+READ_OPERATIONS = frozenset(('GetItem', 'BatchGetItem', 'Query', 'Scan', 'TransactGetItems'))
+# Operations that accept ReturnConsumedCapacity
+CAPACITY_OPERATIONS = READ_OPERATIONS | {
+    'PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem', 'TransactWriteItems'
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+    
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+    
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Counters and histograms for this container, keyed by name and label set"""
+    
+    def __init__(self):
+        self._lock = Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.help: Dict[str, str] = {}
+    
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def observe(self, name: str, value: float, bounds: Tuple[float, ...] = LATENCY_BUCKETS, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(bounds)
+            histogram.observe(value)
+    
+    def describe(self, name: str, text: str) -> None:
+        self.help[name] = text
+    
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+    
+    def render_prometheus(self) -> str:
+        """The registry in Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, (histogram.bounds, list(histogram.counts), histogram.total, histogram.count))
+                for key, histogram in self.histograms.items()
+            )
+        
+        lines: List[str] = []
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.extend(self._header(name, 'counter'))
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), (bounds, counts, total, count) in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.extend(self._header(name, 'histogram'))
+            cumulative = 0
+            for bound, bucket in zip(bounds, counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+    
+    def _header(self, name: str, kind: str) -> List[str]:
+        header = [f"# HELP {name} {self.help[name]}"] if name in self.help else []
+        return header + [f"# TYPE {name} {kind}"]
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+registry = MetricsRegistry()
+registry.describe('http_request_duration_seconds', 'Request latency by route template, method and status')
+registry.describe('dynamodb_call_duration_seconds', 'DynamoDB API call latency by operation')
+registry.describe('dynamodb_consumed_read_capacity_total', 'Read capacity units reported by ReturnConsumedCapacity')
+registry.describe('dynamodb_consumed_write_capacity_total', 'Write capacity units reported by ReturnConsumedCapacity')
+registry.describe('dynamodb_items_scanned_total', 'Items read by Scan and Query before filters')
+registry.describe('dynamodb_items_returned_total', 'Items returned by Scan and Query after filters')
+registry.describe('invocations_total', 'Requests by cold or warm container start')
+registry.describe('metrics_overhead_seconds', 'Time spent recording metrics per request')
+
+
+class RequestMetrics:
+    """DynamoDB work attributed to one request; shared by the threads serving it"""
+    
+    __slots__ = ('calls', 'latency', 'read_units', 'write_units', 'scanned', 'returned', 'overhead', '_lock')
+    
+    def __init__(self):
+        self.calls = 0
+        self.latency = 0.0
+        self.read_units = 0.0
+        self.write_units = 0.0
+        self.scanned = 0
+        self.returned = 0
+        self.overhead = 0.0
+        self._lock = Lock()
+
+
+# The current request's accumulator; worker threads see it when started with a copied context
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar('current_request', default=None)
+
+
+def instrument_client(client) -> None:
+    """Hook a botocore DynamoDB client: ask for consumed capacity and time every call"""
+    if not METRICS_ENABLED:
+        return
+    events = client.meta.events
+    events.register('provide-client-params.dynamodb.*', _request_capacity)
+    events.register('before-call.dynamodb.*', _before_call)
+    events.register('after-call.dynamodb.*', _after_call)
+
+
+def _request_capacity(params, model, **kwargs):
+    if model.name in CAPACITY_OPERATIONS:
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+
+def _before_call(model, context, **kwargs):
+    context['metrics_started'] = time.perf_counter()
+
+
+def _after_call(parsed, model, context, **kwargs):
+    started = context.get('metrics_started')
+    if started is None:
+        return
+    finished = time.perf_counter()
+    operation = model.name
+    elapsed = finished - started
+    
+    capacity = parsed.get('ConsumedCapacity') or []
+    if isinstance(capacity, dict):
+        capacity = [capacity]
+    units = sum(entry.get('CapacityUnits', 0) for entry in capacity)
+    is_read = operation in READ_OPERATIONS
+    scanned = parsed.get('ScannedCount')
+    returned = parsed.get('Count')
+    
+    registry.observe('dynamodb_call_duration_seconds', elapsed, operation=operation)
+    if units:
+        registry.increment(
+            'dynamodb_consumed_read_capacity_total' if is_read else 'dynamodb_consumed_write_capacity_total',
+            units,
+            operation=operation
+        )
+    if scanned is not None:
+        registry.increment('dynamodb_items_scanned_total', scanned, operation=operation)
+        registry.increment('dynamodb_items_returned_total', returned or 0, operation=operation)
+    
+    request = current_request.get()
+    if request is not None:
+        with request._lock:
+            request.calls += 1
+            request.latency += elapsed
+            if is_read:
+                request.read_units += units
+            else:
+                request.write_units += units
+            request.scanned += scanned or 0
+            request.returned += returned or 0
+            request.overhead += time.perf_counter() - finished
+
+
+_cold_start = True
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, DynamoDB work and cold starts per request
+    
+    Routes are labelled by their template (/expenses/{expense_id}), keeping label
+    cardinality bounded. With EMF enabled each request also writes one CloudWatch
+    Embedded Metric Format line to stdout, which Lambda ships to CloudWatch Logs
+    and CloudWatch extracts asynchronously, so no PutMetricData call is made.
+    """
+    
+    def __init__(self, app, emf: Optional[bool] = None, stream=None):
+        self.app = app
+        self.emf = METRICS_EMF if emf is None else emf
+        self.stream = stream
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        
+        global _cold_start
+        cold, _cold_start = _cold_start, False
+        request = RequestMetrics()
+        token = current_request.set(request)
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+        
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finished = time.perf_counter()
+            current_request.reset(token)
+            self._record(scope, request, cold, status_code, finished - started)
+            request.overhead += time.perf_counter() - finished
+            registry.observe('metrics_overhead_seconds', request.overhead, OVERHEAD_BUCKETS)
+    
+    def _record(self, scope, request: RequestMetrics, cold: bool, status_code: int, elapsed: float) -> None:
+        route = _route_template(scope)
+        method = scope.get('method', '')
+        registry.observe(
+            'http_request_duration_seconds', elapsed, route=route, method=method, status=str(status_code)
+        )
+        registry.increment('invocations_total', start='cold' if cold else 'warm')
+        if self.emf:
+            self._emit(scope, request, route, method, status_code, elapsed, cold)
+    
+    def _emit(self, scope, request: RequestMetrics, route: str, method: str, status_code: int, elapsed: float, cold: bool):
+        """Write one EMF log line; CloudWatch indexes the metrics by Route"""
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Route"]],
+                    "Metrics": _EMF_METRICS
+                }]
+            },
+            "Route": f"{method} {route}",
+            "StatusCode": status_code,
+            "Latency": round(elapsed * 1000, 3),
+            "DynamoDBCalls": request.calls,
+            "DynamoDBLatency": round(request.latency * 1000, 3),
+            "ConsumedReadCapacity": request.read_units,
+            "ConsumedWriteCapacity": request.write_units,
+            "ItemsScanned": request.scanned,
+            "ItemsReturned": request.returned,
+            "ColdStart": int(cold)
+        }
+        context = scope.get('aws.context')
+        if context is not None:
+            record["RequestId"] = getattr(context, 'aws_request_id', None)
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(record, separators=(',', ':')) + "\n")
+
+
+_EMF_METRICS = [
+    {"Name": "Latency", "Unit": "Milliseconds"},
+    {"Name": "DynamoDBCalls", "Unit": "Count"},
+    {"Name": "DynamoDBLatency", "Unit": "Milliseconds"},
+    {"Name": "ConsumedReadCapacity", "Unit": "Count"},
+    {"Name": "ConsumedWriteCapacity", "Unit": "Count"},
+    {"Name": "ItemsScanned", "Unit": "Count"},
+    {"Name": "ItemsReturned", "Unit": "Count"},
+    {"Name": "ColdStart", "Unit": "Count"},
+]
+
+
+def _route_template(scope) -> str:
+    """The matched route's path template, or "unmatched" for 404s"""
+    route = scope.get('route')
+    if route is not None and hasattr(route, 'path'):
+        return route.path
+    app = scope.get('app')
+    if app is not None:
+        from starlette.routing import Match
+        for candidate in app.router.routes:
+            match, _ = candidate.matches(scope)
+            if match == Match.FULL:
+                return getattr(candidate, 'path', 'unmatched')
+    return 'unmatched'
@@ -0,0 +1,35 @@
+from pydantic import BaseModel, Field, validator
+from datetime import datetime
+from typing import Dict, List, Optional
+from decimal import Decimal
+
+from src.models.expense import validate_currency_code
+
+class AllocationRuleSpec(BaseModel):
+    name: Optional[str] = Field(None, max_length=100)
+    # Glob patterns (*, ?, [...]) matched against whole names ignoring case; omitted matches any
+    service: Optional[str] = Field(None, min_length=1, max_length=100)
+    client: Optional[str] = Field(None, min_length=1, max_length=50)
+    # Matched anywhere in the description unless it uses globs itself
+    description: Optional[str] = Field(None, min_length=1, max_length=500)
+    # Target client -> weight; shares are proportional to the weights
+    split: Dict[str, Decimal] = Field(..., min_length=1, max_length=100)
+    
+    @validator('split')
+    def validate_split(cls, v):
+        if any(weight <= 0 for weight in v.values()):
+            raise ValueError('Split weights must be positive')
+        if any(not target.strip() for target in v):
+            raise ValueError('Split targets must be client names')
+        return v
+
+class AllocationRequest(BaseModel):
+    # Applied in order; the first rule matching an expense splits it, unmatched expenses stay with their client
+    rules: List[AllocationRuleSpec] = Field(..., min_length=1, max_length=1000)
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    currency: Optional[str] = Field(None, min_length=3, max_length=3)
+    
+    @validator('currency')
+    def validate_currency(cls, v):
+        return validate_currency_code(v) if v is not None else v
@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field, validator
+from typing import Optional
+from decimal import Decimal
+
+from src.models.expense import validate_currency_code
+from src.models.money import DEFAULT_CURRENCY, currency_exponent
+
+class BudgetSet(BaseModel):
+    # Declared before limit so the limit validator can round to its precision
+    currency: str = Field(DEFAULT_CURRENCY, min_length=3, max_length=3)
+    limit: Decimal = Field(..., gt=0, le=100000000)
+    month: Optional[str] = Field(None, pattern=r'^\d{4}-(0[1-9]|1[0-2])$')
+    
+    _currency = validator('currency', allow_reuse=True)(validate_currency_code)
+    
+    @validator('limit')
+    def validate_limit(cls, v, values):
+        rounded = round(v, currency_exponent(values.get('currency', DEFAULT_CURRENCY)))
+        # A zero limit reads as no limit, so it would never alert
+        if rounded <= 0:
+            raise ValueError("Limit rounds to zero at this currency's precision")
+        return rounded
+
+class BudgetStatus(BaseModel):
+    scope: str
+    name: str
+    month: str
+    currency: str
+    limit: Optional[float] = None
+    spent: float
+    remaining: Optional[float] = None
+    percent_used: Optional[float] = None
+    expense_count: int
+    alerted_threshold: int = 0
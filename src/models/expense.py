@@ -1,21 +1,44 @@
 from pydantic import BaseModel, Field, validator
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime, time
+from typing import Dict, List, Optional
 from decimal import Decimal
 import uuid
 
+from src.models.money import DEFAULT_CURRENCY, currency_exponent
+
+def validate_currency_code(v: str) -> str:
+    v = v.upper()
+    currency_exponent(v)
+    return v
+
 class ExpenseBase(BaseModel):
     service_name: str = Field(..., min_length=1, max_length=100)
     client: str = Field(..., min_length=1, max_length=50)
+    # Declared before cost so the cost validator can round to its precision
+    currency: str = Field(DEFAULT_CURRENCY, min_length=3, max_length=3)
     cost: Decimal = Field(..., gt=0, le=100000)
     date: datetime = Field(default_factory=datetime.now)
     description: Optional[str] = Field(None, max_length=500)
     
+    _currency = validator('currency', allow_reuse=True)(validate_currency_code)
+    
+    @validator('date', pre=True)
+    def validate_date(cls, v):
+        # Imports often carry calendar dates; Pydantic before 2.6 rejects them as datetimes
+        if isinstance(v, str) and len(v) == 10:
+            try:
+                v = date.fromisoformat(v)
+            except ValueError:
+                return v
+        if isinstance(v, date) and not isinstance(v, datetime):
+            return datetime.combine(v, time())
+        return v
+    
     @validator('cost')
-    def validate_cost(cls, v):
+    def validate_cost(cls, v, values):
         if v <= 0:
             raise ValueError('Cost must be positive')
-        return round(v, 2)
+        return round(v, currency_exponent(values.get('currency', DEFAULT_CURRENCY)))
     
     class Config:
         json_encoders = {
@@ -29,13 +52,47 @@ class ExpenseCreate(ExpenseBase):
 class ExpenseUpdate(BaseModel):
     service_name: Optional[str] = Field(None, min_length=1, max_length=100)
     client: Optional[str] = Field(None, min_length=1, max_length=50)
+    currency: Optional[str] = Field(None, min_length=3, max_length=3)
     cost: Optional[Decimal] = Field(None, gt=0, le=100000)
     description: Optional[str] = Field(None, max_length=500)
+    
+    _currency = validator('currency', allow_reuse=True)(validate_currency_code)
+    
+    @validator('cost', always=True)
+    def validate_cost(cls, v, values):
+        if v is None:
+            # cost_units are derived from cost, so a currency change must restate the cost
+            if values.get('currency'):
+                raise ValueError('Cost is required when changing currency')
+            return v
+        return round(v, currency_exponent(values.get('currency') or DEFAULT_CURRENCY))
 
 class ExpenseResponse(ExpenseBase):
     expense_id: str
     created_at: datetime
     updated_at: datetime
+    version: int = 1
     
     class Config:
         from_attributes = True
+
+# ExpenseResponse fields in output order; sparse listings (GET /expenses?fields=) choose among these
+EXPENSE_FIELDS = tuple(ExpenseResponse.model_fields)
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: str
+    expense: Optional[ExpenseResponse] = None
+    error: Optional[str] = None
+    # True when the item's idempotency_key had already created this expense
+    replayed: bool = False
+
+class BatchCreateResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BatchItemResult]
+
+class ImportResponse(BaseModel):
+    imported: int
+    failed: int
+    errors: List[Dict]
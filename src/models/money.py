@@ -0,0 +1,85 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Union
+import os
+
+# ISO 4217 minor-unit exponents; amounts are stored as integers in these units
+CURRENCY_EXPONENTS = {
+    'USD': 2, 'EUR': 2, 'GBP': 2, 'CAD': 2, 'AUD': 2, 'CHF': 2, 'CNY': 2,
+    'INR': 2, 'SGD': 2, 'HKD': 2, 'SEK': 2, 'NOK': 2, 'DKK': 2, 'BRL': 2,
+    'MXN': 2, 'ZAR': 2, 'JPY': 0, 'KRW': 0, 'BHD': 3, 'KWD': 3,
+}
+
+DEFAULT_CURRENCY = os.getenv('DEFAULT_CURRENCY', 'USD')
+
+Number = Union[Decimal, int, float, str]
+
+
+def currency_exponent(currency: str) -> int:
+    """Minor-unit exponent for a supported currency code"""
+    try:
+        return CURRENCY_EXPONENTS[currency]
+    except KeyError:
+        raise ValueError(f"Unsupported currency: {currency}")
+
+
+def to_minor_units(amount: Number, currency: str = DEFAULT_CURRENCY) -> int:
+    """Convert an amount to integer minor units, rounding half up at the currency's precision"""
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    scaled = amount.scaleb(currency_exponent(currency))
+    units = int(scaled)
+    return units if units == scaled else int(scaled.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor_units(units: Union[int, float], currency: str = DEFAULT_CURRENCY) -> Decimal:
+    """Convert minor units back to an amount, rounded to the currency's precision"""
+    exponent = currency_exponent(currency)
+    if isinstance(units, int):
+        return Decimal(units).scaleb(-exponent)
+    return Decimal(repr(units)).scaleb(-exponent).quantize(Decimal(1).scaleb(-exponent), rounding=ROUND_HALF_UP)
+
+
+def to_amount(units: Union[int, float], currency: str = DEFAULT_CURRENCY) -> float:
+    """Minor units as a JSON-friendly amount; used only at the response boundary"""
+    return float(from_minor_units(units, currency))
+
+
+class Money:
+    """An exact amount of one currency, held as integer minor units"""
+    
+    __slots__ = ('units', 'currency')
+    
+    def __init__(self, units: int, currency: str = DEFAULT_CURRENCY):
+        currency_exponent(currency)
+        self.units = int(units)
+        self.currency = currency
+    
+    @classmethod
+    def of(cls, amount: Number, currency: str = DEFAULT_CURRENCY) -> "Money":
+        return cls(to_minor_units(amount, currency), currency)
+    
+    @property
+    def amount(self) -> Decimal:
+        return from_minor_units(self.units, self.currency)
+    
+    def __add__(self, other: "Money") -> "Money":
+        if not isinstance(other, Money):
+            return NotImplemented
+        if other.currency != self.currency:
+            raise ValueError(f"Cannot add {other.currency} to {self.currency}")
+        return Money(self.units + other.units, self.currency)
+    
+    def __radd__(self, other):
+        # Lets sum() start from 0
+        if other == 0:
+            return self
+        return NotImplemented
+    
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Money) and (self.units, self.currency) == (other.units, other.currency)
+    
+    def __hash__(self) -> int:
+        return hash((self.units, self.currency))
+    
+    def __repr__(self) -> str:
+        return f"Money({self.amount} {self.currency})"
@@ -0,0 +1,66 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Budget alerts go to this SNS topic; without it they are kept in memory
+ALERTS_TOPIC_ARN = os.getenv('ALERTS_TOPIC_ARN')
+
+# Alerts an in-memory notifier keeps before dropping the oldest
+IN_MEMORY_ALERT_LIMIT = 1000
+
+
+class Notifier(ABC):
+    """Delivers alert messages; a subject line plus a JSON-serializable body"""
+    
+    @abstractmethod
+    def publish(self, subject: str, message: Dict) -> None:
+        ...
+
+
+class SNSNotifier(Notifier):
+    """Publishes alerts to an SNS topic; the SNS client is built on first publish"""
+    
+    def __init__(self, topic_arn: str):
+        self.topic_arn = topic_arn
+        self._client = None
+    
+    def publish(self, subject: str, message: Dict) -> None:
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('sns', region_name=os.getenv('AWS_REGION', 'us-east-1'))
+        # SNS subjects are limited to 100 characters
+        self._client.publish(
+            TopicArn=self.topic_arn,
+            Subject=subject[:100],
+            Message=json.dumps(message, default=str)
+        )
+
+
+class InMemoryNotifier(Notifier):
+    """Keeps the most recent published alerts; for tests and deployments without a topic"""
+    
+    def __init__(self, limit: Optional[int] = IN_MEMORY_ALERT_LIMIT):
+        self.messages: Deque[Tuple[str, Dict]] = deque(maxlen=limit)
+    
+    def publish(self, subject: str, message: Dict) -> None:
+        self.messages.append((subject, message))
+
+
+_notifier: Optional[Notifier] = None
+
+
+def get_notifier() -> Notifier:
+    """Shared notifier for this container: SNS when ALERTS_TOPIC_ARN is set, else in-memory"""
+    global _notifier
+    if _notifier is None:
+        if ALERTS_TOPIC_ARN:
+            _notifier = SNSNotifier(ALERTS_TOPIC_ARN)
+        else:
+            logger.warning("ALERTS_TOPIC_ARN is not set; budget alerts are kept in memory and not delivered")
+            _notifier = InMemoryNotifier()
+    return _notifier
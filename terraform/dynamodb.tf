@@ -3,32 +3,56 @@ resource "aws_dynamodb_table" "expenses_table" {
   billing_mode   = "PAY_PER_REQUEST"  # Free tier friendly
   hash_key       = "expense_id"
   
+  # Stream old and new images so the rollup consumer can apply exact deltas
+  stream_enabled   = true
+  stream_view_type = "NEW_AND_OLD_IMAGES"
+  
   attribute {
     name = "expense_id"
     type = "S"
   }
   
-  # Global Secondary Index for querying by client
+  # Global Secondary Index for querying by client (lowercased), sorted by date
   global_secondary_index {
     name            = "client-index"
-    hash_key        = "client"
+    hash_key        = "client_key"
+    range_key       = "date"
     projection_type = "ALL"
   }
   
   attribute {
-    name = "client"
+    name = "client_key"
     type = "S"
   }
   
-  # Global Secondary Index for querying by service
+  # Global Secondary Index for querying by service (lowercased), sorted by date
   global_secondary_index {
     name            = "service-index"
-    hash_key        = "service_name"
+    hash_key        = "service_key"
+    range_key       = "date"
+    projection_type = "ALL"
+  }
+  
+  attribute {
+    name = "service_key"
+    type = "S"
+  }
+  
+  # Global Secondary Index for date-range queries, bucketed by month (YYYY-MM)
+  global_secondary_index {
+    name            = "date-index"
+    hash_key        = "month_bucket"
+    range_key       = "date"
     projection_type = "ALL"
   }
   
   attribute {
-    name = "service_name"
+    name = "month_bucket"
+    type = "S"
+  }
+  
+  attribute {
+    name = "date"
     type = "S"
   }
   
@@ -38,3 +62,80 @@ resource "aws_dynamodb_table" "expenses_table" {
     Project     = var.project_name
   }
 }
+
+# Pre-aggregated totals per day/month/all-time, maintained from the expenses stream
+resource "aws_dynamodb_table" "expense_rollups" {
+  name           = var.rollups_table_name
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "period"
+  range_key      = "rollup_key"
+  
+  attribute {
+    name = "period"
+    type = "S"
+  }
+  
+  attribute {
+    name = "rollup_key"
+    type = "S"
+  }
+  
+  # Expires the markers of stream records already applied
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+  
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-rollups"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# Monthly budgets and running spend per client and service, updated transactionally with each expense write
+resource "aws_dynamodb_table" "expense_budgets" {
+  name           = var.budgets_table_name
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "budget_key"
+  range_key      = "month"
+  
+  attribute {
+    name = "budget_key"
+    type = "S"
+  }
+  
+  attribute {
+    name = "month"
+    type = "S"
+  }
+  
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-budgets"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# One record per client-supplied Idempotency-Key, written in the same transaction as the expense it created
+resource "aws_dynamodb_table" "expense_idempotency" {
+  name           = var.idempotency_table_name
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "idempotency_key"
+  
+  attribute {
+    name = "idempotency_key"
+    type = "S"
+  }
+  
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+  
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-idempotency"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
@@ -34,6 +34,7 @@ resource "aws_iam_policy" "lambda_dynamodb_policy" {
         Effect = "Allow"
         Action = [
           "dynamodb:GetItem",
+          "dynamodb:BatchGetItem",
           "dynamodb:PutItem",
           "dynamodb:UpdateItem",
           "dynamodb:DeleteItem",
@@ -42,7 +43,61 @@ resource "aws_iam_policy" "lambda_dynamodb_policy" {
         ]
         Resource = [
           aws_dynamodb_table.expenses_table.arn,
-          "${aws_dynamodb_table.expenses_table.arn}/index/*"
+          "${aws_dynamodb_table.expenses_table.arn}/index/*",
+          aws_dynamodb_table.expense_rollups.arn,
+          aws_dynamodb_table.expense_budgets.arn,
+          aws_dynamodb_table.expense_idempotency.arn
+        ]
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "sns:Publish"
+        ]
+        Resource = [
+          aws_sns_topic.cost_alerts.arn
+        ]
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:BatchWriteItem"
+        ]
+        Resource = [
+          aws_dynamodb_table.expenses_table.arn,
+          aws_dynamodb_table.expense_rollups.arn
+        ]
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:DescribeStream",
+          "dynamodb:GetRecords",
+          "dynamodb:GetShardIterator",
+          "dynamodb:ListStreams"
+        ]
+        Resource = [
+          aws_dynamodb_table.expenses_table.stream_arn
+        ]
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject",
+          "s3:DeleteObject"
+        ]
+        Resource = [
+          "${aws_s3_bucket.snapshots.arn}/*"
+        ]
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:ListBucket"
+        ]
+        Resource = [
+          aws_s3_bucket.snapshots.arn
         ]
       }
     ]
@@ -74,8 +129,15 @@ resource "aws_lambda_function" "cost_tracker_api" {
 
   environment {
     variables = {
-      EXPENSES_TABLE = aws_dynamodb_table.expenses_table.name
-      AWS_REGION     = var.aws_region
+      EXPENSES_TABLE    = aws_dynamodb_table.expenses_table.name
+      ROLLUPS_TABLE     = aws_dynamodb_table.expense_rollups.name
+      BUDGETS_TABLE     = aws_dynamodb_table.expense_budgets.name
+      IDEMPOTENCY_TABLE = aws_dynamodb_table.expense_idempotency.name
+      ALERTS_TOPIC_ARN  = aws_sns_topic.cost_alerts.arn
+      INDEX_SHARDS      = tostring(var.index_shards)
+      SNAPSHOT_BUCKET   = aws_s3_bucket.snapshots.bucket
+      AWS_REGION        = var.aws_region
+      ENABLE_DOCS       = var.environment == "prod" ? "false" : "true"
     }
   }
 
@@ -91,6 +153,44 @@ resource "aws_lambda_function" "cost_tracker_api" {
   }
 }
 
+# Stream consumer that keeps the rollup table in step with expense writes
+resource "aws_lambda_function" "rollup_consumer" {
+  filename         = data.archive_file.lambda_zip.output_path
+  function_name    = "${var.project_name}-rollup-consumer"
+  role            = aws_iam_role.lambda_role.arn
+  handler         = "handlers.rollup_handler.handler"
+  runtime         = "python3.9"
+  timeout         = 60
+  memory_size     = 256
+
+  environment {
+    variables = {
+      EXPENSES_TABLE  = aws_dynamodb_table.expenses_table.name
+      ROLLUPS_TABLE   = aws_dynamodb_table.expense_rollups.name
+      SNAPSHOT_BUCKET = aws_s3_bucket.snapshots.bucket
+      AWS_REGION      = var.aws_region
+    }
+  }
+
+  depends_on = [
+    aws_iam_role_policy_attachment.lambda_basic_execution,
+    aws_iam_role_policy_attachment.lambda_dynamodb_policy_attachment,
+  ]
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+resource "aws_lambda_event_source_mapping" "expenses_stream" {
+  event_source_arn  = aws_dynamodb_table.expenses_table.stream_arn
+  function_name     = aws_lambda_function.rollup_consumer.arn
+  starting_position = "TRIM_HORIZON"
+  batch_size        = 100
+}
+
 # Create API Gateway
 resource "aws_apigatewayv2_api" "cost_tracker_api" {
   name          = "${var.project_name}-api"
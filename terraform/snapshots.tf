@@ -0,0 +1,70 @@
+# Columnar snapshots of closed months, read by analytics instead of DynamoDB
+resource "aws_s3_bucket" "snapshots" {
+  bucket_prefix = "${var.project_name}-snapshots-"
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+resource "aws_s3_bucket_public_access_block" "snapshots" {
+  bucket                  = aws_s3_bucket.snapshots.id
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
+
+# Compacts closed months that have no snapshot yet
+resource "aws_lambda_function" "snapshot_compactor" {
+  filename         = data.archive_file.lambda_zip.output_path
+  function_name    = "${var.project_name}-snapshot-compactor"
+  role            = aws_iam_role.lambda_role.arn
+  handler         = "handlers.snapshot_handler.handler"
+  runtime         = "python3.9"
+  timeout         = 900
+  memory_size     = 1024
+
+  environment {
+    variables = {
+      EXPENSES_TABLE           = aws_dynamodb_table.expenses_table.name
+      SNAPSHOT_BUCKET          = aws_s3_bucket.snapshots.bucket
+      SNAPSHOT_LOOKBACK_MONTHS = tostring(var.snapshot_lookback_months)
+      AWS_REGION               = var.aws_region
+    }
+  }
+
+  depends_on = [
+    aws_iam_role_policy_attachment.lambda_basic_execution,
+    aws_iam_role_policy_attachment.lambda_dynamodb_policy_attachment,
+  ]
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# Run compaction daily, so a month is snapshotted soon after it closes
+resource "aws_cloudwatch_event_rule" "daily_snapshot_compaction" {
+  name                = "${var.project_name}-daily-snapshot-compaction"
+  description         = "Compact closed months into columnar snapshots"
+  schedule_expression = "rate(1 day)"
+}
+
+resource "aws_cloudwatch_event_target" "snapshot_compactor_target" {
+  rule      = aws_cloudwatch_event_rule.daily_snapshot_compaction.name
+  target_id = "SnapshotCompactorLambdaTarget"
+  arn       = aws_lambda_function.snapshot_compactor.arn
+}
+
+resource "aws_lambda_permission" "allow_snapshot_schedule" {
+  statement_id  = "AllowExecutionFromCloudWatch"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.snapshot_compactor.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.daily_snapshot_compaction.arn
+}
@@ -21,3 +21,33 @@ variable "table_name" {
   type        = string
   default     = "expenses-table"
 }
+
+variable "rollups_table_name" {
+  description = "DynamoDB table holding pre-aggregated expense rollups"
+  type        = string
+  default     = "expense-rollups"
+}
+
+variable "budgets_table_name" {
+  description = "DynamoDB table holding monthly budgets and running spend counters"
+  type        = string
+  default     = "expense-budgets"
+}
+
+variable "idempotency_table_name" {
+  description = "DynamoDB table holding idempotency records for expense creates"
+  type        = string
+  default     = "expense-idempotency"
+}
+
+variable "index_shards" {
+  description = "Write shards per client/service index key; run backfill_index_keys after changing it"
+  type        = number
+  default     = 1
+}
+
+variable "snapshot_lookback_months" {
+  description = "Closed months the daily compaction keeps as columnar snapshots"
+  type        = number
+  default     = 24
+}
@@ -0,0 +1,20 @@
+import os
+
+# moto needs credentials to be resolvable when boto3 clients are built at import time
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+# moto ignores Segment/TotalSegments, so every segment would return the whole table
+os.environ.setdefault("SCAN_SEGMENTS", "1")
+
+# Each test gets a fresh moto table, so a shared cache would leak results between tests
+os.environ.setdefault("CACHE_BACKEND", "none")
+
+# Send rates learned from one test's simulated throttling would otherwise slow every later test
+os.environ.setdefault("DYNAMODB_ADAPTIVE_RATE", "false")
+
+try:
+    import locust  # noqa: F401
+except ImportError:
+    collect_ignore = ["locust_load_test.py"]
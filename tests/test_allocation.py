@@ -0,0 +1,153 @@
+import random
+from datetime import datetime, timedelta
+from moto import mock_dynamodb
+import boto3
+import pytest
+from fastapi.testclient import TestClient
+from src.analytics.allocation import Allocation, AllocationRules, split_units
+from src.database.dynamodb_client import DynamoDBClient
+from src.main import app
+
+
+def create_table():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    return dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'expense_id', 'AttributeType': 'S'},
+            {'AttributeName': 'month_bucket', 'AttributeType': 'S'},
+            {'AttributeName': 'date', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': 'date-index',
+            'KeySchema': [
+                {'AttributeName': 'month_bucket', 'KeyType': 'HASH'},
+                {'AttributeName': 'date', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def test_split_units_conserves_totals():
+    assert split_units(100, [1, 1, 1]) == [34, 33, 33]
+    assert split_units(-100, [1, 1, 1]) == [-34, -33, -33]
+    assert split_units(5, [3, 1]) == [4, 1]
+    assert split_units(2, [1, 5, 5]) == [0, 1, 1]
+    
+    rng = random.Random(3)
+    for _ in range(2000):
+        weights = [rng.randrange(1, 1000) for _ in range(rng.randrange(1, 8))]
+        units = rng.randrange(-10**9, 10**9)
+        shares = split_units(units, weights)
+        assert sum(shares) == units
+        # No share is more than one unit away from its exact proportion
+        assert all(abs(share * sum(weights) - units * weight) < sum(weights) for share, weight in zip(shares, weights))
+
+
+RULES = [
+    {"name": "shared database", "service": "RDS", "split": {"production": 3, "staging": 1}},
+    {"name": "tagged backups", "service": "S3", "description": "backup", "split": {"ops": 1}},
+    {"service": "S3", "client": "qa*", "split": {"staging": "0.5", "development": "0.5"}},
+    {"name": "platform", "client": "platform", "split": {"production": 1, "staging": 1, "development": 1}},
+    {"service": "cloud*", "split": {"production": 1}},
+]
+
+
+def test_dispatcher_matches_like_testing_every_rule():
+    rules = AllocationRules(RULES)
+    rng = random.Random(11)
+    services = ["RDS", "rds ", "S3", "CloudFront", "cloudwatch", "EC2"]
+    clients = ["QA", "qa-east", "Platform", "production", "staging"]
+    descriptions = [None, "nightly BACKUP", "upload", ""]
+    for _ in range(500):
+        service, client, description = rng.choice(services), rng.choice(clients), rng.choice(descriptions)
+        expected = next((rule for rule in rules.rules if rule.matches(service, client, description)), None)
+        assert rules.match(service, client, description) is expected
+    
+    assert rules.match("S3", "QA", "weekly backup").name == "tagged backups"
+    assert rules.match("S3", "QA", "images").name == "rule 3"
+    assert rules.match("EC2", "qa", None) is None
+    # Literal-service rules are only candidates for their own service
+    assert rules.candidates("EC2", "Platform") == (rules.rules[3],)
+    
+    with pytest.raises(ValueError):
+        AllocationRules([{"service": "EC2", "split": {"production": 0}}])
+
+
+def test_allocation_streams_and_merges_exactly():
+    rules = AllocationRules(RULES)
+    rng = random.Random(5)
+    items = [
+        {
+            "service_name": rng.choice(["RDS", "S3", "EC2", "CloudFront"]),
+            "client": rng.choice(["qa", "platform", "production"]),
+            "cost_units": rng.randrange(1, 100000),
+            "currency": rng.choice(["USD", "USD", "EUR"]),
+            "description": rng.choice([None, "backup job"])
+        }
+        for _ in range(3000)
+    ]
+    whole = Allocation.from_items(iter(items), rules)
+    parts = Allocation.from_items(items[:1000], rules).merge(Allocation.from_items(items[1000:], rules))
+    
+    usd = [item for item in items if item["currency"] == "USD"]
+    assert whole.total_units() == sum(item["cost_units"] for item in usd)
+    assert (whole.count, whole.totals, whole.rule_totals) == (len(usd), parts.totals, parts.rule_totals)
+    assert "platform" not in whole.by_client()
+    assert sum(units for _, units in whole.rule_totals.values()) == sum(
+        allocated for _, allocated in whole.totals.values()
+    )
+
+
+@mock_dynamodb
+def test_cost_allocation_endpoint():
+    create_table()
+    db_client = DynamoDBClient()
+    when = datetime.now() - timedelta(days=2)
+    for expense in [
+        {"service_name": "RDS", "client": "shared", "cost": 100.00},
+        {"service_name": "RDS", "client": "shared", "cost": 0.01},
+        {"service_name": "S3", "client": "staging", "cost": 20.00, "description": "Nightly backup"},
+        {"service_name": "EC2", "client": "production", "cost": 7.50},
+        {"service_name": "EC2", "client": "production", "cost": 9.00, "currency": "EUR"},
+    ]:
+        db_client.create_expense({**expense, "date": when})
+    client = TestClient(app)
+    
+    response = client.post("/cost-allocation", json={"rules": RULES[:2]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["summary"]["total_cost"] == 127.51
+    assert body["summary"]["allocated_cost"] == 120.01
+    assert body["summary"]["total_expenses"] == 4
+    assert body["metadata"]["query_plan"] == "date-index"
+    
+    by_client = {row["client"]: row for row in body["allocation"]}
+    assert set(by_client) == {"production", "staging", "ops"}
+    # 10001 cents split 3:1 rounds to 7501 + 2500, never losing a cent
+    assert (by_client["production"]["direct_cost"], by_client["production"]["allocated_cost"]) == (7.5, 75.01)
+    assert by_client["staging"]["total_cost"] == 25.0
+    assert by_client["ops"]["services"] == [
+        {"service": "S3", "total_cost": 20.0, "direct_cost": 0.0, "allocated_cost": 20.0}
+    ]
+    assert [(rule["name"], rule["matched_expenses"]) for rule in body["rules"]] == [
+        ("shared database", 2), ("tagged backups", 1)
+    ]
+    
+    euros = client.post("/cost-allocation", json={"rules": RULES[:1], "currency": "eur"}).json()
+    assert euros["allocation"] == [{
+        "client": "production", "total_cost": 9.0, "direct_cost": 9.0, "allocated_cost": 0.0, "percentage": 100.0,
+        "services": [{"service": "EC2", "total_cost": 9.0, "direct_cost": 9.0, "allocated_cost": 0.0}]
+    }]
+    
+    assert client.post("/cost-allocation", json={"rules": []}).status_code == 422
+    assert client.post("/cost-allocation", json={"rules": [{"split": {"production": -1}}]}).status_code == 422
+    
+    # Same whole-day default window and range check as /cost-breakdown
+    breakdown = client.get("/cost-breakdown").json()["summary"]
+    assert (body["summary"]["start_date"], body["summary"]["end_date"]) == (breakdown["start_date"], breakdown["end_date"])
+    reversed_range = {"rules": RULES[:1], "start_date": "2024-02-01T00:00:00", "end_date": "2024-01-01T00:00:00"}
+    assert client.post("/cost-allocation", json=reversed_range).status_code == 400
@@ -0,0 +1,243 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from moto import mock_dynamodb
+import boto3
+from botocore.exceptions import ClientError
+import pytest
+from fastapi.testclient import TestClient
+from src import main
+from src.database.budget_client import budget_deltas
+from src.handlers.expense_handler import ExpenseHandler
+from src.models.budget import BudgetSet
+from src.models.expense import ExpenseCreate, ExpenseUpdate
+from src.notifications.notifier import InMemoryNotifier, Notifier
+
+MONTH = "2024-05"
+
+
+def create_tables():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'expense_id', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    dynamodb.create_table(
+        TableName='expense-budgets',
+        KeySchema=[
+            {'AttributeName': 'budget_key', 'KeyType': 'HASH'},
+            {'AttributeName': 'month', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'budget_key', 'AttributeType': 'S'},
+            {'AttributeName': 'month', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    monkeypatch.setenv('BUDGETS_TABLE', 'expense-budgets')
+    with mock_dynamodb():
+        create_tables()
+        expense_handler = ExpenseHandler()
+        expense_handler.budgets.notifier = InMemoryNotifier()
+        yield expense_handler
+
+
+def expense(cost, client="Production", service="EC2", day=10):
+    return ExpenseCreate(service_name=service, client=client, cost=cost, date=datetime(2024, 5, day))
+
+
+def spent(handler, scope, name, month=MONTH):
+    status = handler.budgets.get_budget_status(scope, name, month)
+    return status.spent, status.expense_count
+
+
+def test_writes_move_counters_atomically(handler):
+    first = asyncio.run(handler.create_expense(expense(10.25)))
+    asyncio.run(handler.create_expense(expense(4.50, client="staging")))
+    assert spent(handler, "client", "production") == (10.25, 1)
+    assert spent(handler, "service", "ec2") == (14.75, 2)
+    
+    # Moving an expense to another client moves its spend with it
+    moved = asyncio.run(handler.update_expense(first.expense_id, ExpenseUpdate(client="Staging", cost=3)))
+    assert moved.version == 2
+    assert spent(handler, "client", "production") == (0.0, 0)
+    assert spent(handler, "client", "staging") == (7.5, 2)
+    assert spent(handler, "service", "EC2") == (7.5, 2)
+    
+    asyncio.run(handler.delete_expense(first.expense_id))
+    assert spent(handler, "client", "staging") == (4.5, 1)
+    assert spent(handler, "service", "EC2") == (4.5, 1)
+
+
+def test_failed_write_leaves_counters_alone(handler):
+    created = asyncio.run(handler.create_expense(expense(10)))
+    
+    with pytest.raises(Exception) as error:
+        asyncio.run(handler.update_expense(created.expense_id, ExpenseUpdate(cost=99), expected_version=5))
+    assert error.value.status_code == 412
+    assert spent(handler, "client", "production") == (10.0, 1)
+    
+    with pytest.raises(Exception) as error:
+        asyncio.run(handler.delete_expense("missing"))
+    assert error.value.status_code == 404
+
+
+def test_update_retries_when_item_changes_underneath(handler):
+    created = asyncio.run(handler.create_expense(expense(10)))
+    db_client = handler.db_client
+    real_read = db_client._read_for_write
+    raced = []
+    
+    def read_then_race(expense_id, expected_version):
+        current = real_read(expense_id, expected_version)
+        if not raced:
+            # Another writer commits between our read and our transaction
+            raced.append(True)
+            db_client.table.update_item(
+                Key={'expense_id': expense_id},
+                UpdateExpression='SET description = :d ADD version :one',
+                ExpressionAttributeValues={':d': 'raced', ':one': 1}
+            )
+        return current
+    
+    db_client._read_for_write = read_then_race
+    updated = db_client.update_expense(created.expense_id, {"cost": 25})
+    assert (updated['version'], updated['description']) == (3, 'raced')
+    assert spent(handler, "client", "production") == (25.0, 1)
+
+
+def test_thresholds_alert_once_each(handler):
+    budgets = handler.budgets
+    budgets.set_budget("client", "Production", BudgetSet(limit=100, month=MONTH))
+    
+    asyncio.run(handler.create_expense(expense(40)))
+    assert list(budgets.notifier.messages) == []
+    
+    asyncio.run(handler.create_expense(expense(15)))
+    asyncio.run(handler.create_expense(expense(1)))
+    # Jumping past 80 and 100 at once sends only the highest
+    asyncio.run(handler.create_expense(expense(50)))
+    
+    thresholds = [message["threshold"] for _, message in budgets.notifier.messages]
+    assert thresholds == [50, 100]
+    status = budgets.get_budget_status("client", "production", MONTH)
+    assert (status.limit, status.spent, status.remaining, status.percent_used) == (100.0, 106.0, -6.0, 106.0)
+    assert status.alerted_threshold == 100
+    
+    # Only the client has a budget; the service counter never alerts
+    assert {message["scope"] for _, message in budgets.notifier.messages} == {"client"}
+
+
+def test_setting_budget_mid_month_alerts_existing_spend(handler):
+    asyncio.run(handler.create_expense(expense(85)))
+    
+    status = handler.budgets.set_budget("service", "ec2", BudgetSet(limit=100, month=MONTH))
+    assert (status.spent, status.alerted_threshold) == (85.0, 80)
+    
+    # Raising the limit re-arms the alerts against it
+    status = handler.budgets.set_budget("service", "ec2", BudgetSet(limit=1000, month=MONTH))
+    assert status.alerted_threshold == 0
+    assert [message["threshold"] for _, message in handler.budgets.notifier.messages] == [80]
+
+
+def test_failed_publish_releases_alert_claim(handler):
+    class FailingNotifier(Notifier):
+        def publish(self, subject, message):
+            raise RuntimeError("SNS unavailable")
+    
+    budgets = handler.budgets
+    budgets.set_budget("client", "production", BudgetSet(limit=100, month=MONTH))
+    budgets.notifier = FailingNotifier()
+    asyncio.run(handler.create_expense(expense(60)))
+    assert budgets.get_budget_status("client", "production", MONTH).alerted_threshold == 0
+    
+    # Setting the limit still succeeds, with the alert left for a later write
+    status = budgets.set_budget("client", "production", BudgetSet(limit=100, month=MONTH))
+    assert (status.limit, status.alerted_threshold) == (100.0, 0)
+    
+    # The next write retries the alert that was never delivered
+    budgets.notifier = InMemoryNotifier()
+    asyncio.run(handler.create_expense(expense(1)))
+    assert [message["threshold"] for _, message in budgets.notifier.messages] == [50]
+    assert budgets.get_budget_status("client", "production", MONTH).alerted_threshold == 50
+
+
+def test_concurrent_alert_claims_pick_one_winner(handler):
+    budgets = handler.budgets
+    budgets.set_budget("client", "production", BudgetSet(limit=10, month=MONTH))
+    key = next(iter(budget_deltas(None, {"client": "production", "service_name": "EC2", "cost_units": 1, "date": MONTH})))[0]
+    
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        claims = list(executor.map(lambda _: budgets.budgets.claim_alert(key, MONTH, 50), range(16)))
+    assert claims.count(True) == 1
+
+
+def test_batch_create_updates_counters(handler):
+    result = asyncio.run(handler.create_expenses_bulk([
+        {"service_name": "S3", "client": "production", "cost": 2.5, "date": "2024-05-03T00:00:00"}
+        for _ in range(30)
+    ]))
+    assert result.created == 30
+    assert spent(handler, "service", "S3") == (75.0, 30)
+
+
+def test_batch_reports_stored_items_when_counters_fail(handler, monkeypatch, caplog):
+    table = handler.budgets.budgets.table
+    real_update = table.update_item
+    
+    def update_item(**kwargs):
+        if kwargs['Key']['budget_key'].startswith('service#'):
+            raise ClientError({'Error': {'Code': 'InternalServerError', 'Message': 'counter write failed'}}, 'UpdateItem')
+        return real_update(**kwargs)
+    
+    monkeypatch.setattr(table, "update_item", update_item)
+    result = asyncio.run(handler.create_expenses_bulk([
+        {"service_name": "S3", "client": "production", "cost": 2.5, "date": "2024-05-03T00:00:00"}
+        for _ in range(3)
+    ]))
+    assert result.created == 3
+    assert len(handler.db_client.table.scan()['Items']) == 3
+    # The other counters still land, and the missed one is logged for repair
+    assert spent(handler, "client", "production") == (7.5, 3)
+    assert spent(handler, "service", "S3") == (0.0, 0)
+    assert '"units": 750, "count": 3' in caplog.text
+
+
+def test_budget_endpoints(handler, monkeypatch):
+    monkeypatch.setattr(main, '_expense_handler', handler)
+    client = TestClient(main.app)
+    
+    response = client.put("/budgets/client/Production", json={"limit": 20, "month": MONTH})
+    assert response.status_code == 200
+    # A limit that rounds to zero would read as no limit and never alert
+    for limit, currency in (("0.004", "USD"), ("0.4", "JPY")):
+        response = client.put("/budgets/client/Production", json={"limit": limit, "currency": currency, "month": MONTH})
+        assert response.status_code == 422
+    asyncio.run(handler.create_expense(expense(12)))
+    
+    status = client.get("/budgets/client/production", params={"month": MONTH}).json()
+    assert (status["limit"], status["spent"], status["alerted_threshold"]) == (20.0, 12.0, 50)
+    assert status["name"] == "Production"
+    
+    unbudgeted = client.get("/budgets/service/Lambda", params={"month": MONTH}).json()
+    assert (unbudgeted["limit"], unbudgeted["spent"]) == (None, 0.0)
+    
+    assert client.get("/budgets/region/us-east-1").status_code == 422
+
+
+def test_budget_status_is_a_single_read(handler, monkeypatch):
+    for _ in range(5):
+        asyncio.run(handler.create_expense(expense(1)))
+    calls = []
+    table = handler.budgets.budgets.table
+    real_get = table.get_item
+    monkeypatch.setattr(table, "get_item", lambda **kwargs: calls.append(kwargs) or real_get(**kwargs))
+    
+    handler.budgets.get_budget_status("client", "production", MONTH)
+    assert len(calls) == 1
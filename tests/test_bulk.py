@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+from fastapi.testclient import TestClient
+from moto import mock_dynamodb
+import boto3
+from src.main import app
+
+client = TestClient(app)
+
+
+def create_table():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    return dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[
+            {'AttributeName': 'expense_id', 'KeyType': 'HASH'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'expense_id', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+@mock_dynamodb
+def test_import_ndjson_streams_and_reports_bad_lines():
+    table = create_table()
+    lines = [json.dumps({"service_name": "EC2", "client": "prod", "cost": 1 + i, "date": "2024-01-05"}) for i in range(1200)]
+    lines.insert(3, "{not json")
+    lines.insert(7, json.dumps({"service_name": "EC2", "client": "prod", "cost": 0}))
+    body = ("\n".join(lines) + "\n").encode()
+    
+    def chunks():
+        for start in range(0, len(body), 777):
+            yield body[start:start + 777]
+    
+    response = client.post("/expenses/import", content=chunks(), headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    
+    data = response.json()
+    assert data["imported"] == 1200
+    assert data["failed"] == 2
+    assert [error["line"] for error in data["errors"]] == [4, 8]
+    assert table.scan(Select='COUNT')['Count'] == 1200
+
+
+@mock_dynamodb
+def test_import_csv_with_quoted_newlines():
+    create_table()
+    body = (
+        'service_name,client,cost,date,description\r\n'
+        'EC2,prod,12.50,2024-02-01,"two\nline note"\r\n'
+        'S3,staging,3,2024-02-02,\r\n'
+        'S3,staging\r\n'
+    )
+    
+    response = client.post("/expenses/import", content=body.encode(), headers={"Content-Type": "text/csv"})
+    data = response.json()
+    assert data["imported"] == 2
+    assert data["errors"] == [{"line": 5, "error": "Expected 5 columns, got 2"}]
+    
+    exported = client.get("/expenses/export", params={"format": "csv"})
+    assert exported.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(exported.text)))
+    assert sorted(row["description"] for row in rows) == ["", "two\nline note"]
+
+
+@mock_dynamodb
+def test_export_ndjson_matches_api_representation():
+    create_table()
+    created = client.post("/expenses", json={"service_name": "Lambda", "client": "prod", "cost": 7.25}).json()
+    
+    response = client.get("/expenses/export")
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == [created]
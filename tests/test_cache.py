@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime
+from moto import mock_dynamodb
+import boto3
+from src.database import cache as cache_module
+from src.database.cache import ExpenseCache, LRUCache, RedisCache, normalize_params
+from src.handlers.expense_handler import ExpenseHandler
+from src.models.expense import ExpenseCreate, ExpenseUpdate
+
+
+class FakeRedis:
+    """Minimal stand-in for the Redis commands RedisCache uses"""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def get(self, key):
+        return self.data.get(key)
+    
+    def set(self, key, value, px=None):
+        self.data[key] = value
+    
+    def delete(self, key):
+        self.data.pop(key, None)
+    
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+        return int(self.data[key])
+
+
+def test_lru_cache_evicts_least_recent_and_expires(monkeypatch):
+    backend = LRUCache(max_entries=2)
+    backend.set("a", 1, ttl=60)
+    backend.set("b", 2, ttl=60)
+    backend.get("a")
+    backend.set("c", 3, ttl=60)
+    
+    assert backend.get("a") == 1
+    assert backend.get("b") is cache_module._MISSING
+    assert backend.evictions == 1
+    
+    now = cache_module.time.monotonic()
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now + 120)
+    assert backend.get("a") is cache_module._MISSING
+
+
+def test_analytics_keyed_by_normalized_params_and_invalidated_by_generation():
+    for backend in (LRUCache(), RedisCache(FakeRedis())):
+        cache = ExpenseCache(backend, ttl=60)
+        calls = []
+        
+        def load():
+            calls.append(1)
+            return {"total": len(calls)}
+        
+        assert cache.analytics("breakdown", {"client": "Prod", "end_date": None}, load) == {"total": 1}
+        assert cache.analytics("breakdown", {"client": " prod "}, load) == {"total": 1}
+        cache.invalidate_analytics()
+        assert cache.analytics("breakdown", {"client": "prod"}, load) == {"total": 2}
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+
+
+def test_normalize_params_is_order_independent():
+    assert normalize_params({"b": "X", "a": datetime(2024, 1, 2)}) == normalize_params({"a": datetime(2024, 1, 2), "b": "x"})
+
+
+@mock_dynamodb
+def test_get_expense_is_cached_until_written():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[
+            {'AttributeName': 'expense_id', 'KeyType': 'HASH'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'expense_id', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    handler = ExpenseHandler()
+    handler.cache = ExpenseCache(LRUCache(), ttl=60)
+    
+    created = asyncio.run(handler.create_expense(ExpenseCreate(service_name="EC2", client="prod", cost=5)))
+    reads = []
+    real_get = handler.db_client.get_expense
+    handler.db_client.get_expense = lambda expense_id: reads.append(expense_id) or real_get(expense_id)
+    
+    asyncio.run(handler.get_expense(created.expense_id))
+    asyncio.run(handler.get_expense(created.expense_id))
+    assert len(reads) == 1
+    
+    asyncio.run(handler.update_expense(created.expense_id, ExpenseUpdate(cost=6)))
+    assert asyncio.run(handler.get_expense(created.expense_id)).cost == 6
+    assert len(reads) == 2
@@ -0,0 +1,122 @@
+from collections import defaultdict
+from decimal import Decimal
+import random
+import statistics
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from src.analytics import columnar
+from src.analytics.columnar import ExpenseColumns
+from src.models.money import to_minor_units
+from src.analytics.groupby import aggregate_groups, parse_metrics
+
+
+def make_items(count, seed=3):
+    rng = random.Random(seed)
+    return [
+        {
+            "service_name": rng.choice(["EC2", "S3", "Lambda"]),
+            "client": rng.choice(["production", "staging"]),
+            "cost": Decimal(str(round(rng.uniform(0, 50), 2))),
+            "date": f"2024-{rng.randint(1, 3):02d}-{rng.randint(1, 28):02d}T10:00:00"
+        }
+        for _ in range(count)
+    ]
+
+
+def row_wise(items, key_fn):
+    totals = defaultdict(lambda: [0, 0])
+    for item in items:
+        entry = totals[key_fn(item)]
+        entry[0] += to_minor_units(item["cost"])
+        entry[1] += 1
+    return {key: tuple(value) for key, value in totals.items()}
+
+
+@pytest.fixture(params=["default", "pure-python"])
+def backend(request, monkeypatch):
+    if request.param == "pure-python":
+        monkeypatch.setattr(columnar, "np", None)
+    return request.param
+
+
+def test_group_by_matches_row_wise_totals(backend):
+    items = make_items(500)
+    columns = ExpenseColumns.from_items(items)
+    
+    assert columns.group_by("service_name") == row_wise(items, lambda item: item["service_name"])
+    assert columns.group_by("client") == row_wise(items, lambda item: item["client"])
+    assert columns.group_by("month") == row_wise(items, lambda item: item["date"][:7])
+    assert columns.group_by("day") == row_wise(items, lambda item: item["date"][:10])
+
+
+def test_merge_recodes_dictionaries(backend):
+    items = make_items(300)
+    left = ExpenseColumns.from_items(items[:100])
+    right = ExpenseColumns.from_items(reversed(items[100:]))
+    
+    merged = left.merge(right)
+    assert len(merged) == 300
+    assert merged.group_by("service_name") == row_wise(items, lambda item: item["service_name"])
+
+
+def test_wire_items_build_the_same_columns(backend):
+    items = make_items(400)
+    for index, item in enumerate(items):
+        if index % 3 == 0:
+            item["cost_units"] = to_minor_units(item["cost"])
+        if index % 7 == 0:
+            item["currency"] = "EUR"
+    serializer = TypeSerializer()
+    wire = [{name: serializer.serialize(value) for name, value in item.items()} for item in items]
+    # Legacy items without a client still group under Unknown
+    del items[5]["client"], wire[5]["client"]
+    
+    for currency in ("USD", "EUR"):
+        expected = ExpenseColumns.from_items(items, currency)
+        columns = ExpenseColumns.from_wire_items(iter(wire), currency)
+        for dimension in ("service_name", "client", "day"):
+            assert columns.group_by(dimension) == expected.group_by(dimension)
+    assert columns.units.itemsize + columns.days.itemsize + 2 * columns.services.itemsize == 20
+
+
+def test_cents_are_exact():
+    columns = ExpenseColumns.from_items(
+        {"service_name": "EC2", "client": "prod", "cost": cost, "date": "2024-01-01"}
+        for cost in (Decimal("0.1"), Decimal("0.2"), 0.3, "0.005")
+    )
+    assert columns.group_by("service_name") == {"EC2": (61, 4)}
+    
+    with pytest.raises(ValueError):
+        columns.group_by("description")
+
+
+def test_totals_past_float_precision_stay_exact(backend):
+    units = [2 ** 53 + 1, 3, 2 ** 52 + 7]
+    columns = ExpenseColumns.from_items(
+        {"service_name": "EC2", "client": "prod", "cost_units": amount, "date": "2024-01-01"} for amount in units
+    )
+    assert columns.group_by("service_name") == {"EC2": (sum(units), 3)}
+
+
+def test_aggregate_groups_combines_dimensions(backend):
+    items = make_items(400)
+    groups = aggregate_groups(ExpenseColumns.from_items(items), ["service_name", "quarter"], percentiles=[50, 90])
+    
+    expected = defaultdict(list)
+    for item in items:
+        expected[(item["service_name"], "2024-Q1")].append(to_minor_units(item["cost"]))
+    
+    assert {group["labels"] for group in groups} == set(expected)
+    for group in groups:
+        values = sorted(expected[group["labels"]])
+        assert group["total_units"] == sum(values)
+        assert group["count"] == len(values)
+        assert (group["min_units"], group["max_units"]) == (values[0], values[-1])
+        assert group["percentiles"][50] == pytest.approx(statistics.median(values))
+
+
+def test_parse_metrics():
+    assert parse_metrics(["min", " AVG", "p95", "p99.9", "min"]) == (["min", "avg"], [95.0, 99.9])
+    for bad in (["median"], ["p101"], ["px"]):
+        with pytest.raises(ValueError):
+            parse_metrics(bad)
@@ -0,0 +1,353 @@
+import zlib
+from datetime import datetime, timedelta
+from moto import mock_dynamodb
+import boto3
+from fastapi.testclient import TestClient
+from src.database import dynamodb_client
+from src.database.dynamodb_client import DynamoDBClient, fan_out, index_shard, month_buckets
+from src.handlers.cost_analysis_handler import CostAnalysisHandler
+from src.main import app
+
+
+def create_table():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    return dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[
+            {'AttributeName': 'expense_id', 'KeyType': 'HASH'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'expense_id', 'AttributeType': 'S'},
+            {'AttributeName': 'month_bucket', 'AttributeType': 'S'},
+            {'AttributeName': 'date', 'AttributeType': 'S'},
+            {'AttributeName': 'client_key', 'AttributeType': 'S'},
+            {'AttributeName': 'service_key', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                'IndexName': 'date-index',
+                'KeySchema': [
+                    {'AttributeName': 'month_bucket', 'KeyType': 'HASH'},
+                    {'AttributeName': 'date', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            },
+            {
+                'IndexName': 'client-index',
+                'KeySchema': [
+                    {'AttributeName': 'client_key', 'KeyType': 'HASH'},
+                    {'AttributeName': 'date', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            },
+            {
+                'IndexName': 'service-index',
+                'KeySchema': [
+                    {'AttributeName': 'service_key', 'KeyType': 'HASH'},
+                    {'AttributeName': 'date', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            }
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+class SegmentedScanClient:
+    """moto ignores Segment/TotalSegments; emulate DynamoDB's hash split of the key space"""
+    
+    def __init__(self, client):
+        self._client = client
+        self.segments_seen = set()
+    
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+    
+    def scan(self, Segment=None, TotalSegments=None, **kwargs):
+        if not TotalSegments:
+            return self._client.scan(**kwargs)
+        
+        # Split on the full key, then apply the projection ourselves
+        self.segments_seen.add(Segment)
+        projection = kwargs.pop('ProjectionExpression', None)
+        names = kwargs.pop('ExpressionAttributeNames', {})
+        response = self._client.scan(**kwargs)
+        items = [
+            item for item in response['Items']
+            if zlib.crc32(item['expense_id'].encode()) % TotalSegments == Segment
+        ]
+        if projection:
+            fields = [names.get(name.strip(), name.strip()) for name in projection.split(',')]
+            items = [{k: v for k, v in item.items() if k in fields} for item in items]
+        response['Items'] = items
+        return response
+
+
+def seed(db_client):
+    now = datetime.now()
+    rows = [
+        ("EC2", "production", 10.50, now - timedelta(days=1)),
+        ("EC2", "Staging", 4.25, now - timedelta(days=2)),
+        ("S3", "production", 1.75, now - timedelta(days=3)),
+        ("Lambda", "staging", 0.50, now - timedelta(days=4)),
+        ("RDS", "production", 99.00, now - timedelta(days=90)),
+    ]
+    for service_name, client, cost, date in rows:
+        db_client.create_expense({
+            "service_name": service_name,
+            "client": client,
+            "cost": cost,
+            "date": date
+        })
+
+
+def make_handler():
+    handler = CostAnalysisHandler()
+    handler.db_client.client = SegmentedScanClient(handler.db_client.client)
+    seed(handler.db_client)
+    return handler
+
+
+@mock_dynamodb
+def test_parallel_scan_merges_partials_across_segments():
+    create_table()
+    db_client = DynamoDBClient()
+    db_client.client = SegmentedScanClient(db_client.client)
+    for i in range(40):
+        db_client.create_expense({
+            "service_name": "EC2",
+            "client": "production",
+            "cost": 2,
+            "date": datetime(2024, 1, 1)
+        })
+    
+    def fold(items):
+        return sum(1 for _ in items)
+    
+    total = db_client.parallel_scan(fold, lambda a, b: a + b, total_segments=8, max_workers=3)
+    assert total == 40
+    assert db_client.client.segments_seen == set(range(8))
+
+
+@mock_dynamodb
+def test_cost_breakdown_groups_and_filters():
+    create_table()
+    handler = make_handler()
+    
+    result = handler.get_cost_breakdown(group_by="service", client_filter="STAGING")
+    assert result["summary"]["total_expenses"] == 2
+    assert result["summary"]["total_cost"] == 4.75
+    
+    by_category = {row["category"]: row for row in result["breakdown"]}
+    assert set(by_category) == {"EC2", "Lambda"}
+    assert by_category["EC2"]["percentage"] == round(4.25 / 4.75 * 100, 2)
+    assert result["metadata"]["query_plan"] == "client-index"
+
+
+@mock_dynamodb
+def test_cost_breakdown_query_plans():
+    create_table()
+    handler = make_handler()
+    
+    by_service = handler.get_cost_breakdown(group_by="client", service_filter="ec2")
+    assert by_service["metadata"]["query_plan"] == "service-index"
+    assert {row["category"] for row in by_service["breakdown"]} == {"production", "Staging"}
+    
+    both = handler.get_cost_breakdown(client_filter="Production", service_filter="EC2")
+    assert both["metadata"]["query_plan"] == "client-index"
+    assert both["summary"]["total_cost"] == 10.5
+    
+    unfiltered = handler.get_cost_breakdown()
+    assert unfiltered["metadata"]["query_plan"] == "date-index"
+    assert unfiltered["summary"]["total_expenses"] == 4
+
+
+@mock_dynamodb
+def test_update_keeps_index_keys_in_step():
+    create_table()
+    db_client = DynamoDBClient()
+    created = db_client.create_expense({
+        "service_name": "EC2",
+        "client": "Production",
+        "cost": 5,
+        "date": datetime(2024, 5, 1)
+    })
+    assert created["client_key"] == "production"
+    
+    updated = db_client.update_expense(created["expense_id"], {"client": "QA Team"})
+    assert updated["client_key"] == "qa team"
+    assert updated["service_key"] == "ec2"
+
+
+@mock_dynamodb
+def test_monthly_trends_reads_only_buckets_in_window():
+    create_table()
+    handler = make_handler()
+    queried = []
+    real_query = handler.db_client.client.query
+    
+    def query(**kwargs):
+        queried.append(kwargs['ExpressionAttributeValues'][':h'])
+        return real_query(**kwargs)
+    
+    handler.db_client.client.query = query
+    result = handler.get_monthly_trends(months=1)
+    
+    assert sum(row["expense_count"] for row in result["trends"]) == 4
+    assert len(queried) <= 2
+    assert datetime.now().strftime("%Y-%m") in queried
+
+
+def test_month_buckets_span_year_boundary():
+    assert month_buckets(datetime(2023, 11, 15), datetime(2024, 2, 1)) == [
+        "2023-11", "2023-12", "2024-01", "2024-02"
+    ]
+
+
+@mock_dynamodb
+def test_backfill_index_keys():
+    table = create_table()
+    table.put_item(Item={
+        'expense_id': 'legacy',
+        'service_name': 'EC2',
+        'client': 'production',
+        'cost': 3,
+        'date': '2024-03-09T00:00:00'
+    })
+    db_client = DynamoDBClient()
+    
+    assert db_client.backfill_index_keys() == 1
+    item = db_client.get_expense('legacy')
+    assert item['month_bucket'] == '2024-03'
+    assert item['client_key'] == 'production'
+    assert item['service_key'] == 'ec2'
+    assert (item['cost_units'], item['currency']) == (300, 'USD')
+    assert db_client.backfill_index_keys() == 0
+
+
+@mock_dynamodb
+def test_sharded_index_keys(monkeypatch):
+    create_table()
+    handler = make_handler()
+    before = handler.get_cost_breakdown(group_by="service", client_filter="production")
+    
+    # Raising the shard count leaves existing keys stale until the backfill re-keys them
+    monkeypatch.setattr(dynamodb_client, 'INDEX_SHARDS', 4)
+    db_client = handler.db_client
+    assert db_client.backfill_index_keys() == 5
+    assert db_client.backfill_index_keys() == 0
+    for item in db_client.table.scan()['Items']:
+        shard = index_shard(item['expense_id'])
+        assert item['client_key'] == f"{item['client'].lower()}#{shard}"
+        assert item['service_key'] == f"{item['service_name'].lower()}#{shard}"
+    
+    queried = []
+    real_query = db_client.client.query
+    
+    def query(**kwargs):
+        queried.append(kwargs['ExpressionAttributeValues'][':h'])
+        return real_query(**kwargs)
+    
+    db_client.client.query = query
+    after = handler.get_cost_breakdown(group_by="service", client_filter="production")
+    assert after["metadata"]["query_plan"] == "client-index"
+    # Groups come back in the order shards answer
+    assert sorted(after["breakdown"], key=lambda row: row["category"]) == sorted(
+        before["breakdown"], key=lambda row: row["category"]
+    )
+    assert sorted(queried) == [f"production#{shard}" for shard in range(4)]
+
+
+@mock_dynamodb
+def test_top_services_covers_whole_table():
+    create_table()
+    handler = make_handler()
+    
+    top = handler.get_top_services(limit=2)
+    assert [row["service_name"] for row in top] == ["RDS", "EC2"]
+    assert top[1]["total_cost"] == 14.75
+    assert top[1]["expense_count"] == 2
+
+
+@mock_dynamodb
+def test_analytics_endpoints():
+    create_table()
+    seed(DynamoDBClient())
+    client = TestClient(app)
+    
+    breakdown = client.get("/cost-breakdown", params={"group_by": "client"})
+    assert breakdown.status_code == 200
+    assert breakdown.json()["summary"]["total_cost"] == 17.0
+    
+    trends = client.get("/monthly-trends", params={"months": 6})
+    assert trends.status_code == 200
+    assert sum(row["expense_count"] for row in trends.json()["trends"]) == 5
+    
+    top = client.get("/top-services", params={"limit": 1})
+    assert top.json() == [{"service_name": "RDS", "total_cost": 99.0, "expense_count": 1}]
+    
+    assert client.get("/cost-breakdown", params={"group_by": "description"}).status_code == 422
+
+
+@mock_dynamodb
+def test_cost_breakdown_multi_dimension_layouts():
+    create_table()
+    handler = make_handler()
+    start = datetime.now() - timedelta(days=120)
+    
+    flat = handler.get_cost_breakdown(start_date=start, group_by="service,client", metrics=["min", "max", "avg", "p50"])
+    rows = {(row["service"], row["client"]): row for row in flat["breakdown"]}
+    assert set(rows) == {("EC2", "production"), ("EC2", "Staging"), ("S3", "production"), ("Lambda", "staging"), ("RDS", "production")}
+    assert rows[("RDS", "production")]["percentage"] == round(99 / 116 * 100, 2)
+    assert rows[("EC2", "production")]["p50_cost"] == 10.5
+    
+    by_service = handler.get_cost_breakdown(start_date=start, group_by="service", metrics=["min", "max", "avg", "p50"])
+    ec2 = next(row for row in by_service["breakdown"] if row["category"] == "EC2")
+    assert (ec2["min_cost"], ec2["max_cost"], ec2["avg_cost"], ec2["p50_cost"]) == (4.25, 10.5, 7.38, 7.38)
+    
+    nested = handler.get_cost_breakdown(start_date=start, group_by="client,service", layout="nested")
+    assert nested["breakdown"]["production"]["EC2"]["total_cost"] == 10.5
+    
+    pivot = handler.get_cost_breakdown(start_date=start, group_by="service,quarter", layout="pivot")["breakdown"]
+    assert pivot["rows"] == "service"
+    assert sum(sum(row[column] for column in pivot["columns"]) for row in pivot["data"]) == 116.0
+
+
+@mock_dynamodb
+def test_forecast_and_anomaly_endpoints():
+    create_table()
+    db_client = DynamoDBClient()
+    yesterday = datetime.now() - timedelta(days=1)
+    for offset in range(30):
+        cost = 200.0 if offset == 3 else 10.0
+        db_client.create_expense({"service_name": "EC2", "client": "production", "cost": cost, "date": yesterday - timedelta(days=offset)})
+    client = TestClient(app)
+    
+    anomalies = client.get("/anomalies", params={"history": 30}).json()
+    assert [(row["service"], row["direction"], row["actual_cost"]) for row in anomalies["anomalies"]] == [("EC2", "spike", 200.0)]
+    assert anomalies["anomalies"][0]["date"] == (yesterday - timedelta(days=3)).date().isoformat()
+    assert anomalies["metadata"]["query_plan"] == "date-index"
+    
+    forecast = client.get("/forecast", params={"history": 30, "days": 3, "client": "production"}).json()
+    assert forecast["metadata"]["query_plan"] == "client-index"
+    points = forecast["series"][0]["forecast"]
+    assert [point["date"] for point in points][0] == datetime.now().date().isoformat()
+    assert all(point["lower"] <= point["expected_cost"] <= point["upper"] for point in points)
+    
+    assert client.get("/forecast", params={"dimension": "region"}).status_code == 422
+
+
+@mock_dynamodb
+def test_reversed_date_range_is_rejected():
+    create_table()
+    seed(DynamoDBClient())
+    client = TestClient(app)
+    
+    response = client.get(
+        "/cost-breakdown", params={"start_date": "2024-03-01T00:00:00", "end_date": "2024-01-01T00:00:00"}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "start_date must not be after end_date"
+    # A read spanning no buckets folds to an empty result rather than failing
+    assert month_buckets(datetime(2024, 3, 1), datetime(2024, 1, 1)) == []
+    assert fan_out(None, [], lambda items: sum(1 for _ in items), lambda a, b: a + b) == 0
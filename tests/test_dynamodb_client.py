@@ -0,0 +1,204 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from moto import mock_dynamodb
+import asyncio
+import boto3
+import time
+from datetime import datetime
+from src.database.async_dynamodb_client import AsyncDynamoDBClient
+from src.database.dynamodb_client import (
+    DynamoDBClient,
+    InvalidCursorError,
+    VersionConflictError,
+    decode_cursor,
+    encode_cursor,
+    fan_out,
+)
+
+
+def create_table():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    return dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[
+            {'AttributeName': 'expense_id', 'KeyType': 'HASH'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'expense_id', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def seed(db_client, count):
+    for i in range(count):
+        db_client.create_expense({
+            "service_name": "EC2" if i % 2 else "S3",
+            "client": "production",
+            "cost": 1.25,
+            "date": datetime(2024, 1, 1 + i % 28),
+            "description": f"Expense {i}"
+        })
+
+
+@mock_dynamodb
+def test_iter_expenses_drains_every_page():
+    create_table()
+    db_client = DynamoDBClient()
+    seed(db_client, 23)
+    
+    pages = list(db_client.iter_expense_pages(page_size=5))
+    assert len(pages) >= 5
+    assert sum(len(page) for page in pages) == 23
+    assert len(list(db_client.iter_expenses(page_size=5))) == 23
+
+
+@mock_dynamodb
+def test_iter_expenses_projection():
+    create_table()
+    db_client = DynamoDBClient()
+    seed(db_client, 3)
+    
+    for item in db_client.iter_expenses(projection=('cost', 'date')):
+        assert set(item) == {'cost', 'date'}
+
+
+@mock_dynamodb
+def test_wire_reads_page_through_raw_items():
+    create_table()
+    db_client = DynamoDBClient()
+    seed(db_client, 12)
+    
+    def fold(items):
+        return [item['cost_units']['N'] for item in items]
+    
+    # Items stay in the wire format while LastEvaluatedKey is still converted for the next page
+    requests = [{'TableName': 'expenses-table', 'Limit': 5}, {'TableName': 'expenses-table', 'Limit': 7}]
+    assert fan_out(db_client.client.scan, requests, fold, list.__add__, wire=True) == ['125'] * 24
+    # Reads outside a wire fan-out still get Python types
+    assert db_client.get_expense(db_client.table.scan()['Items'][0]['expense_id'])['cost_units'] == 125
+
+
+@mock_dynamodb
+def test_list_expenses_page_cursor_walks_table_once():
+    create_table()
+    db_client = DynamoDBClient()
+    seed(db_client, 12)
+    
+    seen = []
+    cursor = None
+    while True:
+        items, cursor = db_client.list_expenses_page(limit=5, cursor=cursor)
+        seen.extend(item['expense_id'] for item in items)
+        if not cursor:
+            break
+    
+    assert len(seen) == 12
+    assert len(set(seen)) == 12
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    key = {'expense_id': 'abc-123'}
+    assert decode_cursor(encode_cursor(key)) == key
+    assert encode_cursor(None) is None
+    
+    with pytest.raises(InvalidCursorError):
+        decode_cursor('not-a-cursor!')
+
+
+class FlakyBatchClient:
+    """Leave the first few requests of each call unprocessed, like a throttled table"""
+    
+    def __init__(self, client, unprocessed=3, flaky_calls=2):
+        self._client = client
+        self.unprocessed = unprocessed
+        self.flaky_calls = flaky_calls
+        self.calls = 0
+    
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+    
+    def batch_write_item(self, RequestItems):
+        self.calls += 1
+        (table_name, requests), = RequestItems.items()
+        if self.flaky_calls <= 0:
+            return self._client.batch_write_item(RequestItems=RequestItems)
+        self.flaky_calls -= 1
+        if requests[self.unprocessed:]:
+            self._client.batch_write_item(RequestItems={table_name: requests[self.unprocessed:]})
+        return {'UnprocessedItems': {table_name: requests[:self.unprocessed]}}
+
+
+@mock_dynamodb
+def test_batch_create_retries_unprocessed_items(monkeypatch):
+    table = create_table()
+    db_client = DynamoDBClient()
+    db_client.client = FlakyBatchClient(db_client.client)
+    monkeypatch.setattr('src.database.dynamodb_client.BATCH_BACKOFF_BASE', 0)
+    
+    expenses = [
+        {"service_name": "S3", "client": "production", "cost": 2, "date": datetime(2024, 2, 1)}
+        for _ in range(30)
+    ]
+    results = db_client.batch_create(expenses, max_workers=1)
+    
+    assert [r["status"] for r in results] == ["created"] * 30
+    assert db_client.client.calls == 4
+    assert table.scan(Select='COUNT')['Count'] == 30
+
+
+@mock_dynamodb
+def test_batch_create_reports_items_left_unprocessed(monkeypatch):
+    create_table()
+    db_client = DynamoDBClient()
+    db_client.client = FlakyBatchClient(db_client.client, unprocessed=2, flaky_calls=100)
+    monkeypatch.setattr('src.database.dynamodb_client.BATCH_BACKOFF_BASE', 0)
+    
+    expenses = [
+        {"service_name": "S3", "client": "production", "cost": 2, "date": datetime(2024, 2, 1)}
+        for _ in range(5)
+    ]
+    results = db_client.batch_create(expenses)
+    
+    assert [r["status"] for r in results] == ["failed", "failed", "created", "created", "created"]
+
+
+def test_async_client_overlaps_blocking_calls():
+    class SlowClient:
+        def get_expense(self, expense_id):
+            time.sleep(0.1)
+            return {"expense_id": expense_id}
+    
+    async def fetch_all():
+        db = AsyncDynamoDBClient(SlowClient(), executor=ThreadPoolExecutor(max_workers=8))
+        return await asyncio.gather(*(db.get_expense(str(i)) for i in range(8)))
+    
+    started = time.perf_counter()
+    results = asyncio.run(fetch_all())
+    
+    assert [r["expense_id"] for r in results] == [str(i) for i in range(8)]
+    # Serialized calls would take 0.8s
+    assert time.perf_counter() - started < 0.4
+
+
+@mock_dynamodb
+def test_cost_units_follow_cost_and_currency():
+    create_table()
+    db_client = DynamoDBClient()
+    usd = db_client.create_expense({"service_name": "EC2", "client": "prod", "cost": 12.34, "date": datetime(2024, 1, 1)})
+    yen = db_client.create_expense({
+        "service_name": "EC2", "client": "prod", "cost": 1500, "currency": "JPY", "date": datetime(2024, 1, 1)
+    })
+    assert (usd["cost_units"], usd["currency"]) == (1234, "USD")
+    assert (yen["cost_units"], yen["currency"]) == (1500, "JPY")
+    
+    # A cost-only update is converted at the stored currency's precision
+    assert db_client.update_expense(usd["expense_id"], {"cost": 1.5})["cost_units"] == 150
+    updated = db_client.update_expense(yen["expense_id"], {"cost": 1999}, expected_version=1)
+    assert (updated["cost_units"], updated["currency"], updated["version"]) == (1999, "JPY", 2)
+    
+    with pytest.raises(VersionConflictError):
+        db_client.update_expense(yen["expense_id"], {"cost": 5}, expected_version=1)
+    
+    moved = db_client.update_expense(yen["expense_id"], {"cost": 19.99, "currency": "USD"})
+    assert (moved["cost_units"], moved["currency"]) == (1999, "USD")
@@ -0,0 +1,189 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from moto import mock_dynamodb
+import boto3
+import pytest
+from fastapi.testclient import TestClient
+from src import main
+from src.database import dynamodb_client
+from src.database.dynamodb_client import iter_items
+from src.handlers.expense_handler import ExpenseHandler
+
+
+def create_table():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    return dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'expense_id', 'AttributeType': 'S'},
+            {'AttributeName': 'month_bucket', 'AttributeType': 'S'},
+            {'AttributeName': 'date', 'AttributeType': 'S'},
+            {'AttributeName': 'client_key', 'AttributeType': 'S'},
+            {'AttributeName': 'service_key', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                'IndexName': index,
+                'KeySchema': [
+                    {'AttributeName': hash_key, 'KeyType': 'HASH'},
+                    {'AttributeName': 'date', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            }
+            for index, hash_key in (
+                ('date-index', 'month_bucket'), ('client-index', 'client_key'), ('service-index', 'service_key')
+            )
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+class OrderedQueryClient:
+    """moto applies Limit and ExclusiveStartKey to GSI queries before sorting; page the sorted result as DynamoDB does"""
+    
+    def __init__(self, client):
+        self._client = client
+    
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+    
+    def query(self, Limit=None, ExclusiveStartKey=None, **kwargs):
+        items = list(iter_items(self._client.query, kwargs))
+        if ExclusiveStartKey:
+            position = next(
+                i for i, item in enumerate(items)
+                if all(item.get(key) == value for key, value in ExclusiveStartKey.items())
+            )
+            items = items[position + 1:]
+        page = items[:Limit] if Limit else items
+        response = {'Items': page, 'Count': len(page)}
+        if Limit and len(items) > Limit:
+            keys = ('expense_id', kwargs['ExpressionAttributeNames']['#h'], 'date')
+            response['LastEvaluatedKey'] = {key: page[-1][key] for key in keys}
+        return response
+
+
+@pytest.fixture(params=[1, 4], ids=["unsharded", "sharded"])
+def seeded(request, monkeypatch):
+    # Sharded client/service keys must list exactly as unsharded ones do
+    monkeypatch.setattr(dynamodb_client, 'INDEX_SHARDS', request.param)
+    with mock_dynamodb():
+        create_table()
+        handler = ExpenseHandler()
+        handler.db_client.client = OrderedQueryClient(handler.db_client.client)
+        monkeypatch.setattr(main, '_expense_handler', handler)
+        db_client = handler.db_client
+        rng = random.Random(3)
+        items = [
+            db_client.create_expense({
+                "service_name": rng.choice(("EC2", "S3", "Lambda")),
+                "client": rng.choice(("Production", "staging")),
+                "cost": Decimal(rng.randrange(100, 50000)) / 100,
+                "date": datetime(2024, 1, 1) + timedelta(days=rng.randrange(90), seconds=rng.randrange(86400)),
+                "description": f"item {index}"
+            })
+            for index in range(45)
+        ]
+        yield TestClient(main.app), items
+
+
+def walk(http, limit, **params):
+    """Follow cursors to the end; returns (expense ids in order, plans seen)"""
+    ids, plans, cursor = [], set(), None
+    while True:
+        response = http.get("/expenses", params=dict(params, limit=limit, **({"cursor": cursor} if cursor else {})))
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page) <= limit
+        ids.extend(item["expense_id"] for item in page)
+        plans.add(response.headers["X-Query-Plan"])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids, plans
+
+
+def expected(items, descending=False, keep=lambda item: True):
+    chosen = sorted((item for item in items if keep(item)), key=lambda item: item['date'], reverse=descending)
+    return [item['expense_id'] for item in chosen]
+
+
+def test_client_and_service_filters_query_their_index_in_date_order(seeded):
+    client, items = seeded
+    
+    ids, plans = walk(client, 4, client="PRODUCTION")
+    assert plans == {"client-index"}
+    assert ids == expected(items, keep=lambda item: item['client'] == "Production")
+    
+    ids, plans = walk(client, 3, service="s3", sort="-date")
+    assert plans == {"service-index"}
+    assert ids == expected(items, descending=True, keep=lambda item: item['service_name'] == "S3")
+    
+    # Service and cost become filters on the client index; pages still end on the right items
+    ids, plans = walk(client, 2, client="staging", service="EC2", min_cost=50, max_cost=400, sort="-date")
+    assert plans == {"client-index"}
+    assert ids == expected(items, descending=True, keep=lambda item: (
+        item['client'] == "staging" and item['service_name'] == "EC2" and 50 <= item['cost'] <= 400
+    ))
+    assert ids
+
+
+def test_date_range_walks_month_buckets_in_order(seeded):
+    client, items = seeded
+    start, end = datetime(2024, 1, 20), datetime(2024, 3, 10)
+    
+    def in_range(item):
+        return start.isoformat() <= item['date'] <= end.isoformat()
+    
+    for sort, descending in (("date", False), ("-date", True)):
+        ids, plans = walk(client, 5, start_date=start.isoformat(), end_date=end.isoformat(), sort=sort)
+        assert plans == {"date-index"}
+        assert ids == expected(items, descending=descending, keep=in_range)
+    
+    ids, plans = walk(client, 5, start_date=start.isoformat(), end_date=end.isoformat(), max_cost=100)
+    assert ids == expected(items, keep=lambda item: in_range(item) and item['cost'] <= 100)
+
+
+def test_unkeyed_filters_scan(seeded):
+    client, items = seeded
+    ids, plans = walk(client, 3, min_cost=250)
+    assert plans == {"scan"}
+    assert sorted(ids) == sorted(expected(items, keep=lambda item: item['cost'] >= 250))
+    
+    ids, plans = walk(client, 7, end_date="2024-02-01T00:00:00")
+    assert plans == {"scan"}
+    assert sorted(ids) == sorted(expected(items, keep=lambda item: item['date'] <= "2024-02-01T00:00:00"))
+    
+    ids, _ = walk(client, 10)
+    assert sorted(ids) == sorted(item['expense_id'] for item in items)
+
+
+def test_sparse_fields_are_projected(seeded):
+    client, items = seeded
+    by_id = {item['expense_id']: item for item in items}
+    
+    response = client.get("/expenses", params={"client": "staging", "fields": "date,cost", "limit": 5})
+    for document in response.json():
+        assert list(document) == ["cost", "date", "expense_id"]
+        item = by_id[document["expense_id"]]
+        assert (document["cost"], document["date"]) == (float(item['cost']), item['date'])
+    
+    # Only the requested attributes (plus keys and currency) cross the wire
+    db_items, _, _ = main._expense_handler.db_client.query_expenses_page(5, client="staging", projection=["description"])
+    assert {key for item in db_items for key in item} == {"description", "expense_id", "client_key", "date"}
+
+
+def test_listing_rejects_bad_requests(seeded):
+    client, _ = seeded
+    assert client.get("/expenses", params={"fields": "cost,secret"}).status_code == 400
+    assert client.get("/expenses", params={"sort": "-date"}).status_code == 400
+    assert client.get("/expenses", params={"sort": "cost"}).status_code == 422
+    assert client.get("/expenses", params={"min_cost": 10, "max_cost": 5}).status_code == 400
+    assert client.get("/expenses", params={
+        "client": "staging", "start_date": "2024-03-01T00:00:00", "end_date": "2024-02-01T00:00:00"
+    }).status_code == 400
+    
+    # A cursor only resumes the query that issued it
+    cursor = client.get("/expenses", params={"client": "staging", "limit": 2}).headers["X-Next-Cursor"]
+    assert client.get("/expenses", params={"service": "S3", "cursor": cursor}).status_code == 400
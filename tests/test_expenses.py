@@ -1,4 +1,6 @@
 import pytest
+import subprocess
+import sys
 from fastapi.testclient import TestClient
 from moto import mock_dynamodb
 import boto3
@@ -37,6 +39,11 @@ def test_create_expense():
     assert data["service_name"] == "EC2"
     assert data["client"] == "test-client"
     assert data["cost"] == 25.50
+    
+    # A bare calendar date is read as midnight
+    response = client.post("/expenses", json={**expense_data, "date": "2024-01-05"})
+    assert response.status_code == 201
+    assert response.json()["date"] == "2024-01-05T00:00:00"
 
 @mock_dynamodb
 def test_get_expense():
@@ -61,3 +68,109 @@ def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "healthy", "message": "Cost Tracker API is running"}
+
+@mock_dynamodb
+def test_list_expenses_cursor_pagination():
+    # Setup mock DynamoDB
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    table = dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[
+            {'AttributeName': 'expense_id', 'KeyType': 'HASH'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'expense_id', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    
+    for i in range(5):
+        client.post("/expenses", json={"service_name": "S3", "client": "test-client", "cost": 1 + i})
+    
+    first = client.get("/expenses", params={"limit": 3})
+    assert first.status_code == 200
+    assert len(first.json()) == 3
+    cursor = first.headers["X-Next-Cursor"]
+    
+    second = client.get("/expenses", params={"limit": 3, "cursor": cursor})
+    assert len(second.json()) == 2
+    assert "X-Next-Cursor" not in second.headers
+    
+    ids = {e["expense_id"] for e in first.json() + second.json()}
+    assert len(ids) == 5
+    
+    assert client.get("/expenses", params={"cursor": "bogus!"}).status_code == 400
+
+@mock_dynamodb
+def test_create_expenses_batch_reports_per_item_results():
+    # Setup mock DynamoDB
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    table = dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[
+            {'AttributeName': 'expense_id', 'KeyType': 'HASH'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'expense_id', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    
+    batch = [
+        {"service_name": "EC2", "client": "test-client", "cost": 1.5 + i}
+        for i in range(60)
+    ]
+    batch.insert(10, {"service_name": "EC2", "client": "test-client", "cost": -5})
+    
+    response = client.post("/expenses/batch", json=batch)
+    assert response.status_code == 207
+    
+    data = response.json()
+    assert data["created"] == 60
+    assert data["failed"] == 1
+    assert data["results"][10]["status"] == "failed"
+    assert "cost" in data["results"][10]["error"]
+    assert data["results"][11]["expense"]["cost"] == 11.5
+    assert table.scan(Select='COUNT')['Count'] == 60
+
+@mock_dynamodb
+def test_update_and_delete_use_conditional_writes():
+    # Setup mock DynamoDB
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    table = dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[
+            {'AttributeName': 'expense_id', 'KeyType': 'HASH'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'expense_id', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    
+    assert client.put("/expenses/missing", json={"cost": 3}).status_code == 404
+    assert client.delete("/expenses/missing").status_code == 404
+    
+    created = client.post("/expenses", json={"service_name": "EC2", "client": "test-client", "cost": 10})
+    expense_id = created.json()["expense_id"]
+    assert created.headers["ETag"] == '"1"'
+    
+    updated = client.put(f"/expenses/{expense_id}", json={"cost": 12}, headers={"If-Match": '"1"'})
+    assert updated.status_code == 200
+    assert updated.json()["version"] == 2
+    assert updated.headers["ETag"] == '"2"'
+    
+    stale = client.put(f"/expenses/{expense_id}", json={"cost": 99}, headers={"If-Match": '"1"'})
+    assert stale.status_code == 412
+    assert client.delete(f"/expenses/{expense_id}", headers={"If-Match": '"1"'}).status_code == 412
+    
+    deleted = client.delete(f"/expenses/{expense_id}", headers={"If-Match": '"2"'})
+    assert deleted.status_code == 200
+    assert deleted.json()["expense"]["cost"] == 12
+    assert table.scan(Select='COUNT')['Count'] == 0
+
+
+def test_importing_app_defers_boto3():
+    code = "import sys, src.main; print('boto3' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,125 @@
+from datetime import date
+import random
+import pytest
+from src.analytics import columnar
+from src.analytics.columnar import ExpenseColumns
+from src.analytics.forecast import SeasonalBaseline, analyze, daily_series
+
+FIRST_DAY = date(2024, 1, 1).toordinal()
+
+
+@pytest.fixture(params=["default", "pure-python"])
+def backend(request, monkeypatch):
+    if request.param == "pure-python":
+        monkeypatch.setattr(columnar, "np", None)
+    return request.param
+
+
+def weekly_series(days, seed, weekend=2000, weekday=10000, noise=200):
+    """Daily minor units with a weekend dip and some noise"""
+    rng = random.Random(seed)
+    return [
+        (weekend if date.fromordinal(FIRST_DAY + offset).weekday() >= 5 else weekday) + rng.randint(-noise, noise)
+        for offset in range(days)
+    ]
+
+
+def test_daily_series_fills_missing_days(backend):
+    items = [
+        {"service_name": "EC2", "client": "production", "cost_units": 500, "date": "2024-01-01T09:00:00"},
+        {"service_name": "EC2", "client": "production", "cost_units": 250, "date": "2024-01-01T17:00:00"},
+        {"service_name": "S3", "client": "staging", "cost_units": 100, "date": "2024-01-03T00:00:00"},
+        # Outside the window
+        {"service_name": "S3", "client": "staging", "cost_units": 900, "date": "2024-01-09T00:00:00"},
+    ]
+    columns = ExpenseColumns.from_items(items)
+    labels, series = daily_series(columns, "service_name", FIRST_DAY, FIRST_DAY + 3)
+    
+    assert labels == ["EC2", "S3"]
+    assert [list(row) for row in series] == [[750, 0, 0, 0], [0, 0, 100, 0]]
+
+
+def test_daily_series_totals_stay_exact(backend):
+    items = [
+        {"service_name": "EC2", "client": "production", "cost_units": amount, "date": "2024-01-02T00:00:00"}
+        for amount in (2 ** 53 + 1, 2 ** 53 + 1)
+    ]
+    labels, series = daily_series(ExpenseColumns.from_items(items), "service_name", FIRST_DAY, FIRST_DAY + 1)
+    assert [list(row) for row in series] == [[0, 2 ** 54 + 2]]
+
+
+def test_flags_spike_and_drop(backend):
+    values = weekly_series(60, seed=1)
+    values[40] *= 5
+    values[50] = 0
+    anomalies, _ = analyze([values], FIRST_DAY)
+    
+    flagged = {day - FIRST_DAY: (actual, expected) for _, day, actual, expected, _ in anomalies}
+    assert set(flagged) == {40, 50}
+    assert flagged[40][0] > flagged[40][1]
+    assert flagged[50][0] < flagged[50][1]
+
+
+def test_no_anomalies_during_warmup(backend):
+    values = [1000] * 10 + [50000] + [1000] * 3
+    anomalies, _ = analyze([values], FIRST_DAY)
+    assert anomalies == []
+    
+    anomalies, _ = analyze([values + [1000] * 14 + [50000]], FIRST_DAY)
+    assert [day - FIRST_DAY for _, day, _, _, _ in anomalies] == [28]
+
+
+def test_forecast_follows_weekly_season(backend):
+    _, forecasts = analyze([weekly_series(84, seed=2, noise=0)], FIRST_DAY, horizon=7)
+    
+    last_day = FIRST_DAY + 83
+    for step, (expected, std) in enumerate(forecasts[0], start=1):
+        weekend = date.fromordinal(last_day + step).weekday() >= 5
+        assert expected == pytest.approx(2000 if weekend else 10000, rel=0.05)
+        assert std >= 1
+
+
+def test_forecast_never_negative(backend):
+    values = list(range(3000, 0, -100)) + [0] * 5
+    _, forecasts = analyze([values], FIRST_DAY, horizon=30)
+    assert all(expected >= 0 for expected, _ in forecasts[0])
+
+
+def test_batch_matches_per_series_updates():
+    if columnar.np is None:
+        pytest.skip("numpy not installed")
+    rng = random.Random(5)
+    series = [weekly_series(45, seed=seed, noise=rng.randint(0, 3000)) for seed in range(50)]
+    for values in series[::7]:
+        values[rng.randrange(20, 45)] *= 8
+    
+    batch_anomalies, batch_forecasts = analyze(series, FIRST_DAY, horizon=5)
+    
+    original = columnar.np
+    columnar.np = None
+    try:
+        anomalies, forecasts = analyze(series, FIRST_DAY, horizon=5)
+    finally:
+        columnar.np = original
+    
+    assert [a[:3] for a in batch_anomalies] == [a[:3] for a in anomalies]
+    for batch, single in zip(batch_forecasts, forecasts):
+        assert [value for point in batch for value in point] == pytest.approx([value for point in single for value in point])
+
+
+def test_baseline_updates_incrementally():
+    values = weekly_series(30, seed=4)
+    whole = SeasonalBaseline(float(values[0]), FIRST_DAY)
+    for offset, value in enumerate(values[1:], start=1):
+        whole.update(float(value), FIRST_DAY + offset)
+    
+    # Carrying the state forward gives the same answer as one pass over the history
+    resumed = SeasonalBaseline(float(values[0]), FIRST_DAY)
+    for offset, value in enumerate(values[1:20], start=1):
+        resumed.update(float(value), FIRST_DAY + offset)
+    for offset, value in enumerate(values[20:], start=20):
+        resumed.update(float(value), FIRST_DAY + offset)
+    
+    assert resumed.forecast(1) == whole.forecast(1)
+    assert whole.day == FIRST_DAY + 29
+    assert whole.forecast(7)[1] > whole.forecast(1)[1]
@@ -0,0 +1,203 @@
+import asyncio
+import threading
+from datetime import datetime
+from botocore.exceptions import ClientError
+from moto import mock_dynamodb
+import boto3
+import pytest
+from fastapi.testclient import TestClient
+from src import main
+from src.database import idempotency_client
+from src.handlers.bulk_handler import BulkHandler
+from src.handlers.expense_handler import ExpenseHandler
+from src.models.expense import ExpenseCreate
+
+MONTH = "2024-05"
+
+
+def create_tables():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'expense_id', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    dynamodb.create_table(
+        TableName='expense-budgets',
+        KeySchema=[
+            {'AttributeName': 'budget_key', 'KeyType': 'HASH'},
+            {'AttributeName': 'month', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'budget_key', 'AttributeType': 'S'},
+            {'AttributeName': 'month', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    dynamodb.create_table(
+        TableName='expense-idempotency',
+        KeySchema=[{'AttributeName': 'idempotency_key', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'idempotency_key', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+class SerialClient:
+    """moto's transactions aren't safe across threads; run calls one at a time, as DynamoDB applies each atomically"""
+    
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+        self.calls = []
+    
+    def __getattr__(self, name):
+        operation = getattr(self._client, name)
+        if not callable(operation):
+            return operation
+        
+        def call(*args, **kwargs):
+            with self._lock:
+                self.calls.append(name)
+                return operation(*args, **kwargs)
+        return call
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    monkeypatch.setenv('BUDGETS_TABLE', 'expense-budgets')
+    monkeypatch.setenv('IDEMPOTENCY_TABLE', 'expense-idempotency')
+    with mock_dynamodb():
+        create_tables()
+        expense_handler = ExpenseHandler()
+        db_client = expense_handler.db_client
+        db_client.client = SerialClient(db_client.client)
+        db_client.idempotency.client = db_client.client
+        yield expense_handler
+
+
+def stored(handler):
+    return handler.db_client.table.scan()['Items']
+
+
+def spent(handler, name="production"):
+    status = handler.budgets.get_budget_status("client", name, MONTH)
+    return status.spent, status.expense_count
+
+
+def test_retries_replay_the_first_response(handler, monkeypatch):
+    monkeypatch.setattr(main, '_expense_handler', handler)
+    client = TestClient(main.app)
+    body = {"service_name": "EC2", "client": "Production", "cost": 12.5}
+    
+    first = client.post("/expenses", json=body, headers={"Idempotency-Key": "export-1"})
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+    
+    # The retry leaves date to default again; only the fields sent are compared
+    retry = client.post("/expenses", json=dict(body, cost="12.50"), headers={"Idempotency-Key": "export-1"})
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert retry.headers["ETag"] == first.headers["ETag"]
+    assert len(stored(handler)) == 1
+    
+    reused = client.post("/expenses", json=dict(body, cost=99), headers={"Idempotency-Key": "export-1"})
+    assert reused.status_code == 422
+    assert client.post("/expenses", json=body, headers={"Idempotency-Key": "k" * 256}).status_code == 400
+    
+    # Without a key every request is a new expense
+    client.post("/expenses", json=body)
+    client.post("/expenses", json=body)
+    assert len(stored(handler)) == 3
+
+
+def test_parallel_retries_create_exactly_once(handler):
+    expense = ExpenseCreate(service_name="EC2", client="Production", cost=7, date=datetime(2024, 5, 10))
+    
+    async def storm():
+        return await asyncio.gather(*(handler.create_expense_idempotent(expense, "storm") for _ in range(32)))
+    
+    results = asyncio.run(storm())
+    assert len({created.expense_id for created, _ in results}) == 1
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert len(stored(handler)) == 1
+    # Budget counters move with the one write only
+    assert spent(handler) == (7.0, 1)
+
+
+def test_cancelled_transactions_are_retried(handler, monkeypatch):
+    db_client = handler.db_client
+    real_transact = db_client.client.transact_write_items
+    attempts = []
+    
+    def conflicting(**kwargs):
+        attempts.append(kwargs)
+        if len(attempts) == 1:
+            raise ClientError({
+                'Error': {'Code': 'TransactionCanceledException', 'Message': 'Transaction cancelled'},
+                'CancellationReasons': [{'Code': 'TransactionConflict'}, {'Code': 'None'}]
+            }, 'TransactWriteItems')
+        return real_transact(**kwargs)
+    
+    monkeypatch.setattr(db_client.client, 'transact_write_items', conflicting, raising=False)
+    item, replayed = db_client.create_expense_once(
+        {"service_name": "S3", "client": "Production", "cost": 3, "date": datetime(2024, 5, 1)}, "busy", "fp"
+    )
+    assert (len(attempts), replayed) == (2, False)
+    assert [row['expense_id'] for row in stored(handler)] == [item['expense_id']]
+
+
+def test_expired_records_free_the_key(handler, monkeypatch):
+    expense = ExpenseCreate(service_name="EC2", client="Production", cost=1, date=datetime(2024, 5, 10))
+    monkeypatch.setattr(idempotency_client, 'IDEMPOTENCY_TTL_SECONDS', 0)
+    first, _ = asyncio.run(handler.create_expense_idempotent(expense, "old"))
+    second, replayed = asyncio.run(handler.create_expense_idempotent(expense, "old"))
+    assert not replayed
+    assert first.expense_id != second.expense_id
+
+
+def test_batch_items_are_created_once(handler):
+    batch = [
+        {"service_name": "S3", "client": "Production", "cost": 2.5, "date": "2024-05-03T00:00:00", "idempotency_key": f"row-{i}"}
+        for i in range(30)
+    ]
+    batch.append(dict(batch[0]))  # repeated within the batch
+    batch.append({"service_name": "S3", "client": "Production", "cost": 1, "date": "2024-05-03T00:00:00"})
+    batch.append(dict(batch[1], cost=5))  # key reused for another expense
+    batch.append(dict(batch[2], idempotency_key=""))
+    
+    first = asyncio.run(handler.create_expenses_bulk(batch))
+    assert (first.created, first.failed) == (32, 2)
+    assert first.results[30].replayed and first.results[30].expense == first.results[0].expense
+    assert [result.status for result in first.results[-2:]] == ["failed", "failed"]
+    assert len(stored(handler)) == 31
+    assert spent(handler) == (76.0, 31)
+    
+    # A retried batch is answered from one round of reads; only the unkeyed item is written again
+    calls = handler.db_client.client.calls
+    del calls[:]
+    retry = asyncio.run(handler.create_expenses_bulk(batch))
+    assert [result.expense for result in retry.results[:31]] == [result.expense for result in first.results[:31]]
+    assert all(result.replayed for result in retry.results[:31])
+    assert not retry.results[31].replayed
+    assert "transact_write_items" not in calls
+    assert len(stored(handler)) == 32
+    assert spent(handler) == (77.0, 32)
+
+
+def test_reimported_rows_are_skipped(handler):
+    bulk = BulkHandler(handler.db_client)
+    rows = "service_name,client,cost,date,idempotency_key\n" + "".join(
+        f"EC2,Production,{i + 1},2024-05-0{i % 9 + 1}T00:00:00,line-{i}\n" for i in range(12)
+    )
+    
+    async def upload():
+        async def body():
+            yield rows.encode()
+        return await bulk.import_expenses(body(), "csv")
+    
+    assert asyncio.run(upload()).imported == 12
+    assert asyncio.run(upload()).imported == 12
+    assert len(stored(handler)) == 12
+    assert spent(handler) == (78.0, 12)
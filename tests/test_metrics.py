@@ -0,0 +1,127 @@
+import io
+import json
+from datetime import datetime
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from moto import mock_dynamodb
+import boto3
+import pytest
+from src.database.async_dynamodb_client import AsyncDynamoDBClient
+from src.database.dynamodb_client import DynamoDBClient
+from src.main import app
+from src.middleware import metrics
+from src.middleware.metrics import MetricsMiddleware, MetricsRegistry, registry
+
+
+def create_table():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    return dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'expense_id', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def counter(name, **labels):
+    return registry.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+
+def histogram(name, **labels):
+    return registry.histograms.get((name, tuple(sorted(labels.items()))))
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(monkeypatch):
+    registry.reset()
+    monkeypatch.setattr(metrics, '_cold_start', True)
+    yield
+    registry.reset()
+
+
+def test_prometheus_rendering():
+    local = MetricsRegistry()
+    local.describe('requests_total', 'Requests served')
+    local.increment('requests_total', route='/a')
+    local.increment('requests_total', 2, route='/a')
+    for value in (0.003, 0.003, 0.2):
+        local.observe('latency_seconds', value, (0.005, 0.1), route='/a"b')
+    
+    text = local.render_prometheus()
+    assert '# HELP requests_total Requests served\n# TYPE requests_total counter\nrequests_total{route="/a"} 3\n' in text
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{route="/a\\"b",le="0.005"} 2' in text
+    assert 'latency_seconds_bucket{route="/a\\"b",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a\\"b",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/a\\"b"} 3' in text
+
+
+@mock_dynamodb
+def test_routes_are_labelled_by_template_and_capacity_is_counted():
+    create_table()
+    client = TestClient(app)
+    created = client.post("/expenses", json={"service_name": "EC2", "client": "prod", "cost": 5}).json()
+    client.get(f"/expenses/{created['expense_id']}")
+    client.get("/expenses/missing")
+    
+    assert histogram('http_request_duration_seconds', route='/expenses', method='POST', status='201').count == 1
+    by_id = histogram('http_request_duration_seconds', route='/expenses/{expense_id}', method='GET', status='200')
+    assert by_id.count == 1
+    assert histogram('http_request_duration_seconds', route='/expenses/{expense_id}', method='GET', status='404').count == 1
+    assert histogram('dynamodb_call_duration_seconds', operation='PutItem').count == 1
+    assert counter('dynamodb_consumed_write_capacity_total', operation='PutItem') == 1.0
+    assert counter('dynamodb_consumed_read_capacity_total', operation='GetItem') == 1.0
+    assert (counter('invocations_total', start='cold'), counter('invocations_total', start='warm')) == (1, 2)
+    
+    text = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/expenses/{expense_id}",status="200"} 1' in text
+    assert 'dynamodb_consumed_write_capacity_total{operation="PutItem"} 1' in text
+
+
+@mock_dynamodb
+def test_emf_line_attributes_dynamodb_work_to_the_request():
+    create_table()
+    db_client = DynamoDBClient()
+    for cost in (1, 2, 3, 50):
+        db_client.create_expense({"service_name": "EC2", "client": "prod", "cost": cost, "date": datetime(2024, 1, 1)})
+    db = AsyncDynamoDBClient(db_client)
+    
+    probe = FastAPI()
+    buffer = io.StringIO()
+    probe.add_middleware(MetricsMiddleware, emf=True, stream=buffer)
+    
+    @probe.get("/cheap/{name}")
+    async def cheap(name: str):
+        # One call on the async pool, two scan segments on fan_out threads and one direct call
+        await db.list_expenses_page(10)
+        db_client.parallel_scan(lambda items: sum(1 for _ in items), lambda a, b: a + b, total_segments=2)
+        response = db_client.client.scan(
+            TableName='expenses-table', FilterExpression='cost > :c', ExpressionAttributeValues={':c': 10}
+        )
+        return {"count": response['Count']}
+    
+    assert TestClient(probe).get("/cheap/x").json() == {"count": 1}
+    
+    record = json.loads(buffer.getvalue())
+    directive = record["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Dimensions"] == [["Route"]]
+    assert {metric["Name"] for metric in directive["Metrics"]} >= {"Latency", "ConsumedReadCapacity", "ItemsScanned"}
+    assert record["Route"] == "GET /cheap/{name}"
+    assert record["StatusCode"] == 200
+    assert record["DynamoDBCalls"] == 4
+    assert record["ItemsScanned"] == 16
+    assert record["ItemsReturned"] == 13
+    assert record["ConsumedReadCapacity"] > 0
+    assert record["ColdStart"] == 1
+
+
+@mock_dynamodb
+def test_overhead_stays_within_budget():
+    create_table()
+    client = TestClient(app)
+    for _ in range(50):
+        client.get("/expenses/missing")
+    
+    overhead = histogram('metrics_overhead_seconds')
+    assert overhead.count == 50
+    assert overhead.total / overhead.count < metrics.OVERHEAD_BUDGET_SECONDS
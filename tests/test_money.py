@@ -0,0 +1,84 @@
+from collections import defaultdict
+from decimal import Decimal
+import random
+import pytest
+from src.analytics import columnar
+from src.analytics.columnar import ExpenseColumns
+from src.analytics.groupby import aggregate_groups
+from src.models.money import Money, from_minor_units, to_amount, to_minor_units
+
+
+def random_amount(rng, exponent):
+    """A positive amount with at most `exponent` decimal places, up to 100000"""
+    return Decimal(rng.randrange(1, 100000 * 10 ** exponent)).scaleb(-exponent)
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_totals_match_decimal_reference(seed, use_numpy, monkeypatch):
+    if not use_numpy:
+        monkeypatch.setattr(columnar, "np", None)
+    rng = random.Random(seed)
+    
+    items = []
+    reference = defaultdict(Decimal)
+    for _ in range(5000):
+        cost = Money.of(random_amount(rng, 2))
+        item = {
+            "service_name": rng.choice(["EC2", "S3", "Lambda", "RDS"]),
+            "client": rng.choice(["production", "staging"]),
+            "cost": cost.amount,
+            "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "currency": "USD"
+        }
+        # Some items predate cost_units and are converted from the Decimal
+        if rng.random() < 0.8:
+            item["cost_units"] = Decimal(cost.units)
+        items.append(item)
+        reference[(item["service_name"], item["date"][:7])] += cost.amount
+    
+    columns = ExpenseColumns.from_items(items)
+    groups = aggregate_groups(columns, ["service_name", "month"])
+    
+    assert {group["labels"]: from_minor_units(group["total_units"]) for group in groups} == dict(reference)
+    assert sum(units for units, _ in columns.group_by("client").values()) == to_minor_units(sum(reference.values()))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_minor_units_round_trip(seed):
+    rng = random.Random(seed)
+    for currency, exponent in (("USD", 2), ("JPY", 0), ("KWD", 3)):
+        for _ in range(1000):
+            amount = random_amount(rng, exponent)
+            units = to_minor_units(amount, currency)
+            assert isinstance(units, int)
+            assert from_minor_units(units, currency) == amount
+
+
+def test_rounding_only_at_precision_boundary():
+    assert to_minor_units(Decimal("1.005")) == 101
+    assert to_minor_units("2.5", "JPY") == 3
+    assert to_minor_units(Decimal("0.0004"), "KWD") == 0
+    assert to_amount(1234.5) == 12.35
+    assert to_amount(7, "JPY") == 7.0
+
+
+def test_money_arithmetic():
+    total = sum([Money.of("0.10"), Money.of("0.20"), Money.of("0.30")])
+    assert total == Money.of("0.60")
+    assert total.amount == Decimal("0.60")
+    
+    with pytest.raises(ValueError):
+        Money.of(1) + Money.of(1, "EUR")
+    with pytest.raises(ValueError):
+        Money.of(1, "XXX")
+
+
+def test_columns_skip_other_currencies():
+    items = [
+        {"service_name": "EC2", "client": "a", "cost": Decimal("5"), "date": "2024-01-01", "currency": "USD"},
+        {"service_name": "EC2", "client": "a", "cost": Decimal("500"), "date": "2024-01-01", "currency": "JPY"},
+        {"service_name": "EC2", "client": "a", "cost": Decimal("1.25"), "date": "2024-01-01"},
+    ]
+    assert ExpenseColumns.from_items(items).group_by("service_name") == {"EC2": (625, 2)}
+    assert ExpenseColumns.from_items(items, currency="JPY").group_by("service_name") == {"EC2": (500, 1)}
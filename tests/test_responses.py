@@ -0,0 +1,121 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from moto import mock_dynamodb
+import boto3
+import pytest
+from src.database.dynamodb_client import DynamoDBClient
+from src.handlers import responses
+from src.handlers.expense_handler import format_expense
+from src.handlers.responses import dumps, expense_document, expense_documents
+from src.main import app
+from src.models.expense import ExpenseResponse
+
+
+def reference_bytes(items):
+    """What the route rendered before: models validated and serialized by FastAPI"""
+    reference = FastAPI()
+    
+    @reference.get("/items", response_model=List[ExpenseResponse])
+    def listing():
+        return [format_expense(item) for item in items]
+    
+    return TestClient(reference).get("/items").content
+
+
+def random_items(count):
+    rng = random.Random(19)
+    start = datetime(2024, 1, 1)
+    items = []
+    for index in range(count):
+        stamp = start + timedelta(seconds=rng.randrange(10 ** 8), microseconds=rng.choice((0, rng.randrange(10 ** 6))))
+        currency = rng.choice(("USD", "EUR", "JPY"))
+        # Within the model's 100000 cap at each currency's precision
+        units = rng.randrange(1, 10 ** 5 if currency == "JPY" else 10 ** 7)
+        items.append({
+            'expense_id': f"id-{index}",
+            'service_name': rng.choice(("EC2", "S3", "Lambda", "Größe ☃", 'quote "q"')),
+            'client': rng.choice(("prod", "staging\nnew", "back\\slash")),
+            'currency': currency,
+            'cost': Decimal(units) if currency == "JPY" else Decimal(units).scaleb(-2),
+            'cost_units': Decimal(units),
+            'date': stamp.isoformat(),
+            'description': rng.choice((None, "line item", "emoji 💸")),
+            'created_at': stamp.isoformat(),
+            'updated_at': (stamp + timedelta(microseconds=rng.randrange(10 ** 6))).isoformat(),
+            'version': Decimal(rng.randrange(1, 5))
+        })
+    return items
+
+
+# Items the fast path hands to the model: date-only and offset timestamps, extra precision, no currency or version
+IRREGULAR_ITEMS = [
+    {'expense_id': 'a', 'service_name': 'S3', 'client': 'c', 'cost': Decimal('12.345'),
+     'date': '2024-01-01', 'created_at': '2024-01-01T10:00:00+00:00', 'updated_at': '2024-01-01T10:00:00.5+05:30'},
+    {'expense_id': 'b', 'service_name': 'S3', 'client': 'c', 'currency': 'JPY', 'cost': Decimal('1000.5'),
+     'date': '2024-01-01T00:00:00Z', 'created_at': '2024-01-01 10:00:00', 'updated_at': '2024-01-01T10:00'},
+    {'expense_id': 'c', 'service_name': 'S3', 'client': 'c', 'cost': 7,
+     'date': '2024-02-29T23:59:59.000001', 'created_at': '2024-02-29T23:59:59', 'updated_at': '2024-02-29T23:59:59'},
+]
+
+
+@pytest.mark.parametrize("encoder", ["orjson", "json"])
+def test_documents_match_the_model_pipeline_byte_for_byte(monkeypatch, encoder):
+    if encoder == "json":
+        monkeypatch.setattr(responses, "orjson", None)
+    elif responses.orjson is None:
+        pytest.skip("orjson is not installed")
+    
+    items = random_items(500) + IRREGULAR_ITEMS
+    assert dumps(expense_documents(items)) == reference_bytes(items)
+    assert dumps([]) == reference_bytes([])
+
+
+def test_sparse_documents_match_the_full_document():
+    items = random_items(200) + IRREGULAR_ITEMS + [
+        {'expense_id': 'd', 'service_name': 'S3', 'client': 'c', 'cost': Decimal('2.675'),
+         'date': '2024-01-01', 'created_at': '2024-01-01T10:00:00', 'updated_at': '2024-01-01T10:00:00'}
+    ]
+    rng = random.Random(20)
+    schema = list(ExpenseResponse.model_fields)
+    for item in items:
+        full = format_expense(item).model_dump(mode='json')
+        fields = [field for field in schema if rng.random() < 0.5]
+        assert expense_document(item, fields) == {field: full[field] for field in fields}
+        assert expense_document(item, schema) == full
+
+
+def create_table():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    return dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'expense_id', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+@mock_dynamodb
+def test_list_endpoint_serves_the_same_bytes():
+    create_table()
+    db_client = DynamoDBClient()
+    for index in range(12):
+        db_client.create_expense({
+            "service_name": "EC2", "client": "prod", "cost": Decimal("1.10") * (index + 1),
+            "date": datetime(2024, 3, 1, 12, 30), "description": "ünïcode" if index % 2 else None
+        })
+    
+    client = TestClient(app)
+    first = client.get("/expenses", params={"limit": 5})
+    assert first.headers["content-type"] == "application/json"
+    items, _ = db_client.list_expenses_page(5)
+    assert first.content == reference_bytes(items)
+    
+    cursor = first.headers["X-Next-Cursor"]
+    rest = client.get("/expenses", params={"limit": 100, "cursor": cursor})
+    assert len(rest.json()) == 7
+    assert "X-Next-Cursor" not in rest.headers
+    assert client.get("/expenses", params={"cursor": "garbage"}).status_code == 400
@@ -0,0 +1,185 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from moto import mock_dynamodb
+from boto3.dynamodb.types import TypeSerializer
+import boto3
+import itertools
+import uuid
+from src.database.rollup_client import RollupClient, rollup_buckets
+from src.handlers import rollup_handler
+from src.handlers.cost_analysis_handler import CostAnalysisHandler
+
+serializer = TypeSerializer()
+sequence = itertools.count(1)
+
+
+def create_tables():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[
+            {'AttributeName': 'expense_id', 'KeyType': 'HASH'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'expense_id', 'AttributeType': 'S'},
+            {'AttributeName': 'month_bucket', 'AttributeType': 'S'},
+            {'AttributeName': 'date', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': 'date-index',
+            'KeySchema': [
+                {'AttributeName': 'month_bucket', 'KeyType': 'HASH'},
+                {'AttributeName': 'date', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    return dynamodb.create_table(
+        TableName='expense-rollups',
+        KeySchema=[
+            {'AttributeName': 'period', 'KeyType': 'HASH'},
+            {'AttributeName': 'rollup_key', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'period', 'AttributeType': 'S'},
+            {'AttributeName': 'rollup_key', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def image(expense):
+    return {k: serializer.serialize(v) for k, v in expense.items()}
+
+
+def record(event_name, old=None, new=None):
+    images = {'SequenceNumber': str(next(sequence))}
+    if old:
+        images['OldImage'] = image(old)
+    if new:
+        images['NewImage'] = image(new)
+    return {'eventID': uuid.uuid4().hex, 'eventName': event_name, 'dynamodb': images}
+
+
+def rollup(table, period, rollup_key):
+    item = table.get_item(Key={'period': period, 'rollup_key': rollup_key}).get('Item')
+    return (item['total_cost'], item['expense_count']) if item else None
+
+
+@mock_dynamodb
+def test_stream_deltas_move_money_between_buckets(monkeypatch):
+    table = create_tables()
+    monkeypatch.setattr(rollup_handler, '_rollup_client', RollupClient())
+    
+    original = {'expense_id': 'e1', 'service_name': 'EC2', 'client': 'Production',
+                'cost': Decimal('10.25'), 'date': '2024-03-09T12:00:00'}
+    moved = dict(original, client='Staging', cost=Decimal('4.00'))
+    other = {'expense_id': 'e2', 'service_name': 'S3', 'client': 'staging',
+             'cost': Decimal('1.50'), 'date': '2024-03-20T00:00:00'}
+    
+    rollup_handler.handler({'Records': [record('INSERT', new=original), record('INSERT', new=other)]})
+    assert rollup(table, 'MONTH#2024-03', 'total##total') == (Decimal('11.75'), 2)
+    assert rollup(table, 'DAY#2024-03-09', 'client##Production') == (Decimal('10.25'), 1)
+    
+    rollup_handler.handler({'Records': [record('MODIFY', old=original, new=moved)]})
+    assert rollup(table, 'DAY#2024-03-09', 'client##Production') == (Decimal('0'), 0)
+    assert rollup(table, 'MONTH#2024-03', 'client_service#staging#EC2') == (Decimal('4.00'), 1)
+    assert rollup(table, 'ALL#all', 'service##EC2') == (Decimal('4.00'), 1)
+    
+    rollup_handler.handler({'Records': [record('REMOVE', old=other)]})
+    assert rollup(table, 'MONTH#2024-03', 'total##total') == (Decimal('4.00'), 1)
+
+
+@mock_dynamodb
+def test_replayed_batch_is_applied_once(monkeypatch):
+    table = create_tables()
+    monkeypatch.setattr(rollup_handler, '_rollup_client', RollupClient())
+    
+    expense = {'expense_id': 'e1', 'service_name': 'EC2', 'client': 'Production',
+               'cost': Decimal('10.25'), 'date': '2024-03-09T12:00:00'}
+    moved = dict(expense, cost=Decimal('4.00'))
+    batch = {'Records': [record('INSERT', new=expense), record('MODIFY', old=expense, new=moved)]}
+    
+    assert rollup_handler.handler(batch)['rollups_updated'] > 0
+    assert rollup(table, 'MONTH#2024-03', 'total##total') == (Decimal('4.00'), 1)
+    
+    # A retry after a partial failure redelivers the whole batch
+    assert rollup_handler.handler(batch)['rollups_updated'] == 0
+    assert rollup(table, 'MONTH#2024-03', 'total##total') == (Decimal('4.00'), 1)
+    assert rollup(table, 'DAY#2024-03-09', 'client##Production') == (Decimal('4.00'), 1)
+    
+    # Without an eventID the sequence number identifies the record
+    removal = record('REMOVE', old=moved)
+    del removal['eventID']
+    rollup_handler.handler({'Records': [removal]})
+    rollup_handler.handler({'Records': [removal]})
+    assert rollup(table, 'ALL#all', 'service##EC2') == (Decimal('0.00'), 0)
+    
+    # A rebuild replaces the rollups but keeps the markers
+    RollupClient().rebuild()
+    assert rollup_handler.handler(batch)['rollups_updated'] == 0
+
+
+def test_rollup_buckets_use_whole_months():
+    assert rollup_buckets(date(2024, 1, 30), date(2024, 3, 2)) == [
+        'DAY#2024-01-30', 'DAY#2024-01-31', 'MONTH#2024-02', 'DAY#2024-03-01', 'DAY#2024-03-02'
+    ]
+
+
+@mock_dynamodb
+def test_rebuild_matches_raw_analytics(monkeypatch):
+    create_tables()
+    raw = CostAnalysisHandler()
+    now = datetime.now()
+    for i, (service_name, client) in enumerate([("EC2", "production"), ("S3", "Staging"), ("EC2", "staging")]):
+        raw.db_client.create_expense({
+            "service_name": service_name,
+            "client": client,
+            "cost": 2.5 * (i + 1),
+            "date": now - timedelta(days=i)
+        })
+    
+    monkeypatch.setenv('ROLLUPS_TABLE', 'expense-rollups')
+    handler = CostAnalysisHandler()
+    assert handler.rollups.rebuild() > 0
+    
+    top = handler.get_top_services()
+    assert top == raw.get_top_services()
+    
+    breakdown = handler.get_cost_breakdown(group_by="service", client_filter="STAGING")
+    assert breakdown["metadata"]["query_plan"] == "rollup"
+    assert {row["category"]: row["total_cost"] for row in breakdown["breakdown"]} == {"S3": 5.0, "EC2": 7.5}
+    
+    by_client = handler.get_cost_breakdown(group_by="client", client_filter="production")
+    assert [row["category"] for row in by_client["breakdown"]] == ["production"]
+    
+    trends = handler.get_monthly_trends(months=1)
+    assert sum(row["expense_count"] for row in trends["trends"]) == 3
+
+
+@mock_dynamodb
+def test_partial_day_ranges_read_raw_expenses(monkeypatch):
+    create_tables()
+    raw = CostAnalysisHandler()
+    for hour, cost in ((9, 1.25), (18, 2.0)):
+        raw.db_client.create_expense({
+            "service_name": "EC2",
+            "client": "production",
+            "cost": cost,
+            "date": datetime(2024, 3, 9, hour)
+        })
+    
+    monkeypatch.setenv('ROLLUPS_TABLE', 'expense-rollups')
+    handler = CostAnalysisHandler()
+    handler.rollups.rebuild()
+    
+    whole = handler.get_cost_breakdown(datetime(2024, 3, 9), datetime(2024, 3, 9, 23, 59, 59, 999999))
+    assert whole["metadata"]["query_plan"] == "rollup"
+    assert whole["summary"]["total_cost"] == 3.25
+    
+    # Rollup rows cover whole days, so a range ending mid-day must not count the evening expense
+    morning = handler.get_cost_breakdown(datetime(2024, 3, 9), datetime(2024, 3, 9, 12))
+    assert morning["metadata"]["query_plan"] != "rollup"
+    assert morning["summary"]["total_cost"] == 1.25
+    assert morning == raw.get_cost_breakdown(datetime(2024, 3, 9), datetime(2024, 3, 9, 12))
@@ -0,0 +1,202 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from moto import mock_dynamodb, mock_s3
+import boto3
+import pytest
+from src.analytics import columnar
+from src.analytics.columnar import ExpenseColumns
+from src.analytics.snapshots import SnapshotBuilder, load_columns, month_range, snapshot_key
+from src.database import snapshot_store
+from src.database.snapshot_store import LocalSnapshotStore, S3SnapshotStore
+from src.handlers.cost_analysis_handler import CostAnalysisHandler
+from src.handlers.snapshot_handler import closed_months, compact, drop_stale_snapshots
+
+
+def create_table():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    return dynamodb.create_table(
+        TableName='expenses-table',
+        KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'expense_id', 'AttributeType': 'S'},
+            {'AttributeName': 'month_bucket', 'AttributeType': 'S'},
+            {'AttributeName': 'date', 'AttributeType': 'S'},
+            {'AttributeName': 'client_key', 'AttributeType': 'S'},
+            {'AttributeName': 'service_key', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                'IndexName': index,
+                'KeySchema': [
+                    {'AttributeName': hash_key, 'KeyType': 'HASH'},
+                    {'AttributeName': 'date', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            }
+            for index, hash_key in (
+                ('date-index', 'month_bucket'), ('client-index', 'client_key'), ('service-index', 'service_key')
+            )
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def make_items(count, month="2024-03", seed=5):
+    rng = random.Random(seed)
+    start, _ = month_range(month)
+    return [
+        {
+            "service_name": rng.choice(["EC2", "S3", "Lambda"]),
+            "client": rng.choice(["Production", "staging", "QA"]),
+            "cost": Decimal(rng.randrange(1, 50000)) / 100,
+            "currency": rng.choice(["USD", "USD", "EUR"]),
+            "date": (start + timedelta(days=rng.randrange(28), seconds=rng.randrange(86400))).isoformat()
+        }
+        for _ in range(count)
+    ]
+
+
+@pytest.fixture(params=["default", "pure-python"])
+def backend(request, monkeypatch):
+    if request.param == "pure-python":
+        monkeypatch.setattr(columnar, "np", None)
+    return request.param
+
+
+def test_snapshot_round_trip_matches_columns(backend):
+    items = make_items(400)
+    snapshot = SnapshotBuilder.from_items(items).to_bytes("2024-03")
+    
+    for currency in ("USD", "EUR"):
+        columns = load_columns(snapshot, currency)
+        expected = ExpenseColumns.from_items(items, currency)
+        for dimension in ("service_name", "client", "day", "week"):
+            assert columns.group_by(dimension) == expected.group_by(dimension)
+    assert len(load_columns(snapshot, "JPY")) == 0
+    
+    # Filters behave as the DynamoDB reads do: inclusive dates, names ignoring case
+    start, end = datetime(2024, 3, 4, 12), datetime(2024, 3, 19, 6, 30)
+    chosen = [
+        item for item in items
+        if item["client"] == "staging" and item["service_name"] == "S3"
+        and start.isoformat() <= item["date"] <= end.isoformat()
+    ]
+    columns = load_columns(snapshot, "USD", start, end, client="STAGING", service="s3")
+    expected = ExpenseColumns.from_items(chosen)
+    assert columns.group_by("day") == expected.group_by("day")
+    assert (columns.service_names.values, columns.client_names.values) == (["S3"], ["staging"])
+
+
+@pytest.fixture
+def reporting(tmp_path):
+    with mock_dynamodb():
+        create_table()
+        handler = CostAnalysisHandler()
+        rng = random.Random(9)
+        months = closed_months(3)
+        now = datetime.now()
+        for month in months + [f"{now:%Y-%m}"]:
+            start, end = month_range(month)
+            end = min(end, now)
+            for _ in range(25):
+                handler.db_client.create_expense({
+                    "service_name": rng.choice(["EC2", "S3", "RDS"]),
+                    "client": rng.choice(["Production", "staging"]),
+                    "cost": Decimal(rng.randrange(1, 20000)) / 100,
+                    "date": start + (end - start) * rng.random()
+                })
+        
+        queried = []
+        real_query = handler.db_client.client.query
+        
+        def query(**kwargs):
+            queried.append(kwargs['ExpressionAttributeValues'][':h'])
+            return real_query(**kwargs)
+        
+        handler.db_client.client.query = query
+        yield handler, LocalSnapshotStore(str(tmp_path)), months, queried
+
+
+def test_reports_merge_snapshots_with_the_live_month(reporting):
+    handler, store, months, queried = reporting
+    # Starts part-way into the oldest month, so that snapshot is cut by date too
+    start = month_range(months[0])[0] + timedelta(days=10, hours=6)
+    end = datetime.now()
+    live = handler.get_cost_breakdown(start_date=start, end_date=end, group_by="service,month")
+    by_client = handler.get_cost_breakdown(start_date=start, end_date=end, group_by="day", client_filter="STAGING")
+    
+    assert sorted(compact(months, db_client=handler.db_client, store=store).values()) == [25, 25, 25]
+    handler.snapshots = store
+    del queried[:]
+    
+    merged = handler.get_cost_breakdown(start_date=start, end_date=end, group_by="service,month")
+    assert merged["metadata"]["query_plan"] == "snapshot+date-index"
+    assert merged["summary"] == live["summary"]
+    key = lambda row: (row["service"], row["month"])
+    assert sorted(merged["breakdown"], key=key) == sorted(live["breakdown"], key=key)
+    # Only the current month is read from DynamoDB
+    assert queried == [f"{end:%Y-%m}"]
+    
+    filtered = handler.get_cost_breakdown(start_date=start, end_date=end, group_by="day", client_filter="STAGING")
+    assert filtered["metadata"]["query_plan"] == "snapshot+client-index"
+    assert sorted(filtered["breakdown"], key=lambda row: row["category"]) == sorted(
+        by_client["breakdown"], key=lambda row: row["category"]
+    )
+    
+    # A window of closed months never touches DynamoDB
+    del queried[:]
+    history = handler.get_cost_breakdown(start_date=start, end_date=month_range(months[-1])[1], group_by="client")
+    assert history["metadata"]["query_plan"] == "snapshot"
+    assert queried == []
+
+
+def test_changes_to_closed_months_drop_their_snapshots(reporting):
+    handler, store, months, queried = reporting
+    compact(months, db_client=handler.db_client, store=store)
+    assert compact(months, db_client=handler.db_client, store=store) == {}
+    handler.snapshots = store
+    
+    late = handler.db_client.create_expense({
+        "service_name": "EC2", "client": "Production", "cost": 1000, "date": month_range(months[1])[0]
+    })
+    current = {'date': {'S': datetime.now().isoformat()}}
+    records = [
+        {'eventName': 'INSERT', 'dynamodb': {'NewImage': {'date': {'S': late['date']}}}},
+        {'eventName': 'MODIFY', 'dynamodb': {'OldImage': current, 'NewImage': current}},
+    ]
+    assert drop_stale_snapshots(records, store) == [months[1]]
+    assert store.keys() == [snapshot_key(months[0]), snapshot_key(months[2])]
+    
+    # The month is read live until compacted again, so the late expense counts either way
+    start, end = month_range(months[0])[0], month_range(months[-1])[1]
+    del queried[:]
+    report = handler.get_cost_breakdown(start_date=start, end_date=end, group_by="month")
+    assert queried == [months[1]]
+    assert report["metadata"]["query_plan"] == "snapshot+date-index"
+    assert compact(months, db_client=handler.db_client, store=store) == {months[1]: 26}
+    assert handler.get_cost_breakdown(start_date=start, end_date=end, group_by="month")["summary"] == report["summary"]
+
+
+def test_s3_store_maps_each_version_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_store, 'SNAPSHOT_REFRESH_SECONDS', 0)
+    with mock_s3():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket='snapshots')
+        store = S3SnapshotStore('snapshots', 'prefix/', cache_dir=str(tmp_path), client=client)
+        first = SnapshotBuilder.from_items(make_items(10)).to_bytes("2024-03")
+        second = SnapshotBuilder.from_items(make_items(20)).to_bytes("2024-03")
+        
+        assert store.open(snapshot_key("2024-03")) is None
+        store.put(snapshot_key("2024-03"), first)
+        assert store.keys() == [snapshot_key("2024-03")]
+        assert store.open(snapshot_key("2024-03"))[:] == first
+        assert store.open(snapshot_key("2024-03")) is store.open(snapshot_key("2024-03"))
+        
+        store.put(snapshot_key("2024-03"), second)
+        assert store.open(snapshot_key("2024-03"))[:] == second
+        # Only the current version stays in the local cache
+        assert len(LocalSnapshotStore(str(tmp_path)).keys()) == 1
+        
+        store.delete(snapshot_key("2024-03"))
+        assert store.open(snapshot_key("2024-03")) is None
@@ -0,0 +1,219 @@
+import json
+from datetime import datetime
+from botocore.awsrequest import AWSResponse
+from moto import mock_dynamodb
+from moto.core.models import botocore_stubber
+import boto3
+import pytest
+from fastapi.testclient import TestClient
+from src import main
+from src.database import throttle
+from src.database.dynamodb_client import DynamoDBClient, get_dynamodb
+from src.database.throttle import AdaptiveRateLimiter, TokenBucket, backoff_delay, call_resources, is_throttle
+from src.handlers.expense_handler import ExpenseHandler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class RawBody:
+    def __init__(self, body):
+        self._body = body
+    
+    def stream(self, **kwargs):
+        yield self._body
+
+
+class ThrottleStub:
+    """Answers the first `times` calls of an operation with a throttling error
+    
+    moto serves calls from a before-send hook, and every before-send hook runs
+    even once one has answered; the stub stands in for moto's hook so that a
+    throttled call really isn't applied.
+    """
+    
+    def __init__(self, operation, times):
+        self.operation = operation
+        self.times = times
+        self.calls = 0
+        self.events = get_dynamodb().meta.client.meta.events
+    
+    def __enter__(self):
+        self.events.unregister('before-send', botocore_stubber)
+        self.events.register('before-send', self.respond)
+        return self
+    
+    def __exit__(self, *exc):
+        self.events.unregister('before-send', self.respond)
+        self.events.register('before-send', botocore_stubber)
+    
+    def respond(self, event_name, request, **kwargs):
+        if event_name.endswith(f'.{self.operation}'):
+            self.calls += 1
+            if self.calls <= self.times:
+                body = json.dumps({
+                    '__type': 'com.amazonaws.dynamodb.v20120810#ProvisionedThroughputExceededException',
+                    'message': 'The level of configured provisioned throughput for the table was exceeded.'
+                }).encode()
+                return AWSResponse(request.url, 400, {'x-amzn-requestid': 'throttled'}, RawBody(body))
+        return botocore_stubber(event_name, request, **kwargs)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    monkeypatch.setattr(throttle, 'RETRY_BASE_SECONDS', 0.001)
+    throttle.reset_limiters()
+    with mock_dynamodb():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        yield dynamodb.create_table(
+            TableName='expenses-table',
+            KeySchema=[{'AttributeName': 'expense_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'expense_id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+    throttle.reset_limiters()
+
+
+EXPENSE = {"service_name": "EC2", "client": "Production", "cost": 4, "date": datetime(2024, 5, 1)}
+
+
+def test_throttled_calls_are_retried(table):
+    with ThrottleStub('PutItem', 3) as stub:
+        created = DynamoDBClient().create_expense(dict(EXPENSE))
+    assert stub.calls == 4
+    assert table.get_item(Key={'expense_id': created['expense_id']})['Item']['cost'] == 4
+
+
+def test_persistent_throttling_answers_429(table, monkeypatch):
+    monkeypatch.setattr(throttle, 'DYNAMODB_MAX_ATTEMPTS', 3)
+    monkeypatch.setattr(main, '_expense_handler', ExpenseHandler())
+    client = TestClient(main.app)
+    
+    with ThrottleStub('PutItem', 100) as stub:
+        response = client.post("/expenses", json={"service_name": "EC2", "client": "Production", "cost": 4})
+    assert stub.calls == 3
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert table.scan()['Count'] == 0
+
+
+def test_throttling_slows_the_table_down(table, monkeypatch):
+    monkeypatch.setattr(throttle, 'ADAPTIVE_RATE', True)
+    clock = FakeClock()
+    limiter = throttle._limiters[('expenses-table', 'write')] = AdaptiveRateLimiter(clock, lambda seconds: None)
+    # Writes were going out at 40/s (this one included) when the table started throttling
+    for _ in range(39):
+        limiter.acquire()
+    
+    db_client = DynamoDBClient()
+    with ThrottleStub('PutItem', 2) as stub:
+        db_client.create_expense(dict(EXPENSE))
+    assert stub.calls == 3
+    # Halved once (the second throttle falls in the cooldown); recovery waits for time to pass
+    assert limiter.ceiling == 40
+    assert limiter.rate == 20
+    assert limiter.epoch == 1
+    
+    # Reads of the table keep their own, still unlimited, rate
+    db_client.list_expenses()
+    assert throttle.get_limiter('expenses-table', 'read').rate is None
+
+
+def test_limiter_backs_off_and_recovers():
+    clock, slept = FakeClock(), []
+    limiter = AdaptiveRateLimiter(clock, slept.append)
+    for _ in range(40):
+        clock.now += 0.025
+        assert limiter.acquire() == 0
+    assert limiter.rate is None
+    
+    # Throttled at 40 requests/s: limit to half that, once per cooldown however many calls were throttled
+    epoch = limiter.epoch
+    limiter.throttled(epoch)
+    limiter.throttled(epoch)
+    assert limiter.rate == 20
+    for _ in range(20):
+        clock.now += throttle.RATE_COOLDOWN / 20
+        limiter.acquire()
+    # A call sent before the last decrease doesn't back off again, even after the cooldown
+    limiter.throttled(epoch)
+    assert limiter.rate == 20
+    limiter.throttled(limiter.epoch)
+    assert (limiter.ceiling, limiter.rate) == (20, 10)
+    assert limiter.retry_after() == 0.1
+    
+    # A burst beyond the bucket waits its turn
+    waits = [limiter.acquire() for _ in range(12)]
+    assert waits[:10] == [0] * 10
+    assert waits[10:] == pytest.approx([0.1, 0.2])
+    assert slept == waits[10:]
+    
+    # Successes climb back towards the throttled rate with time, not call count, then probe past it
+    limiter.succeeded()
+    limiter.succeeded()
+    assert limiter.rate == 10
+    rates = []
+    for _ in range(30):
+        clock.now += 0.1
+        limiter.succeeded()
+        rates.append(limiter.rate)
+    assert rates == sorted(rates)
+    assert rates[14] > 19
+    assert rates[-1] - rates[-6] == pytest.approx(throttle.RATE_INCREASE * 0.5)
+    
+    # The limit holds until a whole RATE_RELEASE passes without a throttle
+    clock.now += throttle.RATE_RELEASE
+    limiter.succeeded()
+    assert limiter.rate is None
+
+
+def test_token_bucket_queues_callers():
+    clock = FakeClock()
+    bucket = TokenBucket(2, clock)
+    assert [bucket.reserve() for _ in range(4)] == [0, 0, 0.5, 1.0]
+    clock.now += 1.0
+    assert bucket.reserve() == 0.5
+    
+    bucket.set_rate(4)
+    clock.now += 1.0
+    assert bucket.reserve() == 0
+    assert bucket.tokens == 2
+
+
+def test_backoff_is_full_jitter(monkeypatch):
+    monkeypatch.setattr(throttle, 'RETRY_BASE_SECONDS', 0.01)
+    monkeypatch.setattr(throttle, 'RETRY_CAP_SECONDS', 0.5)
+    for attempt, ceiling in ((1, 0.02), (3, 0.08), (10, 0.5)):
+        delays = [backoff_delay(attempt) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        # Spread across the window rather than bunched at its top
+        assert min(delays) < ceiling / 4 and max(delays) > ceiling * 3 / 4
+
+
+def test_call_resources_and_throttle_codes():
+    assert call_resources('Query', {'TableName': 'expenses-table', 'IndexName': 'client-index'}) == [
+        ('expenses-table/client-index', 'read')
+    ]
+    assert call_resources('BatchWriteItem', {'RequestItems': {'expenses-table': []}}) == [('expenses-table', 'write')]
+    assert call_resources('TransactWriteItems', {'TransactItems': [
+        {'Put': {'TableName': 'expense-idempotency'}},
+        {'Put': {'TableName': 'expenses-table'}},
+        {'Update': {'TableName': 'expense-budgets'}},
+        {'Update': {'TableName': 'expense-budgets'}}
+    ]}) == [('expense-idempotency', 'write'), ('expenses-table', 'write'), ('expense-budgets', 'write')]
+    
+    assert is_throttle({'Error': {'Code': 'ThrottlingException'}})
+    assert is_throttle({
+        'Error': {'Code': 'TransactionCanceledException'},
+        'CancellationReasons': [{'Code': 'None'}, {'Code': 'ThrottlingError'}]
+    })
+    assert not is_throttle({
+        'Error': {'Code': 'TransactionCanceledException'},
+        'CancellationReasons': [{'Code': 'ConditionalCheckFailed'}]
+    })
+    assert not is_throttle({'Error': {'Code': 'ValidationException'}})